@@ -0,0 +1,189 @@
+"""共有 MCP セッション 1 本への同時呼び出し数ごとのスループットと遅延の分布。
+
+`tests/fake_mcp_server.py`（stdio、呼び出しごとの遅延と応答サイズを指定できる偽サーバー）を
+子プロセスで起動し、本番と同じ `_ServerConnection` + `ManagedSession` 経由で `call_tool` を
+同時に `--concurrency` 件ずつ投げ続けて、calls/s と p50 / p95 / p99 を応答サイズごとに測ります。
+続けて、遅い呼び出し（`--slow-ms`）を `--slow-inflight` 件実行中にしたまま速い呼び出しを投げ、
+速い呼び出しの遅延がどれだけ伸びるか（head-of-line blocking）を測ります。
+
+`--save` で結果を JSON に書き出し、`--baseline` で以前の結果と比較します。
+
+    uv run python benchmarks/bench_mcp_concurrency.py [--calls 1000] [--latency-ms 5]
+    uv run python benchmarks/bench_mcp_concurrency.py \\
+        --baseline benchmarks/baselines/mcp_concurrency.json [--save <path>]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from slack_agent.agent import _ServerConnection
+from slack_agent.config import MCPServerSettings
+from slack_agent.mcp.session import ManagedSession
+
+FAKE_SERVER = str(Path(__file__).resolve().parents[1] / "tests" / "fake_mcp_server.py")
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _summary(samples: list[float], elapsed: float) -> dict[str, float]:
+    return {
+        "calls_per_second": round(len(samples) / elapsed, 1),
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(samples, 0.99) * 1000, 2),
+    }
+
+
+async def _timed(managed: ManagedSession, args: dict[str, Any], samples: list[float]) -> None:
+    started = time.perf_counter()
+    result = await managed.call_tool("search", args)
+    samples.append(time.perf_counter() - started)
+    if result.isError:
+        raise RuntimeError(f"call_tool failed: {result.content}")
+
+
+async def _throughput(
+    managed: ManagedSession, calls: int, concurrency: int, payload_kb: int
+) -> dict[str, float]:
+    """concurrency 件を常に実行中に保ちながら calls 件を投げる。"""
+    samples: list[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(calls):
+        queue.put_nowait(i)
+
+    async def _worker() -> None:
+        while not queue.empty():
+            i = queue.get_nowait()
+            await _timed(managed, {"query": f"q{i}", "payload_kb": payload_kb}, samples)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return _summary(samples, time.perf_counter() - started)
+
+
+async def _head_of_line(
+    managed: ManagedSession, calls: int, concurrency: int, slow_ms: float, slow_inflight: int
+) -> dict[str, float]:
+    """遅い呼び出しを slow_inflight 件実行中にしたまま、速い呼び出しの遅延を測る。"""
+    slow_samples: list[float] = []
+    slow = [
+        asyncio.create_task(
+            _timed(managed, {"query": f"slow{i}", "delay_ms": slow_ms}, slow_samples)
+        )
+        for i in range(slow_inflight)
+    ]
+    await asyncio.sleep(0.05)
+    result = await _throughput(managed, calls, concurrency, payload_kb=1)
+    result["slow_still_inflight"] = sum(not task.done() for task in slow)
+    await asyncio.gather(*slow)
+    return result
+
+
+async def _run(args: argparse.Namespace) -> dict[str, Any]:
+    settings = MCPServerSettings(
+        name="fake",
+        command=sys.executable,
+        args=(FAKE_SERVER, f"--latency-ms={args.latency_ms}", f"--jitter-ms={args.jitter_ms}"),
+        call_timeout=60.0,
+    )
+    conn = _ServerConnection(settings)
+    await conn.start()
+    try:
+        assert conn.session is not None
+        managed = ManagedSession("fake", conn.session, call_timeout=60.0)
+        await _throughput(managed, 50, 8, 1)  # ウォームアップ
+        curves: dict[str, dict[str, dict[str, float]]] = {}
+        for payload_kb in args.payload_kb:
+            curve = curves.setdefault(f"{payload_kb}kb", {})
+            for concurrency in args.concurrency:
+                row = await _throughput(managed, args.calls, concurrency, payload_kb)
+                curve[str(concurrency)] = row
+                print(
+                    f"payload {payload_kb:>4} KiB  concurrency {concurrency:>4}  "
+                    f"{row['calls_per_second']:>8.1f} calls/s  p50 {row['p50_ms']:>8.2f} ms  "
+                    f"p95 {row['p95_ms']:>8.2f} ms  p99 {row['p99_ms']:>8.2f} ms"
+                )
+        hol_concurrency = max(args.concurrency)
+        baseline = await _throughput(managed, args.calls, hol_concurrency, 1)
+        blocked = await _head_of_line(
+            managed, args.calls, hol_concurrency, args.slow_ms, args.slow_inflight
+        )
+        print(
+            f"head-of-line: p99 {baseline['p99_ms']:.2f} ms -> {blocked['p99_ms']:.2f} ms with "
+            f"{args.slow_inflight} x {args.slow_ms:.0f} ms calls in flight "
+            f"(still in flight after fast calls: {blocked['slow_still_inflight']:.0f})"
+        )
+    finally:
+        await conn.close()
+    return {
+        "params": {
+            "calls": args.calls,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "slow_ms": args.slow_ms,
+            "slow_inflight": args.slow_inflight,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "curves": curves,
+        "head_of_line": {"without_slow": baseline, "with_slow": blocked},
+    }
+
+
+def _compare(result: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """同じ応答サイズ・同時呼び出し数の calls/s と p99 を以前の結果と比べる。"""
+    print("\ncompared with baseline (current / baseline):")
+    for payload, curve in result["curves"].items():
+        for concurrency, row in curve.items():
+            old = baseline.get("curves", {}).get(payload, {}).get(concurrency)
+            if not old:
+                continue
+            print(
+                f"payload {payload:>6}  concurrency {concurrency:>4}  "
+                f"calls/s x{row['calls_per_second'] / old['calls_per_second']:.2f}  "
+                f"p99 x{row['p99_ms'] / old['p99_ms']:.2f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128, 256])
+    parser.add_argument("--payload-kb", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    # 適応タイムアウトの下限（MIN_TIMEOUT = 2 秒）未満にして、遅い呼び出しを打ち切らせない
+    parser.add_argument("--slow-ms", type=float, default=1500.0)
+    parser.add_argument("--slow-inflight", type=int, default=4)
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    args = parser.parse_args()
+
+    result = asyncio.run(_run(args))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            _compare(result, json.load(f))
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
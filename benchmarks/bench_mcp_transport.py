@@ -0,0 +1,165 @@
+"""MCP トランスポート（stdio / inprocess / thread）ごとの呼び出しレイテンシと総 RSS の比較。
+
+埋め込みモデル相当のメモリ（`--model-mb`）を import 時に確保し、`--doc-kb` の本文を
+`--results` 件返す search ツールを持つ FastMCP サーバーを用意して、トランスポートごとに
+別プロセスのワーカーで `call_tool` を繰り返し、1 回あたりの所要時間と
+ワーカー + 子プロセスの合計 RSS を計測します。
+
+    uv run python benchmarks/bench_mcp_transport.py [--calls 200] [--model-mb 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from mcp import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from slack_agent.mcp.inprocess import ThreadedServerSession
+
+TRANSPORTS = ("stdio", "inprocess", "thread")
+
+
+def _build_server(model_mb: int, results: int, doc_kb: int) -> FastMCP:
+    # 実際にページを書き込んで RSS に乗せる（bytearray(n) はゼロページのまま）
+    model = b"\x01" * (model_mb * 1024 * 1024)
+    body = "ログイン処理の仕様。" * (doc_kb * 1024 // 30)
+    server = FastMCP("bench-semche", log_level="WARNING")
+
+    @server.tool()
+    def search(query: str, top_k: int = 5) -> str:
+        """検索（モデル参照を保持したダミー）。"""
+        items = [
+            {"filepath": f"/docs/{query}/{i}.md", "score": model[i] / 1.0, "document": body}
+            for i in range(results)
+        ]
+        return json.dumps({"status": "success", "results": items}, ensure_ascii=False)
+
+    return server
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _tree_rss_kb(root: int) -> int:
+    """root と子孫プロセスの RSS 合計（Linux の /proc を走査）。"""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [root]
+    while stack:
+        pid = stack.pop()
+        total += _rss_kb(pid)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+@asynccontextmanager
+async def _session(transport: str, args: argparse.Namespace) -> AsyncIterator[Any]:
+    if transport == "stdio":
+        params = StdioServerParameters(
+            command=sys.executable,
+            args=[
+                os.path.abspath(__file__),
+                "--serve",
+                f"--model-mb={args.model_mb}",
+                f"--results={args.results}",
+                f"--doc-kb={args.doc_kb}",
+            ],
+            env=dict(os.environ),
+        )
+        async with stdio_client(params) as (read, write):  # noqa: SIM117
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield session
+        return
+
+    def factory() -> FastMCP:
+        return _build_server(args.model_mb, args.results, args.doc_kb)
+
+    if transport == "thread":
+        async with ThreadedServerSession(factory, "bench") as threaded:
+            yield threaded
+        return
+    async with create_connected_server_and_client_session(factory()) as session:
+        yield session
+
+
+async def _worker(transport: str, args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    async with _session(transport, args) as session:
+        startup = time.perf_counter() - started
+        await session.call_tool("search", {"query": "warmup"})
+        samples = []
+        for i in range(args.calls):
+            t0 = time.perf_counter()
+            await session.call_tool("search", {"query": f"q{i}"})
+            samples.append(time.perf_counter() - t0)
+        rss = _tree_rss_kb(os.getpid())
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{transport:<10} startup {startup * 1000:8.1f} ms  "
+        f"call mean {statistics.mean(samples) * 1000:7.3f} ms  p95 {p95 * 1000:7.3f} ms  "
+        f"total RSS {rss / 1024:7.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--model-mb", type=int, default=200)
+    parser.add_argument("--results", type=int, default=5)
+    parser.add_argument("--doc-kb", type=int, default=4)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", choices=TRANSPORTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _build_server(args.model_mb, args.results, args.doc_kb).run()
+        return
+    if args.worker:
+        asyncio.run(_worker(args.worker, args))
+        return
+
+    print(
+        f"calls={args.calls} model={args.model_mb} MiB response={args.results} x {args.doc_kb} KiB"
+    )
+    passthrough = [a for a in sys.argv[1:] if not a.startswith("--worker")]
+    for transport in TRANSPORTS:
+        # トランスポートごとに新しいプロセスで計測し、RSS が互いに混ざらないようにする
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), f"--worker={transport}", *passthrough],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""大きな Semche 検索レスポンスの解析・整形のマイクロベンチマーク。
+
+100 件・数 MB の合成レスポンス（TextContent の JSON）について、従来方式
+（json.loads + 結果 dict の作り直し）と現在の `parse_call_tool_result`（その場整形）、
+および JSON バックエンド（stdlib / orjson）ごとの所要時間とピークメモリを比較します。
+日本語本文をそのまま含む応答と `\\uXXXX` エスケープされた応答の両方を計測します。
+
+    uv run python benchmarks/bench_semche_parse.py [--results 100] [--doc-kb 30] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import replace
+from typing import Any
+
+from mcp.types import CallToolResult, TextContent
+
+from slack_agent.mcp import semche
+
+
+def _payload(results: int, doc_kb: int) -> str:
+    sentence = "ログイン処理はセッションを検証してからトークンを発行する。"
+    # 日本語は UTF-8 で 1 文字 3 バイト
+    body = (sentence * (doc_kb * 1024 // (3 * len(sentence)) + 1))[: doc_kb * 1024 // 3]
+    return json.dumps(
+        {
+            "status": "success",
+            "message": "ハイブリッド検索が完了しました",
+            "results": [
+                {
+                    "filepath": f"/repo/src/module_{i}.py",
+                    "score": 1.0 / (i + 1),
+                    "document": f"{i}:{body}",
+                    "metadata": {"file_type": "コード", "updated_at": "2025-11-07T00:00:00"},
+                }
+                for i in range(results)
+            ],
+            "count": results,
+            "query_vector_dimension": 768,
+            "persist_directory": "./chroma_db",
+        },
+        ensure_ascii=False,
+    )
+
+
+def _legacy_parse(result: CallToolResult) -> dict[str, Any]:
+    """変更前の実装（json.loads + str()/float() による dict の作り直し）。"""
+    for block in result.content:
+        if isinstance(block, TextContent):
+            data = json.loads(block.text)
+            results = []
+            for r in data.get("results") or []:
+                item = {
+                    "filepath": str(r.get("filepath", "")),
+                    "score": float(r.get("score", 0.0)),
+                    "metadata": r.get("metadata") or {},
+                }
+                if r.get("document") is not None:
+                    item["document"] = str(r.get("document"))
+                results.append(item)
+            return {"results": results, "count": len(results)}
+    return {}
+
+
+def _measure(
+    name: str,
+    parse: Callable[[CallToolResult], Any],
+    text: str,
+    repeat: int,
+    structured: dict[str, Any] | None = None,
+) -> None:
+    result = CallToolResult(
+        content=[TextContent(type="text", text=text)], structuredContent=structured
+    )
+    parse(result)  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parse(result)
+    per_call = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    parse(result)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<15}: {per_call * 1000:8.2f} ms/call  peak {peak / 1024 / 1024:7.2f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("--results", type=int, default=100)
+    parser.add_argument("--doc-kb", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    raw = _payload(args.results, args.doc_kb)
+    escaped = json.dumps(json.loads(raw))
+    settings = semche.SemcheClientSettings(path=None, url=None, timeout=10, chroma_dir=None)
+
+    def current(result: CallToolResult) -> Any:
+        return semche.parse_call_tool_result(result, settings)
+
+    # orjson 未導入時は json に戻るため、実際に選ばれるバックエンドだけを計測する
+    backends = dict.fromkeys(semche._select_json_loads(n)[0] for n in ("json", "orjson"))
+    for label, text in (("raw utf-8", raw), ("escaped", escaped)):
+        size = len(text.encode("utf-8")) / 1024 / 1024
+        print(f"[{label}] results={args.results} payload={size:.2f} MiB")
+        _measure("legacy", _legacy_parse, text, args.repeat)
+        for name in backends:
+            backend = replace(settings, json_backend=name)
+            _measure(
+                f"current/{name}",
+                lambda r, b=backend: semche.parse_call_tool_result(r, b),
+                text,
+                args.repeat,
+            )
+
+    # FastMCP が structuredContent も返す場合、テキスト側の JSON は解析しない
+    print("[structuredContent]")
+    _measure("legacy", _legacy_parse, raw, args.repeat, structured=json.loads(raw))
+    _measure("current", current, raw, args.repeat, structured=json.loads(raw))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""スレッド履歴 1 件あたりの保持メモリを比較するベンチマーク。
+
+Slack の `conversations.replies` が返す生のメッセージ辞書と、API 境界で変換した
+`ThreadMessage` レコードのそれぞれで、スレッドを N 件保持したときのメモリを
+tracemalloc で計測します。
+
+    uv run python benchmarks/bench_thread_memory.py [--threads 200] [--messages 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from slack_agent.records import ThreadMessage
+
+
+def _raw_message(thread: int, i: int) -> dict[str, Any]:
+    """実際の Slack メッセージに近い形（blocks / reactions / files 付き）のダミー。"""
+    text = f"<@U0BOT> スレッド{thread} の {i} 件目: ログイン処理の仕様について確認させてください"
+    return {
+        "type": "message",
+        "ts": f"1700000000.{thread:03d}{i:03d}",
+        "user": f"U{i % 7:04d}",
+        "text": text,
+        "team": "T00000",
+        "client_msg_id": f"{thread:08d}-0000-0000-0000-{i:012d}",
+        "thread_ts": f"1700000000.{thread:03d}000",
+        "blocks": [
+            {
+                "type": "rich_text",
+                "block_id": f"b{i}",
+                "elements": [
+                    {
+                        "type": "rich_text_section",
+                        "elements": [
+                            {"type": "user", "user_id": "U0BOT"},
+                            {"type": "text", "text": text},
+                        ],
+                    }
+                ],
+            }
+        ],
+        "reactions": [{"name": "eyes", "users": ["U0BOT"], "count": 1}],
+        "files": [{"id": f"F{i}", "name": "spec.pdf", "mimetype": "application/pdf"}],
+    }
+
+
+def _measure(build: Callable[[], list[list[Any]]]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    threads = build()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del threads
+    return used
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args()
+
+    def raw() -> list[list[Any]]:
+        return [[_raw_message(t, i) for i in range(args.messages)] for t in range(args.threads)]
+
+    def records() -> list[list[Any]]:
+        return [
+            [ThreadMessage.from_slack(_raw_message(t, i)) for i in range(args.messages)]
+            for t in range(args.threads)
+        ]
+
+    raw_bytes = _measure(raw)
+    record_bytes = _measure(records)
+    print(f"threads={args.threads} messages/thread={args.messages}")
+    print(f"raw dict      : {raw_bytes / args.threads:10.0f} bytes/thread")
+    print(f"ThreadMessage : {record_bytes / args.threads:10.0f} bytes/thread")
+    print(f"ratio         : {raw_bytes / max(1, record_bytes):10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""エージェント呼び出しの受付制御（アドミッションコントロール）と過負荷時の受付拒否。
+
+OpenAI の応答が遅くなると、メンションが背景イベントループ上に積み上がり、全員の待ち時間が
+際限なく伸びていく。本モジュールは `invoke_agent` の手前で次の値を見て受付可否を判断する:
+
+- 実行中の件数（`max_inflight` まで。うち `reserved_slots` は優先対象専用）
+- 実行待ちの件数（`max_queue` を超えたら拒否）
+- 直近のレイテンシ（EWMA）から予測した待ち時間（`max_wait_seconds` を超えたら拒否）
+
+拒否されたリクエストには即座に「混み合っています」の返信を返し、件数をメトリクスに記録する。
+複数ワークスペース構成ではワークスペースごとにコントローラを持ち（上限もワークスペース別）、
+`slack_agent_admission_*` はプロセス全体、`slack_agent_workspace_*` はワークスペース別の値になる。
+Bolt のリスナーは同期関数としてワーカースレッドで動くため、スレッドセーフに実装する。
+実行待ちはリスナーのスレッドを占有したまま待つので、`App` には `listener_workers()` 本の
+スレッドを持つリスナー実行器を渡す（Bolt 既定の 5 本では上限に届く前に Bolt の実行キューで
+見えないまま待たされ、受付拒否が働かない）。
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from . import metrics
+from .config import DEFAULT_WORKSPACE, AdmissionSettings, WorkspaceSettings
+
+logger = logging.getLogger(__name__)
+
+_SHED = metrics.counter(
+    "slack_agent_admission_shed_total", "受付拒否したリクエストの件数（reason / priority 別）"
+)
+_ADMITTED = metrics.counter(
+    "slack_agent_admission_admitted_total", "受け付けたリクエストの件数（priority 別）"
+)
+_INFLIGHT = metrics.gauge("slack_agent_admission_inflight", "実行中のエージェント呼び出し数")
+_QUEUED = metrics.gauge("slack_agent_admission_queue_depth", "実行待ちのリクエスト数")
+_WAIT = metrics.histogram("slack_agent_admission_wait_seconds", "受付までの待ち時間")
+_WS_INFLIGHT = metrics.gauge(
+    "slack_agent_workspace_inflight", "ワークスペースごとの実行中のエージェント呼び出し数"
+)
+_WS_QUEUED = metrics.gauge("slack_agent_workspace_queue_depth", "ワークスペースごとの実行待ち数")
+_WS_SHED = metrics.counter(
+    "slack_agent_workspace_shed_total", "ワークスペースごとの受付拒否の件数（reason 別）"
+)
+
+# レイテンシ EWMA の平滑化係数と、観測がまだ無いときの初期値（秒）
+_EWMA_ALPHA = 0.2
+_INITIAL_LATENCY = 10.0
+# 実行中・実行待ちでリスナーのスレッドが埋まっていても受付拒否の返信を送れるよう残す予備
+SHED_WORKERS = 4
+
+
+def settings_for(workspace: WorkspaceSettings | None) -> AdmissionSettings:
+    """ワークスペース別の上限を反映した受付制御の設定。"""
+    settings = AdmissionSettings.from_env()
+    return workspace.admission(settings) if workspace is not None else settings
+
+
+def listener_workers(settings: AdmissionSettings) -> int:
+    """受付制御の上限まで同時に待たせるのに必要な Bolt リスナーのスレッド数。
+
+    実行中（`max_inflight`）と実行待ち（`max_queue`、優先対象の追加の待ち枠 `reserved_slots`）の
+    全件がそれぞれスレッドを占有するため、その合計に受付拒否の返信用の予備を加える。
+    """
+    return settings.max_inflight + settings.max_queue + settings.reserved_slots + SHED_WORKERS
+
+
+@dataclass
+class Ticket:
+    """受付済みリクエスト。`release()` に渡して実行枠を返却する。"""
+
+    priority: bool
+    admitted_at: float
+
+
+class AdmissionController:
+    """実行中・実行待ちの件数とレイテンシに基づいて受付可否を判断する。"""
+
+    def __init__(self, settings: AdmissionSettings, workspace: str = DEFAULT_WORKSPACE) -> None:
+        self.settings = settings
+        self.workspace = workspace
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._waiting: dict[bool, deque[object]] = {True: deque(), False: deque()}
+        self._latency = _INITIAL_LATENCY
+        self._closed = False
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting[True]) + len(self._waiting[False])
+
+    @property
+    def latency_estimate(self) -> float:
+        return self._latency
+
+    def is_priority(self, channel: str | None, user: str | None) -> bool:
+        return bool(
+            (channel and channel in self.settings.priority_channels)
+            or (user and user in self.settings.priority_users)
+        )
+
+    def _capacity(self, priority: bool) -> int:
+        """優先対象は全枠、それ以外は予約枠を除いた枠まで同時実行できる。"""
+        if priority:
+            return self.settings.max_inflight
+        return max(1, self.settings.max_inflight - self.settings.reserved_slots)
+
+    def _can_run(self, priority: bool, token: object | None) -> bool:
+        if self._inflight >= self._capacity(priority):
+            return False
+        # 優先対象の待ちがある間は通常リクエストを先に通さない
+        if not priority and self._waiting[True]:
+            return False
+        queue = self._waiting[priority]
+        return not queue or queue[0] is token
+
+    def _predicted_wait(self, priority: bool) -> float:
+        ahead = len(self._waiting[True]) + (0 if priority else len(self._waiting[False]))
+        return (ahead + 1) * self._latency / self._capacity(priority)
+
+    def _shed(self, reason: str, priority: bool) -> None:
+        _SHED.inc(reason=reason, priority=str(priority).lower())
+        _WS_SHED.inc(workspace=self.workspace, reason=reason)
+        logger.warning(
+            "Admission shed: workspace=%s reason=%s priority=%s inflight=%d queued=%d "
+            "latency=%.1fs",
+            self.workspace,
+            reason,
+            priority,
+            self._inflight,
+            self.queue_depth,
+            self._latency,
+        )
+
+    def _admit_locked(self, priority: bool, started: float) -> Ticket:
+        self._inflight += 1
+        # プロセス全体の値は複数のコントローラ（ワークスペース）の合計になるよう増減で更新する
+        _INFLIGHT.inc()
+        _WS_INFLIGHT.set(self._inflight, workspace=self.workspace)
+        _ADMITTED.inc(priority=str(priority).lower())
+        now = time.monotonic()
+        _WAIT.observe(now - started)
+        return Ticket(priority=priority, admitted_at=now)
+
+    def acquire(self, channel: str | None = None, user: str | None = None) -> Ticket | None:
+        """実行枠を確保します。受付拒否の場合は None を返します（待つ場合はブロック）。"""
+        priority = self.is_priority(channel, user)
+        started = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._shed("draining", priority)
+                return None
+            if self._can_run(priority, None):
+                return self._admit_locked(priority, started)
+
+            # 優先対象には予約枠と同数の追加の待ち枠を認める
+            queue_limit = self.settings.max_queue + (
+                self.settings.reserved_slots if priority else 0
+            )
+            if self.queue_depth >= queue_limit:
+                self._shed("queue_full", priority)
+                return None
+            if self._predicted_wait(priority) > self.settings.max_wait_seconds:
+                self._shed("latency", priority)
+                return None
+
+            token = object()
+            queue = self._waiting[priority]
+            queue.append(token)
+            _QUEUED.inc()
+            _WS_QUEUED.set(self.queue_depth, workspace=self.workspace)
+            deadline = started + self.settings.max_wait_seconds
+            try:
+                while not self._can_run(priority, token):
+                    if self._closed:
+                        self._shed("draining", priority)
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._shed("timeout", priority)
+                        return None
+                    self._cond.wait(remaining)
+                return self._admit_locked(priority, started)
+            finally:
+                queue.remove(token)
+                _QUEUED.dec()
+                _WS_QUEUED.set(self.queue_depth, workspace=self.workspace)
+                # 先頭が抜けたので後続の待ちにも判定の機会を与える
+                self._cond.notify_all()
+
+    def close(self) -> None:
+        """ドレイン開始時に呼びます。実行待ちを起こして None を返させ、以後の受付も拒否します。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def release(self, ticket: Ticket) -> None:
+        """実行枠を返却し、実行時間をレイテンシ推定に反映します。"""
+        elapsed = time.monotonic() - ticket.admitted_at
+        with self._cond:
+            if self._inflight > 0:
+                self._inflight -= 1
+                _INFLIGHT.dec()
+            self._latency += _EWMA_ALPHA * (elapsed - self._latency)
+            _WS_INFLIGHT.set(self._inflight, workspace=self.workspace)
+            self._cond.notify_all()
@@ -1,20 +1,48 @@
 from __future__ import annotations
 
 import asyncio
-import atexit
+import contextlib
 import logging
 import os
-from typing import Any
+import uuid
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any, cast
 
 from langchain.agents import create_agent
 from langchain_core.messages import AIMessage
 from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.memory import InMemorySaver
 from mcp import ClientSession
 from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.shared.memory import create_connected_server_and_client_session
 from pydantic import SecretStr
 
-from .config import OpenAISettings
-from .text import clean_mention_text
+from .background import add_shutdown_hook
+from .cassette import Cassette, get_cassette
+from .checkpoint import ThreadCheckpoints, create_saver, run_config, thread_id_for
+from .config import (
+    AgentSettings,
+    CheckpointSettings,
+    MCPServerSettings,
+    MCPSettings,
+    ModelClientSettings,
+    OpenAISettings,
+    ToolSelectionSettings,
+)
+from .httpclient import shared_http_client
+from .mcp.cassette import CassetteSession
+from .mcp.inprocess import ThreadedServerSession, load_server
+from .mcp.semche import build_multi_search_tool
+from .mcp.session import ManagedSession
+from .memory import MEMORY
+from .middleware.cassette import CassetteMiddleware
+from .middleware.doc_dedup import DocumentDedupMiddleware, document_scope
+from .middleware.model_limits import ModelRateLimitMiddleware
+from .middleware.tool_concurrency import ToolStepConcurrencyMiddleware
+from .middleware.tool_selection import ToolSelectionMiddleware
+from .middleware.usage import RunUsage, UsageAccountingMiddleware, usage_scope
+from .records import ThreadMessage
+from .usage import get_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -23,21 +51,156 @@ _tools_lock = asyncio.Lock()
 _cached_tools: list[Any] | None = None
 
 
+class _ServerConnection:
+    """MCP サーバー 1 台分の永続接続。
+
+    トランスポート（stdio / inprocess / thread）のコンテキストは専用の所有タスク内で
+    `async with` により開いたまま保持し、close() で停止イベントを送って同じタスク内で閉じる
+    （anyio のキャンセルスコープは開いたタスクと同じタスクで閉じる必要があるため）。
+    """
+
+    def __init__(self, settings: MCPServerSettings) -> None:
+        self.settings = settings
+        self.session: ClientSession | None = None
+        # replicas 分のセッション（先頭は self.session と同じ）
+        self.replicas: list[ClientSession] = []
+        self.managed: ManagedSession | None = None
+        self.tools: list[Any] = []
+        self._task: asyncio.Task[None] | None = None
+        self._stop: asyncio.Event | None = None
+
+    @property
+    def name(self) -> str:
+        return self.settings.name
+
+    async def start(self) -> None:
+        """サーバーを起動し initialize 完了まで待つ（init_timeout 超過で失敗）。"""
+        loop = asyncio.get_running_loop()
+        ready: asyncio.Future[None] = loop.create_future()
+        self._stop = asyncio.Event()
+        self._task = loop.create_task(self._run(ready), name=f"mcp-server-{self.name}")
+        try:
+            await asyncio.wait_for(asyncio.shield(ready), timeout=self.settings.init_timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    @contextlib.asynccontextmanager
+    async def _open_session(self) -> AsyncIterator[ClientSession]:
+        """設定のトランスポートで接続し、initialize 済みのセッションを返す。"""
+        s = self.settings
+        if s.transport == "inprocess":
+            # 重い import（埋め込みモデルの読み込み等）でループを塞がないようスレッドで読み込む
+            server = await asyncio.to_thread(load_server, s.server or "", s.env)
+            async with create_connected_server_and_client_session(server) as session:
+                yield session
+            return
+        if s.transport == "thread":
+            threaded = ThreadedServerSession(lambda: load_server(s.server or "", s.env), s.name)
+            async with threaded:
+                yield cast(ClientSession, threaded)
+            return
+
+        params = StdioServerParameters(
+            command=s.command,
+            args=list(s.args),
+            env=s.process_env(),
+            cwd=os.path.expanduser(s.cwd) if s.cwd else None,
+        )
+        async with stdio_client(params) as (read, write):  # noqa: SIM117
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield session
+
+    async def _run(self, ready: asyncio.Future[None]) -> None:
+        assert self._stop is not None
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                sessions = [
+                    await stack.enter_async_context(self._open_session())
+                    for _ in range(max(1, self.settings.replicas))
+                ]
+                self.session = sessions[0]
+                self.replicas = sessions
+                ready.set_result(None)
+                await self._stop.wait()
+        except asyncio.CancelledError:
+            if not ready.done():
+                ready.cancel()
+            raise
+        except Exception as e:  # noqa: BLE001
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error("MCP サーバー %s の接続が終了しました: %s", self.name, e)
+        finally:
+            self.session = None
+            self.replicas = []
+
+    async def close(self) -> None:
+        task, stop = self._task, self._stop
+        connected = self.session is not None
+        self._task = None
+        self._stop = None
+        self.session = None
+        self.replicas = []
+        self.managed = None
+        self.tools = []
+        if task is None or task.done():
+            return
+        if task.get_loop() is not asyncio.get_running_loop():
+            # 別ループ（終了済みのテスト用ループ等）のタスクはここでは待てないため参照のみ破棄
+            return
+        if connected and stop is not None:
+            # 接続済みなら所有タスク内で正常にクローズさせる
+            stop.set()
+            with contextlib.suppress(BaseException):
+                await asyncio.wait_for(asyncio.shield(task), timeout=self.settings.init_timeout)
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(BaseException):
+                await task
+
+
+def _replay_servers(cassette: Cassette) -> tuple[MCPSettings, dict[str, _ServerConnection]]:
+    """カセットに記録した MCP サーバー構成を、カセットから応答する接続として復元する。"""
+    recorded = cassette.servers()
+    if not recorded:
+        raise RuntimeError(f"カセットに MCP サーバーの記録がありません: {cassette.path}")
+    servers: dict[str, _ServerConnection] = {}
+    for name, entry in recorded.items():
+        conn = _ServerConnection(
+            MCPServerSettings(
+                name=name,
+                command="",
+                transport="cassette",
+                call_timeout=float(entry.get("call_timeout", 10.0)),
+                list_timeout=float(entry.get("list_timeout", 10.0)),
+            )
+        )
+        session = cast(ClientSession, CassetteSession(name, cassette))
+        conn.session = session
+        conn.replicas = [session]
+        servers[name] = conn
+    settings = MCPSettings(servers=tuple(conn.settings for conn in servers.values()))
+    return settings, servers
+
+
 class MCPConnectionManager:
-    """永続 MCP セッションをプロセス内で 1 回だけ開始・保持するシングルトン。
+    """複数の永続 MCP セッションをプロセス内で 1 回だけ開始・保持するシングルトン。
 
-    - stdio_client と ClientSession を手動で __aenter__ し、__aexit__ はプロセス終了時に実行。
-    - LangChain 用の工具（tools）は初回に取得してキャッシュ。
-    - 既存のモジュールレベルキャッシュ（_cached_tools）との互換を維持するため、
-      load_mcp_tools_once() 側で _cached_tools をセットする。
+    - 対象サーバーは MCPSettings.from_env()（MCP_SEMCHE_PATH / MCP_SERVERS_FILE）で決まる。
+    - 各サーバーは並列に起動し、サーバー別の init_timeout で待つ。遅い/失敗したサーバーは
+      警告ログを出して除外し、他サーバーの起動を妨げない（全滅時のみ RuntimeError）。
+    - LangChain 用の工具（tools）は load_mcp_tools_once() がサーバーごとに取得してキャッシュ。
+      既存のモジュールレベルキャッシュ（_cached_tools）との互換も維持する。
     """
 
     def __init__(self) -> None:
         self._lock = asyncio.Lock()
         self._started: bool = False
-        self._stdio_cm: Any | None = None
-        self._session_cm: Any | None = None
-        self._session: ClientSession | None = None
+        self._settings: MCPSettings | None = None
+        self._servers: dict[str, _ServerConnection] = {}
         self._tools: list[Any] | None = None
 
     async def ensure_started(self) -> None:
@@ -56,73 +219,53 @@ class MCPConnectionManager:
                     "langchain_mcp_adapters が未導入のため MCP ツールの自動ロードに失敗しました"
                 ) from e
 
-            # 接続先（Semche MCP サーバ）: 環境変数を利用
-            path = os.getenv("MCP_SEMCHE_PATH", "")
-            if not path:
-                raise RuntimeError("MCP_SEMCHE_PATH が未設定のため MCP 接続を開始できません")
-
-            timeout = int(os.getenv("MCP_SEMCHE_TIMEOUT", 10))
-            safe_timeout = max(1, timeout)
-
-            chroma_dir = os.getenv("SEMCHE_CHROMA_DIR")
-            env = dict(os.environ)
-            if chroma_dir:
-                env["SEMCHE_CHROMA_DIR"] = chroma_dir
-
-            if not os.path.isdir(path):
-                raise RuntimeError(f"MCP_SEMCHE_PATH はディレクトリを指定してください: {path}")
-
-            work_dir = os.path.abspath(path)
-            server_rel = "src/semche/mcp_server.py"
-            server_full = os.path.join(work_dir, server_rel)
-            if not os.path.exists(server_full):
-                raise RuntimeError(f"MCP サーバースクリプトが見つかりません: {server_full}")
+            cassette = get_cassette()
+            if cassette is not None and cassette.replaying:
+                # サーバーは起動せず、記録した構成の応答をカセットから返す
+                self._settings, self._servers = _replay_servers(cassette)
+                self._started = True
+                logger.info("MCP サーバーをカセットから再生します: %s", ", ".join(self._servers))
+                return
 
-            params = StdioServerParameters(
-                command="uv",
-                args=["run", "--directory", work_dir, "python", server_rel],
-                env=env,
+            settings = MCPSettings.from_env()
+            connections = [_ServerConnection(s) for s in settings.servers]
+            results = await asyncio.gather(
+                *(conn.start() for conn in connections), return_exceptions=True
             )
 
-            # context manager を手動でオープンし保持（クローズは close() で）
-            try:
-                self._stdio_cm = stdio_client(params)
-                read, write = await self._stdio_cm.__aenter__()
-                self._session_cm = ClientSession(read, write)
-                self._session = await self._session_cm.__aenter__()
-
-                await asyncio.wait_for(self._session.initialize(), timeout=safe_timeout)
-
-                # ツール取得（実体は load_mcp_tools を load_mcp_tools_once で呼ぶ）
-                # ここではセッション有効化までを担当。ツールの取得は呼び出し元で行う。
-                self._started = True
-            except Exception:
-                # 途中まで開いた場合はクリーンアップを試みる
-                await self._safe_close()
-                self._started = False
-                raise
+            servers: dict[str, _ServerConnection] = {}
+            errors: list[str] = []
+            for conn, result in zip(connections, results, strict=True):
+                if isinstance(result, BaseException):
+                    reason = "timeout" if isinstance(result, TimeoutError) else str(result)
+                    logger.warning("MCP サーバー %s の起動に失敗しました: %s", conn.name, reason)
+                    errors.append(f"{conn.name}: {reason}")
+                else:
+                    servers[conn.name] = conn
+
+            if not servers:
+                raise RuntimeError("MCP サーバーの初期化にすべて失敗しました: " + "; ".join(errors))
+
+            self._settings = settings
+            self._servers = servers
+            self._started = True
+            logger.info(
+                "MCP サーバーを起動しました: %s (失敗 %d 件)",
+                ", ".join(f"{name}[{conn.settings.transport}]" for name, conn in servers.items()),
+                len(errors),
+            )
 
     async def _safe_close(self) -> None:
-        try:
-            if self._session_cm is not None:
-                await self._session_cm.__aexit__(None, None, None)
-        except Exception:  # noqa: BLE001
-            pass
-        finally:
-            self._session_cm = None
-            self._session = None
-
-        try:
-            if self._stdio_cm is not None:
-                await self._stdio_cm.__aexit__(None, None, None)
-        except Exception:  # noqa: BLE001
-            pass
-        finally:
-            self._stdio_cm = None
+        servers = list(self._servers.values())
+        self._servers = {}
+        for conn in servers:
+            with contextlib.suppress(Exception):
+                await conn.close()
 
     async def close(self) -> None:
         await self._safe_close()
         self._tools = None
+        self._settings = None
         self._started = False
         # モジュールキャッシュもクリアして再初期化を許可
         global _cached_tools
@@ -130,7 +273,25 @@ class MCPConnectionManager:
 
     @property
     def session(self) -> ClientSession | None:
-        return self._session
+        """最初に接続したサーバーのセッション（単一サーバー構成との互換用）。"""
+        for conn in self._servers.values():
+            if conn.session is not None:
+                return conn.session
+        return None
+
+    @property
+    def sessions(self) -> dict[str, ClientSession]:
+        """接続済みサーバー名 → セッション。"""
+        return {
+            name: conn.session for name, conn in self._servers.items() if conn.session is not None
+        }
+
+    @property
+    def namespaced(self) -> bool:
+        return self._settings is not None and self._settings.namespaced
+
+    def connections(self) -> list[_ServerConnection]:
+        return list(self._servers.values())
 
     def set_tools(self, tools: list[Any]) -> None:
         self._tools = tools
@@ -144,30 +305,68 @@ class MCPConnectionManager:
 _mcp_manager = MCPConnectionManager()
 
 
-def _register_atexit_close() -> None:
-    def _close_sync() -> None:
-        try:
-            # 可能なら新しいイベントループでクローズを実行
-            loop = asyncio.new_event_loop()
-            try:
-                loop.run_until_complete(_mcp_manager.close())
-            finally:
-                loop.close()
-        except Exception:
-            # ベストエフォート。終了時例外は握りつぶす。
-            pass
+# MCP セッションは背景ループ上で開いているため、閉じるのも同じループ上で行う
+# （ループ停止時・プロセス終了時に background が登録順に実行する）
+add_shutdown_hook(_mcp_manager.close)
 
-    atexit.register(_close_sync)
 
+async def _load_server_tools(conn: _ServerConnection, namespaced: bool) -> list[Any]:
+    """1 サーバー分のツールを list_timeout 付きで取得し、必要なら名前空間化する。"""
+    from langchain_mcp_adapters.tools import load_mcp_tools
 
-_register_atexit_close()
+    if conn.session is None:
+        raise RuntimeError(f"MCP セッションが初期化されていません: {conn.name}")
+
+    sessions = conn.replicas or [conn.session]
+    cassette = get_cassette()
+    if cassette is not None and cassette.recording:
+        # 実セッションとのやり取りを記録する（再生時は接続自体がカセットから応答する）
+        cassette.record_server(
+            conn.name,
+            call_timeout=conn.settings.call_timeout,
+            list_timeout=conn.settings.list_timeout,
+        )
+        sessions = [cast(ClientSession, CassetteSession(conn.name, cassette, s)) for s in sessions]
+    # ManagedSession は ClientSession 互換のプロキシ（call_tool に適応タイムアウトとヘッジを適用）
+    managed = ManagedSession(
+        conn.name,
+        sessions,
+        conn.settings.call_timeout,
+        hedge_tools=conn.settings.hedge_tools,
+    )
+    tools = list(
+        await asyncio.wait_for(
+            load_mcp_tools(cast(ClientSession, managed)), timeout=conn.settings.list_timeout
+        )
+    )
+    if namespaced:
+        for tool in tools:
+            tool.name = f"{conn.name}_{tool.name}"
+    conn.managed = managed
+    conn.tools = tools
+    return tools
+
+
+def _multi_search_tools(namespaced: bool) -> list[Any]:
+    """search ツールを持つサーバーごとに multi_search ツールを生成する。"""
+    tools: list[Any] = []
+    for conn in _mcp_manager.connections():
+        if conn.managed is None:
+            continue
+        prefix = f"{conn.name}_" if namespaced else ""
+        raw_names = [t.name.removeprefix(prefix) for t in conn.tools]
+        if "search" not in raw_names:
+            continue
+        tools.append(build_multi_search_tool(conn.managed, name=f"{prefix}multi_search"))
+    return tools
 
 
 async def load_mcp_tools_once() -> list[Any]:
-    """MCP セッションから LangChain Tool 群を一度だけ自動ロードして返す。
+    """接続済みの全 MCP セッションから LangChain Tool 群を一度だけ自動ロードして返す。
 
     要件:
       - langchain_mcp_adapters が必須。未導入/失敗時は RuntimeError。
+      - サーバーごとのツール取得は並列に行い、失敗したサーバーは除外（全滅時は RuntimeError）。
       - ツール0件や初期化失敗時も RuntimeError。
     キャッシュ:
       - プロセス中 1 回のみ接続・取得し、後続はキャッシュを返す。
@@ -184,39 +383,75 @@ async def load_mcp_tools_once() -> list[Any]:
         await _mcp_manager.ensure_started()
 
         try:
-            from langchain_mcp_adapters.tools import load_mcp_tools
+            from langchain_mcp_adapters.tools import load_mcp_tools  # noqa: F401
         except Exception as e:  # noqa: BLE001
             logger.error("langchain_mcp_adapters が見つかりません: %s", e)
             raise RuntimeError(
                 "langchain_mcp_adapters が未導入のため MCP ツールの自動ロードに失敗しました"
             ) from e
 
-        session = _mcp_manager.session
-        if session is None:
+        connections = _mcp_manager.connections()
+        if not connections:
             raise RuntimeError("MCP セッションが初期化されていません")
 
-        timeout = int(os.getenv("MCP_SEMCHE_TIMEOUT", 10))
-        safe_timeout = max(1, timeout)
-
-        try:
-            tools = await asyncio.wait_for(load_mcp_tools(session), timeout=safe_timeout)
-        except Exception as e:  # noqa: BLE001
-            logger.error("MCP ツールの自動ロード中に失敗しました: %s", e, exc_info=True)
-            raise RuntimeError("MCP ツールの自動ロードに失敗しました") from e
-
-        if not tools:
+        results = await asyncio.gather(
+            *(_load_server_tools(conn, _mcp_manager.namespaced) for conn in connections),
+            return_exceptions=True,
+        )
+        tool_list: list[Any] = []
+        failures = 0
+        for conn, result in zip(connections, results, strict=True):
+            if isinstance(result, BaseException):
+                failures += 1
+                logger.error(
+                    "MCP サーバー %s のツール自動ロード中に失敗しました: %s",
+                    conn.name,
+                    result,
+                    exc_info=result,
+                )
+                continue
+            tool_list.extend(result)
+
+        if failures == len(connections):
+            raise RuntimeError("MCP ツールの自動ロードに失敗しました")
+        if not tool_list:
             raise RuntimeError("MCP から取得できるツールが 0 件でした")
 
-        tool_list = list(tools)
         _mcp_manager.set_tools(tool_list)
         _cached_tools = tool_list
-        logger.info("MCP ツールを %d 件ロードしました", len(_cached_tools))
+        logger.info(
+            "MCP ツールを %d 件ロードしました (servers=%d)", len(tool_list), len(connections)
+        )
         return _cached_tools
 
 
 # --- Agent graph (async, once) ---
 _agent_lock = asyncio.Lock()
 _agent_graph: Any | None = None
+_thread_checkpoints: ThreadCheckpoints | None = None
+
+
+def _checkpoint_storage() -> object:
+    """プロセス内に保持しているスレッド状態（永続バックエンドではメモリ上の管理情報のみ）。"""
+    if _thread_checkpoints is None:
+        return None
+    if isinstance(_thread_checkpoints.saver, InMemorySaver):
+        return (_thread_checkpoints.saver, _thread_checkpoints)
+    return _thread_checkpoints
+
+
+async def _shrink_checkpoints(fraction: float) -> int:
+    return await _thread_checkpoints.shrink(fraction) if _thread_checkpoints is not None else 0
+
+
+MEMORY.register("mcp_tools", lambda: _cached_tools, lambda: len(_cached_tools or ()))
+MEMORY.register(
+    "checkpoints",
+    _checkpoint_storage,
+    lambda: len(_thread_checkpoints) if _thread_checkpoints is not None else 0,
+    _shrink_checkpoints,
+)
+MEMORY.register("agent_graph", lambda: _agent_graph)
 
 
 async def get_agent_graph() -> Any:
@@ -224,8 +459,18 @@ async def get_agent_graph() -> Any:
 
     - MCP ツールは load_mcp_tools_once() で自動ロード（失敗時はエラー）。
     - OpenAI 設定とシステムプロンプトは現状踏襲。
+    - 1 ステップ内の複数ツール呼び出しは ToolStepConcurrencyMiddleware で並列度を制限して実行。
+    - 1 回の実行内で重複した検索ドキュメントは DocumentDedupMiddleware で参照に置き換える。
+    - OpenAI への接続は共有 HTTP クライアントを使い、再試行と TPM / RPM の流量制御は
+      ModelRateLimitMiddleware で行う（ChatOpenAI 自身の再試行は無効）。
+    - モデル呼び出しには ToolSelectionMiddleware で質問に関係するツールだけを縮小して渡す。
+    - モデル呼び出しごとのトークン使用量は UsageAccountingMiddleware で実行単位に集計する。
+    - CASSETTE_MODE が record / replay ならモデル呼び出しを CassetteMiddleware で記録・再生する
+      （再生時は OpenAI に接続しないため OPENAI_API_KEY は不要）。
+    - AGENT_CHECKPOINT_BACKEND が none 以外なら checkpointer 付きでコンパイルし、
+      Slack スレッド単位の状態を ThreadCheckpoints で保持・退避する。
     """
-    global _agent_graph
+    global _agent_graph, _thread_checkpoints
     if _agent_graph is not None:
         return _agent_graph
 
@@ -233,9 +478,20 @@ async def get_agent_graph() -> Any:
         if _agent_graph is not None:
             return _agent_graph
 
-        settings = OpenAISettings.from_env()
+        cassette = get_cassette()
+        settings = OpenAISettings.from_env(
+            require_api_key=cassette is None or not cassette.replaying
+        )
+        agent_settings = AgentSettings.from_env()
+        client_settings = ModelClientSettings.from_env()
+        # 接続プールを共有し、再試行は ModelRateLimitMiddleware が流量制御と合わせて行う
         llm = ChatOpenAI(
-            model=settings.model, api_key=SecretStr(settings.api_key), temperature=0.7
+            model=settings.model,
+            api_key=SecretStr(settings.api_key),
+            temperature=0.7,
+            http_async_client=shared_http_client(client_settings),
+            timeout=client_settings.timeout_seconds,
+            max_retries=0,
         )
 
         system_prompt = (
@@ -247,44 +503,166 @@ async def get_agent_graph() -> Any:
             "`file_type`は`実装内容`、`コード`、`JIRA`が指定できます。実装内容はコードを要約した日本語ドキュメントです。"
             "`実装内容`のファイル名はコードのファイル名の後ろに.exp.mdをつけたものです。"
             "取得本文は要約・引用で必要部分のみ提示。"
+            "複数の検索が必要な場合は、1 回の応答でツール呼び出しをまとめて並列に発行してください。"
+            "表現揺れが考えられる検索は、言い換えクエリを multi_search にまとめて渡してください。"
         )
 
         tools = await load_mcp_tools_once()
-
-        graph: Any = create_agent(model=llm, tools=tools, system_prompt=system_prompt)
-        logger.info("Agent graph created with model=%s (tools=%d)", settings.model, len(tools))
+        # 言い換えクエリを並列検索して順位統合する multi_search を追加（search を持つサーバーのみ）
+        tools = [*tools, *_multi_search_tools(_mcp_manager.namespaced)]
+
+        checkpoint_settings = CheckpointSettings.from_env()
+        saver = await create_saver(checkpoint_settings) if checkpoint_settings.enabled else None
+
+        middleware = [
+            ToolStepConcurrencyMiddleware(agent_settings.tool_concurrency),
+            DocumentDedupMiddleware(),
+            ToolSelectionMiddleware(ToolSelectionSettings.from_env()),
+            # 再試行の外側に置き、成功した応答の使用量だけを数える
+            UsageAccountingMiddleware(),
+            # 他のミドルウェアが加工した後のリクエストでトークン数を見積もる
+            ModelRateLimitMiddleware(client_settings),
+        ]
+        if cassette is not None:
+            # 最も内側に置き、実際のモデル呼び出し 1 回ごとに記録・再生する
+            middleware.append(CassetteMiddleware(cassette))
+        graph: Any = create_agent(
+            model=llm,
+            tools=tools,
+            system_prompt=system_prompt,
+            middleware=middleware,
+            checkpointer=saver,
+        )
+        if saver is not None:
+            _thread_checkpoints = ThreadCheckpoints(saver, checkpoint_settings)
+        logger.info(
+            "Agent graph created with model=%s (tools=%d, tool_concurrency=%d, checkpoint=%s, "
+            "cassette=%s)",
+            settings.model,
+            len(tools),
+            agent_settings.tool_concurrency,
+            checkpoint_settings.backend,
+            cassette.mode if cassette is not None else "off",
+        )
         _agent_graph = graph
         return _agent_graph
 
 
-async def invoke_agent(question: str, history: list[dict[str, Any]] | None = None) -> str:
+async def has_thread_state(thread_key: tuple[str, str], workspace: str | None = None) -> bool:
+    """`(channel, thread_ts)` のエージェント状態が保存済みなら True。
+
+    判定の後に状態が退避されることがあるため、履歴取得を省略するかどうかはこの結果では
+    決めず、`invoke_agent` の `load_history` に任せる。
+    """
+    if _thread_checkpoints is None:
+        return False
+    return await _thread_checkpoints.has_state(thread_id_for(*thread_key, workspace=workspace))
+
+
+def _history_to_messages(history: Sequence[ThreadMessage]) -> list[dict[str, str]]:
+    """Slack履歴をLangChainのmessagesへ粗くマッピングする（本文は呼び出し元で正規化済み）。"""
+    lc_messages: list[dict[str, str]] = []
+    for msg in history:
+        text = msg.text.strip()
+        if not text:
+            continue
+        # Botの投稿はassistant扱い、それ以外はuser扱い（簡易規則）
+        role = "assistant" if msg.is_bot else "user"
+        lc_messages.append({"role": role, "content": text})
+    return lc_messages
+
+
+async def _record_usage(
+    usage: RunUsage, channel: str | None, user: str | None, workspace: str | None, ok: bool
+) -> None:
+    """実行 1 回分の使用量をログに出し、チャンネル・ユーザー・モデル等の別の集計に加えます。"""
+    try:
+        totals = await asyncio.to_thread(get_ledger().record, usage, channel, user, workspace)
+    except Exception as e:  # noqa: BLE001 - 集計の失敗で応答を失敗させない
+        logger.warning("Failed to record agent usage: %s", e)
+        return
+    logger.info(
+        "Agent usage: model=%s prompt=%d completion=%d cached=%d turns=%d tool_calls=%d "
+        "tool_schema_saved=%d cost_usd=%.6f ok=%s",
+        usage.model,
+        usage.prompt_tokens,
+        usage.completion_tokens,
+        usage.cached_tokens,
+        usage.llm_turns,
+        usage.tool_calls,
+        usage.tool_schema_tokens_saved,
+        totals.cost_usd,
+        ok,
+        extra={
+            "usage": {
+                **usage.as_dict(),
+                "cost_usd": totals.cost_usd,
+                "channel": channel,
+                "user": user,
+                "workspace": workspace,
+            }
+        },
+    )
+
+
+async def invoke_agent(
+    question: str,
+    history: Sequence[ThreadMessage] | None = None,
+    thread_key: tuple[str, str] | None = None,
+    user: str | None = None,
+    workspace: str | None = None,
+    load_history: Callable[[], Sequence[ThreadMessage]] | None = None,
+) -> str:
     """Agents API 経由で質問を投げ、最終出力文字列を返します。
 
     Parameters
     - question: 現在のユーザーからの質問（メンション本文クリーニング済み）
-    - history: Slack conversations.replies で取得したメッセージ辞書の配列（任意）
+    - history: Slack conversations.replies で取得したメッセージ（`ThreadMessage`）の配列（任意）
+    - thread_key: `(channel, thread_ts)`。指定時はスレッド単位の保存済み状態から再開し、
+      今回の質問だけを追加する（保存済み状態がなければ history から状態を作る）
+    - user: 質問したユーザーの ID（任意）。トークン使用量・コストの集計キーに使う
+    - workspace: 複数ワークスペース構成でのワークスペース名（任意）。MCP 接続とグラフは
+      共有し、スレッド状態の thread_id と使用量の集計キーをワークスペースごとに分ける
+    - load_history: 保存済み状態から再開できないときだけ呼ぶ履歴の取得関数（任意。ワーカー
+      スレッドで実行する）。再開するかどうかの判定と履歴の取得をここで一度に行うため、
+      判定後に状態が退避されても文脈なしで答えることがない
     """
     graph = await get_agent_graph()
+    checkpoints = _thread_checkpoints if getattr(graph, "checkpointer", None) else None
+    thread_id: str | None = None
+    resumed = False
+    if checkpoints is not None:
+        # checkpointer 付きグラフは thread_id 必須。thread_key なしは使い捨ての thread_id を使う
+        thread_id = (
+            thread_id_for(*thread_key, workspace=workspace)
+            if thread_key
+            else f"adhoc:{uuid.uuid4().hex}"
+        )
+        resumed = await checkpoints.begin(thread_id)
+
+    message_count = 0
+    ok = False
+    usage: RunUsage | None = None
     try:
-        # Slack履歴をLangChainのmessagesへ粗くマッピング
         lc_messages: list[dict[str, str]] = []
-        if history:
-            for msg in history:
-                raw = str(msg.get("text", "")).strip()
-                text = clean_mention_text(raw) if raw else ""
-                if not text:
-                    continue
-                # bot_idがあればassistant扱い、なければuser扱い（簡易規則）
-                role = "assistant" if msg.get("bot_id") else "user"
-                lc_messages.append({"role": role, "content": text})
+        if not resumed and not history and load_history is not None:
+            history = await asyncio.to_thread(load_history)
+        if history and not resumed:
+            lc_messages.extend(_history_to_messages(history))
 
         # 最後に今回の質問を追加（ユーザーメッセージ）
         lc_messages.append({"role": "user", "content": question})
 
-        state = await graph.ainvoke({
-            "messages": lc_messages,
-        })
+        inputs = {"messages": lc_messages}
+        # 同じ実行内で既出の検索ドキュメントは参照に置き換える（DocumentDedupMiddleware）
+        with document_scope(), usage_scope() as usage:
+            if thread_id is None:
+                state = await graph.ainvoke(inputs)
+            else:
+                state = await graph.ainvoke(inputs, config=run_config(thread_id))
         messages = state.get("messages", [])
+        message_count = len(messages)
+        ok = True
         answer_text = None
         if messages:
             last = messages[-1]
@@ -296,3 +674,13 @@ async def invoke_agent(question: str, history: list[dict[str, Any]] | None = Non
     except Exception as e:  # noqa: BLE001
         logger.error("Agent invocation failed: %s", e, exc_info=True)
         raise
+    finally:
+        if usage is not None and usage.llm_turns:
+            channel = thread_key[0] if thread_key else None
+            await _record_usage(usage, channel, user, workspace, ok)
+        if checkpoints is not None and thread_id is not None:
+            if thread_key is None:
+                await checkpoints.discard(thread_id)
+            else:
+                # 失敗した実行の途中状態（未完了の tool_calls 等）からは再開しない
+                await checkpoints.end(thread_id, message_count, ok=ok)
@@ -0,0 +1,104 @@
+"""よく聞かれる質問の回答キャッシュ（バッチ実行で温め、Bot が再利用する）。
+
+`slack-agent batch --warm` が前週の頻出質問の回答を書き込み、Bot はスレッド外からの
+新しいメンション（履歴も保存済み状態もない質問）に限ってキャッシュの回答を返す。
+バッチと Bot は別プロセスのため、保存先は同じホストで共有できる SQLite とする。
+質問は `normalize_question()`（NFKC・小文字化・空白の畳み込み）で正規化し、ワークスペースごとに
+照合する（別のワークスペースで温めた回答は返さない）。
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from . import metrics
+from .config import DEFAULT_WORKSPACE, AnswerCacheSettings
+
+logger = logging.getLogger(__name__)
+
+_LOOKUPS = metrics.counter(
+    "slack_agent_answer_cache_total", "回答キャッシュの参照・書き込みの件数（outcome 別）"
+)
+
+
+def normalize_question(text: str) -> str:
+    """表記ゆれ（全角・半角、大文字・小文字、空白）を吸収した照合用のキー。"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class AnswerCache:
+    """SQLite に保存する回答キャッシュ（同じホストの複数プロセスで共有できる）。"""
+
+    def __init__(self, path: str, ttl_seconds: float) -> None:
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+            if columns and "workspace" not in columns:
+                # ワークスペースを区別しない旧形式のキャッシュは捨てる（次の --warm で作り直す）
+                logger.info("Dropping answer cache without workspace column: %s", path)
+                self._conn.execute("DROP TABLE answers")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (workspace TEXT, question TEXT, "
+                "answer TEXT, stored_at REAL, PRIMARY KEY (workspace, question))"
+            )
+
+    def get(self, question: str, workspace: str = DEFAULT_WORKSPACE) -> str | None:
+        """ワークスペースの有効期限内の回答を返します（無ければ None）。"""
+        key = normalize_question(question)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers "
+                "WHERE workspace = ? AND question = ? AND stored_at >= ?",
+                (workspace, key, time.time() - self._ttl),
+            ).fetchone()
+        _LOOKUPS.inc(outcome="hit" if row else "miss")
+        return str(row[0]) if row else None
+
+    def put(self, question: str, answer: str, workspace: str = DEFAULT_WORKSPACE) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (workspace, question, answer, stored_at) "
+                "VALUES (?, ?, ?, ?)",
+                (workspace, normalize_question(question), answer, now),
+            )
+            self._conn.execute("DELETE FROM answers WHERE stored_at < ?", (now - self._ttl,))
+        _LOOKUPS.inc(outcome="stored")
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        return int(row[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_answer_cache(settings: AnswerCacheSettings) -> AnswerCache | None:
+    if settings.backend == "sqlite":
+        logger.info("Answer cache: sqlite (%s, ttl=%ds)", settings.path, settings.ttl_seconds)
+        return AnswerCache(settings.path, settings.ttl_seconds)
+    return None
+
+
+_cache: AnswerCache | None = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache | None:
+    """プロセス共有の回答キャッシュ（`ANSWER_CACHE=off` なら None）。"""
+    global _cache, _cache_loaded
+    with _cache_lock:
+        if not _cache_loaded:
+            _cache = create_answer_cache(AnswerCacheSettings.from_env())
+            _cache_loaded = True
+        return _cache
@@ -0,0 +1,179 @@
+"""プロセス中存続する背景イベントループ（永続）で非同期関数を実行する仕組み。
+
+Slack Bolt の同期ハンドラー内で asyncio.run() を使うと、処理後にイベントループが
+クローズされ、そこで生成された MCP セッションの下層ストリームも閉じられてしまう。
+これを避けるため、プロセス中に存続する専用のイベントループを別スレッドで動かし、
+そのループ上でエージェント実行を行う。
+
+MCP セッションのように背景ループ上で開いた資源は、同じループ上で閉じる必要がある。
+`add_shutdown_hook()` で登録したコルーチン関数は、ループ停止時（`stop_background_loop()`、
+プロセス終了時の atexit）に背景ループ上で登録順に実行してから停止する。停止後の `submit()` は
+ループを作り直さずに RuntimeError とする（閉じた MCP セッションのまま新しいループで動かさない）。
+明示的に `start()` した場合だけ再び投入できる。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import contextlib
+import logging
+import threading
+from collections.abc import Awaitable, Callable, Coroutine
+from concurrent.futures import Future
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ShutdownHook = Callable[[], Awaitable[None]]
+
+
+class BackgroundLoop:
+    """別スレッドで動く永続イベントループ。投入中のコルーチンを追跡し、停止時に後始末する。"""
+
+    def __init__(self, name: str = "slack-agent-bg-loop") -> None:
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._running: set[Future[Any]] = set()
+        self._hooks: list[ShutdownHook] = []
+        self._stopped = False
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop | None:
+        return self._loop
+
+    @property
+    def thread_ident(self) -> int | None:
+        """ループを動かしているスレッドの ident（未起動なら None）。"""
+        return self._thread.ident if self._thread is not None else None
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            self._stopped = False
+            ready = threading.Event()
+            holder: list[asyncio.AbstractEventLoop] = []
+
+            def _runner() -> None:
+                loop = asyncio.new_event_loop()
+                try:
+                    asyncio.set_event_loop(loop)
+                    holder.append(loop)
+                    ready.set()
+                    loop.run_forever()
+                finally:
+                    # ループ停止時のクローズ
+                    with contextlib.suppress(Exception):
+                        loop.close()
+
+            thread = threading.Thread(target=_runner, name=self.name, daemon=True)
+            thread.start()
+            ready.wait(timeout=5)
+            if not holder:
+                raise RuntimeError("背景イベントループの起動に失敗しました")
+            self._loop, self._thread = holder[0], thread
+            return self._loop
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> Future[T]:
+        """コルーチンを背景ループへ投入し、完了を待てる Future を返します（停止後は例外）。"""
+        with self._lock:
+            loop, stopped = self._loop, self._stopped
+        if loop is None:
+            if stopped:
+                coro.close()
+                raise RuntimeError("背景イベントループは停止済みです")
+            loop = self.start()
+        fut: Future[T] = asyncio.run_coroutine_threadsafe(coro, loop)
+        with self._lock:
+            self._running.add(fut)
+        fut.add_done_callback(self._discard)
+        return fut
+
+    def _discard(self, fut: Future[Any]) -> None:
+        with self._lock:
+            self._running.discard(fut)
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """コルーチンを背景ループで同期的に実行して結果を返します。"""
+        return self.submit(coro).result()
+
+    def running(self) -> int:
+        """背景ループで実行中（未完了）のコルーチン数。"""
+        with self._lock:
+            return len(self._running)
+
+    def cancel_running(self) -> int:
+        """実行中のコルーチンをすべて取り消し、取り消した件数を返します。"""
+        with self._lock:
+            running = list(self._running)
+        return sum(1 for fut in running if fut.cancel())
+
+    def add_shutdown_hook(self, hook: ShutdownHook) -> None:
+        """ループ停止時に背景ループ上で実行するコルーチン関数を登録します。"""
+        with self._lock:
+            self._hooks.append(hook)
+
+    async def _run_hooks(self) -> bool:
+        ok = True
+        for hook in list(self._hooks):
+            try:
+                await hook()
+            except Exception as e:  # noqa: BLE001 - 後続のフックも必ず実行する
+                ok = False
+                logger.warning("Background loop shutdown hook failed: %s", e)
+        return ok
+
+    def stop(self, timeout: float = 10.0) -> bool:
+        """停止フックを背景ループ上で実行してからループを止めます。
+
+        フックがすべて timeout 以内に成功した場合（ループ未起動も含む）に True を返します。
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+            self._stopped = True
+        if loop is None:
+            return True
+        ok = False
+        try:
+            ok = asyncio.run_coroutine_threadsafe(self._run_hooks(), loop).result(timeout)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Background loop shutdown hooks did not finish: %s", e)
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout)
+        return ok
+
+
+_default = BackgroundLoop()
+
+
+def default_loop() -> BackgroundLoop:
+    """ハンドラーとエージェントが共有するプロセス既定の背景ループ。"""
+    return _default
+
+
+def start_background_loop() -> None:
+    _default.start()
+
+
+def run_in_background(coro: Coroutine[Any, Any, T]) -> T:  # noqa: UP047 - 単純な汎用同期ヘルパ
+    """永続イベントループでコルーチンを同期的に実行して結果を返す。"""
+    return _default.run(coro)
+
+
+def add_shutdown_hook(hook: ShutdownHook) -> None:
+    _default.add_shutdown_hook(hook)
+
+
+def stop_background_loop(timeout: float = 10.0) -> bool:
+    return _default.stop(timeout)
+
+
+atexit.register(stop_background_loop)
@@ -0,0 +1,281 @@
+"""質問の JSONL を並列にエージェントへ投げ、回答を JSONL に書き出すバッチ実行。
+
+`slack-agent batch`（`python -m slack_agent.batch`）で起動する。
+
+- 入力: 1 行 1 件の JSON（`question` 必須、`id` / `user` 任意。`id` 省略時は行番号）
+- 出力: 入力と同じ順に 1 行 1 件（`id`, `question`, `answer`, `error`, `seconds`, `usage`）。
+  完了した行から順に追記・flush するため、大きな入力でも途中経過が残る
+- 再開: 出力ファイルが既にあれば、完了済みの行（入力の先頭から同じ `id` の並び）を飛ばして
+  続きから実行する。クラッシュで途中まで書かれた末尾の行は切り捨てる
+- 並列度: `--concurrency`（既定は `BATCH_CONCURRENCY`）。MCP セッション・グラフ・モデル呼び出しの
+  制限は Bot と同じくプロセスで共有する
+- キャッシュの温め: `--top N` で入力中の頻出質問（正規化後の一致）上位 N 件に絞り、`--warm` で
+  回答を回答キャッシュ（`ANSWER_CACHE=sqlite`）へ書き込む。ピーク前に前週の質問で実行しておくと、
+  Bot はスレッド外の同じ質問にエージェントを呼ばずに回答する
+- ワークスペース: `--workspace`（既定は `default`）。回答キャッシュと使用量の集計キーを
+  そのワークスペースに分ける（キャッシュの回答は温めたワークスペースでだけ返す）
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Any, TextIO
+
+from .agent import invoke_agent
+from .answers import AnswerCache, get_answer_cache, normalize_question
+from .background import run_in_background, stop_background_loop
+from .config import DEFAULT_WORKSPACE, BatchSettings, LoggingSettings
+from .logsetup import configure_logging, stop_logging
+from .middleware.usage import usage_scope
+from .usage import estimate_cost, get_ledger
+
+logger = logging.getLogger(__name__)
+
+# 並列度に対して先行して実行してよい件数の倍率（遅い 1 件の後ろに溜まる出力待ちの上限）
+_WINDOW_FACTOR = 4
+
+
+@dataclass(frozen=True, slots=True)
+class BatchItem:
+    id: str
+    question: str
+    user: str | None = None
+    # --top で頻出質問に絞ったときの出現回数
+    count: int | None = None
+
+
+@dataclass
+class BatchSummary:
+    answered: int = 0
+    failed: int = 0
+    skipped: int = 0
+    cached: int = 0
+
+
+def read_questions(path: str) -> Iterator[BatchItem]:
+    """質問の JSONL を 1 件ずつ読みます（空行は無視。形式不正は RuntimeError）。"""
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RuntimeError(f"{path}:{lineno} の JSON を解析できません: {e}") from e
+            question = data.get("question") if isinstance(data, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                raise RuntimeError(f"{path}:{lineno} に question（文字列）がありません")
+            user = data.get("user")
+            yield BatchItem(
+                id=str(data.get("id", lineno)),
+                question=question,
+                user=user if isinstance(user, str) else None,
+            )
+
+
+def most_frequent(items: Iterable[BatchItem], top: int) -> list[BatchItem]:
+    """正規化後に同じ質問を数え、出現回数の多い順に上位 top 件を返します（同数は先に出た順）。"""
+    counts: Counter[str] = Counter()
+    first: dict[str, BatchItem] = {}
+    for item in items:
+        key = normalize_question(item.question)
+        counts[key] += 1
+        first.setdefault(key, item)
+    return [
+        BatchItem(first[key].id, first[key].question, first[key].user, count)
+        for key, count in counts.most_common(top)
+    ]
+
+
+def completed_ids(path: str) -> list[str]:
+    """出力ファイルの完了済みの `id` を順に返します（途中まで書かれた末尾の行は切り捨てる）。"""
+    if not os.path.exists(path):
+        return []
+    ids: list[str] = []
+    with open(path, "rb+") as f:
+        offset = 0
+        for lineno, line in enumerate(f, start=1):
+            if not line.endswith(b"\n"):
+                logger.warning("Truncating partial trailing line of %s (%d bytes)", path, len(line))
+                f.truncate(offset)
+                break
+            try:
+                ids.append(str(json.loads(line)["id"]))
+            except (ValueError, KeyError, TypeError) as e:
+                raise RuntimeError(
+                    f"{path}:{lineno} は再開できる出力の行ではありません: {e}"
+                ) from e
+            offset += len(line)
+    return ids
+
+
+def _skip_completed(items: Iterable[BatchItem], done: Sequence[str]) -> Iterator[BatchItem]:
+    """入力の先頭から完了済みの件数を飛ばします（`id` の並びが一致しなければ RuntimeError）。"""
+    iterator = iter(items)
+    for expected in done:
+        item = next(iterator, None)
+        if item is None or item.id != expected:
+            raise RuntimeError(
+                f"出力ファイルの id={expected} が入力と一致しません"
+                "（別の入力・オプションで作った出力です）"
+            )
+    yield from iterator
+
+
+async def _answer(
+    item: BatchItem, semaphore: asyncio.Semaphore, cache: AnswerCache | None, workspace: str
+) -> dict[str, Any]:
+    scope: dict[str, Any] = {} if workspace == DEFAULT_WORKSPACE else {"workspace": workspace}
+    async with semaphore:
+        started = time.perf_counter()
+        answer: str | None = None
+        error: str | None = None
+        with usage_scope() as usage:
+            try:
+                answer = await invoke_agent(item.question, user=item.user, **scope)
+            except Exception as e:  # noqa: BLE001 - 1 件の失敗でバッチを止めない
+                error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - started
+        if answer and cache is not None:
+            await asyncio.to_thread(cache.put, item.question, answer, workspace)
+    record: dict[str, Any] = {
+        "id": item.id,
+        "question": item.question,
+        "answer": answer,
+        "error": error,
+        "seconds": round(seconds, 3),
+        "usage": {
+            **usage.as_dict(),
+            "cost_usd": estimate_cost(usage, get_ledger().settings.prices),
+        },
+    }
+    if item.count is not None:
+        record["count"] = item.count
+    return record
+
+
+async def run_batch(
+    items: Iterable[BatchItem],
+    out: TextIO,
+    concurrency: int,
+    cache: AnswerCache | None = None,
+    workspace: str = DEFAULT_WORKSPACE,
+) -> BatchSummary:
+    """質問を最大 concurrency 件ずつ並列に実行し、入力と同じ順に out へ 1 行ずつ書き出します。"""
+    summary = BatchSummary()
+    semaphore = asyncio.Semaphore(concurrency)
+    # 先行して始めてよい件数。先頭の 1 件が遅くても出力待ちの回答が溜まり続けない
+    window = asyncio.Semaphore(concurrency * _WINDOW_FACTOR)
+    # 入力順に並べたタスク（None は入力の終わり）
+    pending: asyncio.Queue[asyncio.Task[dict[str, Any]] | None] = asyncio.Queue()
+
+    async def _produce() -> None:
+        try:
+            for item in items:
+                await window.acquire()
+                pending.put_nowait(asyncio.create_task(_answer(item, semaphore, cache, workspace)))
+        finally:
+            pending.put_nowait(None)
+
+    producer = asyncio.create_task(_produce())
+    try:
+        while (task := await pending.get()) is not None:
+            record = await task
+            window.release()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if record["error"] is not None:
+                summary.failed += 1
+                logger.warning("Batch question failed id=%s: %s", record["id"], record["error"])
+                continue
+            summary.answered += 1
+            if cache is not None and record["answer"]:
+                summary.cached += 1
+        # 入力の読み込みエラー（形式不正・再開位置の不一致）はここで送出される
+        await producer
+    finally:
+        # 書き出しの失敗・中断時は実行中の質問も取り消す
+        producer.cancel()
+        while not pending.empty():
+            leftover = pending.get_nowait()
+            if leftover is not None:
+                leftover.cancel()
+    return summary
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="slack-agent batch",
+        description="Answer questions from a JSONL file and write answers to JSONL.",
+    )
+    parser.add_argument("input", help='questions JSONL (one {"question": ...} per line)')
+    parser.add_argument("-o", "--output", required=True, help="answers JSONL (appended on resume)")
+    parser.add_argument("-c", "--concurrency", type=int, help="parallel questions (1-64)")
+    parser.add_argument("--top", type=int, help="only the N most frequent distinct questions")
+    parser.add_argument("--warm", action="store_true", help="store answers in the answer cache")
+    parser.add_argument(
+        "--workspace",
+        default=DEFAULT_WORKSPACE,
+        help="workspace whose answer cache and usage the run counts toward",
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true", help="overwrite the output instead of resuming"
+    )
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """`slack-agent batch` のエントリポイント。失敗した質問があれば終了コード 1 を返します。"""
+    args = _parser().parse_args(argv)
+    configure_logging(LoggingSettings.from_env())
+    try:
+        concurrency = args.concurrency or BatchSettings.from_env().concurrency
+        if not 1 <= concurrency <= 64:
+            raise RuntimeError(f"--concurrency は 1〜64 で指定してください: {concurrency}")
+        cache = get_answer_cache() if args.warm else None
+        if args.warm and cache is None:
+            raise RuntimeError("--warm には ANSWER_CACHE=sqlite の設定が必要です")
+
+        items: Iterable[BatchItem] = read_questions(args.input)
+        if args.top is not None:
+            items = most_frequent(items, max(1, args.top))
+        if args.no_resume and os.path.exists(args.output):
+            os.remove(args.output)
+        done = completed_ids(args.output)
+        items = _skip_completed(items, done)
+
+        started = time.monotonic()
+        with open(args.output, "a", encoding="utf-8") as out:
+            summary = run_in_background(run_batch(items, out, concurrency, cache, args.workspace))
+        summary.skipped = len(done)
+        logger.info(
+            "Batch finished: answered=%d failed=%d resumed_after=%d cached=%d "
+            "workspace=%s concurrency=%d seconds=%.1f",
+            summary.answered,
+            summary.failed,
+            summary.skipped,
+            summary.cached,
+            args.workspace,
+            concurrency,
+            time.monotonic() - started,
+        )
+        return 1 if summary.failed else 0
+    except RuntimeError as e:
+        logger.error("Batch aborted: %s", e)
+        return 2
+    finally:
+        # MCP セッションの後始末と使用量の書き出し（背景ループの停止フック）
+        stop_background_loop()
+        stop_logging()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
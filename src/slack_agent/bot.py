@@ -1,36 +1,115 @@
 from __future__ import annotations
 
 import logging
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-from .config import SlackSettings
+from . import batch, metrics
+from .admission import listener_workers, settings_for
+from .config import (
+    DEFAULT_WORKSPACE,
+    DrainSettings,
+    LoggingSettings,
+    LoopMonitorSettings,
+    MemorySettings,
+    MetricsSettings,
+    SlackSettings,
+    SocketModeSettings,
+    WorkspaceSettings,
+)
 from .handlers import message
+from .ingress import SocketModePool, create_deduper
+from .lifecycle import LIFECYCLE
+from .logsetup import configure_logging
+from .loopmonitor import LoopMonitor
+from .memory import MEMORY
 
 
-def build_app() -> App:
-    """Slack Bolt アプリケーションを構築して返します。"""
-    settings = SlackSettings.from_env()
-    app = App(token=settings.bot_token)
-    # ハンドラーを登録
-    message.register(app)
+def build_app(workspace: WorkspaceSettings | None = None) -> App:
+    """Slack Bolt アプリケーションを構築して返します。
+
+    `workspace` を省略した場合は SLACK_BOT_TOKEN の単一ワークスペース構成になります。
+    """
+    if workspace is None:
+        settings = SlackSettings.from_env()
+        workspace = WorkspaceSettings(DEFAULT_WORKSPACE, settings.bot_token, settings.app_token)
+    # 実行待ちのメンションはリスナーのスレッドを占有して待つため、受付制御の上限まで待てる
+    # 本数にする（Bolt 既定の 5 本では超過分が Bolt の実行キューに積まれ、受付拒否が働かない）
+    executor = ThreadPoolExecutor(
+        max_workers=listener_workers(settings_for(workspace)),
+        thread_name_prefix=f"slack-listener-{workspace.name}",
+    )
+    app = App(token=workspace.bot_token, listener_executor=executor)
+    # ハンドラーを登録（受付制御・キャッシュはワークスペースごと、MCP とグラフは共有）
+    message.register(app, workspace)
     return app
 
 
 def main() -> None:
-    """Socket Mode でアプリを起動します。"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
-    )
+    """Socket Mode でアプリを起動します（`slack-agent batch ...` はバッチ実行）。"""
+    if sys.argv[1:2] == ["batch"]:
+        sys.exit(batch.main(sys.argv[2:]))
+    # ログの書き込みはバックグラウンドスレッドで行い、リクエスト処理をブロックしない
+    configure_logging(LoggingSettings.from_env())
     logger = logging.getLogger("slack_agent")
-    app = build_app()
-    settings = SlackSettings.from_env()
-    handler = SocketModeHandler(app, settings.app_token)
-    # start() はブロッキング呼び出し（外部ライブラリ）なので型未解析として扱う
-    logger.info("Starting Socket Mode handler...")
-    handler.start()  # type: ignore[no-untyped-call]
+    metrics_settings = MetricsSettings.from_env()
+    # メモリの内訳は /debug/memory（METRICS_PORT 設定時）と SIGUSR1 のログで確認できる
+    MEMORY.start(MemorySettings.from_env())
+    if metrics_settings.port is not None:
+        metrics.start_http_server(metrics_settings.port, metrics_settings.host)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(
+            signal.SIGUSR1,
+            lambda signum, frame: threading.Thread(
+                target=MEMORY.log_report, name="slack-agent-memory-report", daemon=True
+            ).start(),
+        )
+    workspaces = SlackSettings.workspaces_from_env()
+    socket_settings = SocketModeSettings.from_env()
+    # 複数接続で受信し、接続間（sqlite なら複数プロセス間）で event_id の重複を除く。
+    # 複数ワークスペースでもプロセス内の MCP 接続・グラフ・重複判定は 1 つを共有する
+    deduper = create_deduper(socket_settings)
+    pools = [
+        SocketModePool(
+            build_app(ws), ws.app_token, socket_settings, deduper=deduper, workspace=ws.name
+        )
+        for ws in workspaces
+    ]
+    # 背景ループを止める同期処理をラグとスタックで検出する
+    monitor = LoopMonitor(LoopMonitorSettings.from_env())
+    monitor.start()
+    drain_settings = DrainSettings.from_env()
+
+    def _close_ingress() -> None:
+        for pool in pools:
+            pool.close()
+
+    # SIGTERM / SIGINT で受信を止めてドレインし、結果をログに出して終了する
+    stop = threading.Event()
+    signals = (signal.SIGTERM, signal.SIGINT)
+    for sig in signals:
+        signal.signal(sig, lambda signum, frame: stop.set())
+
+    logger.info(
+        "Starting Socket Mode handler... (workspaces=%s, connections=%d)",
+        ",".join(ws.name for ws in workspaces),
+        socket_settings.connections,
+    )
+    for pool in pools:
+        pool.connect()
+    stop.wait()
+    # ドレイン中に再度シグナルを受けたら即時終了できるよう既定の動作に戻す
+    for sig in signals:
+        signal.signal(sig, signal.SIG_DFL)
+    logger.info("Shutdown requested; draining (timeout=%.0fs)", drain_settings.timeout_seconds)
+    report = LIFECYCLE.drain(drain_settings.timeout_seconds, stop_ingress=_close_ingress)
+    log = logger.info if report.clean else logger.warning
+    log("Drain finished: %s", report.summary())
+    monitor.stop()
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -0,0 +1,90 @@
+"""LRU + TTL のスレッドセーフなインメモリキャッシュ。
+
+Bolt のリスナーはワーカースレッドで並行に動くため、ロックで保護した `OrderedDict` で
+実装する。上限件数を超えると最も古く使われたエントリから捨て、期限切れのエントリは
+参照時に捨てる。
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Generic, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):  # noqa: UP046 - TypeVar 方式に揃える
+    """最大 `maxsize` 件・有効期限 `ttl` 秒の LRU キャッシュ。"""
+
+    def __init__(
+        self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys: Iterable[K]) -> dict[K, V]:
+        """見つかったキーだけを辞書で返します。"""
+        found: dict[K, V] = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def missing(self, keys: Iterable[K]) -> list[K]:
+        """キャッシュに無い（または期限切れの）キーを重複なく入力順で返します。"""
+        seen: set[K] = set()
+        out: list[K] = []
+        for key in keys:
+            if key in seen:
+                continue
+            seen.add(key)
+            if self.get(key) is None:
+                out.append(key)
+        return out
+
+    def shrink(self, fraction: float) -> int:
+        """期限切れと、最も古く使われた順に全体の `fraction` を捨て、捨てた件数を返します。"""
+        with self._lock:
+            before = len(self._data)
+            now = self._clock()
+            for key in [k for k, (expires, _) in self._data.items() if expires <= now]:
+                del self._data[key]
+            keep = before - math.ceil(before * fraction)
+            while len(self._data) > keep:
+                self._data.popitem(last=False)
+            return before - len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
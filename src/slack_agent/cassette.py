@@ -0,0 +1,172 @@
+"""LLM と MCP の通信を記録・再生するカセット（決定的な性能計測用）。
+
+OpenAI の応答とツール呼び出しの順序は実行ごとに変わるため、エージェントループの
+性能改善を実行間で比べられない。`CASSETTE_MODE=record` では `invoke_agent` が行う
+モデル呼び出し（`CassetteMiddleware`）と MCP の `list_tools` / `call_tool`（`CassetteSession`）を
+要求のキーと応答・所要時間の組としてカセット（JSONL）に追記し、`CASSETTE_MODE=replay` では
+同じキーの要求に記録した応答を返す（OpenAI にも MCP サーバーにも接続しない）。
+再生時は記録した所要時間に `CASSETTE_TIMING_SCALE` を掛けて待ってから返す。
+
+同じキーの要求が複数回記録されていれば記録順に返し、使い切った後は最後の応答を繰り返す。
+記録のない要求は RuntimeError とする（記録と異なる経路を黙って実通信にしない）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, TextIO
+
+from . import metrics
+from .config import CassetteSettings
+
+logger = logging.getLogger(__name__)
+
+_ENTRIES = metrics.counter(
+    "slack_agent_cassette_total",
+    "カセットの記録・再生の件数（kind: model / call_tool / list_tools、"
+    "outcome: recorded / replayed / missing）",
+)
+
+
+def request_key(request: Any) -> str:
+    """要求の内容から決まるキー（JSON の正規形の SHA-256）。"""
+    text = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """1 ファイル分のカセット。記録時は 1 件ごとに追記・flush し、再生時は全件を読み込む。"""
+
+    def __init__(self, path: str, mode: str, timing_scale: float = 1.0) -> None:
+        if mode not in {"record", "replay"}:
+            raise RuntimeError(f"カセットのモードは record / replay のいずれかです: {mode}")
+        self.path = path
+        self.mode = mode
+        self.timing_scale = timing_scale
+        self._lock = threading.Lock()
+        self._file: TextIO | None = None
+        self._entries: dict[tuple[str, str], deque[dict[str, Any]]] = {}
+        self._last: dict[tuple[str, str], dict[str, Any]] = {}
+        self._servers: dict[str, dict[str, Any]] = {}
+        if mode == "record":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")  # noqa: SIM115 - close() で閉じる
+        else:
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError as e:
+            raise RuntimeError(f"カセットが見つかりません: {self.path}") from e
+        count = 0
+        for lineno, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                entry: dict[str, Any] = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RuntimeError(f"カセットの {lineno} 行目が壊れています: {self.path}") from e
+            if entry.get("kind") == "server":
+                self._servers[str(entry["server"])] = entry
+                continue
+            self._entries.setdefault((entry["kind"], entry["key"]), deque()).append(entry)
+            count += 1
+        logger.info(
+            "Cassette loaded: %s (%d entries, servers=%s, timing_scale=%.2f)",
+            self.path,
+            count,
+            ", ".join(self._servers) or "-",
+            self.timing_scale,
+        )
+
+    def servers(self) -> dict[str, dict[str, Any]]:
+        """記録した MCP サーバー名 → 接続設定（記録順）。"""
+        with self._lock:
+            return dict(self._servers)
+
+    def _write(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError(f"カセットは記録用に開かれていません: {self.path}")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record_server(self, name: str, **settings: Any) -> None:
+        """MCP サーバーの接続設定を記録します（再生時に同じ構成を復元するため。1 回だけ）。"""
+        with self._lock:
+            if name in self._servers:
+                return
+            self._servers[name] = {"kind": "server", "server": name, **settings}
+        self._write(self._servers[name])
+
+    def record(self, kind: str, key: str, seconds: float, **fields: Any) -> None:
+        """要求 1 件分の応答と所要時間（秒）を追記します。"""
+        self._write({"kind": kind, "key": key, "seconds": round(seconds, 6), **fields})
+        _ENTRIES.inc(kind=kind, outcome="recorded")
+
+    def take(self, kind: str, key: str) -> dict[str, Any]:
+        """キーに対応する記録を記録順に返します（使い切った後は最後の記録を繰り返す）。"""
+        with self._lock:
+            queue = self._entries.get((kind, key))
+            entry = queue.popleft() if queue else self._last.get((kind, key))
+            if entry is not None:
+                self._last[(kind, key)] = entry
+        if entry is None:
+            _ENTRIES.inc(kind=kind, outcome="missing")
+            raise RuntimeError(
+                f"カセットに記録のない {kind} 要求です（key={key}）。"
+                f"記録時と異なる要求になっていないか確認してください: {self.path}"
+            )
+        _ENTRIES.inc(kind=kind, outcome="replayed")
+        return entry
+
+    async def wait(self, entry: dict[str, Any]) -> None:
+        """記録した所要時間 × timing_scale だけ待ちます（0 なら待たない）。"""
+        delay = float(entry.get("seconds", 0.0)) * self.timing_scale
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def create_cassette(settings: CassetteSettings) -> Cassette | None:
+    if not settings.enabled or settings.path is None:
+        return None
+    logger.info("Cassette: %s (%s)", settings.mode, settings.path)
+    return Cassette(settings.path, settings.mode, settings.timing_scale)
+
+
+_cassette: Cassette | None = None
+_cassette_loaded = False
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette | None:
+    """プロセス共有のカセット（`CASSETTE_MODE=off` なら None）。"""
+    global _cassette, _cassette_loaded
+    with _cassette_lock:
+        if not _cassette_loaded:
+            _cassette = create_cassette(CassetteSettings.from_env())
+            _cassette_loaded = True
+        return _cassette
@@ -0,0 +1,252 @@
+"""Slack スレッド単位のエージェント状態（LangGraph チェックポイント）の保持と退避。
+
+エージェントグラフを checkpointer 付きでコンパイルし、`(channel, thread_ts)` を
+thread_id として状態を保存する。同じスレッドへの 2 回目以降のメンションでは保存済みの
+状態（過去の質問・回答・ツール結果）を再開し、新しいユーザーメッセージだけを追加する。
+同じスレッドの実行は `begin` から `end` までスレッドごとのロックで直列化する（並行に
+実行すると同じ状態へ書き込みが混ざるため）。InMemorySaver は実行のステップごとに
+チェックポイントを残すので、成功した実行の後は再開に使う最新のものだけを残す。
+
+メモリ上限のため、次の退避ポリシーを適用する（実行中のスレッドは退避しない）:
+- 最終利用から `ttl_seconds` を過ぎたスレッド
+- 保持スレッド数が `max_threads` を超えた場合は最も古く使われたスレッド（LRU）
+- 状態のメッセージ数が `max_messages` を超えたスレッド（次回は Slack 履歴から再構築）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, OrderedDict
+from typing import Any
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from . import metrics
+from .config import DEFAULT_WORKSPACE, CheckpointSettings
+
+logger = logging.getLogger(__name__)
+
+_EVICTIONS = metrics.counter(
+    "slack_agent_checkpoint_evictions_total", "退避したスレッド状態の件数（reason 別）"
+)
+_THREADS = metrics.gauge("slack_agent_checkpoint_threads", "保持中のスレッド状態の件数")
+_RESUMES = metrics.counter(
+    "slack_agent_checkpoint_resumes_total", "保存済み状態から再開した実行の件数"
+)
+_PRUNED = metrics.counter(
+    "slack_agent_checkpoint_pruned_total", "最新以外を削除したチェックポイントの件数"
+)
+
+
+def thread_id_for(channel: str, thread_ts: str, workspace: str | None = None) -> str:
+    """`(channel, thread_ts)` から LangGraph の thread_id を組み立てます。
+
+    複数ワークスペース構成では、チャンネル ID が他のワークスペースと衝突しても状態が
+    混ざらないよう `<workspace>:` を前に付けます（`default` は従来の形式のまま）。
+    """
+    if workspace and workspace != DEFAULT_WORKSPACE:
+        return f"{workspace}:{channel}:{thread_ts}"
+    return f"{channel}:{thread_ts}"
+
+
+def run_config(thread_id: str) -> dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+async def create_saver(settings: CheckpointSettings) -> BaseCheckpointSaver[Any]:
+    """設定に応じた checkpointer を生成します（sqlite は任意依存）。"""
+    if settings.backend == "sqlite":
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except Exception as e:  # noqa: BLE001
+            raise RuntimeError(
+                "AGENT_CHECKPOINT_BACKEND=sqlite には langgraph-checkpoint-sqlite が必要です"
+            ) from e
+        conn = await aiosqlite.connect(settings.sqlite_path)
+        saver: BaseCheckpointSaver[Any] = AsyncSqliteSaver(conn)
+        await saver.setup()  # type: ignore[attr-defined]
+        logger.info("SQLite checkpointer を使用します: %s", settings.sqlite_path)
+        return saver
+    return InMemorySaver()
+
+
+def _keep_latest(saver: InMemorySaver, thread_id: str) -> int:
+    """スレッドの最新以外のチェックポイントと、それだけが参照する書き込み・チャンネル値を
+    削除し、削除したチェックポイント数を返します（InMemorySaver のみ）。"""
+    namespaces = saver.storage.get(thread_id)
+    if not namespaces:
+        return 0
+    removed = 0
+    latest_ids: dict[str, str] = {}
+    kept_blobs: set[tuple[str, str, str, Any]] = set()
+    for ns, checkpoints in namespaces.items():
+        if not checkpoints:
+            continue
+        latest = max(checkpoints)
+        for checkpoint_id in [c for c in checkpoints if c != latest]:
+            del checkpoints[checkpoint_id]
+            removed += 1
+        latest_ids[ns] = latest
+        checkpoint = saver.serde.loads_typed(checkpoints[latest][0])
+        kept_blobs.update(
+            (thread_id, ns, channel, version)
+            for channel, version in checkpoint["channel_versions"].items()
+        )
+    for write_key in [
+        k for k in saver.writes if k[0] == thread_id and latest_ids.get(k[1]) != k[2]
+    ]:
+        del saver.writes[write_key]
+    for blob_key in [k for k in saver.blobs if k[0] == thread_id and k not in kept_blobs]:
+        del saver.blobs[blob_key]
+    return removed
+
+
+class _ThreadInfo:
+    __slots__ = ("last_used", "messages")
+
+    def __init__(self) -> None:
+        self.last_used = time.monotonic()
+        self.messages = 0
+
+
+class ThreadCheckpoints:
+    """checkpointer 上のスレッド状態を追跡し、退避ポリシーを適用する。"""
+
+    def __init__(self, saver: BaseCheckpointSaver[Any], settings: CheckpointSettings) -> None:
+        self.saver = saver
+        self.settings = settings
+        self._threads: OrderedDict[str, _ThreadInfo] = OrderedDict()
+        self._active: Counter[str] = Counter()
+        self._run_locks: dict[str, asyncio.Lock] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    async def has_state(self, thread_id: str) -> bool:
+        """スレッドの保存済み状態があれば True（LRU 上も最近利用扱いにする）。"""
+        info = self._threads.get(thread_id)
+        if info is not None:
+            if time.monotonic() - info.last_used > self.settings.ttl_seconds:
+                return False
+            info.last_used = time.monotonic()
+            self._threads.move_to_end(thread_id)
+            return True
+        # 永続バックエンドではプロセス再起動前の状態が残っている場合がある
+        if self.settings.backend == "memory":
+            return False
+        found = await self.saver.aget_tuple(run_config(thread_id)) is not None  # type: ignore[arg-type]
+        if found:
+            self._threads[thread_id] = _ThreadInfo()
+        return found
+
+    async def begin(self, thread_id: str) -> bool:
+        """実行開始を記録し、保存済み状態から再開できるかを返します。
+
+        同じ thread_id の実行は `end` / `discard` まで直列化します（先行の実行が終わるまで待つ）。
+        待っている間も実行中として扱い、退避の対象にしません。
+        """
+        async with self._lock:
+            self._active[thread_id] += 1
+            run_lock = self._run_locks.setdefault(thread_id, asyncio.Lock())
+        try:
+            await run_lock.acquire()
+        except BaseException:
+            self._leave(thread_id, release=False)
+            raise
+        try:
+            async with self._lock:
+                await self._prune_locked()
+                resumable = await self.has_state(thread_id)
+                if not resumable:
+                    # TTL 退避を免れた古い状態（自身が実行中扱い）の上に履歴を積まないよう消す
+                    if thread_id in self._threads:
+                        await self._evict_locked(thread_id, "ttl")
+                    else:
+                        await self.saver.adelete_thread(thread_id)
+        except BaseException:
+            self._leave(thread_id)
+            raise
+        if resumable:
+            _RESUMES.inc()
+        return resumable
+
+    async def end(self, thread_id: str, message_count: int, ok: bool = True) -> None:
+        """実行終了を記録し、失敗した実行やサイズ上限を超えたスレッドを退避します。"""
+        try:
+            async with self._lock:
+                info = self._threads.get(thread_id) or _ThreadInfo()
+                info.last_used = time.monotonic()
+                info.messages = message_count
+                self._threads[thread_id] = info
+                self._threads.move_to_end(thread_id)
+                if not ok:
+                    await self._evict_locked(thread_id, "failed")
+                elif message_count > self.settings.max_messages:
+                    await self._evict_locked(thread_id, "max_messages")
+                elif isinstance(self.saver, InMemorySaver):
+                    _PRUNED.inc(_keep_latest(self.saver, thread_id))
+                await self._prune_locked()
+        finally:
+            self._leave(thread_id)
+
+    async def discard(self, thread_id: str) -> None:
+        """使い捨ての状態（thread_key なしの実行）を削除します。"""
+        try:
+            async with self._lock:
+                self._threads.pop(thread_id, None)
+                await self.saver.adelete_thread(thread_id)
+        finally:
+            self._leave(thread_id)
+
+    def _leave(self, thread_id: str, release: bool = True) -> None:
+        # 実行中の件数を戻し、スレッドのロックを解放する（待つ実行がなければロックも捨てる）
+        run_lock = self._run_locks.get(thread_id)
+        self._active[thread_id] -= 1
+        if self._active[thread_id] <= 0:
+            del self._active[thread_id]
+            self._run_locks.pop(thread_id, None)
+        if release and run_lock is not None:
+            run_lock.release()
+
+    async def shrink(self, fraction: float) -> int:
+        """メモリ予算の超過時に、実行中でないスレッドを古い順に全体の `fraction` だけ退避します。"""
+        async with self._lock:
+            count = math.ceil(len(self._threads) * fraction)
+            victims = [tid for tid in self._threads if tid not in self._active][:count]
+            for tid in victims:
+                await self._evict_locked(tid, "memory")
+            _THREADS.set(len(self._threads))
+        return len(victims)
+
+    async def _prune_locked(self) -> None:
+        now = time.monotonic()
+        expired = [
+            tid
+            for tid, info in self._threads.items()
+            if now - info.last_used > self.settings.ttl_seconds and tid not in self._active
+        ]
+        for tid in expired:
+            await self._evict_locked(tid, "ttl")
+
+        overflow = len(self._threads) - self.settings.max_threads
+        if overflow > 0:
+            victims = [tid for tid in self._threads if tid not in self._active][:overflow]
+            for tid in victims:
+                await self._evict_locked(tid, "max_threads")
+        _THREADS.set(len(self._threads))
+
+    async def _evict_locked(self, thread_id: str, reason: str) -> None:
+        self._threads.pop(thread_id, None)
+        try:
+            await self.saver.adelete_thread(thread_id)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Failed to delete checkpoint thread=%s: %s", thread_id, e)
+            return
+        _EVICTIONS.inc(reason=reason)
+        logger.debug("Evicted checkpoint thread=%s reason=%s", thread_id, reason)
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import importlib.util
+import json
 import os
-from dataclasses import dataclass
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass, field, replace
+from typing import Any
 
 from dotenv import load_dotenv
 
@@ -32,6 +37,100 @@ class SlackSettings:
 
         return SlackSettings(bot_token=bot, app_token=app)
 
+    @staticmethod
+    def workspaces_from_env() -> tuple[WorkspaceSettings, ...]:
+        """1 プロセスで受け持つワークスペースの一覧を読み込みます。
+
+        - SLACK_WORKSPACES_FILE: ワークスペースごとのトークンと同時実行数の JSON 設定ファイル。
+          未設定なら SLACK_BOT_TOKEN / SLACK_APP_TOKEN の 1 ワークスペース（`default`）
+        """
+        load_dotenv()
+
+        path = os.getenv("SLACK_WORKSPACES_FILE", "")
+        if not path:
+            settings = SlackSettings.from_env()
+            return (WorkspaceSettings(DEFAULT_WORKSPACE, settings.bot_token, settings.app_token),)
+        return _load_workspaces_file(path)
+
+
+# 単一ワークスペース構成の名前（thread_id などは従来の形式のまま）
+DEFAULT_WORKSPACE = "default"
+
+
+@dataclass(frozen=True)
+class WorkspaceSettings:
+    name: str
+    bot_token: str
+    app_token: str
+    max_inflight: int | None = None
+    max_queue: int | None = None
+
+    def admission(self, base: AdmissionSettings) -> AdmissionSettings:
+        """ワークスペース別の上限があれば受付制御の設定を上書きします。"""
+        max_inflight = self.max_inflight or base.max_inflight
+        return replace(
+            base,
+            max_inflight=max_inflight,
+            reserved_slots=min(base.reserved_slots, max_inflight - 1),
+            max_queue=self.max_queue if self.max_queue is not None else base.max_queue,
+        )
+
+
+def _workspace_token(name: str, conf: Mapping[str, Any], key: str) -> str:
+    """`<key>` の値、または `<key>_env` で指定した環境変数の値を返します。"""
+    env_name = conf.get(f"{key}_env")
+    value = os.getenv(str(env_name)) if env_name else conf.get(key)
+    if not value:
+        source = f"環境変数 {env_name}" if env_name else key
+        raise RuntimeError(f"ワークスペース {name} の {source} が設定されていません")
+    return str(value)
+
+
+def _load_workspaces_file(path: str) -> tuple[WorkspaceSettings, ...]:
+    """SLACK_WORKSPACES_FILE（JSON）を読み込みます。
+
+    形式::
+
+        {"workspaces": {"<name>": {"bot_token_env": "ACME_SLACK_BOT_TOKEN",
+                                   "app_token_env": "ACME_SLACK_APP_TOKEN",
+                                   "max_inflight": 4, "max_queue": 8}}}
+
+    トークンは `bot_token` / `app_token` に直接書くこともできます。
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"SLACK_WORKSPACES_FILE を読み込めません: {path}: {e}") from e
+
+    entries = data.get("workspaces") if isinstance(data, dict) else None
+    if not isinstance(entries, dict) or not entries:
+        raise RuntimeError(f"SLACK_WORKSPACES_FILE に workspaces オブジェクトがありません: {path}")
+
+    workspaces: list[WorkspaceSettings] = []
+    app_tokens: set[str] = set()
+    for name, conf in entries.items():
+        if not isinstance(name, str) or not _SERVER_NAME_RE.match(name):
+            raise RuntimeError(f"ワークスペース名が不正です（英数字・_・- のみ）: {name!r}")
+        if not isinstance(conf, dict):
+            raise RuntimeError(f"ワークスペース {name} の設定がオブジェクトではありません")
+        app_token = _workspace_token(name, conf, "app_token")
+        if app_token in app_tokens:
+            raise RuntimeError(f"ワークスペース {name} の app_token が他と重複しています")
+        app_tokens.add(app_token)
+        max_inflight = conf.get("max_inflight")
+        max_queue = conf.get("max_queue")
+        workspaces.append(
+            WorkspaceSettings(
+                name=name,
+                bot_token=_workspace_token(name, conf, "bot_token"),
+                app_token=app_token,
+                max_inflight=_parse_int(str(max_inflight), 8, 1) if max_inflight else None,
+                max_queue=_parse_int(str(max_queue), 16, 0) if max_queue is not None else None,
+            )
+        )
+    return tuple(workspaces)
+
 
 @dataclass(frozen=True)
 class OpenAISettings:
@@ -39,11 +138,11 @@ class OpenAISettings:
     model: str
 
     @staticmethod
-    def from_env() -> OpenAISettings:
+    def from_env(require_api_key: bool = True) -> OpenAISettings:
         """環境変数から設定値を読み込みます。
 
         必須の環境変数:
-        - OPENAI_API_KEY: OpenAI API キー
+        - OPENAI_API_KEY: OpenAI API キー（カセット再生時のように `require_api_key=False` なら任意）
 
         オプションの環境変数:
         - OPENAI_MODEL: 使用するモデル（デフォルト: gpt-5-nano）
@@ -55,6 +154,908 @@ class OpenAISettings:
         model = os.getenv("OPENAI_MODEL", "gpt-5-nano")
 
         if not api_key:
-            raise RuntimeError("OPENAI_API_KEY が設定されていません")
+            if require_api_key:
+                raise RuntimeError("OPENAI_API_KEY が設定されていません")
+            api_key = "unused"
 
         return OpenAISettings(api_key=api_key, model=model)
+
+
+def _parse_int(raw: str | None, default: int, minimum: int, maximum: int | None = None) -> int:
+    """整数の環境変数を正規化します。不正値は既定値、範囲外は上下限に丸めます。"""
+    try:
+        value = int(raw) if raw is not None else default
+    except ValueError:
+        value = default
+    value = max(minimum, value)
+    return min(maximum, value) if maximum is not None else value
+
+
+@dataclass(frozen=True)
+class AgentSettings:
+    tool_concurrency: int = 4
+
+    @staticmethod
+    def from_env() -> AgentSettings:
+        """環境変数からエージェント実行時の設定値を読み込みます。
+
+        オプションの環境変数:
+        - AGENT_TOOL_CONCURRENCY: 1 ステップ内で同時実行するツール呼び出し数（デフォルト 4、1〜32）
+        """
+        load_dotenv()
+
+        return AgentSettings(
+            tool_concurrency=_parse_int(os.getenv("AGENT_TOOL_CONCURRENCY"), 4, 1, 32),
+        )
+
+
+@dataclass(frozen=True)
+class ToolSelectionSettings:
+    mode: str = "lexical"
+    max_tools: int = 8
+    always: frozenset[str] = frozenset({"*search"})
+    schema: str = "minify"
+    description_chars: int = 300
+    param_description_chars: int = 120
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def minify(self) -> bool:
+        return self.schema == "minify"
+
+    @staticmethod
+    def from_env() -> ToolSelectionSettings:
+        """環境変数からリクエストごとのツール選択・スキーマ縮小の設定を読み込みます。
+
+        オプションの環境変数:
+        - AGENT_TOOL_SELECTION: lexical（デフォルト）/ off
+        - AGENT_TOOL_SELECTION_MAX_TOOLS: 1 回のモデル呼び出しに渡すツール数の上限（デフォルト 8）
+        - AGENT_TOOL_SELECTION_ALWAYS: 常に渡すツール名のパターン（fnmatch、カンマ区切り。
+          デフォルト `*search`）
+        - AGENT_TOOL_SCHEMA: minify（デフォルト）/ full
+        - AGENT_TOOL_DESCRIPTION_CHARS: 縮小時のツール説明の最大文字数（デフォルト 300）
+        - AGENT_TOOL_PARAM_DESCRIPTION_CHARS: 縮小時の引数説明の最大文字数（デフォルト 120、
+          0 で削除）
+        """
+        load_dotenv()
+
+        mode = os.getenv("AGENT_TOOL_SELECTION", "lexical").strip().lower() or "lexical"
+        if mode not in {"lexical", "off"}:
+            raise RuntimeError(f"AGENT_TOOL_SELECTION は lexical / off のいずれかです: {mode}")
+        schema = os.getenv("AGENT_TOOL_SCHEMA", "minify").strip().lower() or "minify"
+        if schema not in {"minify", "full"}:
+            raise RuntimeError(f"AGENT_TOOL_SCHEMA は minify / full のいずれかです: {schema}")
+        always_raw = os.getenv("AGENT_TOOL_SELECTION_ALWAYS")
+        return ToolSelectionSettings(
+            mode=mode,
+            max_tools=_parse_int(os.getenv("AGENT_TOOL_SELECTION_MAX_TOOLS"), 8, 1),
+            always=_parse_csv(always_raw) if always_raw is not None else frozenset({"*search"}),
+            schema=schema,
+            description_chars=_parse_int(os.getenv("AGENT_TOOL_DESCRIPTION_CHARS"), 300, 20),
+            param_description_chars=_parse_int(
+                os.getenv("AGENT_TOOL_PARAM_DESCRIPTION_CHARS"), 120, 0
+            ),
+        )
+
+
+@dataclass(frozen=True)
+class ModelClientSettings:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_seconds: float = 30.0
+    timeout_seconds: float = 120.0
+    max_retries: int = 4
+    retry_base_seconds: float = 0.5
+    retry_max_seconds: float = 30.0
+    tpm_limit: int = 0
+    rpm_limit: int = 0
+    output_tokens_estimate: int = 1024
+
+    @property
+    def limited(self) -> bool:
+        return self.tpm_limit > 0 or self.rpm_limit > 0
+
+    @staticmethod
+    def from_env() -> ModelClientSettings:
+        """環境変数から OpenAI への HTTP 接続・再試行・クォータ制御の設定値を読み込みます。
+
+        オプションの環境変数:
+        - OPENAI_MAX_CONNECTIONS: 共有 HTTP クライアントの最大接続数（デフォルト 20）
+        - OPENAI_KEEPALIVE_CONNECTIONS: 保持する keep-alive 接続数（デフォルト 10）
+        - OPENAI_KEEPALIVE_EXPIRY_SECONDS: keep-alive 接続を保持する秒数（デフォルト 30）
+        - OPENAI_TIMEOUT_SECONDS: 1 リクエストのタイムアウト秒（デフォルト 120）
+        - OPENAI_MAX_RETRIES: 429 / 5xx / 接続エラー時の再試行回数（デフォルト 4）
+        - OPENAI_RETRY_BASE_SECONDS / OPENAI_RETRY_MAX_SECONDS: 指数バックオフの初期値・上限秒
+          （デフォルト 0.5 / 30。実際の待ちは 0〜その値の一様乱数、Retry-After が長ければそちら）
+        - OPENAI_TPM_LIMIT / OPENAI_RPM_LIMIT: 1 分あたりのトークン数・リクエスト数の上限
+          （デフォルト 0 = 制限なし。組織のクォータより少し低めに設定する）
+        - OPENAI_OUTPUT_TOKENS_ESTIMATE: 事前見積もりに加える出力トークン数（デフォルト 1024）
+        """
+        load_dotenv()
+
+        max_connections = _parse_int(os.getenv("OPENAI_MAX_CONNECTIONS"), 20, 1)
+        return ModelClientSettings(
+            max_connections=max_connections,
+            max_keepalive_connections=_parse_int(
+                os.getenv("OPENAI_KEEPALIVE_CONNECTIONS"), 10, 0, max_connections
+            ),
+            keepalive_expiry_seconds=_parse_float(
+                os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS"), 30.0, 0.0
+            ),
+            timeout_seconds=_parse_float(os.getenv("OPENAI_TIMEOUT_SECONDS"), 120.0, 1.0),
+            max_retries=_parse_int(os.getenv("OPENAI_MAX_RETRIES"), 4, 0, 10),
+            retry_base_seconds=_parse_float(os.getenv("OPENAI_RETRY_BASE_SECONDS"), 0.5, 0.0),
+            retry_max_seconds=_parse_float(os.getenv("OPENAI_RETRY_MAX_SECONDS"), 30.0, 0.0),
+            tpm_limit=_parse_int(os.getenv("OPENAI_TPM_LIMIT"), 0, 0),
+            rpm_limit=_parse_int(os.getenv("OPENAI_RPM_LIMIT"), 0, 0),
+            output_tokens_estimate=_parse_int(os.getenv("OPENAI_OUTPUT_TOKENS_ESTIMATE"), 1024, 0),
+        )
+
+
+@dataclass(frozen=True)
+class CheckpointSettings:
+    backend: str = "memory"
+    sqlite_path: str = "slack_agent_checkpoints.sqlite"
+    max_threads: int = 500
+    ttl_seconds: int = 6 * 60 * 60
+    max_messages: int = 80
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend != "none"
+
+    @staticmethod
+    def from_env() -> CheckpointSettings:
+        """環境変数からスレッド単位のエージェント状態保持（チェックポイント）設定を読み込みます。
+
+        オプションの環境変数:
+        - AGENT_CHECKPOINT_BACKEND: memory（デフォルト）/ sqlite / none
+        - AGENT_CHECKPOINT_SQLITE_PATH: sqlite 利用時の DB ファイル
+        - AGENT_CHECKPOINT_MAX_THREADS: 保持するスレッド数の上限（LRU で退避、デフォルト 500）
+        - AGENT_CHECKPOINT_TTL_SECONDS: 最終利用からの保持秒数（デフォルト 21600）
+        - AGENT_CHECKPOINT_MAX_MESSAGES: 1 スレッドの状態のメッセージ数上限（デフォルト 80）
+        """
+        load_dotenv()
+
+        backend = os.getenv("AGENT_CHECKPOINT_BACKEND", "memory").strip().lower() or "memory"
+        if backend not in {"memory", "sqlite", "none"}:
+            raise RuntimeError(
+                f"AGENT_CHECKPOINT_BACKEND は memory / sqlite / none のいずれかです: {backend}"
+            )
+        return CheckpointSettings(
+            backend=backend,
+            sqlite_path=os.getenv("AGENT_CHECKPOINT_SQLITE_PATH", "slack_agent_checkpoints.sqlite"),
+            max_threads=_parse_int(os.getenv("AGENT_CHECKPOINT_MAX_THREADS"), 500, 1),
+            ttl_seconds=_parse_int(os.getenv("AGENT_CHECKPOINT_TTL_SECONDS"), 21600, 60),
+            max_messages=_parse_int(os.getenv("AGENT_CHECKPOINT_MAX_MESSAGES"), 80, 2),
+        )
+
+
+def _parse_float(raw: str | None, default: float, minimum: float) -> float:
+    """小数の環境変数を正規化します。不正値は既定値、下限未満は下限に丸めます。"""
+    try:
+        value = float(raw) if raw is not None else default
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+
+def _parse_csv(raw: str | None) -> frozenset[str]:
+    """カンマ区切りの環境変数を空要素を除いた集合にします。"""
+    return frozenset(v.strip() for v in (raw or "").split(",") if v.strip())
+
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    max_inflight: int = 8
+    reserved_slots: int = 2
+    max_queue: int = 16
+    max_wait_seconds: float = 60.0
+    priority_channels: frozenset[str] = frozenset()
+    priority_users: frozenset[str] = frozenset()
+    busy_message: str = (
+        "ただいま混み合っています。少し時間をおいてからもう一度メンションしてください。"
+    )
+
+    @staticmethod
+    def from_env() -> AdmissionSettings:
+        """環境変数から受付制御（過負荷時の受付拒否）の設定値を読み込みます。
+
+        オプションの環境変数:
+        - ADMISSION_MAX_INFLIGHT: 同時に実行するエージェント呼び出し数（デフォルト 8）
+        - ADMISSION_RESERVED_SLOTS: うち優先チャンネル/ユーザー専用の枠数（デフォルト 2）
+        - ADMISSION_MAX_QUEUE: 実行待ちで受け付ける件数（デフォルト 16）
+        - ADMISSION_MAX_WAIT_SECONDS: 予測待ち時間がこれを超える場合は受付拒否（デフォルト 60）
+        - ADMISSION_PRIORITY_CHANNELS / ADMISSION_PRIORITY_USERS: 優先対象の ID（カンマ区切り）
+        - ADMISSION_BUSY_MESSAGE: 受付拒否時にスレッドへ返すメッセージ
+        """
+        load_dotenv()
+
+        max_inflight = _parse_int(os.getenv("ADMISSION_MAX_INFLIGHT"), 8, 1)
+        return AdmissionSettings(
+            max_inflight=max_inflight,
+            reserved_slots=_parse_int(
+                os.getenv("ADMISSION_RESERVED_SLOTS"), 2, 0, max_inflight - 1
+            ),
+            max_queue=_parse_int(os.getenv("ADMISSION_MAX_QUEUE"), 16, 0),
+            max_wait_seconds=_parse_float(os.getenv("ADMISSION_MAX_WAIT_SECONDS"), 60.0, 1.0),
+            priority_channels=_parse_csv(os.getenv("ADMISSION_PRIORITY_CHANNELS")),
+            priority_users=_parse_csv(os.getenv("ADMISSION_PRIORITY_USERS")),
+            busy_message=os.getenv("ADMISSION_BUSY_MESSAGE") or AdmissionSettings.busy_message,
+        )
+
+
+def _parse_sample_rates(raw: str | None) -> Mapping[str, float]:
+    """`logger=rate` のカンマ区切りを辞書にします。不正な要素は無視し、rate は 0〜1 に丸めます。"""
+    rates: dict[str, float] = {}
+    for item in (raw or "").split(","):
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    level: str = "INFO"
+    format: str = "json"
+    max_body_chars: int = 300
+    sample_rates: Mapping[str, float] = field(default_factory=dict)
+
+    @staticmethod
+    def from_env() -> LoggingSettings:
+        """環境変数からログ出力の設定値を読み込みます。
+
+        オプションの環境変数:
+        - LOG_LEVEL: ルートロガーのレベル（デフォルト INFO）
+        - LOG_FORMAT: json（デフォルト、1 行 1 JSON）/ text
+        - LOG_MAX_BODY_CHARS: ログに出す本文（質問・回答など）の最大文字数（デフォルト 300）
+        - LOG_SAMPLE_RATES: ロガー別の INFO 以下の出力率（例: `slack_agent.agent=0.1`）
+        """
+        load_dotenv()
+
+        fmt = os.getenv("LOG_FORMAT", "json").strip().lower() or "json"
+        if fmt not in {"json", "text"}:
+            raise RuntimeError(f"LOG_FORMAT は json / text のいずれかです: {fmt}")
+        level = os.getenv("LOG_LEVEL", "INFO").strip().upper() or "INFO"
+        if level not in {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}:
+            raise RuntimeError(f"LOG_LEVEL が不正です: {level}")
+        return LoggingSettings(
+            level=level,
+            format=fmt,
+            max_body_chars=_parse_int(os.getenv("LOG_MAX_BODY_CHARS"), 300, 0),
+            sample_rates=_parse_sample_rates(os.getenv("LOG_SAMPLE_RATES")),
+        )
+
+
+@dataclass(frozen=True)
+class DirectorySettings:
+    ttl_seconds: int = 3600
+    max_entries: int = 5000
+
+    @staticmethod
+    def from_env() -> DirectorySettings:
+        """環境変数からユーザー名・チャンネル名キャッシュの設定値を読み込みます。
+
+        オプションの環境変数:
+        - SLACK_NAME_CACHE_TTL_SECONDS: 名前の保持秒数（デフォルト 3600）
+        - SLACK_NAME_CACHE_MAX_ENTRIES: 保持件数の上限（LRU、デフォルト 5000）
+        """
+        load_dotenv()
+
+        return DirectorySettings(
+            ttl_seconds=_parse_int(os.getenv("SLACK_NAME_CACHE_TTL_SECONDS"), 3600, 1),
+            max_entries=_parse_int(os.getenv("SLACK_NAME_CACHE_MAX_ENTRIES"), 5000, 1),
+        )
+
+
+@dataclass(frozen=True)
+class SocketModeSettings:
+    connections: int = 1
+    reconnect_stagger_seconds: float = 2.0
+    dedupe_backend: str = "memory"
+    dedupe_path: str = ".slack_agent_events.sqlite3"
+    dedupe_ttl_seconds: int = 600
+
+    @staticmethod
+    def from_env() -> SocketModeSettings:
+        """環境変数から Socket Mode 接続の設定値を読み込みます。
+
+        オプションの環境変数:
+        - SLACK_SOCKET_CONNECTIONS: 1 プロセスで張る Socket Mode 接続数（デフォルト 1、1〜10）
+        - SLACK_SOCKET_RECONNECT_STAGGER_SECONDS: 接続・再接続の間隔秒（デフォルト 2）
+        - SLACK_EVENT_DEDUPE: 重複イベント判定の保存先 `memory`（デフォルト）/ `sqlite`
+          （`sqlite` は同じホストの複数プロセス間で共有）
+        - SLACK_EVENT_DEDUPE_PATH: `sqlite` のファイルパス（デフォルト .slack_agent_events.sqlite3）
+        - SLACK_EVENT_DEDUPE_TTL_SECONDS: event_id を保持する秒数（デフォルト 600）
+        """
+        load_dotenv()
+
+        backend = os.getenv("SLACK_EVENT_DEDUPE", "memory").strip().lower()
+        if backend not in ("memory", "sqlite"):
+            raise RuntimeError(
+                f"SLACK_EVENT_DEDUPE は memory / sqlite のいずれかを指定してください: {backend}"
+            )
+        return SocketModeSettings(
+            connections=_parse_int(os.getenv("SLACK_SOCKET_CONNECTIONS"), 1, 1, 10),
+            reconnect_stagger_seconds=_parse_float(
+                os.getenv("SLACK_SOCKET_RECONNECT_STAGGER_SECONDS"), 2.0, 0.0
+            ),
+            dedupe_backend=backend,
+            dedupe_path=os.getenv("SLACK_EVENT_DEDUPE_PATH", ".slack_agent_events.sqlite3"),
+            dedupe_ttl_seconds=_parse_int(os.getenv("SLACK_EVENT_DEDUPE_TTL_SECONDS"), 600, 1),
+        )
+
+
+@dataclass(frozen=True)
+class OutboundSettings:
+    channel_interval_seconds: float = 1.0
+    max_chars: int = 4000
+    workers: int = 4
+    max_retries: int = 3
+    send_timeout_seconds: float = 120.0
+
+    @staticmethod
+    def from_env() -> OutboundSettings:
+        """環境変数から Slack への投稿（送信キュー）の設定値を読み込みます。
+
+        オプションの環境変数:
+        - OUTBOUND_CHANNEL_INTERVAL_SECONDS: 同じチャンネルへの投稿間隔の下限秒（デフォルト 1）
+        - OUTBOUND_MAX_CHARS: 1 メッセージの最大文字数。超える応答は分割する（デフォルト 4000）
+        - OUTBOUND_WORKERS: 異なるチャンネルへ並行して送信する数（デフォルト 4）
+        - OUTBOUND_MAX_RETRIES: `ratelimited` 応答時に再送する回数（デフォルト 3）
+        - OUTBOUND_SEND_TIMEOUT_SECONDS: ハンドラーが送信完了を待つ上限秒（デフォルト 120）
+        """
+        load_dotenv()
+
+        return OutboundSettings(
+            channel_interval_seconds=_parse_float(
+                os.getenv("OUTBOUND_CHANNEL_INTERVAL_SECONDS"), 1.0, 0.0
+            ),
+            max_chars=_parse_int(os.getenv("OUTBOUND_MAX_CHARS"), 4000, 100, 40000),
+            workers=_parse_int(os.getenv("OUTBOUND_WORKERS"), 4, 1, 32),
+            max_retries=_parse_int(os.getenv("OUTBOUND_MAX_RETRIES"), 3, 0),
+            send_timeout_seconds=_parse_float(
+                os.getenv("OUTBOUND_SEND_TIMEOUT_SECONDS"), 120.0, 1.0
+            ),
+        )
+
+
+@dataclass(frozen=True)
+class DrainSettings:
+    timeout_seconds: float = 30.0
+    interrupted_message: str = (
+        "再起動のため処理を中断しました。お手数ですが、もう一度メンションしてください。"
+    )
+
+    @staticmethod
+    def from_env() -> DrainSettings:
+        """環境変数から終了時のドレイン（処理中の応答の完了待ち）の設定値を読み込みます。
+
+        オプションの環境変数:
+        - DRAIN_TIMEOUT_SECONDS: SIGTERM 受信後、処理中の応答の完了を待つ上限秒（デフォルト 30）
+        - DRAIN_INTERRUPTED_MESSAGE: 上限までに終わらず中断した応答・ドレイン中に届いた
+          メンションへ返すメッセージ
+        """
+        load_dotenv()
+
+        return DrainSettings(
+            timeout_seconds=_parse_float(os.getenv("DRAIN_TIMEOUT_SECONDS"), 30.0, 0.0),
+            interrupted_message=os.getenv("DRAIN_INTERRUPTED_MESSAGE")
+            or DrainSettings.interrupted_message,
+        )
+
+
+# 1M トークンあたりの USD 単価（入力 / キャッシュ済み入力 / 出力）。USAGE_PRICES で上書きできる
+DEFAULT_MODEL_PRICES: Mapping[str, tuple[float, float, float]] = {
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+}
+
+
+def _parse_prices(raw: str | None) -> Mapping[str, tuple[float, float, float]]:
+    """`model=入力/キャッシュ済み入力/出力,...` 形式の単価（1M トークンあたり USD）。"""
+    prices = dict(DEFAULT_MODEL_PRICES)
+    for item in (raw or "").split(","):
+        if not item.strip():
+            continue
+        model, sep, values = item.partition("=")
+        parts = values.split("/")
+        try:
+            if not sep or len(parts) != 3:
+                raise ValueError(item)
+            prices[model.strip()] = (float(parts[0]), float(parts[1]), float(parts[2]))
+        except ValueError as e:
+            raise RuntimeError(
+                f"USAGE_PRICES は model=入力/キャッシュ入力/出力 の形式で指定してください: {item}"
+            ) from e
+    return prices
+
+
+@dataclass(frozen=True)
+class UsageSettings:
+    windows_minutes: tuple[int, ...] = (60, 1440)
+    rollup_dir: str | None = None
+    flush_interval_seconds: float = 60.0
+    max_keys: int = 500
+    prices: Mapping[str, tuple[float, float, float]] = field(
+        default_factory=lambda: dict(DEFAULT_MODEL_PRICES)
+    )
+
+    @staticmethod
+    def from_env() -> UsageSettings:
+        """環境変数からトークン使用量・コストの集計設定を読み込みます。
+
+        オプションの環境変数:
+        - USAGE_WINDOWS_MINUTES: 直近の集計窓（分、カンマ区切り。デフォルト 60,1440）
+        - USAGE_ROLLUP_DIR: 日次集計ファイル（usage-YYYY-MM-DD.json）の出力先。未設定なら出力しない
+        - USAGE_FLUSH_SECONDS: 日次集計ファイルを書き出す間隔秒（デフォルト 60）
+        - USAGE_MAX_KEYS: チャンネル・ユーザー・モデルごとに保持するキー数の上限（デフォルト 500）
+        - USAGE_PRICES: 単価の上書き・追加（1M トークンあたり USD。例: `gpt-5=1.25/0.125/10`）
+        """
+        load_dotenv()
+
+        windows: list[int] = []
+        for raw in _parse_csv(os.getenv("USAGE_WINDOWS_MINUTES", "60,1440")):
+            value = _parse_int(raw, 0, 0)
+            if value <= 0:
+                raise RuntimeError(f"USAGE_WINDOWS_MINUTES は正の整数で指定してください: {raw}")
+            windows.append(value)
+        return UsageSettings(
+            windows_minutes=tuple(sorted(set(windows))) or (60,),
+            rollup_dir=os.getenv("USAGE_ROLLUP_DIR") or None,
+            flush_interval_seconds=_parse_float(os.getenv("USAGE_FLUSH_SECONDS"), 60.0, 1.0),
+            max_keys=_parse_int(os.getenv("USAGE_MAX_KEYS"), 500, 1),
+            prices=_parse_prices(os.getenv("USAGE_PRICES")),
+        )
+
+
+@dataclass(frozen=True)
+class ProfileSettings:
+    dir: str | None = None
+    threshold_seconds: float = 10.0
+    interval_seconds: float = 0.02
+    max_seconds: float = 120.0
+    max_files: int = 200
+
+    @property
+    def enabled(self) -> bool:
+        return self.dir is not None
+
+    @staticmethod
+    def from_env() -> ProfileSettings:
+        """環境変数から遅いメンションのプロファイル取得設定を読み込みます。
+
+        オプションの環境変数:
+        - PROFILE_DIR: プロファイル（collapsed stack 形式）の出力先。未設定なら取得しない
+        - PROFILE_THRESHOLD_SECONDS: この秒数を超えたメンションを採取する（デフォルト 10）
+        - PROFILE_INTERVAL_SECONDS: サンプリング間隔秒（デフォルト 0.02）
+        - PROFILE_MAX_SECONDS: 1 件あたりのサンプリングを続ける上限秒（デフォルト 120）
+        - PROFILE_MAX_FILES: 出力先に残すファイル数の上限（古いものから削除、デフォルト 200）
+        """
+        load_dotenv()
+
+        return ProfileSettings(
+            dir=os.getenv("PROFILE_DIR") or None,
+            threshold_seconds=_parse_float(os.getenv("PROFILE_THRESHOLD_SECONDS"), 10.0, 0.0),
+            interval_seconds=_parse_float(os.getenv("PROFILE_INTERVAL_SECONDS"), 0.02, 0.001),
+            max_seconds=_parse_float(os.getenv("PROFILE_MAX_SECONDS"), 120.0, 1.0),
+            max_files=_parse_int(os.getenv("PROFILE_MAX_FILES"), 200, 1),
+        )
+
+
+@dataclass(frozen=True)
+class LoopMonitorSettings:
+    mode: str = "on"
+    interval_seconds: float = 0.25
+    stall_threshold_seconds: float = 1.0
+    slow_callback_seconds: float = 0.1
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def debug(self) -> bool:
+        return self.mode == "debug"
+
+    @staticmethod
+    def from_env() -> LoopMonitorSettings:
+        """環境変数から背景イベントループの遅延監視の設定を読み込みます。
+
+        オプションの環境変数:
+        - LOOP_MONITOR: on（デフォルト）/ off / debug（asyncio のデバッグモードで遅い
+          コールバックを発生箇所付きで記録する。オーバーヘッドがあるため調査時のみ）
+        - LOOP_MONITOR_INTERVAL_SECONDS: 遅延を測る間隔秒（デフォルト 0.25）
+        - LOOP_STALL_THRESHOLD_SECONDS: ループが止まったとみなしてスタックを出す秒数（デフォルト 1）
+        - LOOP_SLOW_CALLBACK_SECONDS: debug 時に記録するコールバックの実行時間（デフォルト 0.1）
+        """
+        load_dotenv()
+
+        mode = os.getenv("LOOP_MONITOR", "on").strip().lower() or "on"
+        if mode not in {"on", "off", "debug"}:
+            raise RuntimeError(f"LOOP_MONITOR は on / off / debug のいずれかです: {mode}")
+        return LoopMonitorSettings(
+            mode=mode,
+            interval_seconds=_parse_float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS"), 0.25, 0.01),
+            stall_threshold_seconds=_parse_float(
+                os.getenv("LOOP_STALL_THRESHOLD_SECONDS"), 1.0, 0.05
+            ),
+            slow_callback_seconds=_parse_float(os.getenv("LOOP_SLOW_CALLBACK_SECONDS"), 0.1, 0.001),
+        )
+
+
+@dataclass(frozen=True)
+class MemorySettings:
+    budget_mb: int | None = None
+    high_watermark: float = 0.9
+    shrink_fraction: float = 0.5
+    check_interval_seconds: float = 10.0
+    tracemalloc_frames: int = 0
+    report_top: int = 15
+
+    @property
+    def budget_bytes(self) -> int | None:
+        return self.budget_mb * 1024 * 1024 if self.budget_mb is not None else None
+
+    @staticmethod
+    def from_env() -> MemorySettings:
+        """環境変数からメモリの内訳レポートとメモリ予算の設定を読み込みます。
+
+        オプションの環境変数:
+        - MEMORY_BUDGET_MB: プロセスの RSS の予算（MB）。未設定ならキャッシュの縮小を行わない
+        - MEMORY_HIGH_WATERMARK: RSS が予算のこの割合を超えたら縮小する（デフォルト 0.9）
+        - MEMORY_SHRINK_FRACTION: 1 回の縮小で各キャッシュから捨てる割合（デフォルト 0.5）
+        - MEMORY_CHECK_INTERVAL_SECONDS: RSS を確認する間隔秒（デフォルト 10）
+        - MEMORY_TRACEMALLOC_FRAMES: 起動時から tracemalloc で追跡するスタックの深さ
+          （デフォルト 0 = 追跡しない。オーバーヘッドがあるため調査時のみ）
+        - MEMORY_REPORT_TOP: レポートに出す確保元の件数（デフォルト 15）
+        """
+        load_dotenv()
+
+        raw_budget = os.getenv("MEMORY_BUDGET_MB")
+        return MemorySettings(
+            budget_mb=_parse_int(raw_budget, 0, 16) if raw_budget else None,
+            high_watermark=min(1.0, _parse_float(os.getenv("MEMORY_HIGH_WATERMARK"), 0.9, 0.1)),
+            shrink_fraction=min(1.0, _parse_float(os.getenv("MEMORY_SHRINK_FRACTION"), 0.5, 0.05)),
+            check_interval_seconds=_parse_float(
+                os.getenv("MEMORY_CHECK_INTERVAL_SECONDS"), 10.0, 0.5
+            ),
+            tracemalloc_frames=_parse_int(os.getenv("MEMORY_TRACEMALLOC_FRAMES"), 0, 0, 64),
+            report_top=_parse_int(os.getenv("MEMORY_REPORT_TOP"), 15, 1, 200),
+        )
+
+
+@dataclass(frozen=True)
+class AnswerCacheSettings:
+    backend: str = "off"
+    path: str = ".slack_agent_answers.sqlite3"
+    ttl_seconds: int = 86400
+
+    @staticmethod
+    def from_env() -> AnswerCacheSettings:
+        """環境変数から回答キャッシュ（バッチで温めた回答の再利用）の設定を読み込みます。
+
+        オプションの環境変数:
+        - ANSWER_CACHE: `off`（デフォルト）/ `sqlite`（バッチと Bot のプロセス間で共有）
+        - ANSWER_CACHE_PATH: `sqlite` のファイルパス（デフォルト .slack_agent_answers.sqlite3）
+        - ANSWER_CACHE_TTL_SECONDS: 回答を再利用する秒数（デフォルト 86400）
+        """
+        load_dotenv()
+
+        backend = os.getenv("ANSWER_CACHE", "off").strip().lower()
+        if backend not in ("off", "sqlite"):
+            raise RuntimeError(
+                f"ANSWER_CACHE は off / sqlite のいずれかを指定してください: {backend}"
+            )
+        return AnswerCacheSettings(
+            backend=backend,
+            path=os.getenv("ANSWER_CACHE_PATH", ".slack_agent_answers.sqlite3"),
+            ttl_seconds=_parse_int(os.getenv("ANSWER_CACHE_TTL_SECONDS"), 86400, 1),
+        )
+
+
+@dataclass(frozen=True)
+class BatchSettings:
+    concurrency: int = 4
+
+    @staticmethod
+    def from_env() -> BatchSettings:
+        """環境変数からバッチ実行（`slack-agent batch`）の設定を読み込みます。
+
+        オプションの環境変数:
+        - BATCH_CONCURRENCY: 同時に実行する質問数（デフォルト 4、1〜64。`--concurrency` で上書き）
+        """
+        load_dotenv()
+
+        return BatchSettings(
+            concurrency=_parse_int(os.getenv("BATCH_CONCURRENCY"), 4, 1, 64),
+        )
+
+
+@dataclass(frozen=True)
+class CassetteSettings:
+    mode: str = "off"
+    path: str | None = None
+    timing_scale: float = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @staticmethod
+    def from_env() -> CassetteSettings:
+        """環境変数から LLM・MCP 通信の記録と再生（カセット）の設定を読み込みます。
+
+        オプションの環境変数:
+        - CASSETTE_MODE: `off`（デフォルト）/ `record`（実通信を記録）/ `replay`（記録から応答）
+        - CASSETTE_PATH: カセットファイル（JSONL）のパス。`off` 以外では必須
+        - CASSETTE_TIMING_SCALE: 再生時に記録した所要時間へ掛ける倍率（デフォルト 1.0、
+          0 で待たずに返す）
+        """
+        load_dotenv()
+
+        mode = os.getenv("CASSETTE_MODE", "off").strip().lower() or "off"
+        if mode not in {"off", "record", "replay"}:
+            raise RuntimeError(
+                f"CASSETTE_MODE は off / record / replay のいずれかを指定してください: {mode}"
+            )
+        path = os.getenv("CASSETTE_PATH", "").strip() or None
+        if mode != "off" and path is None:
+            raise RuntimeError(f"CASSETTE_MODE={mode} では CASSETTE_PATH を指定してください")
+        return CassetteSettings(
+            mode=mode,
+            path=path,
+            timing_scale=_parse_float(os.getenv("CASSETTE_TIMING_SCALE"), 1.0, 0.0),
+        )
+
+
+@dataclass(frozen=True)
+class MetricsSettings:
+    port: int | None
+    host: str
+
+    @staticmethod
+    def from_env() -> MetricsSettings:
+        """環境変数からメトリクス公開設定を読み込みます。
+
+        オプションの環境変数:
+        - METRICS_PORT: 設定時に `/metrics`（Prometheus 形式）を公開するポート
+        - METRICS_HOST: バインドするホスト（デフォルト 127.0.0.1）
+        """
+        load_dotenv()
+
+        raw_port = os.getenv("METRICS_PORT", "")
+        port = _parse_int(raw_port, 0, 0, 65535) if raw_port else 0
+        return MetricsSettings(port=port or None, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+
+
+_SERVER_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Semche サーバー（MCP_SEMCHE_PATH）を既定で起動する際のサーバー名
+SEMCHE_SERVER_NAME = "semche"
+# プロセス内で起動する際の Semche サーバーモジュール（FastMCP インスタンスを自動検出）
+SEMCHE_SERVER_MODULE = "semche.mcp_server"
+
+# stdio: 子プロセス / inprocess: 自プロセスのイベントループ上 / thread: 専用スレッドのループ上
+MCP_TRANSPORTS = ("stdio", "inprocess", "thread")
+
+
+def module_importable(module: str) -> bool:
+    """モジュールが import 可能か（import 自体は行わない）を返します。"""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def resolve_transport(raw: str, server_ref: str | None) -> str:
+    """トランスポート指定を正規化します。
+
+    `auto` はサーバーモジュールが import 可能ならプロセス内（inprocess）、そうでなければ stdio。
+    """
+    value = (raw or "stdio").strip().lower()
+    if value == "auto":
+        module = (server_ref or "").partition(":")[0]
+        return "inprocess" if module and module_importable(module) else "stdio"
+    if value not in MCP_TRANSPORTS:
+        raise RuntimeError(
+            f"MCP トランスポートが不正です（{' / '.join(MCP_TRANSPORTS)} / auto）: {raw}"
+        )
+    return value
+
+
+def _parse_timeout(raw: Any, default: float) -> float:
+    """タイムアウト値（秒）を正規化します。不正値は既定値、下限は 1 秒。"""
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1.0, value)
+
+
+@dataclass(frozen=True)
+class MCPServerSettings:
+    """MCP サーバー 1 台分の接続設定。
+
+    `transport` が `stdio` なら `command`/`args` で子プロセスを起動し、`inprocess`/`thread` なら
+    `server`（`module` または `module:attr`）の MCP サーバーをプロセス内でメモリ上のストリームに
+    接続する。
+    """
+
+    name: str
+    command: str
+    args: tuple[str, ...] = ()
+    env: Mapping[str, str] = field(default_factory=dict)
+    cwd: str | None = None
+    transport: str = "stdio"
+    server: str | None = None
+    # 同じサーバーへ張るセッション数（2 以上でヘッジ要求が可能）と、ヘッジしてよい冪等なツール名
+    replicas: int = 1
+    hedge_tools: frozenset[str] = frozenset()
+    # initialize 完了までの秒数 / ツール一覧取得の秒数 / call_tool 1 回あたりの秒数
+    init_timeout: float = 10.0
+    list_timeout: float = 10.0
+    call_timeout: float = 10.0
+
+    def process_env(self) -> dict[str, str]:
+        """サーバープロセスへ渡す環境変数（親プロセスの環境 + サーバー個別設定）。"""
+        env = dict(os.environ)
+        env.update(self.env)
+        return env
+
+
+@dataclass(frozen=True)
+class MCPSettings:
+    servers: tuple[MCPServerSettings, ...]
+
+    @property
+    def namespaced(self) -> bool:
+        """複数サーバー構成ではツール名を `<server>_<tool>` に名前空間化します。"""
+        return len(self.servers) > 1
+
+    @staticmethod
+    def from_env() -> MCPSettings:
+        """環境変数から MCP サーバー構成を読み込みます。
+
+        - MCP_SEMCHE_PATH: Semche リポジトリのディレクトリ（設定時は `semche` サーバーとして起動）
+        - MCP_SEMCHE_TIMEOUT: Semche サーバーのタイムアウト秒（デフォルト 10）
+        - MCP_SEMCHE_TRANSPORT: Semche の接続方式（stdio 既定 / inprocess / thread / auto）
+        - MCP_SEMCHE_REPLICAS: Semche へ張るセッション数（デフォルト 1、1〜8）
+        - MCP_SEMCHE_HEDGE_TOOLS: ヘッジ要求の対象ツール（カンマ区切り、デフォルト search）
+        - SEMCHE_CHROMA_DIR: Semche サーバープロセスへ引き渡す Chroma DB ディレクトリ
+        - MCP_SERVERS_FILE: 追加 MCP サーバーの JSON 設定ファイル（任意）
+
+        どちらも未設定の場合は RuntimeError を送出します。
+        """
+        load_dotenv()
+
+        servers: list[MCPServerSettings] = []
+        semche_path = os.getenv("MCP_SEMCHE_PATH", "")
+        if semche_path:
+            servers.append(_semche_server_settings(semche_path))
+
+        servers_file = os.getenv("MCP_SERVERS_FILE", "")
+        if servers_file:
+            servers.extend(_load_servers_file(servers_file))
+
+        if not servers:
+            raise RuntimeError(
+                "MCP_SEMCHE_PATH が未設定のため MCP 接続を開始できません"
+                "（追加サーバーは MCP_SERVERS_FILE で指定できます）"
+            )
+
+        names = [s.name for s in servers]
+        duplicated = sorted({n for n in names if names.count(n) > 1})
+        if duplicated:
+            raise RuntimeError(f"MCP サーバー名が重複しています: {', '.join(duplicated)}")
+
+        return MCPSettings(servers=tuple(servers))
+
+
+def _semche_server_settings(path: str) -> MCPServerSettings:
+    if not os.path.isdir(path):
+        raise RuntimeError(f"MCP_SEMCHE_PATH はディレクトリを指定してください: {path}")
+
+    work_dir = os.path.abspath(path)
+    server_rel = "src/semche/mcp_server.py"
+    server_full = os.path.join(work_dir, server_rel)
+    if not os.path.exists(server_full):
+        raise RuntimeError(f"MCP サーバースクリプトが見つかりません: {server_full}")
+
+    timeout = _parse_timeout(os.getenv("MCP_SEMCHE_TIMEOUT", "10"), 10.0)
+    env: dict[str, str] = {}
+    chroma_dir = os.getenv("SEMCHE_CHROMA_DIR")
+    if chroma_dir:
+        env["SEMCHE_CHROMA_DIR"] = chroma_dir
+    transport = resolve_transport(os.getenv("MCP_SEMCHE_TRANSPORT", "stdio"), SEMCHE_SERVER_MODULE)
+
+    return MCPServerSettings(
+        name=SEMCHE_SERVER_NAME,
+        command="uv",
+        args=("run", "--directory", work_dir, "python", server_rel),
+        env=env,
+        transport=transport,
+        server=SEMCHE_SERVER_MODULE,
+        replicas=_parse_int(os.getenv("MCP_SEMCHE_REPLICAS"), 1, 1, 8),
+        hedge_tools=_parse_csv(os.getenv("MCP_SEMCHE_HEDGE_TOOLS", "search")),
+        init_timeout=timeout,
+        list_timeout=timeout,
+        call_timeout=timeout,
+    )
+
+
+def _load_servers_file(path: str) -> list[MCPServerSettings]:
+    """MCP_SERVERS_FILE（JSON）を読み込みます。
+
+    形式::
+
+        {"servers": {"<name>": {"command": "...", "args": [...], "env": {...}, "cwd": "...",
+                                "timeouts": {"init": 10, "list": 10, "call": 30}}}}
+
+    プロセス内で動かす場合は `"transport": "inprocess" | "thread" | "auto"` と
+    `"server": "<module>[:<attr>]"` を指定します（`command` は stdio 時のみ必須）。
+    `"replicas": 2` と `"hedge_tools": ["search"]` で冪等なツールのヘッジ要求を有効にします。
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"MCP_SERVERS_FILE を読み込めません: {path}: {e}") from e
+
+    entries = data.get("servers") if isinstance(data, dict) else None
+    if not isinstance(entries, dict):
+        raise RuntimeError(f"MCP_SERVERS_FILE に servers オブジェクトがありません: {path}")
+
+    servers: list[MCPServerSettings] = []
+    for name, conf in entries.items():
+        if not isinstance(name, str) or not _SERVER_NAME_RE.match(name):
+            raise RuntimeError(f"MCP サーバー名が不正です（英数字・_・- のみ）: {name!r}")
+        if not isinstance(conf, dict):
+            raise RuntimeError(f"MCP サーバー {name} の設定がオブジェクトではありません")
+        server_ref = str(conf["server"]) if conf.get("server") else None
+        transport = resolve_transport(str(conf.get("transport") or "stdio"), server_ref)
+        if transport != "stdio" and not server_ref:
+            raise RuntimeError(f"MCP サーバー {name} に server（モジュール）が指定されていません")
+        if transport == "stdio" and not conf.get("command"):
+            raise RuntimeError(f"MCP サーバー {name} に command が指定されていません")
+
+        args = conf.get("args") or []
+        env = conf.get("env") or {}
+        timeouts = conf.get("timeouts") or {}
+        hedge_tools = conf.get("hedge_tools") or []
+        if not (
+            isinstance(args, list)
+            and isinstance(env, dict)
+            and isinstance(timeouts, dict)
+            and isinstance(hedge_tools, list)
+        ):
+            raise RuntimeError(
+                f"MCP サーバー {name} の args/env/timeouts/hedge_tools の形式が不正です"
+            )
+
+        servers.append(
+            MCPServerSettings(
+                name=name,
+                command=str(conf.get("command") or ""),
+                args=tuple(str(a) for a in args),
+                env={str(k): str(v) for k, v in env.items()},
+                cwd=str(conf["cwd"]) if conf.get("cwd") else None,
+                init_timeout=_parse_timeout(timeouts.get("init"), 10.0),
+                list_timeout=_parse_timeout(timeouts.get("list"), 10.0),
+                call_timeout=_parse_timeout(timeouts.get("call"), 10.0),
+                transport=transport,
+                server=server_ref,
+                replicas=_parse_int(str(conf.get("replicas", 1)), 1, 1, 8),
+                hedge_tools=frozenset(str(t) for t in hedge_tools),
+            )
+        )
+    return servers
@@ -0,0 +1,116 @@
+"""Slack のユーザー名・チャンネル名の解決（LRU + TTL キャッシュ付き）。
+
+メッセージ正規化（`text.normalize_slack_text`）が必要とする ID → 名前の対応表を提供する。
+1 リクエスト分のメッセージに含まれる ID をまとめて `prefetch()` し、キャッシュに無いものだけを
+重複なく `users.info` / `conversations.info` で解決するため、メッセージごとに Slack API を
+呼ぶことはない。Slack には複数 ID をまとめて引く API がないため、未解決の ID が複数あれば
+最大 `_PREFETCH_CONCURRENCY` 件ずつ並行に問い合わせる。取得に失敗した ID も短時間キャッシュし、
+失敗を繰り返し問い合わせない。
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from . import metrics
+from .cache import TTLCache
+from .config import DirectorySettings
+
+logger = logging.getLogger(__name__)
+
+_LOOKUPS = metrics.counter(
+    "slack_agent_directory_lookups_total", "ユーザー名・チャンネル名の解決件数（kind / result 別）"
+)
+
+# 取得失敗（権限不足など）の ID を再問い合わせしない秒数
+_NEGATIVE_TTL_SECONDS = 300.0
+# prefetch() で同時に問い合わせる件数の上限（users.info / conversations.info は Tier 4）
+_PREFETCH_CONCURRENCY = 4
+
+
+def _user_name(user: dict[str, Any]) -> str | None:
+    profile = user.get("profile") or {}
+    for candidate in (profile.get("display_name"), profile.get("real_name"), user.get("name")):
+        if candidate:
+            return str(candidate)
+    return None
+
+
+class SlackDirectory:
+    """ユーザー ID / チャンネル ID を表示名へ解決する。"""
+
+    def __init__(self, client: Any, settings: DirectorySettings) -> None:
+        self.client = client
+        self.settings = settings
+        self._users: TTLCache[str, str] = TTLCache(settings.max_entries, settings.ttl_seconds)
+        self._channels: TTLCache[str, str] = TTLCache(settings.max_entries, settings.ttl_seconds)
+        # 解決できなかった ID（値は ID そのもの）
+        self._failed: TTLCache[str, str] = TTLCache(settings.max_entries, _NEGATIVE_TTL_SECONDS)
+
+    def __len__(self) -> int:
+        return len(self._users) + len(self._channels) + len(self._failed)
+
+    def shrink(self, fraction: float) -> int:
+        """メモリ予算の超過時に、各キャッシュの古いエントリを `fraction` ずつ捨てます。"""
+        return sum(c.shrink(fraction) for c in (self._users, self._channels, self._failed))
+
+    def prefetch(self, user_ids: Iterable[str] = (), channel_ids: Iterable[str] = ()) -> None:
+        """キャッシュに無い ID だけを並行に解決します（失敗しても例外は送出しない）。"""
+        fetches: list[tuple[Callable[[str], None], str]] = [
+            (self._fetch_user, uid)
+            for uid in self._users.missing(user_ids)
+            if self._failed.get(uid) is None
+        ]
+        fetches += [
+            (self._fetch_channel, cid)
+            for cid in self._channels.missing(channel_ids)
+            if self._failed.get(cid) is None
+        ]
+        if len(fetches) <= 1:
+            for fetch, key in fetches:
+                fetch(key)
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(len(fetches), _PREFETCH_CONCURRENCY),
+            thread_name_prefix="slack-directory",
+        ) as pool:
+            for fetch, key in fetches:
+                pool.submit(fetch, key)
+
+    def users(self, user_ids: Iterable[str]) -> dict[str, str]:
+        """キャッシュ済みのユーザー名（API は呼ばない）。"""
+        return self._users.get_many(user_ids)
+
+    def channels(self, channel_ids: Iterable[str]) -> dict[str, str]:
+        """キャッシュ済みのチャンネル名（API は呼ばない）。"""
+        return self._channels.get_many(channel_ids)
+
+    def _fetch_user(self, uid: str) -> None:
+        try:
+            response = self.client.users_info(user=uid)
+            name = _user_name(response.get("user") or {})
+        except Exception as e:  # noqa: BLE001 - 名前解決の失敗で応答を止めない
+            logger.debug("users.info failed user=%s: %s", uid, e)
+            name = None
+        self._store(self._users, uid, name, "user")
+
+    def _fetch_channel(self, cid: str) -> None:
+        try:
+            response = self.client.conversations_info(channel=cid)
+            channel = response.get("channel") or {}
+            name = str(channel["name"]) if channel.get("name") else None
+        except Exception as e:  # noqa: BLE001
+            logger.debug("conversations.info failed channel=%s: %s", cid, e)
+            name = None
+        self._store(self._channels, cid, name, "channel")
+
+    def _store(self, cache: TTLCache[str, str], key: str, name: str | None, kind: str) -> None:
+        if name is None:
+            self._failed.set(key, key)
+            _LOOKUPS.inc(kind=kind, result="error")
+            return
+        cache.set(key, name)
+        _LOOKUPS.inc(kind=kind, result="ok")
@@ -1,14 +1,11 @@
 from __future__ import annotations
 
-import asyncio
-import os
-import atexit
-import contextlib
 import logging
-import threading
-from collections.abc import Coroutine, Mapping
-from concurrent.futures import Future
-from typing import Any, TypeVar
+import os
+import time
+from collections.abc import Mapping
+from concurrent.futures import CancelledError
+from typing import Any
 
 from slack_bolt import App
 from slack_bolt.context.say.say import Say
@@ -16,6 +13,7 @@ from slack_bolt.context.say.say import Say
 try:  # slack_sdk は slack-bolt 依存に含まれる想定。万一未導入でも処理継続できるようフォールバック。
     from slack_sdk.errors import SlackApiError
 except Exception:  # pragma: no cover - インポート失敗はまれ
+
     class SlackApiError(Exception):  # type: ignore
         """フォールバック: SlackApiError が未インポート時の簡易例外クラス"""
 
@@ -27,88 +25,129 @@ except Exception:  # pragma: no cover - インポート失敗はまれ
             super().__init__(message)
             self.response = response or {}
 
-from ..agent import invoke_agent
-from ..text import clean_mention_text
-
-# --- 背景イベントループ（永続）で非同期関数を実行する仕組み ------------------------
-# Slack Bolt の同期ハンドラー内で asyncio.run() を使うと、処理後にイベントループが
-# クローズされ、そこで生成された MCP セッションの下層ストリームも閉じられてしまう。
-# これを避けるため、プロセス中に存続する専用のイベントループを別スレッドで動かし、
-# そのループ上でエージェント実行を行う。
-
-_bg_loop: asyncio.AbstractEventLoop | None = None
-_bg_thread: threading.Thread | None = None
-_bg_ready = threading.Event()
-
 
-def _start_background_loop() -> None:
-    global _bg_loop, _bg_thread
-    if _bg_loop is not None:
-        return
-
-    def _runner() -> None:
-        loop = asyncio.new_event_loop()
-        try:
-            asyncio.set_event_loop(loop)
-            # 共有参照をセットしてから run_forever
-            global _bg_loop
-            _bg_loop = loop
-            _bg_ready.set()
-            loop.run_forever()
-        finally:
-            # ループ停止時のクローズ
-            with contextlib.suppress(Exception):
-                loop.close()
-
-    t = threading.Thread(target=_runner, name="slack-agent-bg-loop", daemon=True)
-    _bg_thread = t
-    t.start()
-    _bg_ready.wait(timeout=5)
-
-
-def _stop_background_loop() -> None:
-    global _bg_loop
-    loop = _bg_loop
-    if loop is None:
-        return
-    try:
-        loop.call_soon_threadsafe(loop.stop)
-    except Exception:  # noqa: BLE001
-        pass
-    finally:
-        _bg_loop = None
+from .. import metrics
+from ..admission import AdmissionController, settings_for
+from ..agent import invoke_agent
+from ..answers import get_answer_cache
+from ..background import run_in_background, start_background_loop, stop_background_loop
+from ..config import (
+    DEFAULT_WORKSPACE,
+    DirectorySettings,
+    DrainSettings,
+    OutboundSettings,
+    ProfileSettings,
+    WorkspaceSettings,
+)
+from ..directory import SlackDirectory
+from ..lifecycle import LIFECYCLE
+from ..logsetup import body
+from ..memory import MEMORY
+from ..outbound import OutboundScheduler
+from ..profiling import RequestProfiler
+from ..records import ThreadMessage
+from ..text import (
+    clean_mention_text,
+    mentioned_ids,
+    normalize_slack_text,
+    strip_leading_mention,
+)
 
+# 背景イベントループは `slack_agent.background` に移動（既存の呼び出し名を維持）
+_start_background_loop = start_background_loop
+_stop_background_loop = stop_background_loop
+_run_in_background = run_in_background
 
-atexit.register(_stop_background_loop)
+_MENTIONS = metrics.counter(
+    "slack_agent_workspace_mentions_total", "ワークスペースごとのメンションの件数（outcome 別）"
+)
+_RESPONSE_SECONDS = metrics.histogram(
+    "slack_agent_workspace_response_seconds",
+    "ワークスペースごとの受付から返信までの時間（秒）",
+    (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
 
 
-T = TypeVar("T")
+def _scoped(name: str, workspace: str) -> str:
+    """ワークスペースごとに登録する名前（`default` は従来の名前のまま）。"""
+    return name if workspace == DEFAULT_WORKSPACE else f"{name}:{workspace}"
 
 
-def _run_in_background(coro: Coroutine[Any, Any, T]) -> T:  # noqa: UP047 - 単純な汎用同期ヘルパ
-    """永続イベントループでコルーチンを同期的に実行して結果を返す。"""
-    if _bg_loop is None:
-        _start_background_loop()
-    assert _bg_loop is not None  # for type checker
-    fut: Future[T] = asyncio.run_coroutine_threadsafe(coro, _bg_loop)
-    return fut.result()
+def register(app: App, workspace: WorkspaceSettings | None = None) -> None:
+    """`app_mention` イベントのハンドラーを登録します。
 
+    複数ワークスペース構成では `App` ごとに呼ばれ、受付制御（上限はワークスペース別）・
+    名前解決のキャッシュ・送信キューをワークスペースごとに持つ。MCP 接続とエージェントの
+    グラフはプロセス内で共有する。
+    """
 
-def register(app: App) -> None:
-    def fetch_thread_history(channel: str, thread_ts: str, limit: int = 10) -> list[dict[str, Any]]:
+    def fetch_thread_history(channel: str, thread_ts: str, limit: int = 10) -> list[ThreadMessage]:
         """指定スレッドの履歴をSlack APIで取得し、直近limit件のみ返す。失敗時は空リスト。"""
         try:
             response = app.client.conversations_replies(channel=channel, ts=thread_ts, limit=limit)
             msgs: list[Any] = response.get("messages", [])  # mypy: arbitrary JSON-like
             # 型安全にキャスト（mypy用）。Slack SDKは任意型を返すため保守的にフィルタ
-            messages: list[dict[str, Any]] = [m for m in msgs if isinstance(m, dict)]
+            # API 境界でコンパクトなレコードに変換（blocks / attachments などは捨てる）
+            messages = [ThreadMessage.from_slack(m) for m in msgs if isinstance(m, dict)]
             # スレッドの時系列順で直近limit件のみ返す
             return messages[-limit:] if len(messages) > limit else messages
         except Exception as e:
             logger.warning(f"Failed to fetch thread history: {e}")
             return []
-    """`app_mention` イベントのハンドラーを登録します。"""
+
     logger = logging.getLogger("slack_agent.handlers.message")
+    tenant = workspace.name if workspace is not None else DEFAULT_WORKSPACE
+    admission = AdmissionController(settings_for(workspace), tenant)
+    # 単一ワークスペースでは従来どおりの呼び出し（thread_id も従来の形式）にする
+    scope: dict[str, Any] = {} if tenant == DEFAULT_WORKSPACE else {"workspace": tenant}
+    directory = SlackDirectory(app.client, DirectorySettings.from_env())
+    outbound = OutboundScheduler(OutboundSettings.from_env())
+    drain_settings = DrainSettings.from_env()
+    profiler = RequestProfiler(ProfileSettings.from_env())
+    # バッチ実行（slack-agent batch --warm）で温めた頻出質問の回答。ANSWER_CACHE=off なら None
+    answer_cache = get_answer_cache()
+
+    def _flush_outbound(timeout: float) -> int:
+        outbound.close(timeout)
+        return outbound.pending()
+
+    # 終了時のドレインでは、処理中の応答が落ち着いた後に送信待ちの返信を送り切る
+    LIFECYCLE.on_drain(_scoped("outbound", tenant), _flush_outbound)
+    # ドレイン開始時に受付待ちのメンションを起こし、受け付けずに中断メッセージを返させる
+    LIFECYCLE.on_drain_start(_scoped("admission", tenant), admission.close)
+    MEMORY.register(
+        _scoped("directory", tenant), lambda: directory, directory.__len__, directory.shrink
+    )
+    MEMORY.register(_scoped("outbound", tenant), lambda: outbound, outbound.pending)
+
+    def _reply(say: Say, channel: str | None, text: str, thread_ts: str | None) -> None:
+        """送信キュー経由でスレッドへ返信し、全断片の送信完了まで待ちます（失敗は例外）。"""
+        if outbound.closed:
+            # ドレインで送信キューを閉じた後に届いた返信（受付拒否など）は直接送る
+            say(text, thread_ts=thread_ts)
+            return
+        futures = outbound.post(channel or "", text, lambda chunk: say(chunk, thread_ts=thread_ts))
+        timeout = outbound.settings.send_timeout_seconds
+        for future in futures:
+            future.result(timeout=timeout)
+
+    def _normalize(cleaned: str, history: list[ThreadMessage]) -> tuple[str, list[ThreadMessage]]:
+        """質問と履歴の mrkdwn を 1 回だけ正規化します（名前解決はまとめて先読み）。"""
+        texts = [strip_leading_mention(m.text) for m in history]
+        user_ids: set[str] = set()
+        channel_ids: set[str] = set()
+        for t in (cleaned, *texts):
+            users, channels = mentioned_ids(t)
+            user_ids |= users
+            channel_ids |= channels
+        directory.prefetch(user_ids, channel_ids)
+        user_names = directory.users(user_ids)
+        channel_names = directory.channels(channel_ids)
+        normalized = [
+            msg.with_text(normalize_slack_text(t, user_names, channel_names))
+            for msg, t in zip(history, texts, strict=True)
+        ]
+        return normalize_slack_text(cleaned, user_names, channel_names), normalized
 
     def _try_add_eyes_reaction(app: App, event: Mapping[str, Any]) -> None:
         """対象メッセージに :eyes: リアクションを付与（失敗しても処理は継続）。"""
@@ -143,9 +182,60 @@ def register(app: App) -> None:
         # スレッド返信にする: 返信先の thread_ts は既存の thread_ts または元メッセージの ts
         thread_ts = event.get("thread_ts") or event.get("ts")
         channel = event.get("channel")
-        # スレッド履歴を取得
-        history: list[dict[str, Any]] = []
-        if channel and thread_ts:
+
+        # 終了処理中（ドレイン中）は新しいメンションを処理せず、再度のメンションを促す
+        if LIFECYCLE.draining:
+            LIFECYCLE.reject()
+            _MENTIONS.inc(workspace=tenant, outcome="draining")
+            _reply(say, channel, drain_settings.interrupted_message, thread_ts)
+            return
+        with LIFECYCLE.track():
+            # 過負荷時は履歴取得やエージェント実行の前に受付拒否し、すぐに返信する
+            ticket = admission.acquire(channel=channel, user=event.get("user"))
+            if LIFECYCLE.draining:
+                # 実行待ちの間（または受付の直後）にドレインが始まった。枠を返して処理しない
+                if ticket is not None:
+                    admission.release(ticket)
+                LIFECYCLE.reject()
+                _MENTIONS.inc(workspace=tenant, outcome="draining")
+                _reply(say, channel, drain_settings.interrupted_message, thread_ts)
+                return
+            if ticket is None:
+                _MENTIONS.inc(workspace=tenant, outcome="busy")
+                _reply(say, channel, admission.settings.busy_message, thread_ts)
+                return
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                outcome = _handle_admitted(event, say, text, cleaned, thread_ts, channel)
+            finally:
+                admission.release(ticket)
+                _MENTIONS.inc(workspace=tenant, outcome=outcome)
+                _RESPONSE_SECONDS.observe(time.monotonic() - started, workspace=tenant)
+
+    def _handle_admitted(
+        event: Mapping[str, Any],
+        say: Say,
+        text: str,
+        cleaned: str,
+        thread_ts: str | None,
+        channel: str | None,
+    ) -> str:
+        """受付済みのメンションを処理し、結果（answered / cached / interrupted / error）を返す。"""
+        cleaned, _ = _normalize(cleaned, [])
+        # スレッド外からの新しい質問は、温めておいた回答があればエージェントを呼ばずに返す
+        if answer_cache is not None and not event.get("thread_ts"):
+            cached = answer_cache.get(cleaned, tenant)
+            if cached is not None:
+                logger.info("Answer cache hit: chars=%d thread_ts=%r", len(cached), thread_ts)
+                _reply(say, channel, cached, thread_ts)
+                return "cached"
+        thread_key = (channel, thread_ts) if channel and thread_ts else None
+
+        def _load_history() -> list[ThreadMessage]:
+            """スレッド履歴を取得します（保存済みのエージェント状態から再開できないときだけ呼ばれる）。"""
+            if not (channel and thread_ts):
+                return []
             # 環境変数で取得件数を調整（デフォルト10）
             raw_limit = os.getenv("SLACK_HISTORY_LIMIT", "10")
             try:
@@ -156,13 +246,17 @@ def register(app: App) -> None:
             # 直近イベント（現在のメッセージ）が含まれている場合は除外して二重投入を防ぐ
             current_ts = event.get("ts")
             if current_ts:
-                history = [m for m in history if m.get("ts") != current_ts]
-        logger.info("Fetched thread history: %d messages", len(history))
+                history = [m for m in history if m.ts != current_ts]
+            _, history = _normalize("", history)
+            logger.info("Fetched thread history: %d messages", len(history))
+            return history
+
         logger.info(
-            "app_mention received: text=%r cleaned=%r thread_ts=%r",
-            text,
-            cleaned,
+            "app_mention received: cleaned=%r chars=%d thread_ts=%r workspace=%s",
+            body(cleaned),
+            len(text),
             thread_ts,
+            tenant,
         )
 
         # 応答生成前に :eyes: リアクションを追加して「処理中」であることを可視化
@@ -170,19 +264,39 @@ def register(app: App) -> None:
 
         try:
             # エージェントに質問を投げて応答を取得（永続ループ上で実行）
-            # 履歴も渡す（今後の拡張で利用）。ただし古いシグネチャ互換のためフォールバックあり。
-            try:
-                answer = _run_in_background(invoke_agent(cleaned, history=history))
-            except TypeError:
-                # 旧版のinvoke_agent(question: str)のみのモック等に対応
-                answer = _run_in_background(invoke_agent(cleaned))
-            logger.info("Agent answer: %r", answer)
+            # 履歴は再開できないときだけ取得させる（古いシグネチャ互換のフォールバックあり）
+            # PROFILE_DIR 設定時、閾値を超えた実行だけスタックを採取してファイルに書き出す
+            with profiler.watch(channel=channel, thread_ts=thread_ts, **scope) as watch:
+                try:
+                    answer = _run_in_background(
+                        watch.instrument(
+                            invoke_agent(
+                                cleaned,
+                                thread_key=thread_key,
+                                load_history=_load_history,
+                                user=event.get("user"),
+                                **scope,
+                            )
+                        )
+                    )
+                except TypeError:
+                    # 旧版のinvoke_agent(question: str)のみのモック等に対応
+                    answer = _run_in_background(watch.instrument(invoke_agent(cleaned)))
+            logger.info("Agent answer: chars=%d answer=%r", len(answer), body(answer))
+
+            # 応答をスレッドに返信（長い応答は分割し、チャンネルの投稿間隔を守って送る）
+            _reply(say, channel, answer, thread_ts)
+            return "answered"
 
-            # 応答をスレッドに返信
-            say(answer, thread_ts=thread_ts)
+        except CancelledError:
+            # ドレインの期限切れで取り消された。途中状態は保存されないため再度のメンションを促す
+            logger.warning("Agent run interrupted by shutdown thread_ts=%r", thread_ts)
+            _reply(say, channel, drain_settings.interrupted_message, thread_ts)
+            return "interrupted"
 
         except Exception as e:
             # エラーハンドリング: ユーザーフレンドリーなメッセージを返信
             error_message = f"申し訳ありません。エラーが発生しました: {e}"
             logger.error("Error invoking agent: %s", e, exc_info=True)
-            say(error_message, thread_ts=thread_ts)
+            _reply(say, channel, error_message, thread_ts)
+            return "error"
@@ -0,0 +1,57 @@
+"""OpenAI 呼び出しで共有する非同期 HTTP クライアント。
+
+`ChatOpenAI` を既定のまま作ると SDK 内部のクライアントが使われ、接続数や keep-alive を
+制御できない。プロセスで 1 つの `httpx.AsyncClient` を作って共有し、接続プールの上限と
+keep-alive の保持時間を設定で決める。クライアントは背景ループ上で使われるため、
+閉じるのも背景ループの停止フックで行う。
+"""
+
+from __future__ import annotations
+
+import logging
+
+import httpx
+
+from .background import add_shutdown_hook
+from .config import ModelClientSettings
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+
+
+def build_http_client(settings: ModelClientSettings) -> httpx.AsyncClient:
+    """設定どおりの接続プール・タイムアウトを持つ `httpx.AsyncClient` を作ります。"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(settings.timeout_seconds, connect=10.0),
+        follow_redirects=True,
+    )
+
+
+def shared_http_client(settings: ModelClientSettings) -> httpx.AsyncClient:
+    """プロセスで共有する HTTP クライアント（初回の設定で 1 回だけ作成）。"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_http_client(settings)
+        logger.info(
+            "Shared HTTP client created (max_connections=%d, keepalive=%d, expiry=%.0fs)",
+            settings.max_connections,
+            settings.max_keepalive_connections,
+            settings.keepalive_expiry_seconds,
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+add_shutdown_hook(close_http_client)
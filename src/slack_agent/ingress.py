@@ -0,0 +1,273 @@
+"""複数の Socket Mode 接続によるイベント受信（重複排除・接続ヘルス・段階的な再接続）。
+
+Slack は 1 つのアプリに対して複数の Socket Mode 接続を許可し、イベントはいずれか 1 つの
+接続へ配送される（ack が遅れた・接続が切れた場合は別の接続へ再送されることがある）。
+1 本の接続が再接続中・ack 遅延中でも他の接続で受信を続けられるよう、`SocketModePool` は
+N 本の接続を張り、`event_id` で重複を除いてから Bolt へ渡す。
+
+- 重複排除: `memory`（プロセス内）または `sqlite`（同じホストの複数プロセスで共有）
+- 再接続: `ReconnectGate` で 1 本ずつ・間隔を空けて行い、全接続が同時に落ちる窓を作らない
+  （Slack からの `disconnect` 要求では新しい接続を確立してから古い接続を閉じる）
+- メトリクス: ack までの時間、再接続回数、重複イベント数、開いている接続数
+
+複数ワークスペース構成では、ワークスペースごとに `SocketModePool` を作り、重複判定器は共有する
+（`event_id` はワークスペースをまたいで一意）。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any, Protocol
+
+from slack_bolt import App
+from slack_bolt.adapter.socket_mode.builtin import SocketModeHandler
+from slack_bolt.adapter.socket_mode.internals import run_bolt_app, send_response
+from slack_sdk.socket_mode.builtin import SocketModeClient
+from slack_sdk.socket_mode.request import SocketModeRequest
+from slack_sdk.socket_mode.response import SocketModeResponse
+
+from . import metrics
+from .cache import TTLCache
+from .config import DEFAULT_WORKSPACE, SocketModeSettings
+from .memory import MEMORY
+
+logger = logging.getLogger(__name__)
+
+_ACK_SECONDS = metrics.histogram(
+    "slack_agent_socket_ack_seconds",
+    "Socket Mode のリクエスト受信から ack 送信までの時間（秒）",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+_RECONNECTS = metrics.counter("slack_agent_socket_reconnects_total", "Socket Mode 接続の再接続回数")
+_DUPLICATES = metrics.counter(
+    "slack_agent_socket_duplicate_events_total", "重複として破棄したイベント数（ack のみ返す）"
+)
+_OPEN = metrics.gauge(
+    "slack_agent_socket_connections_open", "開いている Socket Mode 接続数（workspace 別）"
+)
+
+
+class EventDeduper(Protocol):
+    def first_seen(self, event_id: str) -> bool:
+        """初めて見た event_id なら True（記録する）、既出なら False を返します。"""
+        ...
+
+
+class MemoryEventDeduper:
+    """プロセス内の TTL 付き集合による重複排除（同一プロセスの接続間で共有）。"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000) -> None:
+        self._seen: TTLCache[str, bool] = TTLCache(max_entries, ttl_seconds)
+        # 重複排除の記録は捨てると再配送を二重に処理するため、メモリ予算では縮小しない
+        MEMORY.register("event_dedup", lambda: self._seen, lambda: len(self._seen))
+        self._lock = threading.Lock()
+
+    def first_seen(self, event_id: str) -> bool:
+        with self._lock:
+            if self._seen.get(event_id):
+                return False
+            self._seen.set(event_id, True)
+            return True
+
+
+class SqliteEventDeduper:
+    """SQLite の主キー制約による重複排除（同じホストの複数プロセスで共有できる）。
+
+    `INSERT OR IGNORE` の挿入件数で判定するため、プロセス間でも判定は原子的。
+    期限切れの行は一定回数の挿入ごとにまとめて削除する。
+    """
+
+    _PRUNE_EVERY = 500
+
+    def __init__(self, path: str, ttl_seconds: float) -> None:
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS slack_events (event_id TEXT PRIMARY KEY, seen_at REAL)"
+            )
+
+    def first_seen(self, event_id: str) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO slack_events (event_id, seen_at) VALUES (?, ?)",
+                (event_id, now),
+            )
+            if cur.rowcount == 0:
+                # 期限切れの既存行なら新しいイベントとして扱い直す
+                cur = self._conn.execute(
+                    "UPDATE slack_events SET seen_at = ? WHERE event_id = ? AND seen_at < ?",
+                    (now, event_id, now - self._ttl),
+                )
+                return cur.rowcount == 1
+            self._inserts += 1
+            if self._inserts % self._PRUNE_EVERY == 0:
+                self._conn.execute("DELETE FROM slack_events WHERE seen_at < ?", (now - self._ttl,))
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_deduper(settings: SocketModeSettings) -> EventDeduper:
+    if settings.dedupe_backend == "sqlite":
+        logger.info("Event dedupe: sqlite (%s)", settings.dedupe_path)
+        return SqliteEventDeduper(settings.dedupe_path, settings.dedupe_ttl_seconds)
+    return MemoryEventDeduper(settings.dedupe_ttl_seconds)
+
+
+class ReconnectGate:
+    """再接続を 1 本ずつ、`stagger_seconds` の間隔を空けて行わせるゲート。"""
+
+    def __init__(self, stagger_seconds: float) -> None:
+        self.stagger_seconds = stagger_seconds
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def turn(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def pause(self) -> None:
+        """`turn()` の中で呼び、次の接続の再接続まで間隔を空けます（同時に張り替えない）。"""
+        if self.stagger_seconds > 0:
+            time.sleep(self.stagger_seconds)
+
+
+class _GatedSocketModeClient(SocketModeClient):
+    """再接続を `ReconnectGate` で直列化し、回数をメトリクスに記録するクライアント。"""
+
+    def __init__(self, *args: Any, name: str, gate: ReconnectGate, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self._gate = gate
+
+    def connect_to_new_endpoint(self, force: bool = False) -> None:
+        before = self.current_session
+        with self._gate.turn():
+            super().connect_to_new_endpoint(force)
+            if self.current_session is before:
+                return
+            _RECONNECTS.inc(conn=self.name)
+            logger.info("Socket Mode connection %s reconnected", self.name)
+            self._gate.pause()
+
+
+class PooledSocketModeHandler(SocketModeHandler):
+    """重複イベントを ack だけして破棄し、ack までの時間を計測する Socket Mode ハンドラー。"""
+
+    def __init__(
+        self,
+        app: App,
+        app_token: str,
+        *,
+        name: str,
+        gate: ReconnectGate,
+        deduper: EventDeduper,
+        ping_interval: float = 10,
+        concurrency: int = 10,
+    ) -> None:
+        # SocketModeHandler.__init__ と同じ構成で、再接続を制御するクライアントを使う
+        self.app = app
+        self.app_token = app_token
+        self.name = name
+        self._deduper = deduper
+        self.client = _GatedSocketModeClient(
+            app_token=app_token,
+            logger=app.logger,
+            web_client=app.client,
+            proxy=app.client.proxy,
+            ping_interval=ping_interval,
+            concurrency=concurrency,
+            name=name,
+            gate=gate,
+        )
+        self.client.socket_mode_request_listeners.append(self.handle)  # type: ignore[arg-type]
+
+    def handle(self, client: SocketModeClient, req: SocketModeRequest) -> None:  # type: ignore[override]
+        start = time.time()
+        event_id = req.payload.get("event_id") if req.type == "events_api" else None
+        if isinstance(event_id, str) and not self._deduper.first_seen(event_id):
+            # 別の接続で処理済み（または処理中）の再送。ack だけ返して Slack の再送を止める
+            client.send_socket_mode_response(SocketModeResponse(envelope_id=req.envelope_id))
+            _DUPLICATES.inc(conn=self.name)
+            logger.debug("Duplicate event dropped: %s (retry=%s)", event_id, req.retry_attempt)
+        else:
+            send_response(client, req, run_bolt_app(self.app, req), start)
+        _ACK_SECONDS.observe(time.time() - start, conn=self.name)
+
+
+class SocketModePool:
+    """1 プロセスで複数の Socket Mode 接続を張り、重複排除を共有するハンドラー群。"""
+
+    def __init__(
+        self,
+        app: App,
+        app_token: str,
+        settings: SocketModeSettings,
+        deduper: EventDeduper | None = None,
+        workspace: str = DEFAULT_WORKSPACE,
+    ) -> None:
+        self.settings = settings
+        self.workspace = workspace
+        self.gate = ReconnectGate(settings.reconnect_stagger_seconds)
+        self.deduper = deduper or create_deduper(settings)
+        # 接続名はメトリクスの conn ラベルになるため、ワークスペース間で重ならないようにする
+        prefix = "" if workspace == DEFAULT_WORKSPACE else f"{workspace}-"
+        self.handlers = [
+            PooledSocketModeHandler(
+                app, app_token, name=f"{prefix}conn-{i}", gate=self.gate, deduper=self.deduper
+            )
+            for i in range(settings.connections)
+        ]
+        for handler in self.handlers:
+            handler.client.on_close_listeners.append(self._on_close)
+
+    def _on_close(self, code: int, reason: str | None = None) -> None:
+        self.update_health()
+
+    def open_connections(self) -> int:
+        return sum(1 for h in self.handlers if h.client.is_connected())
+
+    def update_health(self) -> int:
+        count = self.open_connections()
+        _OPEN.set(count, workspace=self.workspace)
+        return count
+
+    def connect(self) -> None:
+        """接続を 1 本ずつ、間隔を空けて確立します。
+
+        同時に張った接続は Slack 側の張り替え（refresh）も同時期になりやすいため、
+        開始時点からずらしておく。
+        """
+        for i, handler in enumerate(self.handlers):
+            if i and self.settings.reconnect_stagger_seconds > 0:
+                time.sleep(self.settings.reconnect_stagger_seconds)
+            handler.connect()  # type: ignore[no-untyped-call]
+            self.update_health()
+        logger.info(
+            "Socket Mode connections established: %d (workspace=%s)",
+            len(self.handlers),
+            self.workspace,
+        )
+
+    def start(self) -> None:
+        """全接続を確立し、プロセスが終了しないよう現在のスレッドをブロックします。"""
+        self.connect()
+        threading.Event().wait()
+
+    def close(self) -> None:
+        for handler in self.handlers:
+            with contextlib.suppress(Exception):
+                handler.close()  # type: ignore[no-untyped-call]
+        self.update_health()
@@ -0,0 +1,174 @@
+"""終了時のドレイン（受信停止 → 処理中の応答の完了待ち → 後始末）。
+
+ローリングデプロイで SIGTERM を受けたプロセスは、次の順で終了する。
+
+1. ドレイン中に切り替え、Socket Mode の接続を閉じて新しいイベントを受けない
+   （Slack は残っている別プロセスの接続へ配送する）。ドレイン中に届いたメンションには
+   中断メッセージを返して処理しない。受付制御で実行待ちのメンションも `on_drain_start()` の
+   フックで起こし、同じく処理せずに中断メッセージを返させる（取り消された実行の枠が
+   空いた後に受け付けられて、停止後の背景ループで実行されることがないように）
+2. 処理中の応答の完了を `DRAIN_TIMEOUT_SECONDS` まで待つ
+3. 期限までに終わらない実行は背景ループ上で取り消す。取り消された実行のスレッド状態は
+   保存されず（`ThreadCheckpoints.end(ok=False)`）、次のメンションで Slack の履歴から
+   作り直される。ハンドラーは中断メッセージをスレッドへ返す
+4. 登録済みのドレインフック（送信キューの送り切りなど）を実行する
+5. 背景ループを停止する。MCP セッションは開いたループと同じ背景ループ上で閉じる
+
+結果は `DrainReport` として返し、`bot.main()` がログに出力して終了する。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+from .background import BackgroundLoop, default_loop
+
+logger = logging.getLogger(__name__)
+
+# 期限後の後始末（中断メッセージの送信・フック・MCP のクローズ）に最低限与える秒数
+GRACE_SECONDS = 5.0
+
+DrainHook = Callable[[float], int]
+StartHook = Callable[[], None]
+
+
+@dataclass(frozen=True)
+class DrainReport:
+    """ドレインの結果。"""
+
+    completed: int  # 期限内に完了した処理中の応答
+    interrupted: int  # 期限までに終わらず中断した応答
+    rejected: int  # ドレイン中に届き、処理しなかったメンション
+    unsent: int  # ドレインフックが送り切れなかった件数（送信キューの残りなど）
+    mcp_closed: bool  # 背景ループ上の停止フック（MCP のクローズ）がすべて成功したか
+    seconds: float
+
+    @property
+    def clean(self) -> bool:
+        return self.interrupted == 0 and self.unsent == 0 and self.mcp_closed
+
+    def summary(self) -> str:
+        return (
+            f"completed={self.completed} interrupted={self.interrupted} "
+            f"rejected={self.rejected} unsent={self.unsent} "
+            f"mcp_closed={self.mcp_closed} seconds={self.seconds:.1f}"
+        )
+
+
+class Lifecycle:
+    """処理中の応答数を数え、ドレインの手順を実行する。"""
+
+    def __init__(self, loop: BackgroundLoop | None = None) -> None:
+        self._loop = loop
+        self._draining = threading.Event()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._rejected = 0
+        self._hooks: list[tuple[str, DrainHook]] = []
+        self._start_hooks: list[tuple[str, StartHook]] = []
+
+    @property
+    def draining(self) -> bool:
+        return self._draining.is_set()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @contextlib.contextmanager
+    def track(self) -> Iterator[None]:
+        """メンション 1 件の処理（受付待ちから返信まで）を処理中として数えます。"""
+        with self._cond:
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    def reject(self) -> None:
+        """ドレイン中に届いて処理しなかったメンションを記録します。"""
+        with self._cond:
+            self._rejected += 1
+
+    def on_drain(self, name: str, hook: DrainHook) -> None:
+        """処理中の応答が落ち着いた後に呼ぶフックを登録します。
+
+        フックは残り秒数を受け取り、やり残した件数を返します。
+        """
+        with self._cond:
+            self._hooks.append((name, hook))
+
+    def on_drain_start(self, name: str, hook: StartHook) -> None:
+        """ドレイン中に切り替えた直後に呼ぶフック（実行待ちを起こすなど）を登録します。"""
+        with self._cond:
+            self._start_hooks.append((name, hook))
+
+    def _wait_idle(self, deadline: float) -> int:
+        """処理中が 0 になるか期限まで待ち、残った件数を返します。"""
+        with self._cond:
+            while self._inflight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._inflight
+
+    def drain(self, timeout: float, stop_ingress: Callable[[], None] | None = None) -> DrainReport:
+        """ドレインを実行して結果を返します（モジュール docstring の手順）。"""
+        loop = self._loop or default_loop()
+        started = time.monotonic()
+        self._draining.set()
+        for name, start_hook in list(self._start_hooks):
+            try:
+                start_hook()
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Drain start hook %s failed: %s", name, e)
+        if stop_ingress is not None:
+            try:
+                stop_ingress()
+            except Exception as e:  # noqa: BLE001 - 受信停止に失敗しても後始末は続ける
+                logger.warning("Failed to stop ingress: %s", e)
+        with self._cond:
+            initial = self._inflight
+        logger.info("Draining: waiting for %d in-flight mention(s) (%.0fs)", initial, timeout)
+
+        interrupted = self._wait_idle(started + timeout)
+        if interrupted:
+            cancelled = loop.cancel_running()
+            logger.warning(
+                "Drain deadline reached: interrupting %d mention(s) (%d task(s) cancelled)",
+                interrupted,
+                cancelled,
+            )
+            # 取り消されたハンドラーが中断メッセージを返して抜けるのを待つ
+            self._wait_idle(time.monotonic() + GRACE_SECONDS)
+
+        unsent = 0
+        for name, hook in list(self._hooks):
+            remaining = max(GRACE_SECONDS, started + timeout - time.monotonic())
+            try:
+                unsent += hook(remaining)
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Drain hook %s failed: %s", name, e)
+
+        mcp_closed = loop.stop(max(GRACE_SECONDS, started + timeout - time.monotonic()))
+        with self._cond:
+            rejected = self._rejected
+        return DrainReport(
+            completed=max(0, initial - interrupted),
+            interrupted=interrupted,
+            rejected=rejected,
+            unsent=unsent,
+            mcp_closed=mcp_closed,
+            seconds=time.monotonic() - started,
+        )
+
+
+LIFECYCLE = Lifecycle()
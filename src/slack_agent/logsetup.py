@@ -0,0 +1,173 @@
+"""ノンブロッキングなログ出力パイプライン。
+
+リクエスト処理中のスレッドではログレコードをキューへ積むだけにし、整形済み出力の
+書き込み（stdout / ファイルなど、遅い I/O）は `QueueListener` のバックグラウンドスレッドで
+行う。出力は既定で 1 行 1 JSON の構造化ログ。
+
+- メッセージ本文（質問・回答・履歴など）は `body()` で包んで渡すと `LOG_MAX_BODY_CHARS`
+  文字に切り詰めて出力される（切り詰めは実際に出力されるときだけ行う）。
+- 大量に出る行は `LOG_SAMPLE_RATES` でロガー単位に間引ける（WARNING 以上は間引かない）。
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any
+
+from .config import LoggingSettings
+
+# LogRecord が標準で持つ属性。これ以外（`extra=` で渡されたもの）は JSON に含める
+_RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None)).keys()
+) | {"message", "asctime"}
+
+_max_body_chars = LoggingSettings.max_body_chars
+_listener: logging.handlers.QueueListener | None = None
+
+
+class _Body:
+    """ログ出力時にだけ切り詰めを行う本文ラッパー（`%s` / `%r` の両方に対応）。"""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: Any) -> None:
+        self.text = text
+
+    def _truncated(self) -> str:
+        text = self.text if isinstance(self.text, str) else str(self.text)
+        limit = _max_body_chars
+        if limit <= 0 or len(text) <= limit:
+            return text
+        return f"{text[:limit]}…(+{len(text) - limit} chars)"
+
+    def __str__(self) -> str:
+        return self._truncated()
+
+    def __repr__(self) -> str:
+        return repr(self._truncated())
+
+
+def body(text: Any) -> _Body:
+    """ログに出すメッセージ本文を `LOG_MAX_BODY_CHARS` 文字に切り詰めるよう包みます。"""
+    return _Body(text)
+
+
+class JsonFormatter(logging.Formatter):
+    """1 レコードを 1 行の JSON に整形する。`extra=` の項目もそのまま含める。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """ロガー名（前方一致）ごとの出力率で INFO 以下のレコードを間引く。
+
+    乱数ではなく件数ベースで間引くため、rate=0.1 なら 10 件に 1 件が確実に残る。
+    """
+
+    def __init__(self, rates: Mapping[str, float]) -> None:
+        super().__init__()
+        # 長い（より具体的な）名前を優先して照合する
+        self._rates = sorted(rates.items(), key=lambda kv: len(kv[0]), reverse=True)
+        self._counts: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, name: str) -> tuple[str, float] | None:
+        for prefix, rate in self._rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return prefix, rate
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._rates:
+            return True
+        matched = self._rate_for(record.name)
+        if matched is None:
+            return True
+        prefix, rate = matched
+        with self._lock:
+            n = self._counts.get(prefix, 0) + 1
+            self._counts[prefix] = n
+        return int(n * rate) != int((n - 1) * rate)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """メッセージの埋め込みだけを呼び出し側で行い、整形は出力スレッドへ委ねる。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # トレースバックのオブジェクトはスレッドを跨いで保持しない
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_formatter(settings: LoggingSettings) -> logging.Formatter:
+    if settings.format == "text":
+        return logging.Formatter("%(asctime)s %(levelname)s %(name)s - %(message)s")
+    return JsonFormatter()
+
+
+def configure_logging(
+    settings: LoggingSettings, stream: Any = None
+) -> logging.handlers.QueueListener:
+    """ルートロガーをキュー経由のバックグラウンド出力に設定します（再設定時は置き換え）。"""
+    global _listener, _max_body_chars
+    stop_logging()
+    _max_body_chars = settings.max_body_chars
+
+    output = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    output.setFormatter(_build_formatter(settings))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.sample_rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.level)
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def stop_logging() -> None:
+    """キューに残ったレコードを書き出してバックグラウンド出力を停止します。"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,149 @@
+"""背景イベントループの遅延（ループラグ）とブロッキング呼び出しの検出。
+
+すべての非同期処理は 1 本の `slack-agent-bg-loop` スレッド上で動くため、そこで同期的な
+処理（同期 API の呼び出し、名前解決、大きな JSON の解析など）が走ると、処理中の全会話が
+その間止まる。`LoopMonitor` は次の 3 つでこれを観測する。
+
+- ハートビート: ループ上で `interval_seconds` ごとにコールバックを予約し、予定時刻からの
+  遅れを `slack_agent_loop_lag_seconds` に記録する
+- ウォッチドッグ: 別スレッドからハートビートの遅れを監視し、`stall_threshold_seconds` を
+  超えて止まっている間に、ループのスレッドで実行中のスタック（＝止めている呼び出し）をログに出す
+- デバッグモード（`LOOP_MONITOR=debug`）: asyncio のデバッグモードを有効にし、
+  `slow_callback_seconds` を超えたコールバックを発生箇所付きで記録・計数する
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from . import metrics
+from .background import BackgroundLoop, default_loop
+from .config import LoopMonitorSettings
+
+logger = logging.getLogger(__name__)
+
+_LAG = metrics.histogram(
+    "slack_agent_loop_lag_seconds",
+    "背景イベントループのコールバックが予定時刻から遅れた時間（秒）",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+_STALLS = metrics.counter(
+    "slack_agent_loop_stalls_total", "背景イベントループが閾値を超えて止まった回数"
+)
+_SLOW_CALLBACKS = metrics.counter(
+    "slack_agent_loop_slow_callbacks_total", "デバッグモードで検出した遅いコールバックの件数"
+)
+
+
+class _SlowCallbackCounter(logging.Filter):
+    """asyncio のデバッグモードが出す「Executing ... took N seconds」を数える（出力は通す）。"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.msg == "Executing %s took %.3f seconds":
+            _SLOW_CALLBACKS.inc()
+        return True
+
+
+class LoopMonitor:
+    """背景ループのラグを測り、止まっている間のスタックを出す監視役。"""
+
+    def __init__(
+        self,
+        settings: LoopMonitorSettings | None = None,
+        loop: BackgroundLoop | None = None,
+    ) -> None:
+        self.settings = settings or LoopMonitorSettings()
+        self._bg = loop or default_loop()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._expected = 0.0
+        self._reported: float | None = None
+        self.last_stall: str | None = None
+
+    def start(self) -> None:
+        """背景ループを（未起動なら）起動し、ハートビートとウォッチドッグを開始します。"""
+        if not self.settings.enabled or self._thread is not None:
+            return
+        loop = self._bg.start()
+        self._expected = time.monotonic() + self.settings.interval_seconds
+        loop.call_soon_threadsafe(self._schedule, loop)
+        if self.settings.debug:
+            loop.call_soon_threadsafe(self._enable_debug, loop)
+        self._thread = threading.Thread(
+            target=self._watch, name="slack-agent-loop-monitor", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            "Loop monitor started (mode=%s, interval=%.2fs, stall_threshold=%.2fs)",
+            self.settings.mode,
+            self.settings.interval_seconds,
+            self.settings.stall_threshold_seconds,
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    # --- ハートビート（背景ループ上） ---------------------------------------------
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._expected = time.monotonic() + self.settings.interval_seconds
+        loop.call_later(self.settings.interval_seconds, self._beat, loop)
+
+    def _beat(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._stop.is_set():
+            return
+        lag = max(0.0, time.monotonic() - self._expected)
+        _LAG.observe(lag)
+        if self._reported is not None:
+            logger.warning("Event loop resumed after blocking for %.2fs", lag)
+            self._reported = None
+        self._schedule(loop)
+
+    def _enable_debug(self, loop: asyncio.AbstractEventLoop) -> None:
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.settings.slow_callback_seconds
+        asyncio_logger = logging.getLogger("asyncio")
+        if not any(isinstance(f, _SlowCallbackCounter) for f in asyncio_logger.filters):
+            asyncio_logger.addFilter(_SlowCallbackCounter())
+        logger.warning(
+            "asyncio debug mode enabled on background loop (slow_callback=%.3fs)",
+            self.settings.slow_callback_seconds,
+        )
+
+    # --- ウォッチドッグ（別スレッド） ---------------------------------------------
+
+    def _watch(self) -> None:
+        # 閾値の半分の間隔で見れば、止まってから閾値の 1.5 倍以内に検出できる
+        period = min(self.settings.interval_seconds, self.settings.stall_threshold_seconds / 2)
+        while not self._stop.wait(period):
+            loop = self._bg.loop
+            if loop is None or not loop.is_running():
+                continue
+            expected = self._expected
+            blocked = time.monotonic() - expected
+            if blocked < self.settings.stall_threshold_seconds or self._reported == expected:
+                continue
+            # 同じ停止（同じ予定時刻のハートビート待ち）は 1 回だけ報告する
+            self._reported = expected
+            self._report(loop, blocked)
+
+    def _report(self, loop: asyncio.AbstractEventLoop, blocked: float) -> None:
+        ident = self._bg.thread_ident
+        frame = sys._current_frames().get(ident) if ident is not None else None
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "(unavailable)"
+        task = asyncio.current_task(loop)
+        self.last_stall = stack
+        _STALLS.inc()
+        logger.warning(
+            "Event loop blocked for %.2fs (task=%s); stack of the running callback:\n%s",
+            blocked,
+            task.get_name() if task is not None else None,
+            stack,
+        )
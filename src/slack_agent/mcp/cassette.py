@@ -0,0 +1,82 @@
+"""MCP の `list_tools` / `call_tool` をカセットに記録・再生するセッションのプロキシ。
+
+記録時は実セッションを包んで要求と応答（`ListToolsResult` / `CallToolResult` の JSON）を
+所要時間とともに記録し、再生時は実セッションなしで記録した応答を返す。
+`ManagedSession` の内側に置くため、適応タイムアウト・ヘッジ・レイテンシの計測は
+記録時も再生時も本番と同じ経路を通る。
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from mcp import ClientSession
+from mcp.types import CallToolResult, ListToolsResult
+
+from ..cassette import Cassette, request_key
+
+
+def call_tool_key(server: str, name: str, arguments: dict[str, Any] | None) -> str:
+    """ツール呼び出しの要求のキー（サーバー名・ツール名・引数）。"""
+    return request_key({"server": server, "name": name, "arguments": arguments or {}})
+
+
+class CassetteSession:
+    """`ClientSession` 互換のプロキシ。記録・再生しない属性は実セッションへ委譲します。"""
+
+    def __init__(
+        self, server_name: str, cassette: Cassette, session: ClientSession | None = None
+    ) -> None:
+        self.server_name = server_name
+        self._cassette = cassette
+        self._session = session
+
+    def _require_session(self) -> ClientSession:
+        if self._session is None:
+            raise RuntimeError(
+                f"カセット再生中の MCP サーバー {self.server_name} には実セッションがありません"
+            )
+        return self._session
+
+    async def list_tools(self, cursor: str | None = None, **kwargs: Any) -> ListToolsResult:
+        key = request_key({"server": self.server_name, "cursor": cursor})
+        if self._cassette.replaying:
+            entry = self._cassette.take("list_tools", key)
+            return ListToolsResult.model_validate(entry["result"])
+
+        started = time.monotonic()
+        result = await self._require_session().list_tools(cursor=cursor, **kwargs)
+        self._cassette.record(
+            "list_tools",
+            key,
+            time.monotonic() - started,
+            server=self.server_name,
+            result=result.model_dump(mode="json", by_alias=True, exclude_none=True),
+        )
+        return result
+
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any] | None = None, **kwargs: Any
+    ) -> CallToolResult:
+        key = call_tool_key(self.server_name, name, arguments)
+        if self._cassette.replaying:
+            entry = self._cassette.take("call_tool", key)
+            await self._cassette.wait(entry)
+            return CallToolResult.model_validate(entry["result"])
+
+        started = time.monotonic()
+        result = await self._require_session().call_tool(name, arguments, **kwargs)
+        self._cassette.record(
+            "call_tool",
+            key,
+            time.monotonic() - started,
+            server=self.server_name,
+            name=name,
+            arguments=arguments,
+            result=result.model_dump(mode="json", by_alias=True, exclude_none=True),
+        )
+        return result
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._require_session(), item)
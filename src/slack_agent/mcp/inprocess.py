@@ -0,0 +1,180 @@
+"""MCP サーバーをプロセス内で動かすトランスポート（stdio 子プロセスを使わない）。
+
+Semche のように Python で書かれた MCP サーバーは、パッケージが import 可能であれば
+自プロセス内でメモリ上のストリームペア（`mcp.shared.memory`）に接続して動かせる。
+パイプ越しの JSON フレーミングと、埋め込みモデルを別途読み込む子プロセスのメモリが不要になる。
+
+- `inprocess`: 呼び出し元のイベントループ上でサーバーを動かす（最小レイテンシ）。
+  同期ツールはループを塞ぐため、サーバー側のツールが非同期実装である場合に向く。
+- `thread`: 専用スレッドのイベントループでサーバーとクライアントを動かし、呼び出しだけを
+  スレッド間で受け渡す（サーバーの重い処理がボットのループを塞がない）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextlib
+import importlib
+import inspect
+import logging
+import os
+import threading
+from collections.abc import Callable, Iterator, Mapping
+from types import TracebackType
+from typing import Any
+
+from mcp import ClientSession
+from mcp.server.fastmcp import FastMCP
+from mcp.server.lowlevel import Server
+from mcp.shared.memory import create_connected_server_and_client_session
+from mcp.types import CallToolResult, ListToolsResult
+
+logger = logging.getLogger(__name__)
+
+MCPServer = Server[Any, Any] | FastMCP
+
+
+# os.environ はプロセス全体で共有されるため、env の一時反映は同時に 1 つだけ行う
+_ENV_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def _scoped_env(env: Mapping[str, str] | None) -> Iterator[None]:
+    """`env` をブロック内だけ `os.environ` に反映し、終了時に元へ戻します（未設定なら削除）。"""
+    if not env:
+        yield
+        return
+    with _ENV_LOCK:
+        saved = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        try:
+            yield
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def load_server(ref: str, env: Mapping[str, str] | None = None) -> MCPServer:
+    """`module` または `module:attr` で指定された MCP サーバーオブジェクトを読み込みます。
+
+    `attr` 省略時はモジュール内の FastMCP / Server インスタンスを探します。
+    `env` はサーバーが import 時に参照する設定として、import とサーバー探索の間だけ
+    `os.environ` に反映し、終わったら元に戻します（ボット自身の設定を上書きしたままにしない）。
+    ツール呼び出し時に環境変数を読むサーバーには届かないため、設定は import 時に読ませること。
+    """
+    with _scoped_env(env):
+        return _resolve_server(ref)
+
+
+def _resolve_server(ref: str) -> MCPServer:
+    module_name, _, attr = ref.partition(":")
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise RuntimeError(f"MCP サーバーモジュールを import できません: {module_name}: {e}") from e
+
+    if attr:
+        server = getattr(module, attr, None)
+        if isinstance(server, FastMCP | Server):
+            return server
+        raise RuntimeError(f"MCP サーバーオブジェクトが見つかりません: {ref}")
+
+    for value in vars(module).values():
+        if isinstance(value, FastMCP | Server):
+            return value
+    raise RuntimeError(f"モジュール内に MCP サーバー（FastMCP/Server）がありません: {module_name}")
+
+
+class ThreadedServerSession:
+    """専用スレッドのイベントループで MCP サーバーとクライアントセッションを動かすプロキシ。
+
+    `async with` で開始・停止し、`call_tool` / `list_tools` などのコルーチンメソッドは
+    サーバースレッドのループへ `run_coroutine_threadsafe` で投げて結果を待つ。
+    呼び出し側がキャンセル（タイムアウト）されると、サーバースレッド側のタスクも取り消される。
+    """
+
+    def __init__(self, factory: Callable[[], MCPServer], name: str) -> None:
+        self._factory = factory
+        self._name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop: asyncio.Event | None = None
+        self._session: ClientSession | None = None
+        self._thread: threading.Thread | None = None
+
+    async def __aenter__(self) -> ThreadedServerSession:
+        ready: concurrent.futures.Future[None] = concurrent.futures.Future()
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._serve(ready)),
+            name=f"mcp-server-{self._name}",
+            daemon=True,
+        )
+        self._thread.start()
+        await asyncio.wrap_future(ready)
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        loop, stop, thread = self._loop, self._stop, self._thread
+        self._thread = None
+        if loop is not None and stop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(stop.set)
+        if thread is not None:
+            await asyncio.to_thread(thread.join, 10.0)
+
+    async def _serve(self, ready: concurrent.futures.Future[None]) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            server = self._factory()
+            async with create_connected_server_and_client_session(server) as session:
+                self._session = session
+                ready.set_result(None)
+                await self._stop.wait()
+        except BaseException as e:  # noqa: BLE001
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error("MCP サーバー %s（thread）が終了しました: %s", self._name, e)
+        finally:
+            self._session = None
+
+    async def _call(self, method: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError(f"MCP サーバー {self._name} のスレッドが停止しています")
+        future = asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def _require_session(self) -> ClientSession:
+        if self._session is None:
+            raise RuntimeError(f"MCP セッションが初期化されていません: {self._name}")
+        return self._session
+
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any] | None = None, **kwargs: Any
+    ) -> CallToolResult:
+        session = self._require_session()
+        result: CallToolResult = await self._call(session.call_tool, name, arguments, **kwargs)
+        return result
+
+    async def list_tools(self, *args: Any, **kwargs: Any) -> ListToolsResult:
+        session = self._require_session()
+        result: ListToolsResult = await self._call(session.list_tools, *args, **kwargs)
+        return result
+
+    def __getattr__(self, item: str) -> Any:
+        attr = getattr(self._require_session(), item)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def proxy(*args: Any, **kwargs: Any) -> Any:
+            return await self._call(attr, *args, **kwargs)
+
+        return proxy
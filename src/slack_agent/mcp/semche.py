@@ -4,23 +4,35 @@
 環境変数 `SEMCHE_MOCK=1` のときにモックレスポンスを返します。
 未設定時は実装準備中のため RuntimeError を送出します。
 
-将来的には modelcontextprotocol などのクライアントを用いて、
-STDIO/HTTP いずれかの経路で Semche サーバーへ接続してツールを呼び出します。
+実接続は stdio（`uv run` の子プロセス）が既定で、`MCP_SEMCHE_TRANSPORT=inprocess` などで
+semche パッケージをプロセス内のメモリ上ストリームに接続して呼び出せます（`inprocess.py`）。
+
+`multi_search` は永続 MCP セッション上で複数クエリを並列に検索し、Reciprocal Rank Fusion で
+統合します（エージェントには `build_multi_search_tool` で Tool として登録）。
 """
 
 from __future__ import annotations
 
 import asyncio
+import functools
 import json
 import os
+import re
 import threading
-from collections.abc import Coroutine
+from collections.abc import Callable, Coroutine
 from dataclasses import dataclass
-from typing import Any, TypedDict, cast
+from typing import Any, Protocol, TypedDict, cast
 
+from dotenv import load_dotenv
+from langchain_core.tools import StructuredTool
 from mcp import ClientSession
 from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.shared.memory import create_connected_server_and_client_session
 from mcp.types import CallToolResult, TextContent
+from pydantic import BaseModel, Field
+
+from ..config import SEMCHE_SERVER_MODULE, resolve_transport
+from .inprocess import load_server
 
 
 class SearchResult(TypedDict, total=False):
@@ -45,9 +57,14 @@ class SemcheClientSettings:
     url: str | None
     timeout: int
     chroma_dir: str | None
+    # stdio（uv run の子プロセス）/ inprocess・thread（semche パッケージをプロセス内で実行）
+    transport: str = "stdio"
+    # 検索レスポンスの JSON 解析バックエンド（json / orjson）
+    json_backend: str = "json"
 
     @staticmethod
     def from_env() -> SemcheClientSettings:
+        load_dotenv()
         path = os.getenv("MCP_SEMCHE_PATH")
         url = os.getenv("MCP_SEMCHE_URL")
         timeout_str = os.getenv("MCP_SEMCHE_TIMEOUT", "10")
@@ -56,7 +73,17 @@ class SemcheClientSettings:
             timeout = int(timeout_str)
         except ValueError:
             timeout = 10
-        return SemcheClientSettings(path=path, url=url, timeout=timeout, chroma_dir=chroma_dir)
+        transport = resolve_transport(
+            os.getenv("MCP_SEMCHE_TRANSPORT", "stdio"), SEMCHE_SERVER_MODULE
+        )
+        return SemcheClientSettings(
+            path=path,
+            url=url,
+            timeout=timeout,
+            chroma_dir=chroma_dir,
+            transport=transport,
+            json_backend=os.getenv("SEMCHE_JSON_BACKEND", "json").strip().lower(),
+        )
 
 
 def get_client() -> SemcheClientSettings:
@@ -64,6 +91,159 @@ def get_client() -> SemcheClientSettings:
     return SemcheClientSettings.from_env()
 
 
+def build_search_arguments(
+    query: str,
+    top_k: int | None = 5,
+    file_type: str | None = None,
+    include_documents: bool | None = True,
+    max_content_length: int | None = None,
+) -> dict[str, Any]:
+    """Semche の search ツールへ渡す arguments を組み立てます（None の項目は省略）。"""
+    arguments: dict[str, Any] = {
+        "query": query,
+    }
+    if top_k is not None:
+        arguments["top_k"] = int(top_k)
+    if file_type is not None:
+        arguments["file_type"] = file_type
+    if include_documents is not None:
+        arguments["include_documents"] = bool(include_documents)
+    if max_content_length is not None:
+        arguments["max_content_length"] = int(max_content_length)
+    return arguments
+
+
+def select_search_tool_name(tool_names: list[str]) -> str:
+    """ツール名一覧から Semche の検索ツール名を選びます。"""
+    # 優先: "search" 完全一致 → ".search" 終端 → 部分一致
+    lowered = [t.lower() for t in tool_names]
+    if "search" in lowered:
+        return tool_names[lowered.index("search")]
+    for i, t in enumerate(lowered):
+        if t.endswith(".search"):
+            return tool_names[i]
+    for i, t in enumerate(lowered):
+        if "search" in t:
+            return tool_names[i]
+    # 見つからなければ最初のツール名（異常系）
+    return tool_names[0] if tool_names else "search"
+
+
+@functools.cache
+def _select_json_loads(preferred: str) -> tuple[str, Callable[[str], Any]]:
+    """JSON バックエンドを選びます。`orjson` は任意依存で、未導入なら stdlib に戻します。
+
+    初めて解析するときに設定値ごとに 1 回だけ判定し、結果をキャッシュします。
+
+    既定は stdlib。日本語本文をエスケープせずに含む Semche 応答では stdlib の方が速く、
+    orjson は解析中のピークメモリが大きい（benchmarks/bench_semche_parse.py）。
+    `\\uXXXX` エスケープ主体の応答では orjson が 2 割ほど速いため、選択可能にしている。
+    """
+    if preferred == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return "json", json.loads
+        return "orjson", orjson.loads
+    return "json", json.loads
+
+
+# JSON オブジェクトらしいテキストだけを解析対象にする（巨大な本文をコピーせずに判定）
+_JSON_OBJECT_START = re.compile(r"\s*\{")
+
+_RESULT_KEYS = frozenset({"filepath", "score", "document", "metadata"})
+
+
+def parse_call_tool_result(result: CallToolResult, cfg: SemcheClientSettings) -> SearchResponse:
+    """`call_tool` の結果を SearchResponse に変換します。
+
+    structuredContent があればテキスト側の JSON は解析しません。テキストの JSON は
+    `cfg.json_backend`（`SEMCHE_JSON_BACKEND`）で 1 回だけ解析し、以降はその dict を再利用します。
+    """
+    # 1) structuredContent が Semche スキーマの dict で来る場合
+    #    （FastMCP は dict 以外の戻り値を {"result": ...} に包むため、その場合はテキスト側を使う）
+    sc = getattr(result, "structuredContent", None)
+    if isinstance(sc, dict):
+        inner = sc.get("result") if len(sc) == 1 else None
+        if isinstance(inner, dict):
+            sc = inner
+        if "results" in sc or "status" in sc:
+            return normalize_semche_response(cast(dict[str, Any], sc), cfg)
+
+    # 2) content の TextContent に JSON 文字列が入っている場合
+    _, json_loads = _select_json_loads(cfg.json_backend)
+    for block in result.content:
+        if isinstance(block, TextContent) and _JSON_OBJECT_START.match(block.text):
+            try:
+                data = json_loads(block.text)
+            except ValueError:
+                # JSON でない → fallthrough
+                continue
+            if isinstance(data, dict):
+                return normalize_semche_response(cast(dict[str, Any], data), cfg)
+
+    # 3) それ以外は簡易的に success としてテキストを message に格納
+    joined = "\n".join([b.text for b in result.content if isinstance(b, TextContent)])
+    return {
+        "status": "success",
+        "message": joined or "search executed",
+        "results": [],
+        "count": 0,
+        "query_vector_dimension": None,
+        "persist_directory": cfg.chroma_dir or "./chroma_db",
+    }
+
+
+def _normalize_result_in_place(r: dict[str, Any]) -> SearchResult:
+    """検索結果 1 件をその場で整形します（型が正しい値は再生成せず、本文もコピーしない）。"""
+    for key in [k for k in r if k not in _RESULT_KEYS]:
+        del r[key]
+    filepath = r.get("filepath", "")
+    if type(filepath) is not str:
+        r["filepath"] = str(filepath)
+    score = r.get("score", 0.0)
+    if type(score) is not float:
+        r["score"] = float(score)
+    if not isinstance(r.get("metadata"), dict):
+        r["metadata"] = {}
+    if "document" in r:
+        document = r["document"]
+        if document is None:
+            del r["document"]
+        elif type(document) is not str:
+            r["document"] = str(document)
+    return cast(SearchResult, r)
+
+
+def normalize_semche_response(data: dict[str, Any], cfg: SemcheClientSettings) -> SearchResponse:
+    """Semche の応答 dict を SearchResponse に整形します。
+
+    解析済みの dict は呼び出し側で再利用しない前提で、`results` の各要素をその場で整形して
+    そのまま返します（大きな `document` 文字列を複製しない）。
+    """
+    # 必須キーの補完と型の整形
+    status = str(data.get("status", "success"))
+    message = str(data.get("message", ""))
+    results_data = data.get("results") or []
+    results: list[SearchResult] = [
+        _normalize_result_in_place(r) for r in results_data if isinstance(r, dict)
+    ]
+
+    count = int(data.get("count", len(results)))
+    qdim = data.get("query_vector_dimension")
+    qdim_val = int(qdim) if isinstance(qdim, int) else None
+    persist_dir = data.get("persist_directory") or cfg.chroma_dir or "./chroma_db"
+
+    return {
+        "status": status,
+        "message": message,
+        "results": results,
+        "count": count,
+        "query_vector_dimension": qdim_val,
+        "persist_directory": cast(str | None, persist_dir),
+    }
+
+
 def search(
     query: str,
     top_k: int | None = 5,
@@ -98,31 +278,27 @@ def search(
         }
 
     # 実接続: stdio（MCP_SEMCHE_PATH）を使用
-    arguments: dict[str, Any] = {
-        "query": query,
-    }
-    if top_k is not None:
-        arguments["top_k"] = int(top_k)
-    if file_type is not None:
-        arguments["file_type"] = file_type
-    if include_documents is not None:
-        arguments["include_documents"] = bool(include_documents)
-    if max_content_length is not None:
-        arguments["max_content_length"] = int(max_content_length)
+    arguments = build_search_arguments(
+        query, top_k, file_type, include_documents, max_content_length
+    )
+
+    timeout = max(1, settings.timeout)
+
+    async def _call_search(session: ClientSession) -> SearchResponse:
+        tools_resp = await asyncio.wait_for(session.list_tools(), timeout=timeout)
+        tool_names = [t.name for t in tools_resp.tools]
+        tool_name = select_search_tool_name(tool_names)
+        result: CallToolResult = await asyncio.wait_for(
+            session.call_tool(tool_name, arguments=arguments), timeout=timeout
+        )
+        return parse_call_tool_result(result, settings)
 
-    def _select_search_tool_name(tool_names: list[str]) -> str:
-        # 優先: "search" 完全一致 → ".search" 終端 → 部分一致
-        lowered = [t.lower() for t in tool_names]
-        if "search" in lowered:
-            return tool_names[lowered.index("search")]
-        for i, t in enumerate(lowered):
-            if t.endswith(".search"):
-                return tool_names[i]
-        for i, t in enumerate(lowered):
-            if "search" in t:
-                return tool_names[i]
-        # 見つからなければ最初のツール名（異常系）
-        return tool_names[0] if tool_names else "search"
+    async def _call_in_process() -> SearchResponse:
+        # モジュールは sys.modules に残るため、埋め込みモデル等の読み込みは初回のみ
+        env = {"SEMCHE_CHROMA_DIR": settings.chroma_dir} if settings.chroma_dir else None
+        server = load_server(SEMCHE_SERVER_MODULE, env)
+        async with create_connected_server_and_client_session(server) as session:
+            return await _call_search(session)
 
     async def _call_over_stdio() -> SearchResponse:
         # stdio 経由でサーバープロセスを起動
@@ -143,17 +319,10 @@ def search(
             env=env,
         )
 
-        timeout = max(1, settings.timeout)
         async with stdio_client(params) as (read, write):  # noqa: SIM117
             async with ClientSession(read, write) as session:
                 await asyncio.wait_for(session.initialize(), timeout=timeout)
-                tools_resp = await asyncio.wait_for(session.list_tools(), timeout=timeout)
-                tool_names = [t.name for t in tools_resp.tools]
-                tool_name = _select_search_tool_name(tool_names)
-                result: CallToolResult = await asyncio.wait_for(
-                    session.call_tool(tool_name, arguments=arguments), timeout=timeout
-                )
-                return _parse_call_tool_result(result, settings)
+                return await _call_search(session)
 
     def _run(
         coro: Coroutine[Any, Any, SearchResponse],
@@ -180,75 +349,172 @@ def search(
             raise err_box["e"]
         return result_box["v"]
 
-    def _parse_call_tool_result(
-        result: CallToolResult, cfg: SemcheClientSettings
-    ) -> SearchResponse:
-        # 1) structuredContent が Semche スキーマの dict で来る場合
-        if getattr(result, "structuredContent", None):
-            sc = cast(dict[str, Any], result.structuredContent)
-            return _normalize_semche_response(sc, cfg)
-
-        # 2) content の TextContent に JSON 文字列が入っている場合
-        for block in result.content:
-            if isinstance(block, TextContent):
-                text = block.text
-                try:
-                    data = json.loads(text)
-                    if isinstance(data, dict):
-                        return _normalize_semche_response(cast(dict[str, Any], data), cfg)
-                except Exception:
-                    # JSON でない → fallthrough
-                    pass
-
-        # 3) それ以外は簡易的に success としてテキストを message に格納
-        joined = "\n".join([b.text for b in result.content if isinstance(b, TextContent)])
-        return {
-            "status": "success",
-            "message": joined or "search executed",
-            "results": [],
-            "count": 0,
-            "query_vector_dimension": None,
-            "persist_directory": cfg.chroma_dir or "./chroma_db",
-        }
+    # 同期呼び出しは別スレッドのループで実行されるため、thread も inprocess と同じ経路
+    if settings.transport in ("inprocess", "thread"):
+        return _run(_call_in_process())
+    if settings.path:
+        return _run(_call_over_stdio())
 
-    def _normalize_semche_response(
-        data: dict[str, Any], cfg: SemcheClientSettings
-    ) -> SearchResponse:
-        # 必須キーの補完と型の整形
-        status = str(data.get("status", "success"))
-        message = str(data.get("message", ""))
-        results_data = data.get("results") or []
-        results: list[SearchResult] = []
-        for r in results_data:
-            if not isinstance(r, dict):
-                continue
-            item: SearchResult = {
-                "filepath": str(r.get("filepath", "")),
-                "score": float(r.get("score", 0.0)),
-                "metadata": cast(dict[str, Any], r.get("metadata") or {}),
-            }
-            if "document" in r and r.get("document") is not None:
-                item["document"] = str(r.get("document"))
-            results.append(item)
-
-        count = int(data.get("count", len(results)))
-        qdim = data.get("query_vector_dimension")
-        qdim_val = int(qdim) if isinstance(qdim, int) else None
-        persist_dir = data.get("persist_directory") or cfg.chroma_dir or "./chroma_db"
+    raise RuntimeError("Semche MCP 接続先が未設定です。MCP_SEMCHE_PATH を設定してください。")
 
-        return {
-            "status": status,
-            "message": message,
-            "results": results,
-            "count": count,
-            "query_vector_dimension": qdim_val,
-            "persist_directory": cast(str | None, persist_dir),
-        }
 
-    # 実運用: stdio のみ
-    if settings.path:
-        return _run(_call_over_stdio())
+# --- マルチクエリ検索（並列ファンアウト + Reciprocal Rank Fusion） --------------------
+
+# RRF の平滑化定数（一般的な既定値。上位の順位差を緩やかにする）
+RRF_K = 60
+# 1 回の multi_search で発行する search 呼び出しの上限（クエリ数 × file_type 数）
+MAX_FANOUT = 12
+
+
+class ToolCaller(Protocol):
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any] | None = None
+    ) -> CallToolResult: ...
 
-    raise RuntimeError(
-        "Semche MCP 接続先が未設定です。MCP_SEMCHE_PATH を設定してください。"
+
+def fuse_results(
+    responses: list[SearchResponse], top_k: int = 5, k: int = RRF_K
+) -> list[SearchResult]:
+    """複数の検索結果を Reciprocal Rank Fusion で統合し、`filepath` で重複を除きます。
+
+    各結果の融合スコアは `Σ 1 / (k + 順位)`。同じ `filepath` は最も上位に現れたものの
+    本文・メタデータを採用します。
+    """
+    fused: dict[str, float] = {}
+    best: dict[str, tuple[int, SearchResult]] = {}
+    for response in responses:
+        for rank, item in enumerate(response["results"], start=1):
+            key = item.get("filepath") or f"#{id(item)}"
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, item)
+
+    ordered = sorted(fused, key=lambda key: fused[key], reverse=True)[: max(1, top_k)]
+    results: list[SearchResult] = []
+    for key in ordered:
+        item = cast(SearchResult, dict(best[key][1]))
+        item["score"] = round(fused[key], 6)
+        results.append(item)
+    return results
+
+
+def _error_response(message: str, cfg: SemcheClientSettings) -> SearchResponse:
+    return {
+        "status": "error",
+        "message": message,
+        "results": [],
+        "count": 0,
+        "query_vector_dimension": None,
+        "persist_directory": cfg.chroma_dir or "./chroma_db",
+    }
+
+
+async def multi_search(
+    session: ToolCaller,
+    queries: list[str],
+    file_types: list[str] | None = None,
+    top_k: int = 5,
+    include_documents: bool | None = True,
+    max_content_length: int | None = None,
+    tool_name: str = "search",
+    settings: SemcheClientSettings | None = None,
+) -> SearchResponse:
+    """複数のクエリ言い換え × `file_type` を並列に検索し、RRF で 1 つの結果に統合します。
+
+    永続 MCP セッション上で `search` ツールを同時に呼び出します（逐次の複数回検索の代替）。
+    一部の呼び出しが失敗しても残りの結果で応答し、すべて失敗した場合や有効なクエリが
+    1 件もない場合は status=error を返します。`settings` 省略時は環境変数から読み込みます。
+    """
+    cfg = settings or get_client()
+    variants = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    kinds: list[str | None] = list(dict.fromkeys(file_types or [])) or [None]
+    combos = [(q, ft) for q in variants for ft in kinds][:MAX_FANOUT]
+    if not combos:
+        return _error_response("multi_search には 1 件以上の空でないクエリが必要です", cfg)
+
+    async def _one(query: str, file_type: str | None) -> SearchResponse:
+        arguments = build_search_arguments(
+            query, top_k, file_type, include_documents, max_content_length
+        )
+        result = await session.call_tool(tool_name, arguments=arguments)
+        if getattr(result, "isError", False):
+            raise RuntimeError(parse_call_tool_result(result, cfg)["message"])
+        return parse_call_tool_result(result, cfg)
+
+    outcomes = await asyncio.gather(*(_one(q, ft) for q, ft in combos), return_exceptions=True)
+    responses = [
+        r for r in outcomes if not isinstance(r, BaseException) and r["status"] == "success"
+    ]
+    failed = len(combos) - len(responses)
+    if not responses:
+        errors = "; ".join(str(r) for r in outcomes if isinstance(r, BaseException))
+        return _error_response(f"マルチクエリ検索がすべて失敗しました: {errors}", cfg)
+
+    results = fuse_results(responses, top_k=top_k)
+    return {
+        "status": "success",
+        "message": (
+            f"マルチクエリ検索が完了しました (calls={len(combos)}, failed={failed}, "
+            f"unique={len(results)})"
+        ),
+        "results": results,
+        "count": len(results),
+        "query_vector_dimension": responses[0]["query_vector_dimension"],
+        "persist_directory": responses[0]["persist_directory"],
+    }
+
+
+class MultiSearchInput(BaseModel):
+    queries: list[str] = Field(
+        description="同じ情報を探す検索クエリの言い換え（日本語の表現違い・コード上の用語など）"
+    )
+    file_types: list[str] | None = Field(
+        default=None,
+        description="絞り込む file_type（`実装内容` / `コード` / `JIRA`）。省略時は全種別",
+    )
+    top_k: int = Field(default=5, description="統合後に返す件数")
+    include_documents: bool = Field(default=True, description="本文を含めるか")
+    max_content_length: int | None = Field(default=None, description="本文の最大長（None で全文）")
+
+
+def build_multi_search_tool(
+    session: ToolCaller,
+    name: str = "multi_search",
+    search_tool_name: str = "search",
+    settings: SemcheClientSettings | None = None,
+) -> StructuredTool:
+    """`multi_search` をエージェント用の LangChain Tool として生成します。
+
+    クライアント設定は生成時に 1 回だけ解決し、呼び出しごとに環境変数を読み直しません。
+    """
+    cfg = settings or get_client()
+
+    async def _run(
+        queries: list[str],
+        file_types: list[str] | None = None,
+        top_k: int = 5,
+        include_documents: bool = True,
+        max_content_length: int | None = None,
+    ) -> str:
+        response = await multi_search(
+            session,
+            queries,
+            file_types=file_types,
+            top_k=top_k,
+            include_documents=include_documents,
+            max_content_length=max_content_length,
+            tool_name=search_tool_name,
+            settings=cfg,
+        )
+        return json.dumps(response, ensure_ascii=False)
+
+    return StructuredTool.from_function(
+        coroutine=_run,
+        name=name,
+        description=(
+            "Semche 検索を複数のクエリ言い換え・file_type で同時に実行し、順位を統合して"
+            "重複のない結果を返します。表現揺れがありそうな社内情報の検索では、"
+            "search を何度も呼ぶ代わりにこちらを 1 回使ってください。"
+        ),
+        args_schema=MultiSearchInput,
     )
@@ -0,0 +1,204 @@
+"""永続 MCP セッションのプロキシ。
+
+`langchain_mcp_adapters.tools.load_mcp_tools` に `ClientSession` の代わりに渡し、
+生成された LangChain Tool からの `call_tool` をサーバー別の設定で制御します。
+
+- 適応タイムアウト: ツールごとに直近のレイテンシを保持し、p99 の数倍（上限は
+  サーバーの `call_timeout`）をタイムアウトにする。遅い外れ値で利用者を長く待たせない。
+  タイムアウトした呼び出しもタイムアウト秒のサンプルとして数えるため、サーバーの遅延が
+  段階的に上がっても数回のタイムアウトで p99 が追従し、タイムアウトし続けることはない。
+- ヘッジ要求: 同じサーバーへ複数のセッション（replicas）がある場合、冪等なツールの呼び出しが
+  p95 を超えたら別セッションへ同じ要求を送り、先に返った応答を採用してもう一方を取り消す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from mcp import ClientSession
+from mcp.types import CallToolResult
+
+from .. import metrics
+
+# 百分位の算出に使う直近の成功サンプル数と、適応値を使い始めるまでの最小サンプル数
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+# 適応タイムアウト = clamp(p99 × TIMEOUT_FACTOR, MIN_TIMEOUT, call_timeout)
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT = 2.0
+
+_CALL_SECONDS = metrics.histogram(
+    "slack_agent_mcp_call_seconds", "MCP ツール呼び出しの所要時間（秒）", metrics.DEFAULT_BUCKETS
+)
+_CALL_TIMEOUTS = metrics.counter(
+    "slack_agent_mcp_call_timeouts_total", "タイムアウトした MCP ツール呼び出し数"
+)
+_HEDGES = metrics.counter(
+    "slack_agent_mcp_hedged_total", "ヘッジ要求を送った MCP ツール呼び出し数（winner 別）"
+)
+_TIMEOUT_GAUGE = metrics.gauge(
+    "slack_agent_mcp_call_timeout_seconds", "ツールごとの現在の適応タイムアウト（秒）"
+)
+
+
+class LatencyWindow:
+    """ツール 1 つ分の直近のレイテンシ（秒）。百分位は参照時にソートして求める。"""
+
+    def __init__(self, size: int = LATENCY_WINDOW) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """q（0〜1）分位点。サンプルが MIN_SAMPLES 未満なら None。"""
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+class ManagedSession:
+    """1 サーバー分のセッション群を包み、`call_tool` に適応タイムアウトとヘッジを適用するプロキシ。
+
+    `call_tool` 以外の属性（`list_tools` など）は先頭のセッションへそのまま委譲します。
+    """
+
+    def __init__(
+        self,
+        server_name: str,
+        session: ClientSession | Sequence[ClientSession],
+        call_timeout: float,
+        hedge_tools: Iterable[str] = (),
+    ) -> None:
+        self.server_name = server_name
+        self._sessions: list[ClientSession] = (
+            list(session) if isinstance(session, Sequence) else [session]
+        )
+        if not self._sessions:
+            raise RuntimeError(f"MCP セッションがありません: {server_name}")
+        self._session = self._sessions[0]
+        self._call_timeout = call_timeout
+        self._hedge_tools = frozenset(hedge_tools)
+        self._latency: dict[str, LatencyWindow] = {}
+        self._next = itertools.count()
+
+    def latency(self, name: str) -> LatencyWindow:
+        window = self._latency.get(name)
+        if window is None:
+            window = self._latency.setdefault(name, LatencyWindow())
+        return window
+
+    def timeout_for(self, name: str) -> float:
+        """ツールの現在のタイムアウト秒（サンプル不足の間は静的な call_timeout）。"""
+        p99 = self.latency(name).percentile(0.99)
+        if p99 is None:
+            return self._call_timeout
+        return min(self._call_timeout, max(MIN_TIMEOUT, p99 * TIMEOUT_FACTOR))
+
+    def _hedge_delay(self, name: str) -> float | None:
+        if len(self._sessions) < 2 or name not in self._hedge_tools:
+            return None
+        return self.latency(name).percentile(0.95)
+
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any] | None = None, **kwargs: Any
+    ) -> CallToolResult:
+        timeout = self.timeout_for(name)
+        _TIMEOUT_GAUGE.set(timeout, server=self.server_name, tool=name)
+        # 呼び出しごとに起点のセッションをずらし、負荷を replicas に分散する
+        offset = next(self._next) % len(self._sessions)
+        primary = self._sessions[offset]
+        delay = self._hedge_delay(name)
+        try:
+            if delay is None or delay >= timeout:
+                started = time.monotonic()
+                result = await asyncio.wait_for(
+                    primary.call_tool(name, arguments, **kwargs), timeout=timeout
+                )
+                self._record(name, time.monotonic() - started)
+                return result
+            backup = self._sessions[(offset + 1) % len(self._sessions)]
+            return await self._hedged(name, arguments, kwargs, primary, backup, delay, timeout)
+        except TimeoutError:
+            _CALL_TIMEOUTS.inc(server=self.server_name, tool=name)
+            # 成功だけを数えると、遅くなったサーバーでは新しいサンプルが入らず p99 が固定される
+            self.latency(name).add(timeout)
+            raise
+
+    async def _hedged(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None,
+        kwargs: dict[str, Any],
+        primary: ClientSession,
+        backup: ClientSession,
+        delay: float,
+        timeout: float,
+    ) -> CallToolResult:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        started: dict[asyncio.Task[CallToolResult], tuple[str, float]] = {}
+
+        def launch(session: ClientSession, role: str) -> None:
+            task = loop.create_task(session.call_tool(name, arguments, **kwargs))
+            started[task] = (role, loop.time())
+
+        launch(primary, "primary")
+        pending = set(started)
+        error: BaseException | None = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                launch(backup, "hedge")
+                pending = set(started)
+            while True:
+                winner: asyncio.Task[CallToolResult] | None = None
+                for task in done:
+                    exc = task.exception()
+                    if exc is not None:
+                        error = exc
+                    elif winner is None:
+                        winner = task
+                if winner is not None:
+                    role, began = started[winner]
+                    self._record(name, loop.time() - began)
+                    if len(started) > 1:
+                        _HEDGES.inc(server=self.server_name, tool=name, winner=role)
+                    return winner.result()
+                if not pending:
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        if error is not None:
+            raise error
+        raise TimeoutError(f"MCP ツール {name} が {timeout:.1f} 秒以内に応答しませんでした")
+
+    def _record(self, name: str, seconds: float) -> None:
+        self.latency(name).add(seconds)
+        _CALL_SECONDS.observe(seconds, server=self.server_name, tool=name)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._session, item)
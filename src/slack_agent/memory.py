@@ -0,0 +1,334 @@
+"""プロセスのメモリの内訳レポートと、メモリ予算によるキャッシュの縮小。
+
+MCP のツール、エージェントのグラフ、スレッド状態（checkpointer）、名前解決のキャッシュなどは
+すべてプロセス内に保持される。各モジュールは `MEMORY.register()` で自身の保持データを
+「サブシステム」として登録し、`MemoryMonitor` が次を行う。
+
+- レポート（`/debug/memory` と SIGUSR1 でのログ出力）: RSS、サブシステムごとの件数と
+  到達可能なオブジェクトの概算バイト数、処理中の応答数、tracemalloc の確保元上位
+- メモリ予算（`MEMORY_BUDGET_MB`）: 背景ループ上で RSS を定期的に確認し、予算の
+  `MEMORY_HIGH_WATERMARK` を超えたら縮小可能なサブシステムの古いエントリを捨てる
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ctypes
+import ctypes.util
+import gc
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+import types
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any
+
+from . import metrics
+from .background import BackgroundLoop, default_loop
+from .config import MemorySettings
+from .lifecycle import LIFECYCLE
+
+logger = logging.getLogger(__name__)
+
+Shrink = Callable[[float], int | Awaitable[int]]
+
+# 概算バイト数を数えるときにたどるオブジェクト数の上限（レポートが長く GIL を握らないように）
+MAX_OBJECTS = 200_000
+
+_RSS = metrics.gauge("slack_agent_memory_rss_bytes", "プロセスの RSS（バイト）")
+_ENTRIES = metrics.gauge("slack_agent_memory_entries", "サブシステムごとの保持件数")
+_OVER_BUDGET = metrics.counter(
+    "slack_agent_memory_budget_exceeded_total", "RSS が予算の閾値を超えてキャッシュを縮小した回数"
+)
+_EVICTED = metrics.counter(
+    "slack_agent_memory_evicted_entries_total", "メモリ予算の超過で捨てたエントリ数（subsystem 別）"
+)
+
+# 中身をたどらない型（共有される定義側のオブジェクト）
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def rss_bytes() -> int | None:
+    """現在の RSS（Linux 以外は最大 RSS で代用、取得できなければ None）。"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (ImportError, OSError):
+        return None
+    # macOS はバイト、その他は KiB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_sizeof(
+    obj: object, seen: set[int] | None = None, limit: int = MAX_OBJECTS
+) -> tuple[int, bool]:
+    """`obj` から到達できるオブジェクトの合計バイト数と、上限で打ち切ったかを返します。
+
+    `seen` を複数の呼び出しで共有すると、既に数えたオブジェクトは数えません。
+    クラス・モジュール・関数の先はたどりません。
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    visited = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _OPAQUE):
+            continue
+        if visited >= limit:
+            return total, True
+        seen.add(id(current))
+        visited += 1
+        total += sys.getsizeof(current, 0)
+        stack.extend(gc.get_referents(current))
+    return total, False
+
+
+def _malloc_trim() -> None:
+    """glibc に解放済みの領域を OS へ返させます（対応していない環境では何もしない）。"""
+    path = ctypes.util.find_library("c")
+    if path is None:
+        return
+    with contextlib.suppress(OSError, AttributeError):
+        ctypes.CDLL(path).malloc_trim(0)
+
+
+@dataclass(frozen=True)
+class _Subsystem:
+    name: str
+    root: Callable[[], object]
+    entries: Callable[[], int] | None
+    shrink: Shrink | None
+
+
+class MemoryMonitor:
+    """サブシステムの登録簿。レポートの作成とメモリ予算の監視を行う。"""
+
+    def __init__(
+        self,
+        settings: MemorySettings | None = None,
+        loop: BackgroundLoop | None = None,
+        rss: Callable[[], int | None] = rss_bytes,
+    ) -> None:
+        self.settings = settings or MemorySettings()
+        self._bg = loop
+        self._rss = rss
+        self._lock = threading.Lock()
+        self._subsystems: dict[str, _Subsystem] = {}
+        self._watcher: Future[None] | None = None
+        self._started = False
+        self._last_snapshot: tracemalloc.Snapshot | None = None
+
+    def register(
+        self,
+        name: str,
+        root: Callable[[], object],
+        entries: Callable[[], int] | None = None,
+        shrink: Shrink | None = None,
+    ) -> None:
+        """保持データを登録します（同名は置き換え）。
+
+        `root` は大きさを見積もる対象を返す関数、`entries` は件数、`shrink(fraction)` は
+        古いエントリを割合 `fraction` だけ捨てて捨てた件数を返す関数（コルーチン関数も可）。
+        """
+        with self._lock:
+            self._subsystems[name] = _Subsystem(name, root, entries, shrink)
+
+    def subsystems(self) -> list[str]:
+        with self._lock:
+            return list(self._subsystems)
+
+    def _snapshot(self) -> list[_Subsystem]:
+        with self._lock:
+            return list(self._subsystems.values())
+
+    # --- 起動 -----------------------------------------------------------------
+
+    def start(self, settings: MemorySettings | None = None) -> None:
+        """tracemalloc・`/debug/memory`・メトリクス・予算の監視を開始します。"""
+        if settings is not None:
+            self.settings = settings
+        if self.settings.tracemalloc_frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.settings.tracemalloc_frames)
+        if not self._started:
+            self._started = True
+            metrics.REGISTRY.add_collector(self.collect)
+            metrics.add_page("/debug/memory", self.render, "application/json")
+        budget = self.settings.budget_bytes
+        if budget is not None and self._watcher is None:
+            self._watcher = (self._bg or default_loop()).submit(self._watch())
+        logger.info(
+            "Memory monitor started (budget=%s, watermark=%.2f, tracemalloc=%s)",
+            f"{self.settings.budget_mb}MB" if budget is not None else "none",
+            self.settings.high_watermark,
+            tracemalloc.is_tracing(),
+        )
+
+    def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    # --- レポート -------------------------------------------------------------
+
+    def report(self, top: int | None = None, sizes: bool = True) -> dict[str, Any]:
+        """メモリの内訳を辞書で返します。
+
+        サブシステムの `bytes` は縮小できるもの → その他の順（同じ区分内は登録順）に数え、
+        前のサブシステムで数えたオブジェクトは含めません（共有オブジェクトを二重に数えない）。
+        """
+        top = self.settings.report_top if top is None else top
+        seen: set[int] = set()
+        subsystems: dict[str, dict[str, Any]] = {}
+        # 縮小できるキャッシュを先に数え、共有オブジェクトはキャッシュ側に計上する
+        ordered = sorted(self._snapshot(), key=lambda sub: sub.shrink is None)
+        for sub in ordered:
+            info: dict[str, Any] = {}
+            try:
+                if sub.entries is not None:
+                    info["entries"] = sub.entries()
+                if sizes:
+                    info["bytes"], truncated = deep_sizeof(sub.root(), seen)
+                    if truncated:
+                        info["truncated"] = True
+            except Exception as e:  # noqa: BLE001 - 1 つの失敗でレポート全体を止めない
+                info["error"] = str(e)
+            info["shrinkable"] = sub.shrink is not None
+            subsystems[sub.name] = info
+
+        bg = self._bg or default_loop()
+        budget = self.settings.budget_bytes
+        return {
+            "rss_bytes": self._rss(),
+            "budget_bytes": budget,
+            "high_watermark_bytes": int(budget * self.settings.high_watermark) if budget else None,
+            "inflight": LIFECYCLE.inflight,
+            "background_tasks": bg.running(),
+            "gc_objects": len(gc.get_objects()),
+            "subsystems": subsystems,
+            "tracemalloc": self._tracemalloc_report(top),
+        }
+
+    def _tracemalloc_report(self, top: int) -> dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )
+        )
+        key = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+        current, peak = tracemalloc.get_traced_memory()
+
+        def _where(stat: tracemalloc.Statistic | tracemalloc.StatisticDiff) -> list[str]:
+            return [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+
+        result: dict[str, Any] = {
+            "tracing": True,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {"bytes": s.size, "count": s.count, "where": _where(s)}
+                for s in snapshot.statistics(key)[:top]
+            ],
+        }
+        if self._last_snapshot is not None:
+            # 前回のレポートから増えた確保元（リークの調査用）
+            result["growth"] = [
+                {"bytes": s.size_diff, "count": s.count_diff, "where": _where(s)}
+                for s in snapshot.compare_to(self._last_snapshot, key)[:top]
+                if s.size_diff > 0
+            ]
+        self._last_snapshot = snapshot
+        return result
+
+    def render(self) -> str:
+        """`/debug/memory` の本文（JSON）。"""
+        return json.dumps(self.report(), ensure_ascii=False, indent=2)
+
+    def log_report(self) -> None:
+        """レポートをログに出します（SIGUSR1）。"""
+        report = self.report()
+        rss = report["rss_bytes"]
+        logger.warning(
+            "Memory report: rss=%s inflight=%d subsystems=%s",
+            f"{rss / 1024 / 1024:.1f}MB" if rss is not None else "unknown",
+            report["inflight"],
+            {name: info.get("bytes") for name, info in report["subsystems"].items()},
+            extra={"memory": report},
+        )
+
+    def collect(self) -> None:
+        """`/metrics` の出力前に RSS とサブシステムの件数をゲージへ反映します。"""
+        rss = self._rss()
+        if rss is not None:
+            _RSS.set(rss)
+        for sub in self._snapshot():
+            if sub.entries is None:
+                continue
+            try:
+                _ENTRIES.set(sub.entries(), subsystem=sub.name)
+            except Exception as e:  # noqa: BLE001
+                logger.debug("Memory entries failed subsystem=%s: %s", sub.name, e)
+
+    # --- メモリ予算 -----------------------------------------------------------
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.check_interval_seconds)
+            try:
+                await self.check()
+            except Exception as e:  # noqa: BLE001 - 監視は止めない
+                logger.warning("Memory budget check failed: %s", e)
+
+    async def check(self) -> dict[str, int] | None:
+        """RSS が予算の閾値を超えていれば各サブシステムを縮小し、捨てた件数を返します。
+
+        背景ループ上で呼ばれる（checkpointer の縮小は背景ループ上で行う必要があるため）。
+        """
+        budget = self.settings.budget_bytes
+        rss = self._rss()
+        if budget is None or rss is None or rss < budget * self.settings.high_watermark:
+            return None
+        freed: dict[str, int] = {}
+        for sub in self._snapshot():
+            if sub.shrink is None:
+                continue
+            try:
+                result = sub.shrink(self.settings.shrink_fraction)
+                count = await result if inspect.isawaitable(result) else result
+            except Exception as e:  # noqa: BLE001 - 1 つの失敗で他の縮小を止めない
+                logger.warning("Memory shrink failed subsystem=%s: %s", sub.name, e)
+                continue
+            freed[sub.name] = count
+            if count:
+                _EVICTED.inc(count, subsystem=sub.name)
+        gc.collect()
+        _malloc_trim()
+        _OVER_BUDGET.inc()
+        after = self._rss()
+        logger.warning(
+            "Memory budget exceeded: rss=%.1fMB budget=%dMB; evicted %s; rss now %s",
+            rss / 1024 / 1024,
+            self.settings.budget_mb,
+            freed,
+            f"{after / 1024 / 1024:.1f}MB" if after is not None else "unknown",
+        )
+        return freed
+
+
+MEMORY = MemoryMonitor()
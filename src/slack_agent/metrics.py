@@ -0,0 +1,294 @@
+"""プロセス内メトリクスの最小実装。
+
+カウンタ・ゲージ・ヒストグラムをスレッドセーフに集計し、Prometheus のテキスト形式で
+公開します（`METRICS_PORT` 設定時に `bot.main()` が `/metrics` を HTTP で提供）。
+外部依存を増やさないため prometheus_client は使用しません。
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from collections.abc import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[tuple[str, LabelKey, float]]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> Iterable[tuple[str, LabelKey, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, value) for key, value in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    """任意に上下する値。"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels: Any) -> None:
+        """ラベルの組を出力対象から外します（対象が無くなった系列を残さないため）。"""
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+    def label_sets(self) -> list[dict[str, str]]:
+        with self._lock:
+            return [dict(key) for key in self._values]
+
+
+class Histogram(_Metric):
+    """累積バケット方式のヒストグラム（Prometheus 互換）。"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float]) -> None:
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (bucket counts, sum, count)
+        self._values: dict[LabelKey, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(_label_key(labels))
+        return entry[2] if entry else 0
+
+    def sum(self, **labels: Any) -> float:
+        with self._lock:
+            entry = self._values.get(_label_key(labels))
+        return entry[1] if entry else 0.0
+
+    def samples(self) -> Iterable[tuple[str, LabelKey, float]]:
+        with self._lock:
+            items = [(k, (list(c), s, n)) for k, (c, s, n) in self._values.items()]
+        out: list[tuple[str, LabelKey, float]] = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts, strict=True):
+                le = (("le", _format_value(bound)),)
+                out.append((f"{self.name}_bucket", key + le, float(bucket_count)))
+            out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), float(count)))
+            out.append((f"{self.name}_sum", key, total))
+            out.append((f"{self.name}_count", key, float(count)))
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """メトリクスの登録簿。同名メトリクスは get-or-create で共有されます。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def _get_or_create(self, name: str, factory: Callable[[], _Metric]) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        metric = self._get_or_create(name, lambda: Counter(name, description))
+        if not isinstance(metric, Counter) or isinstance(metric, Gauge):
+            raise RuntimeError(f"メトリクス {name} は counter ではありません")
+        return metric
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        metric = self._get_or_create(name, lambda: Gauge(name, description))
+        if not isinstance(metric, Gauge):
+            raise RuntimeError(f"メトリクス {name} は gauge ではありません")
+        return metric
+
+    def histogram(
+        self, name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = self._get_or_create(name, lambda: Histogram(name, description, buckets))
+        if not isinstance(metric, Histogram):
+            raise RuntimeError(f"メトリクス {name} は histogram ではありません")
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """出力の直前に呼ぶ関数を登録します（時間とともに変わるゲージの更新用）。"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus テキスト形式（version 0.0.4）で全メトリクスを出力します。"""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:  # noqa: BLE001 - 1 つの失敗で出力全体を止めない
+                logger.warning("Metrics collector failed: %s", e)
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: list[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """全メトリクスの値をクリアします（主にテスト用）。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, description: str) -> Counter:
+    return REGISTRY.counter(name, description)
+
+
+def gauge(name: str, description: str) -> Gauge:
+    return REGISTRY.gauge(name, description)
+
+
+def histogram(name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, description, buckets)
+
+
+_PAGES: dict[str, tuple[str, Callable[[], str]]] = {
+    "/metrics": ("text/plain; version=0.0.4; charset=utf-8", REGISTRY.render),
+}
+
+
+def add_page(path: str, render: Callable[[], str], content_type: str = "text/plain") -> None:
+    """`/metrics` と同じ HTTP サーバーで返すページ（デバッグ用など）を登録します。"""
+    _PAGES[path] = (f"{content_type}; charset=utf-8", render)
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """`/metrics`（と `add_page()` で登録したページ）を返す HTTP サーバーを起動します。"""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 - http.server の規約
+            page = _PAGES.get(self.path.split("?", 1)[0])
+            if page is None:
+                self.send_error(404)
+                return
+            content_type, render = page
+            try:
+                body = render().encode("utf-8")
+            except Exception as e:  # noqa: BLE001 - ページの失敗でサーバーを止めない
+                logger.warning("metrics http: failed to render %s: %s", self.path, e)
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            logger.debug("metrics http: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    thread = threading.Thread(target=server.serve_forever, name="slack-agent-metrics", daemon=True)
+    thread.start()
+    logger.info("Metrics endpoint started on http://%s:%d/metrics", host, port)
+    return server
@@ -0,0 +1 @@
+# Agent middleware package for slack_agent
@@ -0,0 +1,88 @@
+"""モデル呼び出しをカセットに記録し、再生時は記録した応答を返すミドルウェア。
+
+最も内側（流量制御の内側）に置き、他のミドルウェアが加工した後のリクエストから
+キー（システムメッセージ・メッセージ列・ツール名・tool_choice）を作る。コンテンツブロックの
+ID のように実行ごとに変わる値はキーに含めない。再生時はモデルを呼ばずに記録した `AIMessage` を
+記録時の所要時間 × timing_scale だけ待ってから返す（使用量のメタデータも記録どおり）。
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict, messages_to_dict
+
+from ..cassette import Cassette, request_key
+
+
+def _content_view(content: Any) -> Any:
+    # コンテンツブロックの id（`lc_<uuid>` など）は実行ごとに採番されるため除く
+    if isinstance(content, list):
+        return [
+            {k: v for k, v in block.items() if k != "id"} if isinstance(block, dict) else block
+            for block in content
+        ]
+    return content
+
+
+def _message_view(message: BaseMessage) -> dict[str, Any]:
+    view: dict[str, Any] = {"type": message.type, "content": _content_view(message.content)}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        view["tool_calls"] = [
+            {"name": call["name"], "args": call["args"], "id": call.get("id")}
+            for call in tool_calls
+        ]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        view["tool_call_id"] = tool_call_id
+    return view
+
+
+def _tool_name(tool: Any) -> str:
+    if isinstance(tool, dict):
+        function = tool.get("function")
+        return str(tool.get("name") or (function or {}).get("name") or "")
+    return str(getattr(tool, "name", tool))
+
+
+def model_request_key(request: ModelRequest[Any]) -> str:
+    """モデル呼び出しの要求のキー。"""
+    messages = [request.system_message, *request.messages]
+    return request_key(
+        {
+            "messages": [_message_view(m) for m in messages if m is not None],
+            "tools": sorted(_tool_name(t) for t in request.tools),
+            "tool_choice": request.tool_choice,
+        }
+    )
+
+
+class CassetteMiddleware(AgentMiddleware[Any, Any]):
+    """モデルの応答をカセットに記録する（再生時はカセットから応答する）。"""
+
+    def __init__(self, cassette: Cassette) -> None:
+        super().__init__()
+        self.cassette = cassette
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any] | AIMessage:
+        key = model_request_key(request)
+        if self.cassette.replaying:
+            entry = self.cassette.take("model", key)
+            await self.cassette.wait(entry)
+            return ModelResponse(result=messages_from_dict(entry["result"]))
+
+        started = time.monotonic()
+        response = await handler(request)
+        messages = [response] if isinstance(response, AIMessage) else response.result
+        self.cassette.record(
+            "model", key, time.monotonic() - started, result=messages_to_dict(messages)
+        )
+        return response
@@ -0,0 +1,213 @@
+"""1 回のエージェント実行内で、既にモデルへ渡した検索ドキュメントの重複を省くミドルウェア。
+
+1 回の `graph.ainvoke` の中で検索ツールが何度も呼ばれると、同じ `filepath` の本文が毎回
+ツール結果としてメッセージ履歴に追加され、以降の LLM 呼び出しの入力が膨らみ続ける。
+本ミドルウェアは実行単位のレジストリ（`document_scope()` で開始）に渡し済みの本文を記録し、
+2 回目以降のヒットは本文を「doc #N を参照」という短い参照に置き換える。
+本文が異なる（別の抜粋・長さ違いの）ヒットは新しい本文として転送する。
+スレッドの保存済み状態から再開した実行では、状態に残る ToolMessage の `doc_id` を実行の
+開始時（`before_agent`）にレジストリへ引き継ぐため、番号は実行をまたいでも重複しない
+（前回の doc #N と別の本文に同じ番号を振って、モデルに取り違えさせることがない）。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, ToolCallRequest
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+_SAVED_TOTAL = metrics.counter(
+    "slack_agent_doc_dedup_saved_bytes_total", "既出ドキュメントの参照置換で省いたバイト数の累計"
+)
+_SAVED_PER_RUN = metrics.histogram(
+    "slack_agent_doc_dedup_saved_bytes",
+    "1 回の実行で省いたバイト数",
+    (0, 1_000, 5_000, 20_000, 50_000, 100_000, 500_000, 1_000_000),
+)
+_HITS = metrics.counter("slack_agent_doc_dedup_hits_total", "参照に置き換えた既出ドキュメント数")
+
+
+def reference_text(doc_id: int) -> str:
+    return f"（既出: doc #{doc_id} を参照）"
+
+
+@dataclass
+class RunDocuments:
+    """1 回の実行でモデルへ渡したドキュメントの登録簿。"""
+
+    ids: dict[tuple[str, int, int], int] = field(default_factory=dict)
+    next_id: int = 1
+    saved_bytes: int = 0
+    hits: int = 0
+
+    def register(self, filepath: str, document: str) -> tuple[int, bool]:
+        """ドキュメント番号と、既出かどうかを返します。"""
+        key = (filepath, len(document), hash(document))
+        doc_id = self.ids.get(key)
+        if doc_id is not None:
+            return doc_id, True
+        doc_id = self.next_id
+        self.next_id += 1
+        self.ids[key] = doc_id
+        return doc_id, False
+
+    def seed(self, messages: Iterable[Any]) -> None:
+        """再開した状態の ToolMessage に振られた doc_id を引き継ぎます。"""
+        for message in messages:
+            if not isinstance(message, ToolMessage):
+                continue
+            for item in _result_items(message):
+                doc_id = item.get("doc_id")
+                if not isinstance(doc_id, int):
+                    continue
+                self.next_id = max(self.next_id, doc_id + 1)
+                filepath, document = item.get("filepath"), item.get("document")
+                if (
+                    isinstance(filepath, str)
+                    and isinstance(document, str)
+                    and document != reference_text(doc_id)
+                ):
+                    self.ids.setdefault((filepath, len(document), hash(document)), doc_id)
+
+
+_current: ContextVar[RunDocuments | None] = ContextVar("slack_agent_run_documents", default=None)
+
+
+@contextmanager
+def document_scope() -> Iterator[RunDocuments]:
+    """1 回のエージェント実行分のレジストリを開始します（`graph.ainvoke` を囲んで使う）。
+
+    LangGraph のノードは呼び出し元のコンテキストをコピーしたタスクで動くため、
+    ここで設定したレジストリは並列のツール呼び出しからも共有される。
+    """
+    docs = RunDocuments()
+    token = _current.set(docs)
+    try:
+        yield docs
+    finally:
+        _current.reset(token)
+        _SAVED_PER_RUN.observe(docs.saved_bytes)
+        if docs.hits:
+            logger.info(
+                "Doc dedup: replaced %d repeated documents, saved %d bytes",
+                docs.hits,
+                docs.saved_bytes,
+            )
+
+
+def dedup_payload(payload: Any, docs: RunDocuments) -> bool:
+    """検索レスポンス（`results[].filepath/document`）内の既出本文を参照に置き換えます。
+
+    置き換え・番号付けを行った場合は True を返します（payload はその場で更新）。
+    """
+    if not isinstance(payload, dict):
+        return False
+    results = payload.get("results")
+    if not isinstance(results, list):
+        return False
+    changed = False
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        filepath, document = item.get("filepath"), item.get("document")
+        if not isinstance(filepath, str) or not isinstance(document, str) or not document:
+            continue
+        doc_id, seen = docs.register(filepath, document)
+        item["doc_id"] = doc_id
+        changed = True
+        if seen:
+            ref = reference_text(doc_id)
+            saved = len(document.encode("utf-8")) - len(ref.encode("utf-8"))
+            item["document"] = ref
+            if saved > 0:
+                docs.saved_bytes += saved
+                _SAVED_TOTAL.inc(saved)
+            docs.hits += 1
+            _HITS.inc()
+    return changed
+
+
+def _dedup_text(text: str, docs: RunDocuments) -> str | None:
+    if '"results"' not in text:
+        return None
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return None
+    if not dedup_payload(payload, docs):
+        return None
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _result_items(message: ToolMessage) -> Iterator[dict[str, Any]]:
+    content = message.content
+    if isinstance(content, str):
+        texts = [content]
+    else:
+        texts = [
+            str(block.get("text", ""))
+            for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        ]
+    for text in texts:
+        if '"results"' not in text:
+            continue
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            continue
+        results = payload.get("results") if isinstance(payload, dict) else None
+        if isinstance(results, list):
+            yield from (item for item in results if isinstance(item, dict))
+
+
+def dedup_tool_message(message: ToolMessage, docs: RunDocuments) -> None:
+    """ToolMessage の本文（JSON 文字列またはテキストブロック列）をその場で書き換えます。"""
+    content = message.content
+    if isinstance(content, str):
+        replaced = _dedup_text(content, docs)
+        if replaced is not None:
+            message.content = replaced
+        return
+    for block in content:
+        if isinstance(block, dict) and block.get("type") == "text":
+            replaced = _dedup_text(str(block.get("text", "")), docs)
+            if replaced is not None:
+                block["text"] = replaced
+
+
+class DocumentDedupMiddleware(AgentMiddleware[Any, Any]):
+    """ツール結果のうち、同じ実行内で既に渡した本文を参照に置き換える。
+
+    `document_scope()` の外で実行された場合は何もしない。
+    """
+
+    async def abefore_agent(self, state: Any, runtime: Any) -> dict[str, Any] | None:
+        # 再開した実行では、保存済みのメッセージに残る doc_id から番号を続ける
+        docs = _current.get()
+        if docs is not None:
+            docs.seed(state.get("messages", []))
+        return None
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command[Any]]],
+    ) -> ToolMessage | Command[Any]:
+        result = await handler(request)
+        docs = _current.get()
+        if docs is not None and isinstance(result, ToolMessage):
+            dedup_tool_message(result, docs)
+        return result
@@ -0,0 +1,152 @@
+"""モデル呼び出しの流量制御と再試行を行うミドルウェア。
+
+`ChatOpenAI` 側の自動再試行は無効（`max_retries=0`）にし、再試行はここで行う。SDK 内部の
+再試行は流量制御を素通りするため、429 を受けた直後に同じクォータへ再送が重なり
+（再試行の増幅）、429 が連鎖しやすい。
+
+- 呼び出し前に入力トークン数を見積もり、`ModelRateLimiter` で TPM / RPM の枠を確保する
+  （枠が無ければ 429 を受ける前にここで待つ）。応答の usage で見積もりとの差を精算する
+- 429 / 5xx / 接続エラーはフルジッター付きの指数バックオフで再試行する。Retry-After
+  （`retry-after-ms` / `retry-after`）があればそれより早くは再送せず、429 の場合は他の
+  リクエストも含めてその間止める。クォータ不足（`insufficient_quota`）は再試行しない
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import openai
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage
+
+from .. import metrics
+from ..config import ModelClientSettings
+from ..ratelimit import ModelRateLimiter, backoff_delay, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_RETRIES = metrics.counter(
+    "slack_agent_model_retries_total", "モデル呼び出しの再試行回数（reason 別）"
+)
+
+_RETRYABLE: tuple[type[Exception], ...] = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """OpenAI のエラー応答ヘッダから再送までの秒数を取り出します（無ければ None）。"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    raw_ms = headers.get("retry-after-ms")
+    if raw_ms:
+        try:
+            return max(0.0, float(raw_ms) / 1000.0)
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        # HTTP-date 形式
+        return max(0.0, email.utils.parsedate_to_datetime(raw).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_reason(error: BaseException) -> str | None:
+    """再試行すべきエラーなら理由（メトリクスのラベル）、そうでなければ None。"""
+    if not isinstance(error, _RETRYABLE):
+        return None
+    if isinstance(error, openai.RateLimitError):
+        if getattr(error, "code", None) == "insufficient_quota":
+            return None
+        return "ratelimited"
+    if isinstance(error, openai.APIConnectionError):
+        return "timeout" if isinstance(error, openai.APITimeoutError) else "connection"
+    return "server"
+
+
+def _total_tokens(response: ModelResponse[Any] | AIMessage) -> int | None:
+    messages = [response] if isinstance(response, AIMessage) else response.result
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            return int(usage.get("total_tokens", 0)) or None
+    return None
+
+
+class ModelRateLimitMiddleware(AgentMiddleware[Any, Any]):
+    """モデル呼び出しを TPM / RPM の枠内に収め、一時的なエラーを再試行する。"""
+
+    def __init__(
+        self, settings: ModelClientSettings, limiter: ModelRateLimiter | None = None
+    ) -> None:
+        super().__init__()
+        self.settings = settings
+        self.limiter = limiter
+        if limiter is None and settings.limited:
+            self.limiter = ModelRateLimiter(tpm=settings.tpm_limit, rpm=settings.rpm_limit)
+
+    def _estimate(self, request: ModelRequest[Any]) -> int:
+        messages = [request.system_message, *request.messages]
+        return estimate_tokens(
+            [m for m in messages if m is not None],
+            request.tools,
+            self.settings.output_tokens_estimate,
+        )
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any] | AIMessage:
+        estimated = self._estimate(request) if self.limiter is not None else 0
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                await self.limiter.acquire(estimated)
+            try:
+                response = await handler(request)
+            except Exception as e:
+                reason = _retry_reason(e)
+                if self.limiter is not None:
+                    self.limiter.settle(estimated, 0)
+                if reason is None or attempt >= self.settings.max_retries:
+                    raise
+                retry_after = retry_after_seconds(e)
+                if reason == "ratelimited" and retry_after and self.limiter is not None:
+                    self.limiter.block_for(retry_after)
+                delay = backoff_delay(
+                    attempt,
+                    self.settings.retry_base_seconds,
+                    self.settings.retry_max_seconds,
+                    retry_after,
+                )
+                _RETRIES.inc(reason=reason)
+                logger.warning(
+                    "Model call failed (%s); retrying in %.2fs (attempt %d/%d)",
+                    reason,
+                    delay,
+                    attempt + 1,
+                    self.settings.max_retries,
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if self.limiter is not None:
+                self.limiter.settle(estimated, _total_tokens(response) or estimated)
+            return response
@@ -0,0 +1,120 @@
+"""1 エージェントステップ内の並列ツール呼び出しを制御するミドルウェア。
+
+モデルが 1 回の応答で複数の tool_calls を返すと、`create_agent` はそれらを Send API で
+同一スーパーステップ内に並列ディスパッチする。本ミドルウェアはその並列度を
+ステップ単位のセマフォで制限し、逐次実行した場合との差（短縮できた待ち時間）を
+メトリクスとして記録する。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, ToolCallRequest
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.types import Command
+
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+_STEP_WALL = metrics.histogram(
+    "slack_agent_tool_step_wall_seconds", "並列ツールステップの実経過時間"
+)
+_STEP_SERIAL = metrics.histogram(
+    "slack_agent_tool_step_serial_seconds",
+    "ステップ内ツール呼び出し時間の合計（逐次実行時の想定時間）",
+)
+_STEP_SAVED = metrics.counter(
+    "slack_agent_tool_step_saved_seconds_total", "並列実行により短縮された待ち時間の累計"
+)
+_STEP_CALLS = metrics.histogram(
+    "slack_agent_tool_step_calls", "1 ステップあたりのツール呼び出し数", (1, 2, 3, 4, 6, 8, 12, 16)
+)
+
+# 中断された実行などで完了しないステップが溜まり続けないようにする上限
+_MAX_TRACKED_STEPS = 1024
+
+
+class _StepState:
+    def __init__(self, expected: int, limit: int) -> None:
+        self.expected = max(1, expected)
+        self.semaphore = asyncio.Semaphore(limit)
+        self.started = time.perf_counter()
+        self.finished = 0
+        self.serial_seconds = 0.0
+
+
+def _step_message(request: ToolCallRequest) -> AIMessage | None:
+    """リクエストの tool_call を発行した AIMessage（= ステップ）を状態から探す。"""
+    state = request.state
+    messages = state.get("messages", []) if isinstance(state, dict) else []
+    call_id = request.tool_call.get("id")
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and any(tc.get("id") == call_id for tc in msg.tool_calls):
+            return msg
+    return None
+
+
+class ToolStepConcurrencyMiddleware(AgentMiddleware[Any, Any]):
+    """ステップ単位で並列ツール実行数を `max_concurrency` に制限し、短縮時間を計測する。"""
+
+    def __init__(self, max_concurrency: int) -> None:
+        super().__init__()
+        self.max_concurrency = max(1, max_concurrency)
+        self._steps: OrderedDict[str, _StepState] = OrderedDict()
+
+    def _step_for(self, request: ToolCallRequest) -> tuple[str, _StepState]:
+        message = _step_message(request)
+        if message is not None:
+            key = message.id or f"msg-{id(message)}"
+            expected = len(message.tool_calls)
+        else:
+            key = f"call-{request.tool_call.get('id') or id(request)}"
+            expected = 1
+        step = self._steps.get(key)
+        if step is None:
+            step = _StepState(expected, self.max_concurrency)
+            self._steps[key] = step
+            while len(self._steps) > _MAX_TRACKED_STEPS:
+                self._steps.popitem(last=False)
+        return key, step
+
+    def _finish(self, key: str, step: _StepState, elapsed: float) -> None:
+        step.finished += 1
+        step.serial_seconds += elapsed
+        if step.finished < step.expected:
+            return
+        self._steps.pop(key, None)
+        wall = time.perf_counter() - step.started
+        saved = max(0.0, step.serial_seconds - wall)
+        _STEP_WALL.observe(wall)
+        _STEP_SERIAL.observe(step.serial_seconds)
+        _STEP_CALLS.observe(step.expected)
+        _STEP_SAVED.inc(saved)
+        if step.expected > 1:
+            logger.info(
+                "Tool step finished: calls=%d wall=%.3fs serial=%.3fs saved=%.3fs",
+                step.expected,
+                wall,
+                step.serial_seconds,
+                saved,
+            )
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command[Any]]],
+    ) -> ToolMessage | Command[Any]:
+        key, step = self._step_for(request)
+        async with step.semaphore:
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                self._finish(key, step, time.perf_counter() - started)
@@ -0,0 +1,317 @@
+"""リクエストごとに関係するツールだけをモデルへ渡すミドルウェア。
+
+`create_agent` は既定で全ツールの JSON スキーマを毎回のモデル呼び出しに載せるため、
+MCP サーバーを増やすほど LLM 呼び出し 1 回あたりの入力トークンが増える。
+`ToolSelectionMiddleware` は質問文とツール名・説明・引数名を字句的に照合し
+（埋め込みやモデル呼び出しは使わない）、上位のツールと常時渡すツールだけをバインドする。
+あわせてスキーマを縮小（長い説明の切り詰め、`title` / `default` / `examples` の削除）し、
+省いた分の見積もりトークン数を実行単位の使用量とメトリクスに記録する。
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from collections.abc import Awaitable, Callable, Collection, Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .. import metrics
+from ..config import ToolSelectionSettings
+from ..ratelimit import estimate_tokens
+from .usage import current_usage
+
+logger = logging.getLogger(__name__)
+
+_SELECTED = metrics.histogram(
+    "slack_agent_tool_selection_tools",
+    "1 回のモデル呼び出しに渡したツール数",
+    (1, 2, 4, 8, 12, 16, 24, 32, 64),
+)
+_OUTCOME = metrics.counter(
+    "slack_agent_tool_selection_total", "ツール選択の結果（outcome: all / subset / fallback）"
+)
+_SCHEMA_TOKENS = metrics.counter(
+    "slack_agent_tool_schema_tokens_total",
+    "ツールスキーマの見積もりトークン数（kind: full = 全ツールの縮小前 / bound = 渡した分）",
+)
+
+# スキーマ縮小で削除するキー（モデルの判断にほぼ寄与しない冗長な情報）
+_DROP_KEYS = frozenset({"title", "default", "examples", "$comment"})
+# プロパティ名などキー自体が任意の名前になるマップ
+_NAMED_MAPS = frozenset({"properties", "$defs", "definitions", "patternProperties"})
+# 照合に使わない頻出語
+_STOPWORDS = frozenset(
+    {
+        "a",
+        "an",
+        "and",
+        "are",
+        "by",
+        "for",
+        "from",
+        "in",
+        "is",
+        "it",
+        "of",
+        "on",
+        "or",
+        "the",
+        "this",
+        "that",
+        "to",
+        "with",
+        "use",
+        "used",
+        "tool",
+        "returns",
+        "return",
+        "given",
+    }
+)
+
+_WORD = re.compile(r"[A-Za-z][a-z]*|[A-Z]+(?![a-z])|\d+")
+# 漢字・カタカナの連続（ひらがなは助詞などで区切りとして扱う）
+_CJK_RUN = re.compile(r"[\u30a0-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff66-\uff9f]+")
+
+
+def terms(text: str) -> set[str]:
+    """照合用の語の集合。英数字は snake_case / camelCase を分割して小文字化し、
+    漢字・カタカナの連続は 2 文字ずつ（1 文字だけの連続はその文字）に分けます。"""
+    out: set[str] = set()
+    for word in _WORD.findall(text):
+        word = word.lower()
+        if len(word) > 1 and word not in _STOPWORDS:
+            out.add(word)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            out.add(run)
+        out.update(run[i : i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def _shorten(text: str, limit: int) -> str:
+    # 最初の段落だけを残し、空白を詰めてから切り詰める
+    paragraph = re.split(r"\n\s*\n", text.strip(), maxsplit=1)[0]
+    flat = " ".join(paragraph.split())
+    return flat if len(flat) <= limit else flat[: limit - 1] + "…"
+
+
+def _minify_node(node: Any, param_description_chars: int) -> Any:
+    if isinstance(node, list):
+        return [_minify_node(item, param_description_chars) for item in node]
+    if not isinstance(node, Mapping):
+        return node
+    out: dict[str, Any] = {}
+    for key, value in node.items():
+        if key in _DROP_KEYS:
+            continue
+        if key == "description":
+            if param_description_chars > 0 and isinstance(value, str):
+                out[key] = _shorten(value, param_description_chars)
+            continue
+        if key in _NAMED_MAPS and isinstance(value, Mapping):
+            out[key] = {
+                name: _minify_node(sub, param_description_chars) for name, sub in value.items()
+            }
+        else:
+            out[key] = _minify_node(value, param_description_chars)
+    return out
+
+
+def minify_tool_schema(
+    schema: Mapping[str, Any], description_chars: int, param_description_chars: int
+) -> dict[str, Any]:
+    """OpenAI 形式のツール定義（`{"type": "function", "function": {...}}`）を縮小します。"""
+    function = dict(schema["function"])
+    if isinstance(function.get("description"), str):
+        function["description"] = _shorten(function["description"], description_chars)
+    if "parameters" in function:
+        function["parameters"] = _minify_node(function["parameters"], param_description_chars)
+    return {**schema, "function": function}
+
+
+@dataclass(frozen=True)
+class _Profile:
+    """ツール 1 つ分の照合用の語と、縮小前後のスキーマ・見積もりトークン数。"""
+
+    name: str
+    name_terms: frozenset[str]
+    terms: frozenset[str]
+    bound: Any
+    full_tokens: int
+    bound_tokens: int
+
+
+def _profile(tool: BaseTool, settings: ToolSelectionSettings) -> _Profile:
+    schema = convert_to_openai_tool(tool)
+    parameters = schema["function"].get("parameters") or {}
+    params = " ".join(parameters.get("properties", {}) or {})
+    bound: Any = tool
+    if settings.minify:
+        bound = minify_tool_schema(
+            schema, settings.description_chars, settings.param_description_chars
+        )
+    full_tokens = estimate_tokens((), tools=[schema])
+    return _Profile(
+        name=tool.name,
+        name_terms=frozenset(terms(tool.name)),
+        terms=frozenset(terms(f"{tool.name} {tool.description} {params}")),
+        bound=bound,
+        full_tokens=full_tokens,
+        bound_tokens=estimate_tokens((), tools=[bound]) if settings.minify else full_tokens,
+    )
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            part if isinstance(part, str) else str(part.get("text", ""))
+            for part in content
+            if isinstance(part, str | dict)
+        )
+    return ""
+
+
+def _question(messages: Sequence[Any]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return _text(message.content)
+    return ""
+
+
+def _used_tools(messages: Iterable[Any]) -> set[str]:
+    """これまでに呼んだツール名（続きのステップでも同じツールを呼べるよう残す）。"""
+    return {
+        call["name"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for call in message.tool_calls
+    }
+
+
+class ToolSelector:
+    """質問文とツールの語の重なりでツールを選ぶ（ツールごとの解析結果はキャッシュ）。"""
+
+    def __init__(self, settings: ToolSelectionSettings | None = None) -> None:
+        self.settings = settings or ToolSelectionSettings()
+        self._profiles: dict[int, _Profile] = {}
+        self._idf: tuple[tuple[int, ...], dict[str, float]] | None = None
+
+    def profile(self, tool: BaseTool) -> _Profile:
+        key = id(tool)
+        cached = self._profiles.get(key)
+        if cached is None or cached.name != tool.name:
+            cached = self._profiles[key] = _profile(tool, self.settings)
+        return cached
+
+    def _weights(self, profiles: Sequence[_Profile]) -> dict[str, float]:
+        # 多くのツールに現れる語ほど軽くする（idf）。ツール構成が変わったときだけ作り直す
+        key = tuple(id(p) for p in profiles)
+        if self._idf is None or self._idf[0] != key:
+            df: dict[str, int] = {}
+            for p in profiles:
+                for term in p.terms:
+                    df[term] = df.get(term, 0) + 1
+            n = len(profiles)
+            self._idf = (key, {t: math.log(1 + n / c) for t, c in df.items()})
+        return self._idf[1]
+
+    def scores(self, question: str, profiles: Sequence[_Profile]) -> list[float]:
+        weights = self._weights(profiles)
+        wanted = terms(question)
+        return [
+            sum(weights.get(t, 0.0) * (2.0 if t in p.name_terms else 1.0) for t in wanted & p.terms)
+            for p in profiles
+        ]
+
+    def select(
+        self, question: str, tools: Sequence[BaseTool], used: Collection[str] = ()
+    ) -> tuple[list[BaseTool], str]:
+        """渡すツール（元の順序を保つ）と結果の種別（all / subset / fallback）を返します。"""
+        limit = self.settings.max_tools
+        if len(tools) <= limit:
+            return list(tools), "all"
+        profiles = [self.profile(t) for t in tools]
+        chosen = {
+            i
+            for i, t in enumerate(tools)
+            if t.name in used or any(fnmatchcase(t.name, pat) for pat in self.settings.always)
+        }
+        ranked = sorted(
+            ((score, i) for i, score in enumerate(self.scores(question, profiles)) if score > 0),
+            key=lambda pair: (-pair[0], pair[1]),
+        )
+        for _score, i in ranked:
+            if len(chosen) >= limit:
+                break
+            chosen.add(i)
+        if not chosen:
+            # どのツールにも当てはまらない質問で、ツールを全く渡せなくなるのを避ける
+            return list(tools), "fallback"
+        return [t for i, t in enumerate(tools) if i in chosen], "subset"
+
+
+class ToolSelectionMiddleware(AgentMiddleware[Any, Any]):
+    """モデル呼び出しごとに、質問に関係するツールだけを（縮小したスキーマで）渡す。"""
+
+    def __init__(
+        self,
+        settings: ToolSelectionSettings | None = None,
+        selector: ToolSelector | None = None,
+    ) -> None:
+        super().__init__()
+        self.settings = settings or ToolSelectionSettings()
+        self.selector = selector or ToolSelector(self.settings)
+
+    def apply(self, request: ModelRequest[Any]) -> ModelRequest[Any]:
+        """ツールを選んで縮小したリクエストを返します（省いたトークン数を記録）。"""
+        client = [t for t in request.tools if isinstance(t, BaseTool)]
+        if not client:
+            return request
+        others = [t for t in request.tools if not isinstance(t, BaseTool)]
+        if self.settings.enabled:
+            question = _question(request.messages)
+            selected, outcome = self.selector.select(
+                question, client, _used_tools(request.messages)
+            )
+        else:
+            selected, outcome = client, "all"
+        profiles = [self.selector.profile(t) for t in client]
+        by_tool = {id(t): p for t, p in zip(client, profiles, strict=True)}
+        full = sum(p.full_tokens for p in profiles)
+        bound = sum(by_tool[id(t)].bound_tokens for t in selected)
+
+        _OUTCOME.inc(outcome=outcome)
+        _SELECTED.observe(len(selected))
+        _SCHEMA_TOKENS.inc(full, kind="full")
+        _SCHEMA_TOKENS.inc(bound, kind="bound")
+        usage = current_usage()
+        if usage is not None:
+            usage.add_tool_schema_savings(full - bound)
+        logger.debug(
+            "Tool selection: outcome=%s tools=%d/%d schema_tokens=%d->%d",
+            outcome,
+            len(selected),
+            len(client),
+            full,
+            bound,
+        )
+        tools: list[Any] = [by_tool[id(t)].bound for t in selected]
+        return request.override(tools=[*tools, *others])
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any] | AIMessage:
+        return await handler(self.apply(request))
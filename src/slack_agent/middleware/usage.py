@@ -0,0 +1,121 @@
+"""1 回のエージェント実行内の LLM 呼び出しから使用量を集めるミドルウェア。
+
+エージェントループは 1 つの質問に対してモデルを複数回（ツール呼び出しの往復ごとに）呼ぶ。
+各呼び出しの応答（`AIMessage.usage_metadata`）から入力・出力・キャッシュ済みトークン数を、
+`tool_calls` からツール呼び出し数を数え、実行単位の `RunUsage` に合算する。
+`usage_scope()` で `graph.ainvoke` を囲むと、その実行の呼び出しだけが集計される
+（入れ子のスコープは終了時に外側へ合算される）。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Awaitable, Callable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.messages import AIMessage
+
+
+@dataclass
+class RunUsage:
+    """1 回の実行（1 つの質問への応答）の使用量。"""
+
+    model: str = "unknown"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    llm_turns: int = 0
+    tool_calls: int = 0
+    # ツール選択・スキーマ縮小で省いた入力トークン数の見積もり（全モデル呼び出しの合計）
+    tool_schema_tokens_saved: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add_message(self, message: AIMessage, model: str | None = None) -> None:
+        usage: Mapping[str, Any] = message.usage_metadata or {}
+        details: Mapping[str, Any] = usage.get("input_token_details") or {}
+        with self._lock:
+            if model:
+                self.model = model
+            self.llm_turns += 1
+            self.prompt_tokens += int(usage.get("input_tokens", 0))
+            self.completion_tokens += int(usage.get("output_tokens", 0))
+            self.cached_tokens += int(details.get("cache_read", 0) or 0)
+            self.tool_calls += len(message.tool_calls)
+
+    def add_tool_schema_savings(self, tokens: int) -> None:
+        with self._lock:
+            self.tool_schema_tokens_saved += tokens
+
+    def merge(self, other: RunUsage) -> None:
+        """別の実行の使用量を合算します（モデル名は後から合算した側を優先）。"""
+        with self._lock:
+            if other.llm_turns:
+                self.model = other.model
+            self.prompt_tokens += other.prompt_tokens
+            self.completion_tokens += other.completion_tokens
+            self.cached_tokens += other.cached_tokens
+            self.llm_turns += other.llm_turns
+            self.tool_calls += other.tool_calls
+            self.tool_schema_tokens_saved += other.tool_schema_tokens_saved
+
+    def as_dict(self) -> dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "_lock"}
+
+
+_current: ContextVar[RunUsage | None] = ContextVar("slack_agent_run_usage", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[RunUsage]:
+    """1 回のエージェント実行分の使用量の集計を開始します（`graph.ainvoke` を囲んで使う）。
+
+    外側にもスコープがある場合、終了時にこのスコープの使用量を外側へ合算します
+    （バッチ実行が `invoke_agent` 1 回分の使用量を受け取るため）。
+    """
+    parent = _current.get()
+    usage = RunUsage()
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.merge(usage)
+
+
+def current_usage() -> RunUsage | None:
+    return _current.get()
+
+
+def _model_name(request: ModelRequest[Any], message: AIMessage) -> str | None:
+    name = message.response_metadata.get("model_name") if message.response_metadata else None
+    if name:
+        return str(name)
+    return getattr(request.model, "model_name", None) or getattr(request.model, "model", None)
+
+
+class UsageAccountingMiddleware(AgentMiddleware[Any, Any]):
+    """モデル呼び出しの応答ごとに、実行中の `RunUsage` へ使用量を加算する。"""
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest[Any],
+        handler: Callable[[ModelRequest[Any]], Awaitable[ModelResponse[Any]]],
+    ) -> ModelResponse[Any] | AIMessage:
+        response = await handler(request)
+        usage = _current.get()
+        if usage is not None:
+            messages = [response] if isinstance(response, AIMessage) else response.result
+            for message in messages:
+                if isinstance(message, AIMessage):
+                    model = _model_name(request, message)
+                    usage.add_message(message, model if isinstance(model, str) else None)
+        return response
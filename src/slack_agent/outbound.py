@@ -0,0 +1,272 @@
+"""Slack への投稿をチャンネルごとのキューで送る送信スケジューラ。
+
+Slack の投稿はチャンネルあたりおおむね 1 件/秒に制限されており、同じチャンネルで回答が
+重なったり長い回答を分割したりすると `ratelimited` で弾かれる。`OutboundScheduler` は
+すべての投稿・更新をチャンネル別のキューに積み、次の条件で 1 本のディスパッチャから送る。
+
+- 同じチャンネルへは `channel_interval_seconds` 以上の間隔を空け、同時に 1 件だけ送る
+  （異なるチャンネルは `workers` 件まで並行）
+- 同じメッセージへの未送信の `chat.update` は最新の内容 1 件にまとめる
+- 長い本文は `split_message` で分割し、分割した断片は続けて（順番どおりに）送る
+- `ratelimited` 応答は `Retry-After` だけそのチャンネルを止めてから再送する
+
+送信そのもの（`say` や `client.chat_update`）は呼び出し側が関数として渡す。
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from slack_sdk.errors import SlackApiError
+
+from . import metrics
+from .config import OutboundSettings
+from .text import split_message
+
+logger = logging.getLogger(__name__)
+
+# Retry-After が無い ratelimited 応答で待つ秒数
+DEFAULT_RETRY_AFTER = 1.0
+
+_QUEUE_SECONDS = metrics.histogram(
+    "slack_agent_outbound_queue_seconds",
+    "投稿をキューに積んでから送信を始めるまでの待ち時間（秒）",
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0),
+)
+_QUEUE_DEPTH = metrics.gauge(
+    "slack_agent_outbound_queue_depth", "送信待ちの投稿・更新の件数（全チャンネル合計）"
+)
+_SENT = metrics.counter("slack_agent_outbound_sent_total", "Slack へ送信した件数（kind 別）")
+_COALESCED = metrics.counter(
+    "slack_agent_outbound_coalesced_total", "新しい内容で置き換えて送らずに済んだ更新の件数"
+)
+_RATELIMITED = metrics.counter(
+    "slack_agent_outbound_ratelimited_total", "ratelimited 応答を受けて再送した件数"
+)
+
+Send = Callable[[str], Any]
+
+
+@dataclass
+class _Item:
+    kind: str
+    text: str
+    send: Send
+    enqueued_at: float
+    key: Hashable | None = None
+    attempts: int = 0
+    futures: list[Future[Any]] = field(default_factory=list)
+
+
+@dataclass
+class _Channel:
+    items: deque[_Item] = field(default_factory=deque)
+    next_at: float = 0.0
+    busy: bool = False
+
+
+def _retry_after(error: SlackApiError) -> float | None:
+    """ratelimited 応答なら待つべき秒数、それ以外は None。"""
+    response = getattr(error, "response", None)
+    if response is None or response.get("error") != "ratelimited":
+        return None
+    headers = getattr(response, "headers", None) or {}
+    for name, value in headers.items():
+        if str(name).lower() == "retry-after":
+            try:
+                return max(0.0, float(value))
+            except (TypeError, ValueError):
+                break
+    return DEFAULT_RETRY_AFTER
+
+
+class OutboundScheduler:
+    """チャンネル別キューで Slack への投稿・更新を送るスケジューラ（スレッドセーフ）。
+
+    ディスパッチャのスレッドは最初の投入時に起動します。
+    """
+
+    def __init__(
+        self,
+        settings: OutboundSettings | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.settings = settings or OutboundSettings()
+        self._clock = clock
+        self._channels: dict[str, _Channel] = {}
+        self._cond = threading.Condition()
+        self._depth = 0
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.settings.workers, thread_name_prefix="slack-outbound"
+        )
+
+    # --- 投入 -----------------------------------------------------------------
+
+    def post(self, channel: str, text: str, send: Send) -> list[Future[Any]]:
+        """本文を必要に応じて分割し、断片ごとの送信完了 Future を順番どおりに返します。
+
+        `send(text)` はディスパッチャのワーカースレッドから呼ばれます。
+        """
+        chunks = split_message(text, self.settings.max_chars)
+        now = self._clock()
+        items = [_Item("post", chunk, send, now) for chunk in chunks]
+        with self._cond:
+            self._ensure_running()
+            queue = self._channels.setdefault(channel, _Channel())
+            for item in items:
+                item.futures.append(Future())
+                queue.items.append(item)
+            self._set_depth(len(items))
+            self._cond.notify()
+        return [item.futures[0] for item in items]
+
+    def update(self, channel: str, ts: str, text: str, send: Send) -> Future[Any]:
+        """既存メッセージ `ts` の更新を積みます。
+
+        同じ `ts` の更新がまだ送られずに残っていれば、その内容を置き換えて 1 件にまとめます
+        （置き換えられた側の Future も最新の内容の送信完了で解決）。更新は分割できないため、
+        上限を超える本文は末尾を切り詰めます。
+        """
+        limit = self.settings.max_chars
+        if len(text) > limit:
+            text = text[: limit - 1] + "…"
+        future: Future[Any] = Future()
+        key = ("update", ts)
+        with self._cond:
+            self._ensure_running()
+            queue = self._channels.setdefault(channel, _Channel())
+            for pending in queue.items:
+                if pending.key == key:
+                    pending.text = text
+                    pending.send = send
+                    pending.futures.append(future)
+                    _COALESCED.inc()
+                    return future
+            item = _Item("update", text, send, self._clock(), key=key, futures=[future])
+            queue.items.append(item)
+            self._set_depth(1)
+            self._cond.notify()
+        return future
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def pending(self) -> int:
+        """送信待ち（送信中を除く）の件数。"""
+        with self._cond:
+            return self._depth
+
+    def close(self, timeout: float | None = None) -> None:
+        """新しい投入を止め、送信待ちを送り切ってからディスパッチャを終了します。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        # 期限内に送り切れなかった場合は送信中のワーカーを待たずに戻る
+        self._pool.shutdown(wait=thread is None or not thread.is_alive())
+
+    # --- ディスパッチ -----------------------------------------------------------
+
+    def _set_depth(self, delta: int) -> None:
+        self._depth += delta
+        _QUEUE_DEPTH.set(self._depth)
+
+    def _ensure_running(self) -> None:
+        if self._closed:
+            raise RuntimeError("送信スケジューラは停止済みです")
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="slack-outbound-dispatcher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                ready = self._wait_ready()
+                if ready is None:
+                    return
+                for channel, queue in ready:
+                    item = queue.items.popleft()
+                    queue.busy = True
+                    self._set_depth(-1)
+                    self._pool.submit(self._deliver, channel, queue, item)
+
+    def _wait_ready(self) -> list[tuple[str, _Channel]] | None:
+        """送信できるチャンネルが現れるまで待ちます（停止済みで空なら None）。"""
+        while True:
+            now = self._clock()
+            ready: list[tuple[str, _Channel]] = []
+            wait: float | None = None
+            busy = False
+            for channel, queue in list(self._channels.items()):
+                busy = busy or queue.busy
+                if queue.busy:
+                    continue
+                if not queue.items:
+                    if queue.next_at <= now:
+                        del self._channels[channel]
+                    continue
+                if queue.next_at <= now:
+                    ready.append((channel, queue))
+                else:
+                    delay = queue.next_at - now
+                    wait = delay if wait is None else min(wait, delay)
+            if ready:
+                return ready
+            if self._closed and self._depth == 0 and not busy:
+                return None
+            self._cond.wait(timeout=wait)
+
+    def _deliver(self, channel: str, queue: _Channel, item: _Item) -> None:
+        _QUEUE_SECONDS.observe(max(0.0, self._clock() - item.enqueued_at), kind=item.kind)
+        retry: float | None = None
+        try:
+            result = item.send(item.text)
+        except SlackApiError as e:
+            retry = _retry_after(e)
+            if retry is None or item.attempts >= self.settings.max_retries:
+                self._fail(item, e)
+        except Exception as e:  # noqa: BLE001 - 呼び出し側の Future で受け取る
+            self._fail(item, e)
+        else:
+            _SENT.inc(kind=item.kind)
+            for future in item.futures:
+                if not future.done():
+                    future.set_result(result)
+        with self._cond:
+            queue.busy = False
+            if retry is not None and item.attempts < self.settings.max_retries:
+                item.attempts += 1
+                _RATELIMITED.inc(kind=item.kind)
+                logger.warning(
+                    "Slack rate limited channel=%s; retry after %.1fs (attempt %d)",
+                    channel,
+                    retry,
+                    item.attempts,
+                )
+                queue.items.appendleft(item)
+                self._set_depth(1)
+                queue.next_at = self._clock() + retry
+            else:
+                queue.next_at = self._clock() + self.settings.channel_interval_seconds
+            self._channels.setdefault(channel, queue)
+            self._cond.notify()
+
+    @staticmethod
+    def _fail(item: _Item, error: BaseException) -> None:
+        for future in item.futures:
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,272 @@
+"""遅いメンション 1 件分だけを対象にしたサンプリングプロファイラ。
+
+`RequestProfiler.watch()` でメンションの処理（`invoke_agent` の実行）を囲むと、
+処理が `PROFILE_THRESHOLD_SECONDS` を超えた時点から完了まで、そのリクエストの
+非同期タスクのスタックを一定間隔で採取し、collapsed stack 形式（flamegraph.pl /
+speedscope / inferno で読める `frame;frame;frame count`）のファイルに書き出す。
+
+- 背景ループのタスクのうち、`instrument()` で包んだコルーチンとそこから作られた子タスク
+  （contextvar を引き継ぐ）だけを対象にする。同じループ上の他のメンションは混ざらない
+- 実行中のタスクはスレッドのスタック（`[running]`）、待機中のタスクは await の連鎖
+  （`[waiting]`。末尾に待っている Future / Task の種類）として数える（wall-clock）
+- 閾値に達しないリクエストでは、期限の登録と解除だけでサンプリングは行わない
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+from typing import Any, TypeVar
+
+from . import metrics
+from .background import BackgroundLoop, default_loop
+from .config import ProfileSettings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_PROFILES = metrics.counter(
+    "slack_agent_profiles_written_total", "閾値を超えたメンションのプロファイルを書き出した件数"
+)
+
+_current: ContextVar[Watch | None] = ContextVar("slack_agent_profile_watch", default=None)
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class Watch:
+    """プロファイル対象のリクエスト 1 件分の状態。"""
+
+    def __init__(self, tags: dict[str, str], started: float, deadline: float) -> None:
+        self.tags = tags
+        self.started = started
+        self.deadline = deadline
+        self.sampling = False
+        self.finished = False
+        self.truncated = False
+        self.ticks = 0
+        self.stacks: Counter[str] = Counter()
+
+    def instrument(self, coro: Coroutine[Any, Any, T]) -> Coroutine[Any, Any, T]:  # noqa: UP047
+        """コルーチンをこのリクエストのタスクとして印を付けて実行するよう包みます。"""
+        return _tagged(self, coro)
+
+
+async def _tagged(watch: Watch, coro: Coroutine[Any, Any, T]) -> T:  # noqa: UP047
+    token = _current.set(watch)
+    try:
+        return await coro
+    finally:
+        _current.reset(token)
+
+
+class _NoopWatch(Watch):
+    def instrument(self, coro: Coroutine[Any, Any, T]) -> Coroutine[Any, Any, T]:  # noqa: UP047
+        return coro
+
+
+_NOOP = _NoopWatch({}, 0.0, 0.0)
+
+
+# --- スタックの採取 -------------------------------------------------------------
+
+_short_names: dict[str, str] = {}
+
+
+def _short(filename: str) -> str:
+    """ファイル名を sys.path からの相対パスに縮めます。"""
+    short = _short_names.get(filename)
+    if short is None:
+        short = filename
+        for base in sorted((p for p in sys.path if p), key=len, reverse=True):
+            if filename.startswith(base.rstrip("/") + "/"):
+                short = filename[len(base.rstrip("/")) + 1 :]
+                break
+        _short_names[filename] = short
+    return short
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = f"{code.co_qualname} ({_short(code.co_filename)}:{frame.f_lineno})"
+    return name.replace(";", ":")
+
+
+def _thread_stack(frame: FrameType | None) -> list[str]:
+    """スレッドのスタック（根 → 葉）。イベントループ自身のフレームは除きます。"""
+    frames: list[FrameType] = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    start = 0
+    for i, f in enumerate(frames):
+        if f.f_code.co_name == "_run" and f.f_code.co_filename.endswith("events.py"):
+            start = i + 1
+    return [_label(f) for f in frames[start:]]
+
+
+def _await_stack(coro: Any) -> list[str]:
+    """待機中のコルーチンの await の連鎖（根 → 葉）。"""
+    labels: list[str] = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        frame = frame or getattr(coro, "ag_frame", None)
+        if frame is None:
+            # コルーチン以外（Future の待機など）に達したら種類だけ残す
+            name = type(coro).__name__
+            labels.append(f"[await {'Future' if name == 'FutureIter' else name}]")
+            break
+        labels.append(_label(frame))
+        awaited = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        coro = awaited or getattr(coro, "ag_await", None)
+    return labels
+
+
+class RequestProfiler:
+    """閾値を超えたリクエストだけをサンプリングするプロファイラ（スレッドセーフ）。
+
+    サンプリング用のスレッドは最初の `watch()` で起動します。
+    """
+
+    def __init__(
+        self,
+        settings: ProfileSettings | None = None,
+        loop: BackgroundLoop | None = None,
+    ) -> None:
+        self.settings = settings or ProfileSettings()
+        self._loop = loop or default_loop()
+        self._cond = threading.Condition()
+        self._watches: list[Watch] = []
+        self._thread: threading.Thread | None = None
+
+    @contextmanager
+    def watch(self, **tags: str | None) -> Iterator[Watch]:
+        """ブロック内の処理を監視します。閾値を超えていれば終了時にファイルを書き出します。
+
+        `tags`（channel / thread_ts など）はファイル名とログに使います。
+        """
+        if not self.settings.enabled:
+            yield _NOOP
+            return
+        now = time.monotonic()
+        watch = Watch(
+            {k: str(v) for k, v in tags.items() if v}, now, now + self.settings.threshold_seconds
+        )
+        with self._cond:
+            self._ensure_running()
+            self._watches.append(watch)
+            self._cond.notify()
+        try:
+            yield watch
+        finally:
+            with self._cond:
+                watch.finished = True
+                self._watches.remove(watch)
+            if watch.stacks:
+                self._write(watch, time.monotonic() - watch.started)
+
+    # --- サンプリング -----------------------------------------------------------
+
+    def _ensure_running(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="slack-agent-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        interval = self.settings.interval_seconds
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                active: list[Watch] = []
+                wait: float | None = None
+                for w in self._watches:
+                    if w.truncated:
+                        continue
+                    if now - w.deadline > self.settings.max_seconds:
+                        w.truncated = True
+                    elif now >= w.deadline:
+                        w.sampling = True
+                        active.append(w)
+                    else:
+                        delay = w.deadline - now
+                        wait = delay if wait is None else min(wait, delay)
+                if not active:
+                    # 閾値に達したリクエストが無い間は次の期限（または新しい登録）まで眠る
+                    self._cond.wait(timeout=wait)
+                    continue
+            self._sample(active)
+            time.sleep(interval)
+
+    def _sample(self, watches: list[Watch]) -> None:
+        loop = self._loop.loop
+        if loop is None:
+            return
+        wanted = {id(w): w for w in watches}
+        running = asyncio.current_task(loop)
+        ident = self._loop.thread_ident
+        try:
+            tasks = list(asyncio.all_tasks(loop))
+        except RuntimeError:  # 別スレッドでの作成・完了と競合した場合は次の周期で取り直す
+            return
+        samples: list[tuple[Watch, str]] = []
+        for task in tasks:
+            watch = task.get_context().get(_current)
+            if watch is None or id(watch) not in wanted:
+                continue
+            if task is running and ident is not None:
+                frame = sys._current_frames().get(ident)
+                stack = ["[running]", *_thread_stack(frame)]
+            else:
+                stack = ["[waiting]", *_await_stack(task.get_coro())]
+            samples.append((watch, ";".join(stack)))
+        with self._cond:
+            for w in watches:
+                w.ticks += 1
+            for watch, collapsed in samples:
+                if not watch.finished:
+                    watch.stacks[collapsed] += 1
+
+    # --- 書き出し ---------------------------------------------------------------
+
+    def _write(self, watch: Watch, seconds: float) -> Path | None:
+        directory = Path(self.settings.dir or ".")
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        tag = "-".join(_UNSAFE.sub("_", watch.tags[k]) for k in sorted(watch.tags))
+        path = directory / f"mention-{stamp}{'-' + tag if tag else ''}.collapsed"
+        lines = [f"{stack} {count}" for stack, count in sorted(watch.stacks.items())]
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            self._prune(directory)
+        except OSError as e:
+            logger.warning("Failed to write profile %s: %s", path, e)
+            return None
+        _PROFILES.inc()
+        logger.warning(
+            "Slow mention profiled: seconds=%.2f samples=%d truncated=%s path=%s",
+            seconds,
+            watch.ticks,
+            watch.truncated,
+            path,
+            extra={"profile": {**watch.tags, "path": str(path), "seconds": round(seconds, 3)}},
+        )
+        return path
+
+    def _prune(self, directory: Path) -> None:
+        files = sorted(directory.glob("mention-*.collapsed"), key=lambda p: p.stat().st_mtime)
+        for old in files[: max(0, len(files) - self.settings.max_files)]:
+            old.unlink(missing_ok=True)
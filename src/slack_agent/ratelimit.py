@@ -0,0 +1,175 @@
+"""OpenAI のクォータ（TPM / RPM）に合わせたクライアント側の流量制御と再試行の待ち時間。
+
+- `TokenBucket`: 1 分あたりの上限を秒あたりの補充量に換算したトークンバケット（asyncio 用）
+- `ModelRateLimiter`: リクエスト数とトークン数の 2 つのバケットを FIFO で待ち、
+  クォータを超える分は 429 を受ける前にクライアント側で待たせる。実際の使用量が分かった後に
+  見積もりとの差を精算し、429 の Retry-After を受けたら全リクエストをその間止める
+- `estimate_tokens`: 送信前の入力トークン数の概算（tokenizer を使わない文字数ベース）
+- `backoff_delay`: フルジッター付き指数バックオフ（Retry-After がそれより長ければそちら）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import time
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from . import metrics
+
+_WAIT_SECONDS = metrics.histogram(
+    "slack_agent_model_limiter_wait_seconds",
+    "TPM / RPM 制限によりモデル呼び出しを待たせた時間（秒）",
+    (0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+_TOKENS = metrics.counter(
+    "slack_agent_model_limiter_tokens_total", "流量制御で計上したトークン数（kind 別）"
+)
+
+
+class TokenBucket:
+    """`per_minute` を上限に、秒あたり `per_minute / 60` ずつ補充されるバケット。
+
+    残量は負になり得る（見積もりより多く使った分の精算）。負の間は補充されるまで待つ。
+    """
+
+    def __init__(self, per_minute: float, clock: Any = time.monotonic) -> None:
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def wait_time(self, amount: float) -> float:
+        """`amount` を取り出せるまでの秒数（0 なら即時）。上限を超える要求は上限として扱う。"""
+        self._refill()
+        needed = min(amount, self.capacity) - self._tokens
+        return 0.0 if needed <= 0 else needed / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """見積もりとの差を精算します（正なら追加消費、負なら返却）。"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class ModelRateLimiter:
+    """TPM / RPM のバケットを FIFO で待つ流量制御（1 つのイベントループ上で使う）。
+
+    上限 0 のバケットは持たない（制限なし）。
+    """
+
+    def __init__(self, tpm: int = 0, rpm: int = 0) -> None:
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+
+    async def acquire(self, tokens: int) -> float:
+        """1 リクエスト分（見積もり `tokens`）を確保するまで待ち、待った秒数を返します。"""
+        started = time.monotonic()
+        # 先に並んだリクエストから順に確保し、大きな要求が後続に追い越され続けないようにする
+        async with self._lock:
+            while True:
+                wait = max(0.0, self._blocked_until - time.monotonic())
+                if self.tokens is not None:
+                    wait = max(wait, self.tokens.wait_time(tokens))
+                if self.requests is not None:
+                    wait = max(wait, self.requests.wait_time(1))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            if self.requests is not None:
+                self.requests.take(1)
+        waited = time.monotonic() - started
+        _WAIT_SECONDS.observe(waited)
+        _TOKENS.inc(tokens, kind="estimated")
+        return waited
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """実際の使用トークン数が分かった後に見積もりとの差を精算します。"""
+        _TOKENS.inc(actual, kind="actual")
+        if self.tokens is not None:
+            self.tokens.adjust(actual - estimated)
+
+    def block_for(self, seconds: float) -> None:
+        """429 の Retry-After を受けたとき、全リクエストを `seconds` 秒止めます。"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def _text_tokens(text: str) -> int:
+    # ASCII は 4 文字 ≒ 1 トークン、日本語など非 ASCII は 1 文字 ≒ 1 トークンで概算する
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part if isinstance(part, str) else str(part.get("text", ""))
+            for part in content
+            if isinstance(part, str | dict)
+        )
+    return str(content or "")
+
+
+def estimate_tokens(
+    messages: Iterable[Any],
+    tools: Iterable[Any] = (),
+    output_tokens: int = 0,
+) -> int:
+    """送信前に 1 リクエストのトークン数を概算します（入力 + `output_tokens`）。
+
+    メッセージ本文・tool_calls の引数・ツール定義（名前・説明・引数スキーマ）を数え、
+    メッセージごとの固定オーバーヘッドを加えます。tokenizer より多めに見積もる方向の近似で、
+    実際の使用量は `ModelRateLimiter.settle()` で精算します。
+    """
+    total = output_tokens
+    for message in messages:
+        total += 4 + _text_tokens(_content_text(getattr(message, "content", message)))
+        for call in getattr(message, "tool_calls", None) or ():
+            total += _text_tokens(json.dumps(call.get("args", {}), ensure_ascii=False))
+    for tool in tools:
+        if isinstance(tool, Mapping):
+            total += _text_tokens(json.dumps(tool, ensure_ascii=False, default=str))
+            continue
+        schema = getattr(tool, "args", None) or {}
+        spec = {
+            "name": getattr(tool, "name", ""),
+            "description": getattr(tool, "description", ""),
+            "args": schema,
+        }
+        total += _text_tokens(json.dumps(spec, ensure_ascii=False, default=str))
+    return total
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float | None = None) -> float:
+    """`attempt` 回目（0 始まり）の再試行までの待ち秒数。
+
+    フルジッター（0〜min(cap, base × 2^attempt) の一様乱数）で再試行の時刻を散らし、
+    同時に 429 を受けたリクエストが揃って再送する（再試行の増幅）のを避ける。
+    サーバーが Retry-After を返した場合はそれより早くは再送しない。
+    """
+    delay = random.uniform(0.0, min(cap, base * (2**attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,38 @@
+"""パイプライン内で受け渡すコンパクトなメッセージレコード。
+
+Slack API が返すメッセージ辞書には blocks / attachments / reactions / files などが含まれ、
+そのまま持ち回るとスレッド 1 件あたりのメモリと処理量が膨らむ。API 境界（履歴取得の直後）で
+必要な 4 項目だけの `ThreadMessage` に変換し、以降の履歴フィルタ・正規化・ロール割り当て
+（`agent.invoke_agent`）はこのレコードだけを扱う。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, replace
+from typing import Any
+
+
+@dataclass(frozen=True, slots=True)
+class ThreadMessage:
+    """スレッド内の 1 メッセージ（ts / 投稿者 / Bot か / 本文）。"""
+
+    ts: str
+    user: str | None
+    is_bot: bool
+    text: str
+
+    @classmethod
+    def from_slack(cls, raw: Mapping[str, Any]) -> ThreadMessage:
+        """Slack のメッセージ辞書から必要な項目だけを取り出します。"""
+        user = raw.get("user")
+        return cls(
+            ts=str(raw.get("ts", "")),
+            user=str(user) if user else None,
+            is_bot=bool(raw.get("bot_id")),
+            text=str(raw.get("text") or ""),
+        )
+
+    def with_text(self, text: str) -> ThreadMessage:
+        """本文だけを差し替えたレコードを返します（正規化後の置き換え用）。"""
+        return replace(self, text=text)
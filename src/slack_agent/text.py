@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import re
+from collections.abc import Mapping
 from typing import Final
 
 DEFAULT_EMPTY_MESSAGE: Final[str] = "(no message)"
@@ -18,3 +19,111 @@ def clean_mention_text(text: str) -> str:
     # 先頭のメンション（<@U...>）とその前後の空白のみを除去し、内部の空白は保持する
     cleaned = _LEADING_MENTION_RE.sub("", text, count=1).strip()
     return cleaned if cleaned else DEFAULT_EMPTY_MESSAGE
+
+
+# --- Slack mrkdwn の正規化 ------------------------------------------------------
+# `<@U123>` / `<#C123|name>` / `<https://...|label>` などの制御トークンを、LLM に渡す前に
+# 読みやすく短い形へ置き換える。ユーザー名・チャンネル名は呼び出し側が解決済みの
+# 対応表（`SlackDirectory` のキャッシュ）を渡し、ここでは Slack API を呼ばない。
+
+_TOKEN_RE: Final[re.Pattern[str]] = re.compile(r"<([^<>]+)>")
+_USER_ID_RE: Final[re.Pattern[str]] = re.compile(r"<@([UW][A-Z0-9]+)(?:\|[^>]*)?>")
+_CHANNEL_ID_RE: Final[re.Pattern[str]] = re.compile(r"<#([CGD][A-Z0-9]+)(?:\|[^>]*)?>")
+
+
+def mentioned_ids(text: str) -> tuple[set[str], set[str]]:
+    """テキスト中のユーザー ID とチャンネル ID（名前解決が必要なもの）を返します。"""
+    users = set(_USER_ID_RE.findall(text))
+    channels = {m.group(1) for m in _CHANNEL_ID_RE.finditer(text) if "|" not in m.group(0)}
+    return users, channels
+
+
+def _replace_token(token: str, users: Mapping[str, str], channels: Mapping[str, str]) -> str:
+    body, _, label = token.partition("|")
+    if body.startswith("@"):
+        uid = body[1:]
+        return "@" + (users.get(uid) or label or uid)
+    if body.startswith("#"):
+        cid = body[1:]
+        return "#" + (label or channels.get(cid) or cid)
+    if body.startswith("!"):
+        # <!here> / <!channel> / <!subteam^S123|@team> / <!date^...|fallback>
+        return label or "@" + body[1:].split("^", 1)[0]
+    if body.startswith("mailto:"):
+        return label or body[len("mailto:") :]
+    if label and label != body:
+        return f"{label} ({body})"
+    return body
+
+
+def normalize_slack_text(
+    text: str,
+    users: Mapping[str, str] | None = None,
+    channels: Mapping[str, str] | None = None,
+) -> str:
+    """Slack mrkdwn の制御トークンを読みやすい形に置き換え、HTML エスケープを戻します。
+
+    - `<@U123>` → `@表示名`（未解決なら `@U123`）
+    - `<#C123|general>` / `<#C123>` → `#general`
+    - `<https://example.com|ラベル>` → `ラベル (https://example.com)`、ラベル無しは URL のみ
+    - `<!here>` → `@here`、`<!subteam^S1|@team>` → `@team`、`<mailto:a@b|a@b>` → `a@b`
+    """
+    if "<" not in text and "&" not in text:
+        return text
+    users = users or {}
+    channels = channels or {}
+    replaced = _TOKEN_RE.sub(lambda m: _replace_token(m.group(1), users, channels), text)
+    return replaced.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def strip_leading_mention(text: str) -> str:
+    """先頭のメンションを除去してトリミングします（空なら空文字のまま返す）。"""
+    return _LEADING_MENTION_RE.sub("", text, count=1).strip()
+
+
+# --- 長い応答の分割 -------------------------------------------------------------
+# Slack の `text` は 4,000 文字を超えると切り詰められる（40,000 文字超は投稿自体が失敗）。
+# 段落 → 行 → 空白の順で区切り位置を探し、コードブロック（```）の途中で切る場合は
+# 前半を閉じて後半で開き直し、各メッセージ単体でも崩れずに表示されるようにする。
+
+SLACK_TEXT_LIMIT: Final[int] = 4000
+_FENCE: Final[str] = "```"
+
+
+def _cut_point(text: str, limit: int) -> int:
+    window = text[:limit]
+    for sep in ("\n\n", "\n", " "):
+        at = window.rfind(sep)
+        # 先頭付近でしか区切れない場合は細かく割れすぎるので次の候補へ
+        if at >= limit // 2:
+            return at + len(sep)
+    return limit
+
+
+def split_message(text: str, limit: int = SLACK_TEXT_LIMIT) -> list[str]:
+    """`limit` 文字以内の断片に分割します（分割不要ならそのまま 1 要素で返す）。
+
+    - 段落（空行）・改行・空白の順で区切り位置を探し、見つからなければ文字数で切る
+    - コードブロックの途中で切れる断片は末尾で閉じ、次の断片の先頭で開き直す
+    """
+    if len(text) <= limit:
+        return [text]
+    # 開き直し・閉じ直しの分の余白を確保する
+    budget = max(1, limit - 2 * (len(_FENCE) + 1))
+    chunks: list[str] = []
+    rest = text
+    in_fence = False
+    while rest:
+        prefix = _FENCE + "\n" if in_fence else ""
+        if len(prefix) + len(rest) <= limit:
+            chunks.append(prefix + rest)
+            break
+        at = _cut_point(rest, budget)
+        head, rest = rest[:at], rest[at:]
+        if head.count(_FENCE) % 2 == 1:
+            in_fence = not in_fence
+        chunk = prefix + head.rstrip("\n")
+        if in_fence:
+            chunk += "\n" + _FENCE
+        chunks.append(chunk)
+    return [c for c in chunks if c.strip()]
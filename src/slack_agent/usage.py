@@ -0,0 +1,326 @@
+"""トークン使用量とコストのチャンネル別・ユーザー別・モデル別・ワークスペース別の集計。
+
+`invoke_agent` が実行ごとの `RunUsage`（`middleware/usage.py`）を `UsageLedger.record()` に渡す。
+
+- 累計: `slack_agent_llm_tokens_total{model,kind}` / `slack_agent_llm_cost_usd_total{model}`
+- 直近の時間窓（`USAGE_WINDOWS_MINUTES`）: 1 分単位のバケットを持ち、`/metrics` の出力時に
+  `slack_agent_usage_window_*{window,dimension,key}` のゲージへ反映する
+- 日次集計: 日付ごとの合計を `USAGE_ROLLUP_DIR/usage-YYYY-MM-DD.json` に一定間隔で書き出す
+  （同じ日に再起動した場合は既存ファイルの値に加算を続ける）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Mapping
+from dataclasses import asdict, dataclass, fields
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any
+
+from . import metrics
+from .background import add_shutdown_hook
+from .config import DEFAULT_WORKSPACE, UsageSettings
+from .memory import MEMORY
+from .middleware.usage import RunUsage
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("channel", "user", "model", "workspace")
+
+_TOKENS = metrics.counter("slack_agent_llm_tokens_total", "LLM のトークン使用量（kind 別）")
+_COST = metrics.counter("slack_agent_llm_cost_usd_total", "LLM の推定コスト（USD）")
+_TURNS = metrics.histogram(
+    "slack_agent_llm_turns", "1 回の応答あたりの LLM 呼び出し回数", (1, 2, 3, 4, 6, 8, 12, 16)
+)
+_TOOL_CALLS = metrics.histogram(
+    "slack_agent_agent_tool_calls", "1 回の応答あたりのツール呼び出し数", (0, 1, 2, 4, 8, 16, 32)
+)
+_WINDOW_TOKENS = metrics.gauge(
+    "slack_agent_usage_window_tokens", "直近の時間窓のトークン使用量（入力 + 出力）"
+)
+_WINDOW_COST = metrics.gauge("slack_agent_usage_window_cost_usd", "直近の時間窓の推定コスト（USD）")
+_WINDOW_REQUESTS = metrics.gauge("slack_agent_usage_window_requests", "直近の時間窓の応答数")
+
+
+@dataclass
+class UsageTotals:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    llm_turns: int = 0
+    tool_calls: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: UsageTotals) -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+    @staticmethod
+    def from_dict(data: Mapping[str, Any]) -> UsageTotals:
+        totals = UsageTotals()
+        for f in fields(totals):
+            value = data.get(f.name)
+            if isinstance(value, int | float):
+                setattr(totals, f.name, type(getattr(totals, f.name))(value))
+        return totals
+
+
+def _price_for(
+    model: str, prices: Mapping[str, tuple[float, float, float]]
+) -> tuple[float, float, float] | None:
+    """モデル名に前方一致する最長の単価（`gpt-5-nano-2025-08-07` → `gpt-5-nano`）。"""
+    matches = [name for name in prices if model == name or model.startswith(name + "-")]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(usage: RunUsage, prices: Mapping[str, tuple[float, float, float]]) -> float:
+    """1M トークンあたりの単価から USD を概算します（単価不明のモデルは 0）。"""
+    price = _price_for(usage.model, prices)
+    if price is None:
+        return 0.0
+    input_price, cached_price, output_price = price
+    cached = min(usage.cached_tokens, usage.prompt_tokens)
+    return (
+        (usage.prompt_tokens - cached) * input_price
+        + cached * cached_price
+        + usage.completion_tokens * output_price
+    ) / 1_000_000
+
+
+class _Series:
+    """1 キー分の 1 分単位バケット（最長の時間窓の分だけ保持）。"""
+
+    def __init__(self) -> None:
+        self.buckets: deque[tuple[int, UsageTotals]] = deque()
+
+    def add(self, minute: int, totals: UsageTotals) -> None:
+        if self.buckets and self.buckets[-1][0] == minute:
+            self.buckets[-1][1].add(totals)
+        else:
+            bucket = UsageTotals()
+            bucket.add(totals)
+            self.buckets.append((minute, bucket))
+
+    def prune(self, oldest: int) -> None:
+        while self.buckets and self.buckets[0][0] < oldest:
+            self.buckets.popleft()
+
+    def window(self, since: int) -> UsageTotals:
+        totals = UsageTotals()
+        for minute, bucket in self.buckets:
+            if minute >= since:
+                totals.add(bucket)
+        return totals
+
+
+class UsageLedger:
+    """使用量を時間窓・日次で集計する（スレッドセーフ）。"""
+
+    def __init__(
+        self,
+        settings: UsageSettings | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.settings = settings or UsageSettings()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series: dict[str, OrderedDict[str, _Series]] = {d: OrderedDict() for d in DIMENSIONS}
+        self._day: date | None = None
+        self._daily: dict[str, dict[str, UsageTotals]] = {}
+        self._dirty = False
+        self._last_flush = clock()
+
+    def record(
+        self,
+        usage: RunUsage,
+        channel: str | None,
+        user: str | None,
+        workspace: str | None = None,
+    ) -> UsageTotals:
+        """1 回の実行の使用量を計上し、コストを含む合計を返します。"""
+        totals = UsageTotals(
+            requests=1,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens,
+            llm_turns=usage.llm_turns,
+            tool_calls=usage.tool_calls,
+            cost_usd=estimate_cost(usage, self.settings.prices),
+        )
+        _TOKENS.inc(usage.prompt_tokens, model=usage.model, kind="prompt")
+        _TOKENS.inc(usage.completion_tokens, model=usage.model, kind="completion")
+        _TOKENS.inc(usage.cached_tokens, model=usage.model, kind="cached")
+        _COST.inc(totals.cost_usd, model=usage.model)
+        _TURNS.observe(usage.llm_turns)
+        _TOOL_CALLS.observe(usage.tool_calls)
+
+        now = self._clock()
+        keys = {
+            "channel": channel or "-",
+            "user": user or "-",
+            "model": usage.model,
+            "workspace": workspace or DEFAULT_WORKSPACE,
+        }
+        flush_previous: tuple[date, dict[str, dict[str, UsageTotals]]] | None = None
+        with self._lock:
+            minute = int(now // 60)
+            for dimension, key in keys.items():
+                series = self._series[dimension]
+                entry = series.pop(key, None) or _Series()
+                entry.add(minute, totals)
+                series[key] = entry  # 最近使ったキーを末尾へ
+                while len(series) > self.settings.max_keys:
+                    series.popitem(last=False)
+
+            today = datetime.fromtimestamp(now).date()
+            if self._day != today:
+                if self._day is not None and self._dirty:
+                    flush_previous = (self._day, self._daily)
+                self._day, self._daily = today, self._load_day(today)
+            for dimension, key in [("total", "all"), *keys.items()]:
+                self._daily.setdefault(dimension, {}).setdefault(key, UsageTotals()).add(totals)
+            self._dirty = True
+            due = now - self._last_flush >= self.settings.flush_interval_seconds
+
+        if flush_previous is not None:
+            self._write(*flush_previous)
+        if due:
+            self.flush()
+        return totals
+
+    # --- 時間窓 ---------------------------------------------------------------
+
+    def series_count(self) -> int:
+        """時間窓のために保持しているキー（チャンネル・ユーザー・モデル）の数。"""
+        with self._lock:
+            return sum(len(series) for series in self._series.values())
+
+    def window(self, minutes: int) -> dict[str, dict[str, UsageTotals]]:
+        """直近 `minutes` 分の合計（dimension → key → 合計。0 件のキーは含めない）。"""
+        since = int(self._clock() // 60) - minutes + 1
+        out: dict[str, dict[str, UsageTotals]] = {}
+        with self._lock:
+            for dimension, series in self._series.items():
+                out[dimension] = {}
+                for key, entry in series.items():
+                    totals = entry.window(since)
+                    if totals.requests:
+                        out[dimension][key] = totals
+        return out
+
+    def collect(self) -> None:
+        """時間窓のゲージを現在時刻で更新します（`/metrics` の出力時に呼ばれる）。"""
+        oldest = int(self._clock() // 60) - max(self.settings.windows_minutes) + 1
+        with self._lock:
+            for series in self._series.values():
+                for key in [k for k, entry in series.items() if not _prune(entry, oldest)]:
+                    del series[key]
+        live: set[tuple[str, str, str]] = set()
+        for minutes in self.settings.windows_minutes:
+            window = f"{minutes}m"
+            for dimension, entries in self.window(minutes).items():
+                for key, totals in entries.items():
+                    labels = {"window": window, "dimension": dimension, "key": key}
+                    live.add((window, dimension, key))
+                    _WINDOW_TOKENS.set(totals.total_tokens, **labels)
+                    _WINDOW_COST.set(totals.cost_usd, **labels)
+                    _WINDOW_REQUESTS.set(totals.requests, **labels)
+        for gauge in (_WINDOW_TOKENS, _WINDOW_COST, _WINDOW_REQUESTS):
+            for labels in gauge.label_sets():
+                if (labels.get("window"), labels.get("dimension"), labels.get("key")) not in live:
+                    gauge.remove(**labels)
+
+    # --- 日次集計 -------------------------------------------------------------
+
+    def _path(self, day: date) -> Path | None:
+        if not self.settings.rollup_dir:
+            return None
+        return Path(self.settings.rollup_dir) / f"usage-{day.isoformat()}.json"
+
+    def _load_day(self, day: date) -> dict[str, dict[str, UsageTotals]]:
+        path = self._path(day)
+        if path is None or not path.exists():
+            return {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return {
+                dimension: {key: UsageTotals.from_dict(v) for key, v in entries.items()}
+                for dimension, entries in data.get("usage", {}).items()
+            }
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("Failed to load usage rollup %s: %s", path, e)
+            return {}
+
+    def _write(self, day: date, daily: Mapping[str, Mapping[str, UsageTotals]]) -> None:
+        path = self._path(day)
+        if path is None:
+            return
+        payload = {
+            "date": day.isoformat(),
+            "updated_at": datetime.fromtimestamp(self._clock()).isoformat(timespec="seconds"),
+            "usage": {
+                dimension: {key: asdict(t) for key, t in entries.items()}
+                for dimension, entries in daily.items()
+            },
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Failed to write usage rollup %s: %s", path, e)
+
+    def flush(self) -> bool:
+        """当日の集計をファイルへ書き出します（出力先未設定・変更なしなら何もしない）。"""
+        with self._lock:
+            self._last_flush = self._clock()
+            if not self._dirty or self._day is None:
+                return False
+            day = self._day
+            snapshot = {
+                dimension: {key: UsageTotals.from_dict(asdict(t)) for key, t in entries.items()}
+                for dimension, entries in self._daily.items()
+            }
+            self._dirty = False
+        self._write(day, snapshot)
+        return self._path(day) is not None
+
+
+def _prune(entry: _Series, oldest: int) -> bool:
+    entry.prune(oldest)
+    return bool(entry.buckets)
+
+
+_ledger: UsageLedger | None = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> UsageLedger:
+    """プロセス共有の集計（初回に環境変数から作成し、/metrics と終了処理に登録）。"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(UsageSettings.from_env())
+            metrics.REGISTRY.add_collector(_ledger.collect)
+            add_shutdown_hook(_flush_ledger)
+            MEMORY.register("usage_ledger", lambda: _ledger, _ledger.series_count)
+        return _ledger
+
+
+async def _flush_ledger() -> None:
+    """終了時（背景ループの停止フック）に当日の集計を書き出します。"""
+    if _ledger is not None:
+        await asyncio.to_thread(_ledger.flush)
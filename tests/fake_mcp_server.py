@@ -0,0 +1,59 @@
+"""ストレステスト・ベンチマーク用の偽 MCP サーバー（stdio）。
+
+`search` ツールは `--latency-ms`（+ 0〜`--jitter-ms` の揺らぎ）だけ非同期に待ってから、
+クエリを繰り返した `--payload-kb` の本文とそのダイジェストを返します。呼び出しごとに
+`delay_ms` / `payload_kb` で上書きでき、応答にクエリを含めるため、同じセッションで
+多重化した要求と応答の対応（取り違えがないこと）を検証できます。
+
+    python tests/fake_mcp_server.py [--latency-ms 5] [--jitter-ms 0] [--payload-kb 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+from mcp.server.fastmcp import FastMCP
+
+
+def payload_for(query: str, payload_kb: int) -> str:
+    """クエリから決まる本文（応答の対応付けの検証にも使う）。"""
+    size = payload_kb * 1024
+    unit = f"{query}|"
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def build_server(latency_ms: float, jitter_ms: float, default_payload_kb: int) -> FastMCP:
+    server = FastMCP("fake-search", log_level="WARNING")
+
+    @server.tool()
+    async def search(
+        query: str, delay_ms: float | None = None, payload_kb: int | None = None
+    ) -> str:
+        """指定の遅延の後、クエリから決まる本文を返す検索のダミー。"""
+        delay = latency_ms if delay_ms is None else delay_ms
+        await asyncio.sleep((delay + random.uniform(0.0, jitter_ms)) / 1000)
+        body = payload_for(query, default_payload_kb if payload_kb is None else payload_kb)
+        return json.dumps({"query": query, "digest": digest(body), "document": body})
+
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--payload-kb", type=int, default=1)
+    args = parser.parse_args()
+    build_server(args.latency_ms, args.jitter_ms, args.payload_kb).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""エージェントのテストで共有するフェイクチャットモデル。
+
+`tests/` は pytest により sys.path に入るため、各テストから `from fake_models import ...`
+で利用します。
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+
+class FakeToolModel(GenericFakeChatModel):
+    """ツールバインドを無視して既定の応答列を返すフェイクモデル。"""
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:  # type: ignore[override]
+        return self
+
+
+class RecordingModel(FakeToolModel):
+    """受け取ったメッセージ列（`seen`）とバインドされたツール（`bound`）を記録するフェイクモデル。"""
+
+    seen: list[list[BaseMessage]] = []
+    bound: list[list[Any]] = []
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Any:  # type: ignore[override]
+        self.bound.append(list(tools))
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        self.seen.append(list(messages))
+        return super()._generate(messages, *args, **kwargs)
@@ -0,0 +1,214 @@
+"""受付制御（AdmissionController）と過負荷時の受付拒否のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import types
+from typing import Any
+
+import pytest
+from slack_bolt.request import BoltRequest
+from slack_sdk import WebClient
+from slack_sdk.web import SlackResponse
+
+import slack_agent.answers as answers
+import slack_agent.handlers.message as message_handler
+from slack_agent import metrics
+from slack_agent.admission import AdmissionController, listener_workers
+from slack_agent.bot import build_app
+from slack_agent.config import AdmissionSettings, WorkspaceSettings
+
+
+def test_reserved_slots_are_kept_for_priority_channels() -> None:
+    """通常リクエストは予約枠を使えず、優先チャンネルは使える。"""
+    metrics.REGISTRY.reset()
+    controller = AdmissionController(
+        AdmissionSettings(
+            max_inflight=2, reserved_slots=1, max_queue=0, priority_channels=frozenset({"CVIP"})
+        )
+    )
+
+    normal = controller.acquire(channel="C1")
+    assert normal is not None
+    # 通常枠（1）が埋まり、待ち枠も 0 なので通常リクエストは拒否される
+    assert controller.acquire(channel="C2") is None
+    vip = controller.acquire(channel="CVIP")
+    assert vip is not None and vip.priority
+
+    shed = metrics.counter("slack_agent_admission_shed_total", "")
+    assert shed.value(reason="queue_full", priority="false") == 1
+    controller.release(normal)
+    controller.release(vip)
+    assert controller.inflight == 0
+
+
+def test_predicted_wait_over_threshold_is_shed() -> None:
+    """直近レイテンシから予測した待ち時間が上限を超える場合は待たずに拒否する。"""
+    metrics.REGISTRY.reset()
+    controller = AdmissionController(
+        AdmissionSettings(max_inflight=1, reserved_slots=0, max_queue=10, max_wait_seconds=5.0)
+    )
+    ticket = controller.acquire()
+    assert ticket is not None
+    # 初期レイテンシ推定（10 秒）では 5 秒以内に枠が空く見込みがない
+    started = time.monotonic()
+    assert controller.acquire() is None
+    assert time.monotonic() - started < 0.5
+    shed = metrics.counter("slack_agent_admission_shed_total", "")
+    assert shed.value(reason="latency", priority="false") == 1
+    controller.release(ticket)
+
+
+def test_queued_request_is_admitted_after_release() -> None:
+    """実行待ちのリクエストは枠が空いた時点で受け付けられる。"""
+    controller = AdmissionController(
+        AdmissionSettings(max_inflight=1, reserved_slots=0, max_queue=4, max_wait_seconds=30.0)
+    )
+    controller._latency = 0.1
+    first = controller.acquire()
+    assert first is not None
+
+    results: list[Any] = []
+    waiter = threading.Thread(target=lambda: results.append(controller.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    assert controller.queue_depth == 1
+
+    controller.release(first)
+    waiter.join(timeout=2)
+
+    assert results and results[0] is not None
+    assert controller.queue_depth == 0
+    controller.release(results[0])
+
+
+def test_handler_replies_busy_when_shed(monkeypatch: pytest.MonkeyPatch) -> None:
+    """受付拒否時はエージェントを呼ばずに混雑メッセージをスレッドへ返す。"""
+    monkeypatch.setenv("ADMISSION_MAX_INFLIGHT", "1")
+    monkeypatch.setenv("ADMISSION_RESERVED_SLOTS", "0")
+    monkeypatch.setenv("ADMISSION_MAX_QUEUE", "0")
+    monkeypatch.setenv("ADMISSION_BUSY_MESSAGE", "busy")
+
+    release = threading.Event()
+    invoked: list[str] = []
+
+    async def _fake_invoke(q: str) -> str:
+        invoked.append(q)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return "ok"
+
+    monkeypatch.setattr("slack_agent.handlers.message.invoke_agent", _fake_invoke)
+
+    app = types.SimpleNamespace(client=types.SimpleNamespace(reactions_add=lambda **_: None))
+    handlers: list[Any] = []
+    app.event = lambda _name: lambda func: handlers.append(func) or func
+    message_handler.register(app)  # type: ignore[arg-type]
+    handler = handlers[0]
+
+    said: list[str] = []
+
+    def say(msg: str, thread_ts: str | None = None) -> None:
+        said.append(msg)
+
+    first = threading.Thread(
+        target=handler,
+        kwargs={"event": {"text": "<@U1> a", "channel": "C1", "ts": "1.0"}, "say": say},
+    )
+    first.start()
+    while not invoked:
+        time.sleep(0.01)
+
+    handler(event={"text": "<@U1> b", "channel": "C1", "ts": "2.0"}, say=say)
+    assert said == ["busy"]
+    assert invoked == ["a"]
+
+    release.set()
+    first.join(timeout=2)
+    assert said == ["busy", "ok"]
+
+
+def test_bolt_listener_threads_cover_admission_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    """実際の App のリスナー実行器を通しても、上限を超えた分は Bolt 内で待たずに受付拒否される。"""
+    metrics.REGISTRY.reset()
+    monkeypatch.setenv("ADMISSION_MAX_INFLIGHT", "2")
+    monkeypatch.setenv("ADMISSION_RESERVED_SLOTS", "0")
+    monkeypatch.setenv("ADMISSION_MAX_QUEUE", "3")
+    monkeypatch.setenv("ADMISSION_MAX_WAIT_SECONDS", "60")
+    monkeypatch.setenv("ADMISSION_BUSY_MESSAGE", "busy")
+    monkeypatch.setenv("OUTBOUND_CHANNEL_INTERVAL_SECONDS", "0")
+    monkeypatch.setattr(answers, "_cache", None)
+    monkeypatch.setattr(answers, "_cache_loaded", True)
+
+    posted: list[str] = []
+
+    def _api_call(self: WebClient, api_method: str, **kwargs: Any) -> SlackResponse:
+        params = kwargs.get("json") or kwargs.get("data") or kwargs.get("params") or {}
+        if api_method == "chat.postMessage":
+            posted.append(params["text"])
+        data = {"ok": True, "user_id": "UBOT", "bot_id": "BBOT", "team_id": "T1", "messages": []}
+        return SlackResponse(
+            client=self,
+            http_verb="POST",
+            api_url=api_method,
+            req_args={},
+            data=data,
+            headers={},
+            status_code=200,
+        )
+
+    monkeypatch.setattr(WebClient, "api_call", _api_call)
+    release = threading.Event()
+    started: list[str] = []
+
+    async def _fake_invoke(q: str, **_kwargs: Any) -> str:
+        started.append(q)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return f"answer:{q}"
+
+    monkeypatch.setattr(message_handler, "invoke_agent", _fake_invoke)
+    app = build_app(WorkspaceSettings("default", "xoxb-test", "xapp-test"))
+    assert listener_workers(AdmissionSettings.from_env()) > 5  # Bolt 既定のスレッド数を超える
+
+    def _mention(i: int) -> None:
+        event = {
+            "type": "app_mention",
+            "text": f"<@UBOT> q{i}",
+            "user": "U1",
+            "channel": "C1",
+            "ts": f"{i}.0",
+            "event_ts": f"{i}.0",
+        }
+        payload = {
+            "type": "event_callback",
+            "team_id": "T1",
+            "api_app_id": "A1",
+            "event": event,
+            "event_id": f"Ev{i}",
+            "event_time": 1,
+        }
+        app.dispatch(BoltRequest(body=payload, mode="socket_mode"))
+
+    try:
+        for i in range(9):
+            _mention(i)
+        deadline = time.monotonic() + 5
+        while posted.count("busy") < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # 実行中 2 件 + 実行待ち 3 件を受け付け、残り 4 件は実行器のキューに積まれず即座に拒否される
+        shed = metrics.counter("slack_agent_admission_shed_total", "")
+        assert shed.value(reason="queue_full", priority="false") == 4
+        assert posted.count("busy") == 4 and len(started) == 2
+    finally:
+        release.set()
+        # 残りのメンションを偽の Slack API のうちに処理し終える
+        deadline = time.monotonic() + 5
+        while len(posted) < 9 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert sorted(p for p in posted if p != "busy") == sorted(f"answer:{q}" for q in started)
+    assert len(started) == 5
@@ -7,6 +7,7 @@ from _pytest.monkeypatch import MonkeyPatch
 from langchain_core.messages import AIMessage
 
 import slack_agent.agent as agent_mod
+from slack_agent.records import ThreadMessage
 
 
 class _FakeGraph:
@@ -52,9 +53,9 @@ async def test_invoke_agent_with_history(monkeypatch: MonkeyPatch) -> None:
     monkeypatch.setattr(agent_mod, "get_agent_graph", _fake_get_agent_graph)
 
     history = [
-        {"text": "User: こんにちは"},
-        {"text": "Bot: どうしましたか?", "bot_id": "BXXX"},
-        {"text": "User: 質問があります"},
+        ThreadMessage(ts="1.0", user="U1", is_bot=False, text="User: こんにちは"),
+        ThreadMessage(ts="2.0", user=None, is_bot=True, text="Bot: どうしましたか?"),
+        ThreadMessage(ts="3.0", user="U1", is_bot=False, text="User: 質問があります"),
     ]
 
     result = await agent_mod.invoke_agent("最終の質問", history=history)
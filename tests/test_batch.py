@@ -0,0 +1,229 @@
+"""質問 JSONL のバッチ実行（順序どおりの出力・再開・回答キャッシュの温め）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import sqlite3
+import types
+from pathlib import Path
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import slack_agent.answers as answers
+import slack_agent.batch as batch
+import slack_agent.handlers.message as message_handler
+from slack_agent import metrics
+from slack_agent.answers import AnswerCache
+from slack_agent.batch import BatchItem, completed_ids, most_frequent, read_questions, run_batch
+from slack_agent.config import WorkspaceSettings
+from slack_agent.middleware.usage import usage_scope
+
+
+def _write_questions(path: Path, questions: list[str]) -> None:
+    lines = [json.dumps({"id": f"q{i}", "question": q}) for i, q in enumerate(questions)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _fake_agent(calls: list[str], delays: dict[str, float] | None = None) -> Any:
+    async def _invoke(question: str, **_kwargs: Any) -> str:
+        calls.append(question)
+        await asyncio.sleep((delays or {}).get(question, 0.0))
+        if question == "boom":
+            raise RuntimeError("agent failed")
+        # invoke_agent 内部の使用量スコープは外側（バッチの 1 件分）へ合算される
+        with usage_scope() as usage:
+            usage.add_message(
+                AIMessage(
+                    content="",
+                    usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110},
+                ),
+                model="gpt-5-nano",
+            )
+        return f"answer:{question}"
+
+    return _invoke
+
+
+@pytest.mark.asyncio
+async def test_output_keeps_input_order_and_usage(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[str] = []
+    monkeypatch.setattr(batch, "invoke_agent", _fake_agent(calls, {"slow": 0.2}))
+    items = [BatchItem(str(i), q) for i, q in enumerate(["slow", "fast", "boom", "last"])]
+    out = io.StringIO()
+
+    summary = await run_batch(items, out, concurrency=4)
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["id"] for r in records] == ["0", "1", "2", "3"]
+    # 遅い 1 件目を待つ間に後続の質問も実行されている
+    assert calls.index("fast") < 2
+    assert records[0]["answer"] == "answer:slow" and records[0]["seconds"] >= 0.2
+    assert records[1]["usage"]["prompt_tokens"] == 100
+    assert records[1]["usage"]["cost_usd"] > 0
+    assert records[2]["answer"] is None and "agent failed" in records[2]["error"]
+    assert (summary.answered, summary.failed) == (3, 1)
+
+
+def test_resume_skips_completed_and_truncates_partial_line(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: list[str] = []
+    monkeypatch.setattr(batch, "invoke_agent", _fake_agent(calls))
+    monkeypatch.setattr(batch, "stop_background_loop", lambda: True)
+    questions = tmp_path / "questions.jsonl"
+    _write_questions(questions, ["a", "b", "c", "d"])
+    output = tmp_path / "answers.jsonl"
+    done = [{"id": "q0", "answer": "answer:a"}, {"id": "q1", "answer": "answer:b"}]
+    # クラッシュで 3 件目の途中までしか書けなかった出力
+    output.write_text(
+        "".join(json.dumps(r) + "\n" for r in done) + '{"id": "q2", "ans', encoding="utf-8"
+    )
+
+    assert batch.main([str(questions), "-o", str(output), "-c", "2"]) == 0
+
+    assert calls == ["c", "d"]
+    assert completed_ids(str(output)) == ["q0", "q1", "q2", "q3"]
+
+
+def test_resume_rejects_output_of_another_input(tmp_path: Path) -> None:
+    questions = tmp_path / "questions.jsonl"
+    _write_questions(questions, ["a", "b"])
+    output = tmp_path / "answers.jsonl"
+    output.write_text(json.dumps({"id": "other"}) + "\n", encoding="utf-8")
+
+    items = batch._skip_completed(read_questions(str(questions)), completed_ids(str(output)))
+    with pytest.raises(RuntimeError):
+        list(items)
+
+
+@pytest.mark.asyncio
+async def test_warm_stores_most_frequent_answers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: list[str] = []
+    monkeypatch.setattr(batch, "invoke_agent", _fake_agent(calls))
+    questions = tmp_path / "questions.jsonl"
+    _write_questions(questions, ["VPN の申請", "経費精算", "vpn  の申請", "休暇", "ＶＰＮ の申請"])
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_seconds=3600)
+
+    top = most_frequent(read_questions(str(questions)), 2)
+    assert [(item.question, item.count) for item in top] == [("VPN の申請", 3), ("経費精算", 1)]
+
+    out = io.StringIO()
+    summary = await run_batch(top, out, concurrency=2, cache=cache)
+
+    assert summary.cached == 2 and len(cache) == 2
+    assert json.loads(out.getvalue().splitlines()[0])["count"] == 3
+    assert cache.get("vpn の申請") == "answer:VPN の申請"
+    assert cache.get("休暇") is None
+
+
+def test_handler_answers_top_level_mention_from_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    metrics.REGISTRY.reset()
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_seconds=3600)
+    cache.put("経費精算の締め日は？", "毎月 25 日です")
+    monkeypatch.setattr(answers, "_cache", cache)
+    monkeypatch.setattr(answers, "_cache_loaded", True)
+
+    async def _fail_invoke(*_a: Any, **_k: Any) -> str:
+        raise AssertionError("cached answers must not call the agent")
+
+    monkeypatch.setattr(message_handler, "invoke_agent", _fail_invoke)
+    handlers: list[Any] = []
+    client = types.SimpleNamespace(
+        reactions_add=lambda **_k: None,
+        conversations_replies=lambda **_k: {"messages": []},
+    )
+    app = types.SimpleNamespace(client=client, event=lambda _name: handlers.append)
+    message_handler.register(app)  # type: ignore[arg-type]
+    replies: list[str] = []
+
+    event = {"text": "<@UBOT> 経費精算の締め日は？", "channel": "C1", "ts": "1.0", "user": "U1"}
+    handlers[0](event=event, say=lambda text, **_k: replies.append(text))
+
+    assert replies == ["毎月 25 日です"]
+    mentions = metrics.counter("slack_agent_workspace_mentions_total", "")
+    assert mentions.value(workspace="default", outcome="cached") == 1
+
+
+@pytest.mark.asyncio
+async def test_warmed_answers_are_scoped_to_workspace(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """--workspace で温めた回答はそのワークスペースでだけ返り、別のワークスペースでは外れる。"""
+    calls: list[str] = []
+    monkeypatch.setattr(batch, "invoke_agent", _fake_agent(calls))
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_seconds=3600)
+
+    items = [BatchItem(id="q0", question="VPN の申請")]
+    await run_batch(items, io.StringIO(), concurrency=1, cache=cache, workspace="acme")
+
+    assert cache.get("VPN の申請", "acme") == "answer:VPN の申請"
+    assert cache.get("VPN の申請", "beta") is None
+    assert cache.get("VPN の申請") is None
+
+    # 同じ質問でもワークスペースごとに別の回答を保持する
+    cache.put("VPN の申請", "beta の手順", "beta")
+    assert cache.get("VPN の申請", "acme") == "answer:VPN の申請"
+    assert cache.get("VPN の申請", "beta") == "beta の手順"
+
+
+def test_handler_misses_answers_warmed_for_another_workspace(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    metrics.REGISTRY.reset()
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl_seconds=3600)
+    cache.put("経費精算の締め日は？", "acme の締め日は 25 日です", "acme")
+    monkeypatch.setattr(answers, "_cache", cache)
+    monkeypatch.setattr(answers, "_cache_loaded", True)
+    calls: list[str] = []
+    monkeypatch.setattr(message_handler, "invoke_agent", _fake_agent(calls))
+
+    handlers: dict[str, Any] = {}
+    for name in ("acme", "beta"):
+        client = types.SimpleNamespace(
+            reactions_add=lambda **_k: None,
+            conversations_replies=lambda **_k: {"messages": []},
+        )
+        app = types.SimpleNamespace(
+            client=client,
+            event=lambda _name, name=name: lambda f: handlers.setdefault(name, f),
+        )
+        message_handler.register(
+            app,  # type: ignore[arg-type]
+            WorkspaceSettings(name, f"xoxb-{name}", f"xapp-{name}"),
+        )
+    replies: dict[str, list[str]] = {"acme": [], "beta": []}
+
+    event = {"text": "<@UBOT> 経費精算の締め日は？", "channel": "C1", "ts": "1.0", "user": "U1"}
+    for name in ("acme", "beta"):
+        handlers[name](event=event, say=lambda text, name=name, **_k: replies[name].append(text))
+
+    assert replies["acme"] == ["acme の締め日は 25 日です"]
+    assert replies["beta"] == ["answer:経費精算の締め日は？"]
+    assert calls == ["経費精算の締め日は？"]
+    mentions = metrics.counter("slack_agent_workspace_mentions_total", "")
+    assert mentions.value(workspace="acme", outcome="cached") == 1
+    assert mentions.value(workspace="beta", outcome="answered") == 1
+
+
+def test_legacy_cache_without_workspace_is_rebuilt(tmp_path: Path) -> None:
+    path = str(tmp_path / "answers.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE answers (question TEXT PRIMARY KEY, answer TEXT, stored_at REAL)"
+        )
+        conn.execute("INSERT INTO answers VALUES ('vpn', 'old', 1e12)")
+    conn.close()
+
+    cache = AnswerCache(path, ttl_seconds=3600)
+
+    assert len(cache) == 0 and cache.get("vpn") is None
+    cache.put("vpn", "new")
+    assert cache.get("vpn") == "new"
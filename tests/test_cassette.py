@@ -0,0 +1,167 @@
+"""LLM・MCP 通信のカセット記録と再生（決定的でオフラインな再実行）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fake_models import FakeToolModel
+from langchain_core.messages import AIMessage
+from mcp.types import CallToolResult, TextContent
+
+import slack_agent.agent as agent_mod
+import slack_agent.cassette as cassette_mod
+from slack_agent import metrics
+from slack_agent.cassette import Cassette
+from slack_agent.mcp.cassette import CassetteSession
+
+FAKE_SERVER = str(Path(__file__).with_name("fake_mcp_server.py"))
+
+
+class _FailingModel(FakeToolModel):
+    """呼ばれたら失敗する（再生時にモデルへ接続していないことの確認用）。"""
+
+    async def _agenerate(self, *args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("replay must not call the model")
+
+
+class _SlowSession:
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.calls = 0
+
+    async def call_tool(self, name: str, arguments: dict[str, Any] | None = None) -> Any:
+        self.calls += 1
+        await asyncio.sleep(self.seconds)
+        text = json.dumps({"name": name, "arguments": arguments, "n": self.calls})
+        return CallToolResult(content=[TextContent(type="text", text=text)])
+
+
+def _text(result: CallToolResult) -> str:
+    block = result.content[0]
+    assert isinstance(block, TextContent)
+    return block.text
+
+
+async def _reset_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    await agent_mod._mcp_manager.close()
+    monkeypatch.setattr(agent_mod, "_agent_graph", None)
+    monkeypatch.setattr(agent_mod, "_thread_checkpoints", None)
+    monkeypatch.setattr(cassette_mod, "_cassette", None)
+    monkeypatch.setattr(cassette_mod, "_cassette_loaded", False)
+
+
+@pytest.mark.asyncio
+async def test_recorded_run_replays_offline_with_identical_answer(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "run.cassette.jsonl"
+    servers_file = tmp_path / "servers.json"
+    servers_file.write_text(
+        json.dumps(
+            {
+                "servers": {
+                    "fake": {"command": sys.executable, "args": [FAKE_SERVER, "--latency-ms=50"]}
+                }
+            }
+        ),
+        encoding="utf-8",
+    )
+    monkeypatch.delenv("MCP_SEMCHE_PATH", raising=False)
+    monkeypatch.setenv("AGENT_CHECKPOINT_BACKEND", "none")
+    monkeypatch.setenv("CASSETTE_PATH", str(path))
+
+    # 記録: 実 MCP サーバー（stdio）とフェイクモデルで 1 回実行する
+    model = FakeToolModel(
+        messages=iter(
+            [
+                AIMessage(
+                    content="",
+                    tool_calls=[{"name": "search", "args": {"query": "VPN"}, "id": "c1"}],
+                ),
+                AIMessage(content="VPN は申請が必要です"),
+            ]
+        )
+    )
+    monkeypatch.setattr(agent_mod, "ChatOpenAI", lambda **_kwargs: model)
+    monkeypatch.setenv("CASSETTE_MODE", "record")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("MCP_SERVERS_FILE", str(servers_file))
+    await _reset_agent(monkeypatch)
+    try:
+        recorded = await agent_mod.invoke_agent("VPN の申請方法は？")
+    finally:
+        await _reset_agent(monkeypatch)
+
+    entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [e["kind"] for e in entries].count("model") == 2
+    (call,) = [e for e in entries if e["kind"] == "call_tool"]
+    assert call["arguments"] == {"query": "VPN"} and call["seconds"] >= 0.05
+
+    # 再生: API キーも MCP サーバー設定もなく、モデルを呼ぶと失敗する状態で同じ答えになる
+    metrics.REGISTRY.reset()
+    monkeypatch.setattr(agent_mod, "ChatOpenAI", lambda **_kwargs: _FailingModel(messages=iter([])))
+    monkeypatch.setenv("CASSETTE_MODE", "replay")
+    monkeypatch.setenv("CASSETTE_TIMING_SCALE", "0")
+    monkeypatch.delenv("OPENAI_API_KEY")
+    monkeypatch.delenv("MCP_SERVERS_FILE")
+    await _reset_agent(monkeypatch)
+    try:
+        await agent_mod.get_agent_graph()
+        started = time.perf_counter()
+        replayed = await agent_mod.invoke_agent("VPN の申請方法は？")
+        elapsed = time.perf_counter() - started
+    finally:
+        await _reset_agent(monkeypatch)
+
+    assert replayed == recorded == "VPN は申請が必要です"
+    assert elapsed < 0.05
+    replays = metrics.counter("slack_agent_cassette_total", "")
+    assert replays.value(kind="model", outcome="replayed") == 2
+    assert replays.value(kind="call_tool", outcome="replayed") == 1
+
+
+@pytest.mark.asyncio
+async def test_replay_scales_recorded_timing(tmp_path: Path) -> None:
+    path = str(tmp_path / "timing.jsonl")
+    recorder = Cassette(path, "record")
+    await CassetteSession("s", recorder, _SlowSession(0.2)).call_tool("search", {"q": "a"})  # type: ignore[arg-type]
+    recorder.close()
+
+    for scale, low, high in ((1.0, 0.18, 0.5), (0.25, 0.04, 0.15), (0.0, 0.0, 0.03)):
+        session = CassetteSession("s", Cassette(path, "replay", timing_scale=scale))
+        started = time.perf_counter()
+        await session.call_tool("search", {"q": "a"})
+        assert low <= time.perf_counter() - started < high
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_replay_in_recorded_order(tmp_path: Path) -> None:
+    metrics.REGISTRY.reset()
+    path = str(tmp_path / "order.jsonl")
+    recorder = Cassette(path, "record")
+    session = CassetteSession("s", recorder, _SlowSession(0.0))  # type: ignore[arg-type]
+    for _ in range(2):
+        await session.call_tool("search", {"q": "a"})
+    recorder.close()
+
+    replay = CassetteSession("s", Cassette(path, "replay", timing_scale=0.0))
+    results = [await replay.call_tool("search", {"q": "a"}) for _ in range(3)]
+    numbers = [json.loads(_text(result))["n"] for result in results]
+    # 記録順に返し、使い切った後は最後の応答を繰り返す
+    assert numbers == [1, 2, 2]
+
+    with pytest.raises(RuntimeError, match="記録のない call_tool"):
+        await replay.call_tool("search", {"q": "b"})
+    outcomes = metrics.counter("slack_agent_cassette_total", "")
+    assert outcomes.value(kind="call_tool", outcome="missing") == 1
+
+
+def test_missing_cassette_file_is_an_error(tmp_path: Path) -> None:
+    with pytest.raises(RuntimeError, match="カセットが見つかりません"):
+        Cassette(str(tmp_path / "none.jsonl"), "replay")
@@ -0,0 +1,210 @@
+"""スレッド単位のエージェント状態保持（checkpointer）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from fake_models import RecordingModel
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+import slack_agent.agent as agent_mod
+from slack_agent.checkpoint import ThreadCheckpoints, run_config, thread_id_for
+from slack_agent.config import CheckpointSettings
+from slack_agent.records import ThreadMessage
+
+
+@pytest.fixture
+def checkpointed_graph(monkeypatch: MonkeyPatch) -> tuple[Any, RecordingModel]:
+    model = RecordingModel(
+        messages=iter([AIMessage(content="answer-1"), AIMessage(content="answer-2")])
+    )
+    model.seen = []
+    saver = InMemorySaver()
+    graph = create_agent(model=model, tools=[], checkpointer=saver)
+
+    async def _fake_get_agent_graph() -> Any:
+        return graph
+
+    monkeypatch.setattr(agent_mod, "get_agent_graph", _fake_get_agent_graph)
+    monkeypatch.setattr(
+        agent_mod, "_thread_checkpoints", ThreadCheckpoints(saver, CheckpointSettings())
+    )
+    return graph, model
+
+
+@pytest.mark.asyncio
+async def test_second_mention_resumes_thread_state(
+    checkpointed_graph: tuple[Any, RecordingModel],
+) -> None:
+    """2 回目のメンションは保存済み状態から再開し、履歴を再送しない。"""
+    graph, model = checkpointed_graph
+    key = ("C1", "100.000")
+    history = [ThreadMessage(ts="100.000", user="U2", is_bot=False, text="前提の説明です")]
+
+    assert await agent_mod.has_thread_state(key) is False
+    first = await agent_mod.invoke_agent("質問1", history=history, thread_key=key)
+    assert first == "answer-1"
+    assert await agent_mod.has_thread_state(key) is True
+
+    # 再開時は history を渡されても無視され、新しい質問だけが追加される
+    second = await agent_mod.invoke_agent("質問2", history=history, thread_key=key)
+    assert second == "answer-2"
+
+    contents = [m.content for m in model.seen[-1]]
+    assert contents == ["前提の説明です", "質問1", "answer-1", "質問2"]
+    state = await graph.aget_state(run_config(thread_id_for(*key)))
+    assert [m.content for m in state.values["messages"]][-2:] == ["質問2", "answer-2"]
+
+
+@pytest.mark.asyncio
+async def test_invoke_without_thread_key_discards_state(
+    checkpointed_graph: tuple[Any, RecordingModel],
+) -> None:
+    """thread_key なしの実行は使い捨ての状態で行い、保持しない。"""
+    answer = await agent_mod.invoke_agent("単発の質問")
+
+    assert answer == "answer-1"
+    assert agent_mod._thread_checkpoints is not None
+    assert len(agent_mod._thread_checkpoints) == 0
+
+
+async def _put_state(graph: Any, thread_id: str) -> None:
+    await graph.aupdate_state(run_config(thread_id), {"messages": [HumanMessage("x")]})
+
+
+@pytest.mark.asyncio
+async def test_lru_and_size_caps_evict_threads() -> None:
+    saver = InMemorySaver()
+    graph = create_agent(
+        model=GenericFakeChatModel(messages=iter([])), tools=[], checkpointer=saver
+    )
+    checkpoints = ThreadCheckpoints(saver, CheckpointSettings(max_threads=2, max_messages=3))
+
+    for tid in ("t1", "t2", "t3"):
+        await checkpoints.begin(tid)
+        await _put_state(graph, tid)
+        await checkpoints.end(tid, message_count=2)
+
+    # 最も古い t1 が LRU で退避される
+    assert await checkpoints.has_state("t1") is False
+    assert await saver.aget_tuple(run_config("t1")) is None  # type: ignore[arg-type]
+    assert await checkpoints.has_state("t3") is True
+
+    # メッセージ数上限超過・失敗した実行は退避される
+    await checkpoints.begin("t3")
+    await checkpoints.end("t3", message_count=10)
+    assert await checkpoints.has_state("t3") is False
+    await checkpoints.begin("t2")
+    await checkpoints.end("t2", message_count=2, ok=False)
+    assert await checkpoints.has_state("t2") is False
+
+
+@pytest.mark.asyncio
+async def test_runs_on_same_thread_are_serialized() -> None:
+    """同じスレッドの実行は begin から end まで直列化され、失敗した実行は必ず退避される。"""
+    saver = InMemorySaver()
+    graph = create_agent(
+        model=GenericFakeChatModel(messages=iter([])), tools=[], checkpointer=saver
+    )
+    checkpoints = ThreadCheckpoints(saver, CheckpointSettings())
+    await checkpoints.begin("t1")
+    await _put_state(graph, "t1")
+    await checkpoints.end("t1", message_count=1)
+
+    order: list[str] = []
+
+    async def _run(name: str, ok: bool) -> bool:
+        resumed = await checkpoints.begin("t1")
+        order.append(f"{name}:begin")
+        await asyncio.sleep(0.01)
+        order.append(f"{name}:end")
+        await checkpoints.end("t1", message_count=2, ok=ok)
+        return resumed
+
+    first, second = await asyncio.gather(_run("a", ok=False), _run("b", ok=True))
+
+    assert order == ["a:begin", "a:end", "b:begin", "b:end"]
+    # 先行の実行が失敗して退避されたため、後続の実行は状態から再開しない
+    assert first is True and second is False
+    assert len(checkpoints._run_locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_history_is_loaded_when_state_was_evicted(
+    checkpointed_graph: tuple[Any, RecordingModel],
+) -> None:
+    """再開できない（退避された）ときは load_history で履歴を取得し、再開時は呼ばない。"""
+    _graph, model = checkpointed_graph
+    key = ("C1", "100.000")
+    loads: list[int] = []
+
+    def _load() -> list[ThreadMessage]:
+        loads.append(1)
+        return [ThreadMessage(ts="100.000", user="U2", is_bot=False, text="前提の説明です")]
+
+    await agent_mod.invoke_agent("質問1", thread_key=key, load_history=_load)
+    assert len(loads) == 1
+
+    # 判定の後で退避されても、invoke_agent が再開できないと判断して履歴を取り直す
+    checkpoints = agent_mod._thread_checkpoints
+    assert checkpoints is not None
+    await checkpoints.begin(thread_id_for(*key))
+    await checkpoints.end(thread_id_for(*key), message_count=0, ok=False)
+    await agent_mod.invoke_agent("質問2", thread_key=key, load_history=_load)
+
+    assert len(loads) == 2
+    assert [m.content for m in model.seen[-1]] == ["前提の説明です", "質問2"]
+
+
+@pytest.mark.asyncio
+async def test_thread_expired_at_begin_is_rebuilt_from_history(
+    checkpointed_graph: tuple[Any, RecordingModel],
+) -> None:
+    """begin 中（実行中扱い）に TTL を過ぎた状態は消してから履歴で作り直し、重ねて積まない。"""
+    graph, _model = checkpointed_graph
+    key = ("C1", "100.000")
+    thread_id = thread_id_for(*key)
+
+    def _load() -> list[ThreadMessage]:
+        return [ThreadMessage(ts="100.000", user="U2", is_bot=False, text="前提の説明です")]
+
+    await agent_mod.invoke_agent("質問1", thread_key=key, load_history=_load)
+    checkpoints = agent_mod._thread_checkpoints
+    assert checkpoints is not None
+    checkpoints._threads[thread_id].last_used -= checkpoints.settings.ttl_seconds + 1
+
+    await agent_mod.invoke_agent("質問2", thread_key=key, load_history=_load)
+
+    state = await graph.aget_state(run_config(thread_id))
+    assert [m.content for m in state.values["messages"]] == ["前提の説明です", "質問2", "answer-2"]
+
+
+@pytest.mark.asyncio
+async def test_memory_saver_keeps_only_latest_checkpoint(
+    checkpointed_graph: tuple[Any, RecordingModel],
+) -> None:
+    """成功した実行の後は最新のチェックポイントだけを残し、再開に必要な状態は保たれる。"""
+    graph, model = checkpointed_graph
+    key = ("C1", "100.000")
+    thread_id = thread_id_for(*key)
+
+    await agent_mod.invoke_agent("質問1", thread_key=key)
+    await agent_mod.invoke_agent("質問2", thread_key=key)
+
+    saver = graph.checkpointer
+    assert len(saver.storage[thread_id][""]) == 1
+    assert all(k[2] in saver.storage[thread_id][""] for k in saver.writes if k[0] == thread_id)
+    state = await graph.aget_state(run_config(thread_id))
+    assert [m.content for m in state.values["messages"]] == [
+        "質問1",
+        "answer-1",
+        "質問2",
+        "answer-2",
+    ]
+    assert [m.content for m in model.seen[-1]] == ["質問1", "answer-1", "質問2"]
@@ -0,0 +1,134 @@
+"""ユーザー名・チャンネル名キャッシュ（SlackDirectory / TTLCache）と正規化段のテスト。"""
+
+from __future__ import annotations
+
+import threading
+import types
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+import slack_agent.handlers.message as message_handler
+from slack_agent.cache import TTLCache
+from slack_agent.config import DirectorySettings
+from slack_agent.directory import SlackDirectory
+from slack_agent.records import ThreadMessage
+
+
+class _FakeClient:
+    def __init__(self) -> None:
+        self.user_calls: list[str] = []
+        self.channel_calls: list[str] = []
+
+    def users_info(self, user: str) -> dict[str, Any]:
+        self.user_calls.append(user)
+        if user == "UGONE":
+            raise RuntimeError("user_not_found")
+        return {"user": {"name": user.lower(), "profile": {"display_name": f"name-{user}"}}}
+
+    def conversations_info(self, channel: str) -> dict[str, Any]:
+        self.channel_calls.append(channel)
+        return {"channel": {"name": f"ch-{channel}"}}
+
+
+def test_ttl_cache_evicts_lru_and_expired() -> None:
+    now = [0.0]
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a を最近利用にする
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.missing(["a", "b", "c", "b"]) == ["b"]
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_prefetch_resolves_each_id_once() -> None:
+    """同じ ID は 1 回だけ解決し、失敗した ID も再問い合わせしない。"""
+    client = _FakeClient()
+    directory = SlackDirectory(client, DirectorySettings())
+
+    directory.prefetch(["U1", "U2", "U1", "UGONE"], ["C1"])
+    directory.prefetch(["U1", "UGONE"], ["C1"])
+
+    # 並行に解決するため問い合わせの順序は問わない
+    assert sorted(client.user_calls) == ["U1", "U2", "UGONE"]
+    assert client.channel_calls == ["C1"]
+    assert directory.users(["U1", "UGONE"]) == {"U1": "name-U1"}
+    assert directory.channels(["C1"]) == {"C1": "ch-C1"}
+
+
+def test_prefetch_resolves_missing_ids_concurrently() -> None:
+    """未解決の ID は 1 件ずつ待たずに並行して問い合わせる。"""
+    client = _FakeClient()
+    # 2 件が同時に問い合わせ中でなければ揃わない（逐次ならタイムアウトして解決に失敗する）
+    barrier = threading.Barrier(2, timeout=5.0)
+    users_info = client.users_info
+
+    def _users_info(user: str) -> dict[str, Any]:
+        barrier.wait()
+        return users_info(user)
+
+    client.users_info = _users_info  # type: ignore[method-assign]
+    directory = SlackDirectory(client, DirectorySettings())
+
+    directory.prefetch(["U1", "U2"])
+
+    assert directory.users(["U1", "U2"]) == {"U1": "name-U1", "U2": "name-U2"}
+
+
+def test_handler_normalizes_question_and_history(monkeypatch: pytest.MonkeyPatch) -> None:
+    """履歴は ThreadMessage に変換され、mrkdwn が正規化されてエージェントへ渡る。"""
+    client = _FakeClient()
+    client.reactions_add = lambda **_: None  # type: ignore[attr-defined]
+    client.conversations_replies = lambda **_: {  # type: ignore[attr-defined]
+        "messages": [
+            {
+                "ts": "1.0",
+                "user": "U1",
+                "text": "<@UBOT> <#C1> の件は <https://x.example|チケット> を参照",
+                "blocks": [{"type": "rich_text"}],
+                "attachments": [{"fallback": "big"}],
+            },
+            {"ts": "2.0", "user": "U1", "text": "<@UBOT> <@U2> さんどう？"},
+        ]
+    }
+    captured: dict[str, Any] = {}
+
+    async def _fake_invoke(
+        question: str,
+        thread_key: Any = None,
+        user: str | None = None,
+        load_history: Callable[[], list[ThreadMessage]] | None = None,
+    ) -> str:
+        # 保存済み状態がない（再開できない）ときと同じく履歴を取得させる
+        captured["question"] = question
+        captured["history"] = load_history() if load_history is not None else None
+        return "ok"
+
+    monkeypatch.setattr(message_handler, "invoke_agent", _fake_invoke)
+
+    handlers: list[Any] = []
+    app = types.SimpleNamespace(
+        client=client, event=lambda _name: lambda f: handlers.append(f) or f
+    )
+    message_handler.register(app)  # type: ignore[arg-type]
+
+    event = {"text": "<@UBOT> <@U2> に聞いて", "channel": "C9", "ts": "2.0", "thread_ts": "1.0"}
+    handlers[0](event=event, say=lambda *_a, **_k: None)
+
+    assert captured["question"] == "@name-U2 に聞いて"
+    assert captured["history"] == [
+        ThreadMessage(
+            ts="1.0",
+            user="U1",
+            is_bot=False,
+            text="#ch-C1 の件は チケット (https://x.example) を参照",
+        )
+    ]
+    # 先頭メンション（Bot 自身）は解決せず、U2 は質問と履歴で共有して 1 回だけ解決
+    assert client.user_calls == ["U2"]
@@ -0,0 +1,140 @@
+"""実行内の既出ドキュメント重複排除（DocumentDedupMiddleware）のテスト。"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import pytest
+from fake_models import FakeToolModel
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from slack_agent import metrics
+from slack_agent.middleware.doc_dedup import (
+    DocumentDedupMiddleware,
+    RunDocuments,
+    dedup_payload,
+    document_scope,
+    reference_text,
+)
+
+_BODY = "ログイン処理の仕様。" * 200
+
+
+def _search_call(call_id: str, query: str) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": "search", "args": {"query": query}, "id": call_id}]
+    )
+
+
+def _build_graph() -> Any:
+    async def search(query: str) -> str:
+        results = [{"filepath": "/docs/login.md", "score": 0.9, "document": _BODY}]
+        if query == "2":
+            results.append({"filepath": "/docs/new.md", "score": 0.5, "document": "新しい本文"})
+        return json.dumps({"status": "success", "results": results}, ensure_ascii=False)
+
+    tool = StructuredTool.from_function(coroutine=search, name="search", description="検索")
+    model = FakeToolModel(
+        messages=iter([_search_call("c1", "1"), _search_call("c2", "2"), AIMessage(content="done")])
+    )
+    return create_agent(model=model, tools=[tool], middleware=[DocumentDedupMiddleware()])
+
+
+@pytest.mark.asyncio
+async def test_repeated_document_is_replaced_with_reference() -> None:
+    """2 回目の検索で同じ本文が返ると参照に置き換わり、新しい本文だけが転送される。"""
+    metrics.REGISTRY.reset()
+    graph = _build_graph()
+
+    with document_scope() as docs:
+        state = await graph.ainvoke({"messages": [{"role": "user", "content": "q"}]})
+
+    tool_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    first = json.loads(str(tool_messages[0].content))
+    second = json.loads(str(tool_messages[1].content))
+    assert first["results"][0]["document"] == _BODY
+    assert first["results"][0]["doc_id"] == 1
+    assert second["results"][0]["document"] == reference_text(1)
+    assert second["results"][1] == {
+        "filepath": "/docs/new.md",
+        "score": 0.5,
+        "document": "新しい本文",
+        "doc_id": 2,
+    }
+
+    assert docs.hits == 1
+    assert docs.saved_bytes > len(_BODY.encode("utf-8")) - 100
+    assert metrics.counter("slack_agent_doc_dedup_saved_bytes_total", "").value() == (
+        docs.saved_bytes
+    )
+
+
+@pytest.mark.asyncio
+async def test_no_dedup_outside_scope() -> None:
+    graph = _build_graph()
+
+    state = await graph.ainvoke({"messages": [{"role": "user", "content": "q"}]})
+
+    tool_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    second = json.loads(str(tool_messages[1].content))
+    assert second["results"][0]["document"] == _BODY
+
+
+@pytest.mark.asyncio
+async def test_resumed_run_continues_document_numbering() -> None:
+    """再開した実行では前回の doc_id を引き継ぎ、新しい本文に同じ番号を振らない。"""
+
+    async def search(query: str) -> str:
+        login = {"filepath": "/docs/login.md", "document": _BODY}
+        other = {"filepath": "/docs/other.md", "document": "別の本文"}
+        results = [login] if query == "1" else [other, login]
+        return json.dumps({"status": "success", "results": results}, ensure_ascii=False)
+
+    tool = StructuredTool.from_function(coroutine=search, name="search", description="検索")
+    model = FakeToolModel(
+        messages=iter(
+            [
+                _search_call("c1", "1"),
+                AIMessage(content="done-1"),
+                _search_call("c2", "2"),
+                AIMessage(content="done-2"),
+            ]
+        )
+    )
+    graph = create_agent(
+        model=model,
+        tools=[tool],
+        middleware=[DocumentDedupMiddleware()],
+        checkpointer=InMemorySaver(),
+    )
+    config: Any = {"configurable": {"thread_id": "C1:1.0"}}
+
+    for question in ("q1", "q2"):
+        with document_scope():
+            state = await graph.ainvoke(
+                {"messages": [{"role": "user", "content": question}]}, config=config
+            )
+
+    tool_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    assert json.loads(str(tool_messages[0].content))["results"][0]["doc_id"] == 1
+    resumed = json.loads(str(tool_messages[1].content))["results"]
+    assert resumed[0] == {"filepath": "/docs/other.md", "document": "別の本文", "doc_id": 2}
+    assert resumed[1]["doc_id"] == 1
+    assert resumed[1]["document"] == reference_text(1)
+
+
+def test_different_passage_of_same_file_is_forwarded() -> None:
+    docs = RunDocuments()
+    first = {"results": [{"filepath": "a.py", "document": "抜粋1"}]}
+    second = {"results": [{"filepath": "a.py", "document": "抜粋2"}, {"filepath": "b.py"}]}
+
+    assert dedup_payload(first, docs)
+    assert dedup_payload(second, docs)
+
+    assert second["results"][0] == {"filepath": "a.py", "document": "抜粋2", "doc_id": 2}
+    assert "doc_id" not in second["results"][1]
+    assert docs.hits == 0
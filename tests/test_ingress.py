@@ -0,0 +1,115 @@
+"""複数 Socket Mode 接続の受信（重複排除・ack 計測・再接続ゲート）のテスト。"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from slack_bolt import App
+from slack_bolt.response import BoltResponse
+from slack_sdk.socket_mode.request import SocketModeRequest
+
+from slack_agent import ingress, metrics
+from slack_agent.config import SocketModeSettings
+
+
+class _FakeClient:
+    def __init__(self) -> None:
+        self.responses: list[Any] = []
+        self.logger = logging.getLogger("test.socket_mode")
+
+    def send_socket_mode_response(self, response: Any) -> None:
+        self.responses.append(response)
+
+
+def _event(envelope_id: str, event_id: str, retry: int | None = None) -> SocketModeRequest:
+    return SocketModeRequest(
+        type="events_api",
+        envelope_id=envelope_id,
+        payload={"type": "event_callback", "event_id": event_id, "event": {"type": "app_mention"}},
+        retry_attempt=retry,
+    )
+
+
+def test_sqlite_deduper_is_shared_between_instances(tmp_path: Path) -> None:
+    """同じファイルを開いた別インスタンス（別プロセス相当）でも重複と判定される。"""
+    path = str(tmp_path / "events.sqlite3")
+    first, second = ingress.SqliteEventDeduper(path, 600), ingress.SqliteEventDeduper(path, 600)
+
+    assert first.first_seen("Ev1")
+    assert not second.first_seen("Ev1")
+    assert second.first_seen("Ev2")
+
+    expired = ingress.SqliteEventDeduper(path, 0.01)
+    time.sleep(0.02)
+    assert expired.first_seen("Ev1")
+    for deduper in (first, second, expired):
+        deduper.close()
+
+
+def test_duplicate_event_is_acked_but_not_dispatched(monkeypatch: pytest.MonkeyPatch) -> None:
+    """別の接続へ再送された同じ event_id は ack だけ返し、Bolt へは 1 回だけ渡す。"""
+    metrics.REGISTRY.reset()
+    dispatched: list[str] = []
+
+    def fake_run_bolt_app(app: Any, req: SocketModeRequest) -> BoltResponse:
+        dispatched.append(req.envelope_id)
+        return BoltResponse(status=200, body="")
+
+    monkeypatch.setattr(ingress, "run_bolt_app", fake_run_bolt_app)
+    app = App(token="xoxb-test", token_verification_enabled=False)
+    pool = ingress.SocketModePool(
+        app, "xapp-test", SocketModeSettings(connections=2, reconnect_stagger_seconds=0)
+    )
+    try:
+        conn0, conn1 = pool.handlers
+        client = _FakeClient()
+        conn0.handle(client, _event("env-1", "Ev1"))  # type: ignore[arg-type]
+        conn1.handle(client, _event("env-2", "Ev1", retry=1))  # type: ignore[arg-type]
+        conn1.handle(client, _event("env-3", "Ev2"))  # type: ignore[arg-type]
+    finally:
+        pool.close()
+
+    assert dispatched == ["env-1", "env-3"]
+    assert [r.envelope_id for r in client.responses] == ["env-1", "env-2", "env-3"]
+    assert (
+        metrics.counter("slack_agent_socket_duplicate_events_total", "").value(conn="conn-1") == 1
+    )
+    ack = metrics.histogram("slack_agent_socket_ack_seconds", "", ())
+    assert ack.count(conn="conn-0") == 1
+    assert ack.count(conn="conn-1") == 2
+
+
+def test_reconnect_gate_staggers_reconnects() -> None:
+    gate = ingress.ReconnectGate(0.1)
+    order: list[tuple[str, float]] = []
+
+    def reconnect(name: str) -> None:
+        with gate.turn():
+            order.append((name, time.monotonic()))
+            gate.pause()
+
+    threads = [threading.Thread(target=reconnect, args=(f"c{i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    times = sorted(at for _, at in order)
+    assert all(b - a >= 0.09 for a, b in zip(times, times[1:], strict=False))
+
+
+def test_socket_mode_settings_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SLACK_SOCKET_CONNECTIONS", "3")
+    monkeypatch.setenv("SLACK_EVENT_DEDUPE", "sqlite")
+    settings = SocketModeSettings.from_env()
+    assert settings.connections == 3
+    assert settings.dedupe_backend == "sqlite"
+
+    monkeypatch.setenv("SLACK_EVENT_DEDUPE", "redis")
+    with pytest.raises(RuntimeError, match="SLACK_EVENT_DEDUPE"):
+        SocketModeSettings.from_env()
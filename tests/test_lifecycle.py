@@ -0,0 +1,197 @@
+"""終了時のドレイン（処理中の応答の完了待ち・期限での中断・背景ループ上の後始末）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import types
+from concurrent.futures import CancelledError
+from typing import Any
+
+import pytest
+
+import slack_agent.handlers.message as message_handler
+from slack_agent import lifecycle, metrics
+from slack_agent.background import BackgroundLoop
+from slack_agent.config import WorkspaceSettings
+from slack_agent.lifecycle import Lifecycle
+
+
+def test_shutdown_hooks_run_on_owning_loop() -> None:
+    """停止フックは新しいループではなく、資源を開いた背景ループ上で実行される。"""
+    bg = BackgroundLoop(name="test-bg-loop")
+    seen: list[tuple[bool, str]] = []
+
+    async def hook() -> None:
+        seen.append((asyncio.get_running_loop() is owner, threading.current_thread().name))
+
+    owner = bg.start()
+    bg.add_shutdown_hook(hook)
+    assert bg.run(asyncio.sleep(0, result="ok")) == "ok"
+
+    assert bg.stop(timeout=2)
+    assert seen == [(True, "test-bg-loop")]
+    assert owner.is_closed()
+
+
+def test_drain_waits_for_inflight_mentions() -> None:
+    bg = BackgroundLoop(name="test-bg-loop")
+    lc = Lifecycle(loop=bg)
+    entered = threading.Event()
+    stopped: list[bool] = []
+
+    def mention() -> None:
+        with lc.track():
+            entered.set()
+            bg.run(asyncio.sleep(0.2))
+
+    worker = threading.Thread(target=mention)
+    worker.start()
+    entered.wait(2)
+    lc.on_drain("queue", lambda remaining: 0)
+
+    report = lc.drain(5.0, stop_ingress=lambda: stopped.append(lc.draining))
+    worker.join(2)
+
+    assert stopped == [True]
+    assert (report.completed, report.interrupted, report.unsent) == (1, 0, 0)
+    assert report.mcp_closed and report.clean
+
+
+def test_drain_interrupts_runs_past_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    """期限までに終わらない実行は取り消され、ハンドラー側は CancelledError で抜けられる。"""
+    monkeypatch.setattr(lifecycle, "GRACE_SECONDS", 1.0)
+    bg = BackgroundLoop(name="test-bg-loop")
+    lc = Lifecycle(loop=bg)
+    entered = threading.Event()
+    outcome: list[str] = []
+
+    def mention() -> None:
+        with lc.track():
+            entered.set()
+            try:
+                bg.run(asyncio.sleep(30))
+            except CancelledError:
+                outcome.append("interrupted")
+
+    worker = threading.Thread(target=mention)
+    worker.start()
+    entered.wait(2)
+    started = time.monotonic()
+    report = lc.drain(0.2)
+    worker.join(2)
+
+    assert time.monotonic() - started < 3
+    assert outcome == ["interrupted"]
+    assert (report.completed, report.interrupted) == (0, 1)
+    assert not report.clean
+
+
+def test_mentions_during_drain_are_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    lc = Lifecycle(loop=BackgroundLoop(name="test-bg-loop"))
+    monkeypatch.setattr(message_handler, "LIFECYCLE", lc)
+    invoked: list[str] = []
+
+    async def _fake_invoke(_q: str) -> str:
+        invoked.append(_q)
+        return "ok"
+
+    monkeypatch.setattr("slack_agent.handlers.message.invoke_agent", _fake_invoke)
+    handlers: dict[str, Any] = {}
+    app = types.SimpleNamespace(
+        client=types.SimpleNamespace(reactions_add=lambda **kw: None),
+        event=lambda name: lambda func: handlers.setdefault(name, func),
+    )
+    message_handler.register(app)  # type: ignore[arg-type]
+    lc.drain(0.1)
+
+    said: list[str] = []
+    handlers["app_mention"](
+        event={"text": "<@U1> hi", "channel": "C1", "ts": "1.0"},
+        say=lambda msg, thread_ts=None: said.append(msg),
+    )
+
+    assert invoked == []
+    assert said and "再起動" in said[0]
+    assert lc.drain(0.1).rejected == 1
+
+
+def test_submit_after_stop_raises_instead_of_restarting() -> None:
+    """停止後の投入は新しいループを作らずに失敗し、明示的な start() の後だけ再び受け付ける。"""
+    bg = BackgroundLoop(name="test-bg-loop")
+    assert bg.run(asyncio.sleep(0, result="ok")) == "ok"
+    assert bg.stop(timeout=2)
+
+    with pytest.raises(RuntimeError, match="停止済み"):
+        bg.run(asyncio.sleep(0))
+    assert bg.loop is None
+
+    bg.start()
+    try:
+        assert bg.run(asyncio.sleep(0, result="again")) == "again"
+    finally:
+        bg.stop(timeout=2)
+
+
+def test_mentions_waiting_for_admission_are_rejected_on_drain(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """ドレイン開始時に受付待ちのメンションは起こされ、実行されずに中断メッセージを返す。"""
+    metrics.REGISTRY.reset()
+    monkeypatch.setattr(lifecycle, "GRACE_SECONDS", 1.0)
+    bg = BackgroundLoop(name="test-bg-loop")
+    lc = Lifecycle(loop=bg)
+    monkeypatch.setattr(message_handler, "LIFECYCLE", lc)
+    monkeypatch.setattr(message_handler, "_run_in_background", bg.run)
+    invoked: list[str] = []
+
+    async def _fake_invoke(question: str, **_kwargs: Any) -> str:
+        invoked.append(question)
+        await asyncio.sleep(30)
+        return "ok"
+
+    monkeypatch.setattr(message_handler, "invoke_agent", _fake_invoke)
+    handlers: dict[str, Any] = {}
+    app = types.SimpleNamespace(
+        client=types.SimpleNamespace(
+            reactions_add=lambda **_k: None,
+            conversations_replies=lambda **_k: {"messages": []},
+        ),
+        event=lambda name: lambda func: handlers.setdefault(name, func),
+    )
+    message_handler.register(
+        app,  # type: ignore[arg-type]
+        WorkspaceSettings("acme", "xoxb-acme", "xapp-acme", max_inflight=1),
+    )
+    said: list[str] = []
+
+    def _mention(text: str, ts: str) -> threading.Thread:
+        event = {"text": f"<@U1> {text}", "channel": "C1", "ts": ts}
+        worker = threading.Thread(
+            target=handlers["app_mention"],
+            kwargs={"event": event, "say": lambda msg, **_k: said.append(msg)},
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    running = _mention("first", "1.0")
+    queued_depth = metrics.gauge("slack_agent_workspace_queue_depth", "")
+    waiting = _mention("second", "2.0")
+    deadline = time.monotonic() + 5
+    while (not invoked or queued_depth.value(workspace="acme") < 1) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert invoked == ["first"] and queued_depth.value(workspace="acme") == 1
+
+    report = lc.drain(0.2)
+    running.join(2)
+    waiting.join(2)
+
+    # 取り消された実行の枠が空いても、待っていたメンションは受け付けられない
+    assert invoked == ["first"]
+    assert report.rejected == 1 and report.interrupted == 1
+    assert len(said) == 2 and all("再起動" in msg for msg in said)
+    mentions = metrics.counter("slack_agent_workspace_mentions_total", "")
+    assert mentions.value(workspace="acme", outcome="draining") == 1
+    assert mentions.value(workspace="acme", outcome="interrupted") == 1
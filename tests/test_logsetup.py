@@ -0,0 +1,81 @@
+"""キュー経由のログ出力・本文の切り詰め・ロガー別サンプリングのテスト。"""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+from collections.abc import Iterator
+
+import pytest
+
+from slack_agent import logsetup
+from slack_agent.config import LoggingSettings
+
+
+@pytest.fixture
+def restore_root_logger() -> Iterator[None]:
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    logsetup.stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_json_output_with_truncated_body(restore_root_logger: None) -> None:
+    """JSON 1 行で出力され、本文は上限文字数で切り詰められる。"""
+    stream = io.StringIO()
+    logsetup.configure_logging(LoggingSettings(max_body_chars=10), stream=stream)
+
+    logging.getLogger("slack_agent.test").info(
+        "answer=%s", logsetup.body("あ" * 25), extra={"channel": "C1"}
+    )
+    logsetup.stop_logging()
+
+    record = json.loads(stream.getvalue().strip())
+    assert record["level"] == "INFO"
+    assert record["logger"] == "slack_agent.test"
+    assert record["msg"] == "answer=" + "あ" * 10 + "…(+15 chars)"
+    assert record["channel"] == "C1"
+
+
+def test_exception_is_rendered_on_listener_thread(restore_root_logger: None) -> None:
+    stream = io.StringIO()
+    logsetup.configure_logging(LoggingSettings(), stream=stream)
+
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("slack_agent.test").error("failed", exc_info=True)
+    logsetup.stop_logging()
+
+    record = json.loads(stream.getvalue().strip())
+    assert record["msg"] == "failed"
+    assert "ValueError: boom" in record["exc"]
+
+
+def test_sampling_filter_thins_info_but_keeps_warnings() -> None:
+    """rate=0.25 の INFO は 4 件に 1 件、WARNING は常に出力される。"""
+    sampler = logsetup.SamplingFilter({"slack_agent.agent": 0.25})
+
+    def make(name: str, level: int) -> logging.LogRecord:
+        return logging.LogRecord(name, level, __file__, 0, "x", None, None)
+
+    kept = [sampler.filter(make("slack_agent.agent.sub", logging.INFO)) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert all(sampler.filter(make("slack_agent.agent", logging.WARNING)) for _ in range(3))
+    assert sampler.filter(make("slack_agent.handlers", logging.INFO))
+
+
+def test_sample_rates_env_parsing(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LOG_SAMPLE_RATES", "slack_agent.agent=0.1, bad, x=abc,slack_agent=2")
+    monkeypatch.setenv("LOG_MAX_BODY_CHARS", "50")
+
+    settings = LoggingSettings.from_env()
+
+    assert dict(settings.sample_rates) == {"slack_agent.agent": 0.1, "slack_agent": 1.0}
+    assert settings.max_body_chars == 50
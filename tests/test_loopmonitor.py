@@ -0,0 +1,86 @@
+"""背景イベントループの遅延監視（LoopMonitor）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+import pytest
+
+from slack_agent import metrics
+from slack_agent.background import BackgroundLoop
+from slack_agent.config import LoopMonitorSettings
+from slack_agent.loopmonitor import LoopMonitor
+
+
+def _blocking_search() -> None:
+    time.sleep(0.4)  # 背景ループ上の同期呼び出し（名前解決や同期 API の代わり）
+
+
+async def _handler() -> None:
+    _blocking_search()
+
+
+def test_stall_reports_stack_of_blocking_call(caplog: pytest.LogCaptureFixture) -> None:
+    metrics.REGISTRY.reset()
+    bg = BackgroundLoop(name="test-monitor-loop")
+    settings = LoopMonitorSettings(interval_seconds=0.02, stall_threshold_seconds=0.15)
+    monitor = LoopMonitor(settings, loop=bg)
+    monitor.start()
+    try:
+        time.sleep(0.1)
+        with caplog.at_level(logging.WARNING, logger="slack_agent.loopmonitor"):
+            bg.run(_handler())
+            time.sleep(0.1)
+    finally:
+        monitor.stop()
+        bg.stop(timeout=2)
+
+    assert monitor.last_stall is not None and "_blocking_search" in monitor.last_stall
+    assert metrics.counter("slack_agent_loop_stalls_total", "").value() == 1
+    lag = metrics.histogram("slack_agent_loop_lag_seconds", "", ())
+    assert lag.count() > 3
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(m.startswith("Event loop blocked for") for m in messages)
+    assert any(m.startswith("Event loop resumed after blocking") for m in messages)
+
+
+def test_idle_loop_does_not_report_stalls() -> None:
+    metrics.REGISTRY.reset()
+    bg = BackgroundLoop(name="test-monitor-loop")
+    monitor = LoopMonitor(
+        LoopMonitorSettings(interval_seconds=0.02, stall_threshold_seconds=0.2), loop=bg
+    )
+    monitor.start()
+    try:
+        bg.run(asyncio.sleep(0.3))
+    finally:
+        monitor.stop()
+        bg.stop(timeout=2)
+
+    assert monitor.last_stall is None
+    assert metrics.counter("slack_agent_loop_stalls_total", "").value() == 0
+
+
+def test_debug_mode_counts_slow_callbacks() -> None:
+    metrics.REGISTRY.reset()
+    bg = BackgroundLoop(name="test-monitor-loop")
+    settings = LoopMonitorSettings(
+        mode="debug", interval_seconds=0.05, stall_threshold_seconds=5.0, slow_callback_seconds=0.05
+    )
+    monitor = LoopMonitor(settings, loop=bg)
+    monitor.start()
+    try:
+        bg.run(asyncio.sleep(0.05))
+        assert bg.loop is not None and bg.loop.get_debug()
+
+        async def slow() -> None:
+            time.sleep(0.1)
+
+        bg.run(slow())
+    finally:
+        monitor.stop()
+        bg.stop(timeout=2)
+
+    assert metrics.counter("slack_agent_loop_slow_callbacks_total", "").value() >= 1
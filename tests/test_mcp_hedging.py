@@ -0,0 +1,158 @@
+"""MCP ツール呼び出しの適応タイムアウトとヘッジ要求（ManagedSession）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from mcp.types import CallToolResult, TextContent
+
+from slack_agent import metrics
+from slack_agent.config import MCPSettings
+from slack_agent.mcp import session as session_mod
+from slack_agent.mcp.session import ManagedSession
+
+
+class _FakeSession:
+    """呼び出しごとに指定した秒数だけ待ってから自分の名前を返すセッション。"""
+
+    def __init__(self, name: str, delays: list[float] | None = None, default: float = 0.001):
+        self.name = name
+        self.delays = list(delays or [])
+        self.default = default
+        self.calls = 0
+        self.cancelled = 0
+
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any] | None = None, **kwargs: Any
+    ) -> CallToolResult:
+        self.calls += 1
+        delay = self.delays.pop(0) if self.delays else self.default
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return CallToolResult(content=[TextContent(type="text", text=self.name)])
+
+
+async def _warm_up(managed: ManagedSession, tool: str = "search") -> None:
+    for _ in range(session_mod.MIN_SAMPLES):
+        await managed.call_tool(tool, {})
+
+
+@pytest.mark.asyncio
+async def test_adaptive_timeout_cuts_slow_outliers(monkeypatch: pytest.MonkeyPatch) -> None:
+    """十分なサンプルが集まると p99 × 係数（下限 MIN_TIMEOUT）でタイムアウトする。"""
+    metrics.REGISTRY.reset()
+    monkeypatch.setattr(session_mod, "MIN_TIMEOUT", 0.05)
+    fake = _FakeSession("only")
+    managed = ManagedSession("semche", fake, call_timeout=10.0)  # type: ignore[arg-type]
+
+    assert managed.timeout_for("search") == 10.0
+    await _warm_up(managed)
+    assert managed.timeout_for("search") == pytest.approx(0.05)
+
+    fake.delays = [1.0]
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        await managed.call_tool("search", {})
+    assert time.perf_counter() - started < 0.5
+    timeouts = metrics.counter("slack_agent_mcp_call_timeouts_total", "")
+    assert timeouts.value(server="semche", tool="search") == 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_timeout_recovers_after_latency_step_up(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """サーバーの遅延が適応タイムアウトを超えても、タイムアウトをサンプルに数えて追従する。"""
+    metrics.REGISTRY.reset()
+    monkeypatch.setattr(session_mod, "MIN_TIMEOUT", 0.05)
+    fake = _FakeSession("only")
+    managed = ManagedSession("semche", fake, call_timeout=10.0)  # type: ignore[arg-type]
+    await _warm_up(managed)
+
+    fake.default = 0.2
+    timeouts = 0
+    for _ in range(10):
+        try:
+            await managed.call_tool("search", {})
+            break
+        except TimeoutError:
+            timeouts += 1
+    else:
+        pytest.fail("adaptive timeout never adapted to the slower server")
+
+    # 0.05 → 0.15 → 0.45 秒と広がり、3 回目で成功する
+    assert timeouts == 2
+    assert 0.2 < managed.timeout_for("search") <= 10.0
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_first_reply_and_cancels_other() -> None:
+    """p95 を超えた呼び出しは別セッションへヘッジし、先に返った応答を採用する。"""
+    metrics.REGISTRY.reset()
+    first, second = _FakeSession("first"), _FakeSession("second")
+    managed = ManagedSession(
+        "semche",
+        [first, second],  # type: ignore[list-item]
+        call_timeout=5.0,
+        hedge_tools=["search"],
+    )
+    await _warm_up(managed)
+    assert first.calls == second.calls == session_mod.MIN_SAMPLES // 2
+
+    # 次の起点は first。first は遅延し、ヘッジ先の second が先に返る
+    first.delays = [2.0]
+    started = time.perf_counter()
+    result = await managed.call_tool("search", {"query": "q"})
+    elapsed = time.perf_counter() - started
+
+    assert isinstance(result.content[0], TextContent)
+    assert result.content[0].text == "second"
+    assert elapsed < 0.5
+    await asyncio.sleep(0)
+    assert first.cancelled == 1
+    hedged = metrics.counter("slack_agent_mcp_hedged_total", "")
+    assert hedged.value(server="semche", tool="search", winner="hedge") == 1
+
+
+@pytest.mark.asyncio
+async def test_non_idempotent_tools_are_not_hedged() -> None:
+    first, second = _FakeSession("first"), _FakeSession("second")
+    managed = ManagedSession(
+        "tickets",
+        [first, second],  # type: ignore[list-item]
+        call_timeout=5.0,
+        hedge_tools=["search"],
+    )
+    await _warm_up(managed, tool="create_ticket")
+
+    first.delays = [0.2]
+    result = await managed.call_tool("create_ticket", {})
+
+    assert isinstance(result.content[0], TextContent)
+    assert result.content[0].text == "first"
+    assert first.calls + second.calls == session_mod.MIN_SAMPLES + 1
+
+
+def test_replicas_and_hedge_tools_from_servers_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    servers_file = tmp_path / "servers.json"
+    servers_file.write_text(
+        json.dumps({"servers": {"t": {"command": "x", "replicas": 3, "hedge_tools": ["search"]}}}),
+        encoding="utf-8",
+    )
+    monkeypatch.delenv("MCP_SEMCHE_PATH", raising=False)
+    monkeypatch.setenv("MCP_SERVERS_FILE", str(servers_file))
+
+    settings = MCPSettings.from_env().servers[0]
+
+    assert settings.replicas == 3
+    assert settings.hedge_tools == frozenset({"search"})
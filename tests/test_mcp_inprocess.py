@@ -0,0 +1,130 @@
+"""プロセス内 MCP トランスポート（inprocess / thread）のテスト。
+
+tmp_path に FastMCP サーバーモジュールを置き、`MCP_SERVERS_FILE` で読み込ませて
+stdio 子プロセスを起動せずにツールを呼び出せることを検証。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+import slack_agent.agent as agent_mod
+from slack_agent.config import MCPSettings, resolve_transport
+from slack_agent.mcp import semche
+
+_SERVER_SOURCE = '''
+import os
+import threading
+
+from mcp.server.fastmcp import FastMCP
+
+server = FastMCP("fake-semche")
+# サーバー設定の env は import 時にだけ見える
+MESSAGE = os.environ.get("FAKE_SEMCHE_MESSAGE", "")
+
+
+@server.tool()
+def search(query: str, top_k: int = 5) -> str:
+    """検索"""
+    import json
+
+    return json.dumps({
+        "status": "success",
+        "message": MESSAGE,
+        "results": [{"filepath": f"/docs/{query}.md", "score": 1.0, "metadata": {
+            "thread": threading.current_thread().name,
+        }}],
+        "count": 1,
+    })
+'''
+
+
+@pytest.fixture
+def server_module(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    name = f"fake_semche_server_{id(tmp_path)}"
+    (tmp_path / f"{name}.py").write_text(_SERVER_SOURCE, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield name
+    sys.modules.pop(name, None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("transport", ["inprocess", "thread"])
+async def test_tools_run_without_subprocess(
+    transport: str, server_module: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """サーバーモジュールを import し、メモリ上のストリーム経由でツールを呼び出す。"""
+    servers_file = tmp_path / "servers.json"
+    servers_file.write_text(
+        json.dumps(
+            {
+                "servers": {
+                    "fake": {
+                        "transport": transport,
+                        "server": f"{server_module}:server",
+                        "env": {"FAKE_SEMCHE_MESSAGE": "from-env", "FAKE_SEMCHE_KEPT": "server"},
+                    }
+                }
+            }
+        ),
+        encoding="utf-8",
+    )
+    monkeypatch.delenv("MCP_SEMCHE_PATH", raising=False)
+    monkeypatch.setenv("MCP_SERVERS_FILE", str(servers_file))
+    monkeypatch.delenv("FAKE_SEMCHE_MESSAGE", raising=False)
+    monkeypatch.setenv("FAKE_SEMCHE_KEPT", "bot")
+
+    agent_mod._cached_tools = None
+    await agent_mod._mcp_manager.close()
+    try:
+        tools = await agent_mod.load_mcp_tools_once()
+        tool = next(t for t in tools if t.name == "search")
+        raw = await tool.ainvoke({"query": "login"})
+    finally:
+        await agent_mod._mcp_manager.close()
+
+    text = raw if isinstance(raw, str) else raw[0]["text"]
+    data = json.loads(text)
+    assert data["results"][0]["filepath"] == "/docs/login.md"
+    assert data["message"] == "from-env"
+    # サーバーの env はボットのプロセス環境に残らない（未設定だった値は消え、既存の値は戻る）
+    assert "FAKE_SEMCHE_MESSAGE" not in os.environ
+    assert os.environ["FAKE_SEMCHE_KEPT"] == "bot"
+    server_thread = data["results"][0]["metadata"]["thread"]
+    if transport == "thread":
+        assert server_thread == "mcp-server-fake"
+    else:
+        assert server_thread == threading.current_thread().name
+
+
+def test_semche_search_in_process(server_module: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(semche, "SEMCHE_SERVER_MODULE", server_module)
+    monkeypatch.delenv("SEMCHE_MOCK", raising=False)
+    monkeypatch.setenv("MCP_SEMCHE_TRANSPORT", "inprocess")
+
+    result = semche.search("仕様")
+
+    assert result["status"] == "success"
+    assert result["results"][0]["filepath"] == "/docs/仕様.md"
+
+
+def test_transport_resolution(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert resolve_transport("auto", "json") == "inprocess"
+    assert resolve_transport("auto", "no_such_semche_module.mcp_server") == "stdio"
+    assert resolve_transport("", None) == "stdio"
+    with pytest.raises(RuntimeError, match="トランスポートが不正"):
+        resolve_transport("http", None)
+
+    servers_file = tmp_path / "servers.json"
+    servers_file.write_text(json.dumps({"servers": {"x": {"transport": "thread"}}}))
+    monkeypatch.delenv("MCP_SEMCHE_PATH", raising=False)
+    monkeypatch.setenv("MCP_SERVERS_FILE", str(servers_file))
+    with pytest.raises(RuntimeError, match="server（モジュール）"):
+        MCPSettings.from_env()
@@ -0,0 +1,167 @@
+"""複数 MCP サーバー構成（MCP_SERVERS_FILE）のテスト。
+
+並列起動・名前空間化・遅い/失敗サーバーの除外を検証。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+import slack_agent.agent as agent_mod
+from slack_agent.config import MCPSettings
+
+
+def _write_servers_file(tmp_path: Path, servers: dict[str, Any]) -> str:
+    path = tmp_path / "mcp_servers.json"
+    path.write_text(json.dumps({"servers": servers}), encoding="utf-8")
+    return str(path)
+
+
+def _make_stdio_cm(behavior: str) -> Any:
+    """behavior: ok / fail / hang"""
+    cm = AsyncMock()
+
+    async def aenter() -> tuple[Any, Any]:
+        if behavior == "fail":
+            raise RuntimeError("spawn failed")
+        if behavior == "hang":
+            await asyncio.sleep(30)
+        return MagicMock(), MagicMock()
+
+    cm.__aenter__.side_effect = aenter
+    cm.__aexit__ = AsyncMock(return_value=None)
+    return cm
+
+
+def _make_session_cm(server: str) -> Any:
+    cm = AsyncMock()
+    session = AsyncMock()
+    session.initialize = AsyncMock()
+    session.server = server
+    cm.__aenter__ = AsyncMock(return_value=session)
+    cm.__aexit__ = AsyncMock(return_value=None)
+    return cm
+
+
+async def _run_load(servers_file: str, behaviors: dict[str, str]) -> list[Any]:
+    def fake_stdio(params: Any) -> Any:
+        return _make_stdio_cm(behaviors[params.command])
+
+    def fake_client_session(read: Any, write: Any) -> Any:
+        return _make_session_cm("x")
+
+    async def fake_load_mcp_tools(session: Any) -> list[Any]:
+        tool = MagicMock()
+        tool.name = "search"
+        return [tool]
+
+    with (
+        patch.dict("os.environ", {"MCP_SERVERS_FILE": servers_file}, clear=True),
+        patch("slack_agent.agent.stdio_client", side_effect=fake_stdio),
+        patch("slack_agent.agent.ClientSession", side_effect=fake_client_session),
+        patch.dict(
+            "sys.modules",
+            {"langchain_mcp_adapters": MagicMock(), "langchain_mcp_adapters.tools": MagicMock()},
+        ),
+    ):
+        import sys
+
+        sys.modules["langchain_mcp_adapters.tools"].load_mcp_tools = fake_load_mcp_tools
+        agent_mod._cached_tools = None
+        await agent_mod._mcp_manager.close()
+        return await agent_mod.load_mcp_tools_once()
+
+
+@pytest.mark.asyncio
+async def test_multi_server_tools_are_namespaced(tmp_path: Path) -> None:
+    """複数サーバーのツールは `<server>_<tool>` で結合される。"""
+    servers_file = _write_servers_file(
+        tmp_path,
+        {"code": {"command": "code-cmd"}, "tickets": {"command": "ticket-cmd"}},
+    )
+
+    tools = await _run_load(servers_file, {"code-cmd": "ok", "ticket-cmd": "ok"})
+
+    assert sorted(t.name for t in tools) == ["code_search", "tickets_search"]
+    assert set(agent_mod._mcp_manager.sessions) == {"code", "tickets"}
+    # search を持つサーバーごとに multi_search ツールも名前空間付きで生成される
+    multi = agent_mod._multi_search_tools(namespaced=True)
+    assert sorted(t.name for t in multi) == ["code_multi_search", "tickets_multi_search"]
+    await agent_mod._mcp_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_failing_and_slow_servers_do_not_block_others(tmp_path: Path) -> None:
+    """失敗/タイムアウトしたサーバーは除外され、他サーバーのツールは利用できる。"""
+    servers_file = _write_servers_file(
+        tmp_path,
+        {
+            "code": {"command": "code-cmd"},
+            "broken": {"command": "broken-cmd"},
+            "slow": {"command": "slow-cmd", "timeouts": {"init": 1}},
+        },
+    )
+
+    started = time.monotonic()
+    tools = await _run_load(
+        servers_file, {"code-cmd": "ok", "broken-cmd": "fail", "slow-cmd": "hang"}
+    )
+    elapsed = time.monotonic() - started
+
+    assert [t.name for t in tools] == ["code_search"]
+    assert list(agent_mod._mcp_manager.sessions) == ["code"]
+    # 遅いサーバーは自身の init タイムアウト（1 秒）で打ち切られる
+    assert elapsed < 5
+    await agent_mod._mcp_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_all_servers_failing_raises(tmp_path: Path) -> None:
+    servers_file = _write_servers_file(tmp_path, {"broken": {"command": "broken-cmd"}})
+
+    with pytest.raises(RuntimeError, match="初期化にすべて失敗"):
+        await _run_load(servers_file, {"broken-cmd": "fail"})
+
+    assert agent_mod._mcp_manager.session is None
+    assert agent_mod._cached_tools is None
+
+
+def test_servers_file_parsing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    servers_file = _write_servers_file(
+        tmp_path,
+        {
+            "code": {
+                "command": "node",
+                "args": ["server.js", "--stdio"],
+                "env": {"TOKEN": "x"},
+                "timeouts": {"init": 20, "list": 5, "call": 60},
+            }
+        },
+    )
+    monkeypatch.delenv("MCP_SEMCHE_PATH", raising=False)
+    monkeypatch.setenv("MCP_SERVERS_FILE", servers_file)
+
+    settings = MCPSettings.from_env()
+
+    (server,) = settings.servers
+    assert server.name == "code"
+    assert server.args == ("server.js", "--stdio")
+    assert server.process_env()["TOKEN"] == "x"
+    assert (server.init_timeout, server.list_timeout, server.call_timeout) == (20, 5, 60)
+    assert settings.namespaced is False
+
+
+def test_servers_file_rejects_invalid_name(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    servers_file = _write_servers_file(tmp_path, {"bad name": {"command": "x"}})
+    monkeypatch.delenv("MCP_SEMCHE_PATH", raising=False)
+    monkeypatch.setenv("MCP_SERVERS_FILE", servers_file)
+
+    with pytest.raises(RuntimeError, match="サーバー名が不正"):
+        MCPSettings.from_env()
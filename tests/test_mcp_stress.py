@@ -0,0 +1,117 @@
+"""共有 MCP セッションへの大量同時呼び出しのストレステスト（偽 stdio サーバー使用）。
+
+`MCPConnectionManager` はすべての同時 `invoke_agent` で 1 つの `ClientSession` を共有する。
+ここでは実際の stdio 子プロセス（`tests/fake_mcp_server.py`）に数百件の `call_tool` を同時に
+投げ、要求と応答の対応が取り違えられないこと、遅い 1 件が他の呼び出しを塞がないこと
+（head-of-line blocking がないこと）を確かめる。いずれも完了の順序と重なりで判定し、経過時間は
+見ない（負荷の高い CI でも揺れない）。スループットと遅延の分布の計測は
+`benchmarks/bench_mcp_concurrency.py`。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fake_mcp_server import digest, payload_for
+from mcp.types import CallToolResult, TextContent
+
+from slack_agent.agent import _load_server_tools, _ServerConnection
+from slack_agent.config import MCPServerSettings
+from slack_agent.mcp.session import ManagedSession
+
+FAKE_SERVER = str(Path(__file__).with_name("fake_mcp_server.py"))
+
+
+async def _connect(latency_ms: float = 5.0, jitter_ms: float = 20.0) -> _ServerConnection:
+    settings = MCPServerSettings(
+        name="fake",
+        command=sys.executable,
+        args=(FAKE_SERVER, f"--latency-ms={latency_ms}", f"--jitter-ms={jitter_ms}"),
+        call_timeout=30.0,
+    )
+    conn = _ServerConnection(settings)
+    await conn.start()
+    return conn
+
+
+def _payload(result: CallToolResult) -> dict[str, Any]:
+    assert not result.isError
+    block = result.content[0]
+    assert isinstance(block, TextContent)
+    data: dict[str, Any] = json.loads(block.text)
+    return data
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_paired_with_their_responses() -> None:
+    conn = await _connect()
+    try:
+        assert conn.session is not None
+        managed = ManagedSession("fake", conn.session, call_timeout=30.0)
+        completed: list[int] = []
+
+        async def _call(i: int) -> tuple[int, dict[str, Any]]:
+            # 応答サイズもばらつかせ、大きな応答の読み取り中に他の応答が混ざらないことも確かめる
+            args = {"query": f"q{i}", "payload_kb": (i % 4) * 16}
+            data = _payload(await managed.call_tool("search", args))
+            completed.append(i)
+            return i, data
+
+        results = await asyncio.gather(*(_call(i) for i in range(300)))
+
+        for i, data in results:
+            assert data["query"] == f"q{i}"
+            assert data["digest"] == digest(payload_for(f"q{i}", (i % 4) * 16))
+            assert data["document"] == payload_for(f"q{i}", (i % 4) * 16)
+        # 揺らぎのある遅延で応答は発行順と異なる順に届く（1 本のセッションで多重化されている。
+        # 呼び出しが 1 件ずつ直列化されていれば発行順に完了する）
+        assert completed != sorted(completed)
+    finally:
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_call_does_not_block_other_calls() -> None:
+    conn = await _connect(jitter_ms=0.0)
+    try:
+        assert conn.session is not None
+        managed = ManagedSession("fake", conn.session, call_timeout=30.0)
+        slow = asyncio.create_task(managed.call_tool("search", {"query": "slow", "delay_ms": 1500}))
+        await asyncio.sleep(0.05)  # 遅い要求を先にサーバーへ届ける
+
+        async def _fast(i: int) -> bool:
+            data = _payload(await managed.call_tool("search", {"query": f"fast{i}"}))
+            assert data["query"] == f"fast{i}"
+            # 後から発行した速い呼び出しが、先に発行した遅い呼び出しの応答を待たずに完了する
+            return not slow.done()
+
+        overlapped = await asyncio.gather(*(_fast(i) for i in range(100)))
+
+        assert all(overlapped)
+        assert _payload(await slow)["query"] == "slow"
+    finally:
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_langchain_tools_share_the_session_concurrently() -> None:
+    conn = await _connect()
+    try:
+        (tool,) = await _load_server_tools(conn, namespaced=False)
+
+        async def _invoke(i: int) -> str:
+            output = await tool.ainvoke({"query": f"lc{i}", "payload_kb": 1})
+            if isinstance(output, list):
+                output = "".join(block.get("text", "") for block in output)
+            return str(json.loads(output)["query"])
+
+        queries = await asyncio.gather(*(_invoke(i) for i in range(200)))
+
+        assert queries == [f"lc{i}" for i in range(200)]
+    finally:
+        await conn.close()
@@ -0,0 +1,123 @@
+"""メモリの内訳レポートとメモリ予算によるキャッシュの縮小のテスト。"""
+
+from __future__ import annotations
+
+import json
+import tracemalloc
+import urllib.request
+
+import pytest
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from slack_agent import metrics
+from slack_agent.cache import TTLCache
+from slack_agent.checkpoint import ThreadCheckpoints, run_config
+from slack_agent.config import CheckpointSettings, MemorySettings
+from slack_agent.memory import MemoryMonitor, deep_sizeof
+
+
+def test_ttl_cache_shrink_drops_least_recently_used() -> None:
+    cache: TTLCache[str, int] = TTLCache(10, 60)
+    for i in range(4):
+        cache.set(f"k{i}", i)
+    cache.get("k0")  # k0 を最近利用扱いにする
+
+    assert cache.shrink(0.5) == 2
+    assert cache.get("k1") is None and cache.get("k2") is None
+    assert cache.get("k0") == 0 and cache.get("k3") == 3
+
+
+def test_deep_sizeof_counts_shared_objects_once() -> None:
+    payload = ["x" * 10_000 for _ in range(10)]
+    size, truncated = deep_sizeof({"a": payload})
+    assert size > 100_000 and not truncated
+
+    seen: set[int] = set()
+    deep_sizeof(payload, seen)
+    shared, _ = deep_sizeof({"a": payload}, seen)
+    assert shared < 1_000
+    assert deep_sizeof(payload, limit=3)[1] is True
+
+
+def test_report_lists_subsystems_and_top_allocators() -> None:
+    monitor = MemoryMonitor(MemorySettings(report_top=5), rss=lambda: 64 * 1024 * 1024)
+    cache: TTLCache[str, bytes] = TTLCache(100, 60)
+    monitor.register("cache", lambda: cache, cache.__len__, cache.shrink)
+    monitor.register("graph", lambda: {"cache": cache, "other": b"y" * 50_000})
+
+    tracemalloc.start()
+    try:
+        for i in range(20):
+            cache.set(str(i), b"x" * 10_000)
+        report = monitor.report()
+        json.dumps(report)  # /debug/memory でそのまま出せる
+        second = monitor.report()
+    finally:
+        tracemalloc.stop()
+
+    assert report["rss_bytes"] == 64 * 1024 * 1024
+    assert report["subsystems"]["cache"]["entries"] == 20
+    assert report["subsystems"]["cache"]["bytes"] > 200_000
+    # キャッシュで数えた分はグラフ側に二重に数えない
+    assert 50_000 < report["subsystems"]["graph"]["bytes"] < 100_000
+    assert report["tracemalloc"]["tracing"] is True
+    assert 0 < len(report["tracemalloc"]["top"]) <= 5
+    assert "growth" in second["tracemalloc"]
+
+
+@pytest.mark.asyncio
+async def test_check_shrinks_caches_only_over_watermark() -> None:
+    metrics.REGISTRY.reset()
+    rss = {"value": 50 * 1024 * 1024}
+    settings = MemorySettings(budget_mb=100, high_watermark=0.8, shrink_fraction=0.5)
+    monitor = MemoryMonitor(settings, rss=lambda: rss["value"])
+    cache: TTLCache[str, int] = TTLCache(100, 60)
+    for i in range(10):
+        cache.set(str(i), i)
+    saver = InMemorySaver()
+    graph = create_agent(
+        model=GenericFakeChatModel(messages=iter([])), tools=[], checkpointer=saver
+    )
+    checkpoints = ThreadCheckpoints(saver, CheckpointSettings())
+    for tid in ("t1", "t2", "t3", "t4"):
+        await checkpoints.begin(tid)
+        await graph.aupdate_state(run_config(tid), {"messages": [HumanMessage("x")]})
+        await checkpoints.end(tid, message_count=1)
+    await checkpoints.begin("t1")  # 実行中のスレッドは退避しない
+    monitor.register("cache", lambda: cache, cache.__len__, cache.shrink)
+    monitor.register("checkpoints", lambda: saver, checkpoints.__len__, checkpoints.shrink)
+    monitor.register("tools", lambda: [1, 2, 3], lambda: 3)
+
+    assert await monitor.check() is None
+    assert len(cache) == 10
+
+    rss["value"] = 90 * 1024 * 1024
+    freed = await monitor.check()
+    assert freed == {"cache": 5, "checkpoints": 2}
+    assert len(cache) == 5
+    assert await checkpoints.has_state("t1") is True
+    assert await saver.aget_tuple(run_config("t2")) is None  # type: ignore[arg-type]
+    assert metrics.counter("slack_agent_memory_budget_exceeded_total", "").value() == 1
+    evicted = metrics.counter("slack_agent_memory_evicted_entries_total", "")
+    assert evicted.value(subsystem="checkpoints") == 2
+
+
+def test_debug_memory_page_is_served_with_metrics() -> None:
+    monitor = MemoryMonitor(rss=lambda: 1024)
+    monitor.register("cache", lambda: {"k": "v"}, lambda: 1)
+    metrics.add_page("/debug/memory", monitor.render, "application/json")
+    server = metrics.start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/debug/memory"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("application/json")
+            report = json.loads(response.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert report["rss_bytes"] == 1024
+    assert report["subsystems"]["cache"]["entries"] == 1
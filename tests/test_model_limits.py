@@ -0,0 +1,124 @@
+"""モデル呼び出しの流量制御（TPM / RPM）と再試行（ModelRateLimitMiddleware）のテスト。"""
+
+from __future__ import annotations
+
+import time
+import types
+from typing import Any
+
+import httpx
+import openai
+import pytest
+from langchain.agents import create_agent
+from langchain.agents.middleware import ModelResponse
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from slack_agent import metrics
+from slack_agent.config import ModelClientSettings
+from slack_agent.middleware.model_limits import ModelRateLimitMiddleware, retry_after_seconds
+from slack_agent.ratelimit import ModelRateLimiter, estimate_tokens
+
+_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _rate_limited(headers: dict[str, str], code: str | None = None) -> openai.RateLimitError:
+    response = httpx.Response(429, headers=headers, request=_REQUEST)
+    body = {"code": code, "message": "rate limited"} if code else None
+    return openai.RateLimitError("rate limited", response=response, body=body)
+
+
+def _request(text: str = "ログイン処理の仕様を教えて") -> Any:
+    return types.SimpleNamespace(system_message=None, messages=[HumanMessage(text)], tools=[])
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_requests_beyond_tpm() -> None:
+    """TPM の枠を使い切ったリクエストは 429 を受ける代わりに補充まで待つ。"""
+    metrics.REGISTRY.reset()
+    limiter = ModelRateLimiter(tpm=6000)  # 100 トークン/秒
+
+    assert await limiter.acquire(6000) < 0.05
+    started = time.perf_counter()
+    await limiter.acquire(20)
+    assert time.perf_counter() - started >= 0.15
+
+    wait = metrics.histogram("slack_agent_model_limiter_wait_seconds", "", ())
+    assert wait.count() == 2
+
+
+@pytest.mark.asyncio
+async def test_settle_charges_tokens_used_beyond_estimate() -> None:
+    limiter = ModelRateLimiter(tpm=60_000)
+    await limiter.acquire(100)
+    assert limiter.tokens is not None
+    before = limiter.tokens.available
+
+    limiter.settle(estimated=100, actual=1100)
+
+    assert limiter.tokens.available == pytest.approx(before - 1000, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_is_retried_after_retry_after() -> None:
+    metrics.REGISTRY.reset()
+    settings = ModelClientSettings(
+        retry_base_seconds=0.01, retry_max_seconds=0.01, tpm_limit=60_000
+    )
+    middleware = ModelRateLimitMiddleware(settings)
+    calls: list[float] = []
+
+    async def handler(request: Any) -> ModelResponse[Any]:
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            raise _rate_limited({"retry-after-ms": "200"})
+        usage = {"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}
+        return ModelResponse(result=[AIMessage("ok", usage_metadata=usage)])  # type: ignore[arg-type]
+
+    response = await middleware.awrap_model_call(_request(), handler)
+
+    assert isinstance(response, ModelResponse)
+    assert response.result[0].content == "ok"
+    assert calls[1] - calls[0] >= 0.19
+    assert metrics.counter("slack_agent_model_retries_total", "").value(reason="ratelimited") == 1
+    tokens = metrics.counter("slack_agent_model_limiter_tokens_total", "")
+    assert tokens.value(kind="actual") == 15
+
+
+@pytest.mark.asyncio
+async def test_insufficient_quota_is_not_retried() -> None:
+    middleware = ModelRateLimitMiddleware(ModelClientSettings(retry_base_seconds=0.01))
+    calls = 0
+
+    async def handler(request: Any) -> ModelResponse[Any]:
+        nonlocal calls
+        calls += 1
+        raise _rate_limited({}, code="insufficient_quota")
+
+    with pytest.raises(openai.RateLimitError):
+        await middleware.awrap_model_call(_request(), handler)
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_middleware_runs_inside_agent_graph() -> None:
+    metrics.REGISTRY.reset()
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="done")]))
+    middleware = ModelRateLimitMiddleware(ModelClientSettings(rpm_limit=60))
+    graph = create_agent(model=model, tools=[], middleware=[middleware])
+
+    state = await graph.ainvoke({"messages": [{"role": "user", "content": "こんにちは"}]})
+
+    assert state["messages"][-1].content == "done"
+    assert metrics.histogram("slack_agent_model_limiter_wait_seconds", "", ()).count() == 1
+
+
+def test_estimate_tokens_and_retry_after_parsing() -> None:
+    ascii_only = estimate_tokens([HumanMessage("a" * 400)])
+    japanese = estimate_tokens([HumanMessage("あ" * 400)])
+    assert ascii_only < japanese
+    assert estimate_tokens([HumanMessage("x")], output_tokens=1000) > 1000
+
+    assert retry_after_seconds(_rate_limited({"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(_rate_limited({"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(_rate_limited({})) is None
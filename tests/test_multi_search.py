@@ -0,0 +1,142 @@
+"""マルチクエリ検索（multi_search）と Reciprocal Rank Fusion のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any
+
+import pytest
+from mcp.types import CallToolResult, TextContent
+
+from slack_agent.mcp import semche
+
+
+class _FakeSearchSession:
+    """クエリごとに決まった順位の結果を返す search ツールのフェイク。"""
+
+    def __init__(self, ranking: dict[str, list[str]], delay: float = 0.0) -> None:
+        self.ranking = ranking
+        self.delay = delay
+        self.calls: list[dict[str, Any]] = []
+
+    async def call_tool(self, name: str, arguments: dict[str, Any] | None = None) -> CallToolResult:
+        args = arguments or {}
+        self.calls.append({"name": name, **args})
+        await asyncio.sleep(self.delay)
+        key = f"{args['query']}|{args.get('file_type', '')}"
+        if key not in self.ranking:
+            raise RuntimeError(f"search failed: {key}")
+        results = [
+            {"filepath": fp, "score": 1.0, "document": f"doc:{fp}", "metadata": {}}
+            for fp in self.ranking[key]
+        ]
+        payload = {"status": "success", "message": "ok", "results": results}
+        return CallToolResult(content=[TextContent(type="text", text=json.dumps(payload))])
+
+
+def test_fuse_results_prefers_documents_ranked_by_many_queries() -> None:
+    def resp(paths: list[str]) -> semche.SearchResponse:
+        return {
+            "status": "success",
+            "message": "",
+            "results": [{"filepath": p, "score": 0.0, "metadata": {}} for p in paths],
+            "count": len(paths),
+            "query_vector_dimension": None,
+            "persist_directory": None,
+        }
+
+    fused = semche.fuse_results([resp(["a", "b", "c"]), resp(["b", "d"]), resp(["b", "a"])])
+
+    assert [r["filepath"] for r in fused] == ["b", "a", "d", "c"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61 + 1 / 61, rel=1e-4)
+
+
+@pytest.mark.asyncio
+async def test_multi_search_fans_out_concurrently_and_dedups() -> None:
+    """クエリ × file_type を並列に呼び出し、filepath で重複を除いて統合する。"""
+    session = _FakeSearchSession(
+        {
+            "ログイン|コード": ["auth.py", "login.py"],
+            "ログイン|実装内容": ["auth.py.exp.md"],
+            "認証|コード": ["login.py", "session.py"],
+            "認証|実装内容": ["auth.py.exp.md", "login.py.exp.md"],
+        },
+        delay=0.2,
+    )
+
+    started = time.perf_counter()
+    response = await semche.multi_search(
+        session, ["ログイン", "認証", "ログイン"], file_types=["コード", "実装内容"], top_k=3
+    )
+    elapsed = time.perf_counter() - started
+
+    assert len(session.calls) == 4  # 重複クエリは 1 回にまとめる
+    assert elapsed < 0.6
+    assert response["status"] == "success"
+    paths = [r["filepath"] for r in response["results"]]
+    assert paths[:2] == ["auth.py.exp.md", "login.py"]
+    assert len(paths) == len(set(paths)) == 3
+    assert response["results"][0]["document"] == "doc:auth.py.exp.md"
+
+
+@pytest.mark.asyncio
+async def test_multi_search_tolerates_partial_failures() -> None:
+    session = _FakeSearchSession({"a|": ["x.py"]})
+
+    partial = await semche.multi_search(session, ["a", "b"])
+    assert partial["status"] == "success"
+    assert partial["count"] == 1
+    assert "failed=1" in partial["message"]
+
+    failed = await semche.multi_search(session, ["b"])
+    assert failed["status"] == "error"
+    assert failed["results"] == []
+
+
+@pytest.mark.asyncio
+async def test_multi_search_tool_returns_json() -> None:
+    session = _FakeSearchSession({"q|JIRA": ["PROJ-1"]})
+    tool = semche.build_multi_search_tool(session, name="semche_multi_search")
+
+    raw = await tool.ainvoke({"queries": ["q"], "file_types": ["JIRA"]})
+
+    assert tool.name == "semche_multi_search"
+    data = json.loads(raw)
+    assert data["results"][0]["filepath"] == "PROJ-1"
+    assert session.calls[0]["include_documents"] is True
+
+
+@pytest.mark.asyncio
+async def test_multi_search_rejects_blank_queries_with_error_response() -> None:
+    """空・空白のみのクエリは例外にせず status=error を返す（呼び出しは発行しない）。"""
+    session = _FakeSearchSession({})
+    tool = semche.build_multi_search_tool(session)
+
+    data = json.loads(await tool.ainvoke({"queries": ["", "  "]}))
+
+    assert data["status"] == "error"
+    assert data["results"] == []
+    assert session.calls == []
+
+
+@pytest.mark.asyncio
+async def test_multi_search_tool_resolves_settings_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """クライアント設定はツール生成時に 1 回だけ解決し、呼び出しごとに読み直さない。"""
+    resolved: list[semche.SemcheClientSettings] = []
+
+    def counting_get_client() -> semche.SemcheClientSettings:
+        cfg = semche.SemcheClientSettings(None, None, 10, "/data/chroma")
+        resolved.append(cfg)
+        return cfg
+
+    monkeypatch.setattr(semche, "get_client", counting_get_client)
+    session = _FakeSearchSession({"q|": ["a.py"]})
+    tool = semche.build_multi_search_tool(session)
+
+    await tool.ainvoke({"queries": ["q"]})
+    data = json.loads(await tool.ainvoke({"queries": ["missing"]}))
+
+    assert len(resolved) == 1
+    assert data["persist_directory"] == "/data/chroma"
@@ -0,0 +1,148 @@
+"""送信スケジューラ（チャンネル別キュー・更新のまとめ・長文分割・ratelimited 再送）のテスト。"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.slack_response import SlackResponse
+
+from slack_agent import metrics
+from slack_agent.config import OutboundSettings
+from slack_agent.outbound import OutboundScheduler
+from slack_agent.text import split_message
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, str, float]] = []
+        self.lock = threading.Lock()
+
+    def sender(self, channel: str) -> Any:
+        def send(text: str) -> str:
+            with self.lock:
+                self.sent.append((channel, text, time.monotonic()))
+            return f"ok:{text[:10]}"
+
+        return send
+
+
+def _ratelimited(retry_after: str) -> SlackApiError:
+    response = SlackResponse(
+        client=None,
+        http_verb="POST",
+        api_url="https://slack.com/api/chat.postMessage",
+        req_args={},
+        data={"ok": False, "error": "ratelimited"},
+        headers={"retry-after": retry_after},
+        status_code=429,
+    )
+    return SlackApiError("ratelimited", response)
+
+
+def test_posts_to_same_channel_are_spaced_but_channels_run_in_parallel() -> None:
+    metrics.REGISTRY.reset()
+    recorder = _Recorder()
+    scheduler = OutboundScheduler(OutboundSettings(channel_interval_seconds=0.2))
+    try:
+        futures = [
+            *scheduler.post("C1", "a1", recorder.sender("C1")),
+            *scheduler.post("C1", "a2", recorder.sender("C1")),
+            *scheduler.post("C2", "b1", recorder.sender("C2")),
+        ]
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        scheduler.close(timeout=5)
+
+    c1 = [at for channel, _, at in recorder.sent if channel == "C1"]
+    c2 = [at for channel, _, at in recorder.sent if channel == "C2"]
+    assert [text for channel, text, _ in recorder.sent if channel == "C1"] == ["a1", "a2"]
+    assert c1[1] - c1[0] >= 0.18
+    # 別チャンネルは C1 の間隔待ちに巻き込まれない
+    assert c2[0] < c1[1]
+    assert metrics.histogram("slack_agent_outbound_queue_seconds", "", ()).count(kind="post") == 3
+
+
+def test_pending_updates_for_same_message_are_coalesced() -> None:
+    """送信待ちの同じ ts への更新は最新の内容 1 件だけが送られる。"""
+    metrics.REGISTRY.reset()
+    recorder = _Recorder()
+    scheduler = OutboundScheduler(OutboundSettings(channel_interval_seconds=0.2))
+    try:
+        scheduler.post("C1", "first", recorder.sender("C1"))[0].result(timeout=5)
+        # ここから 0.2 秒はチャンネルが空かないため、更新はキューに溜まる
+        updates = [
+            scheduler.update("C1", "111.222", f"partial {i}", recorder.sender("C1"))
+            for i in range(5)
+        ]
+        for future in updates:
+            assert future.result(timeout=5) == "ok:partial 4"
+    finally:
+        scheduler.close(timeout=5)
+
+    assert [text for _, text, _ in recorder.sent] == ["first", "partial 4"]
+    assert metrics.counter("slack_agent_outbound_coalesced_total", "").value() == 4
+
+
+def test_long_answer_is_split_in_order() -> None:
+    recorder = _Recorder()
+    scheduler = OutboundScheduler(OutboundSettings(channel_interval_seconds=0, max_chars=120))
+    paragraphs = [f"段落{i} " + "あ" * 50 for i in range(6)]
+    try:
+        futures = scheduler.post("C1", "\n\n".join(paragraphs), recorder.sender("C1"))
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        scheduler.close(timeout=5)
+
+    texts = [text for _, text, _ in recorder.sent]
+    assert len(texts) == len(futures) > 1
+    assert all(len(t) <= 120 for t in texts)
+    assert "\n\n".join(texts) == "\n\n".join(paragraphs)
+
+
+def test_ratelimited_post_is_retried_after_retry_after() -> None:
+    metrics.REGISTRY.reset()
+    attempts: list[float] = []
+
+    def send(text: str) -> str:
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise _ratelimited("0.2")
+        return "sent"
+
+    scheduler = OutboundScheduler(OutboundSettings(channel_interval_seconds=0))
+    try:
+        assert scheduler.post("C1", "hello", send)[0].result(timeout=5) == "sent"
+    finally:
+        scheduler.close(timeout=5)
+
+    assert attempts[1] - attempts[0] >= 0.18
+    assert metrics.counter("slack_agent_outbound_ratelimited_total", "").value(kind="post") == 1
+
+
+def test_send_errors_are_raised_from_future() -> None:
+    def send(text: str) -> None:
+        raise RuntimeError("boom")
+
+    scheduler = OutboundScheduler(OutboundSettings(channel_interval_seconds=0))
+    try:
+        with pytest.raises(RuntimeError, match="boom"):
+            scheduler.post("C1", "hello", send)[0].result(timeout=5)
+    finally:
+        scheduler.close(timeout=5)
+
+
+@pytest.mark.parametrize("limit", [60, 200])
+def test_split_message_keeps_code_fences_balanced(limit: int) -> None:
+    text = "説明\n\n```\n" + "\n".join(f"line {i} = value" for i in range(30)) + "\n```\n\n以上"
+    chunks = split_message(text, limit)
+
+    assert len(chunks) > 1
+    assert all(len(c) <= limit for c in chunks)
+    assert all(c.count("```") % 2 == 0 for c in chunks)
+    assert split_message("short", limit) == ["short"]
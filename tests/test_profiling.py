@@ -0,0 +1,76 @@
+"""遅いメンションだけを対象にしたサンプリングプロファイラ（RequestProfiler）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from slack_agent.background import BackgroundLoop
+from slack_agent.config import ProfileSettings
+from slack_agent.profiling import RequestProfiler
+
+
+async def _blocking_step() -> None:
+    time.sleep(0.15)  # ループを止める同期処理（[running] として採取される）
+
+
+async def _slow_request() -> str:
+    await asyncio.sleep(0.15)
+    await _blocking_step()
+    return "ok"
+
+
+async def _other_mention() -> None:
+    await asyncio.sleep(0.3)
+
+
+@pytest.fixture
+def bg() -> BackgroundLoop:
+    loop = BackgroundLoop(name="test-profile-loop")
+    loop.start()
+    yield loop  # type: ignore[misc]
+    loop.stop(timeout=2)
+
+
+def test_slow_request_writes_collapsed_stacks(tmp_path: Path, bg: BackgroundLoop) -> None:
+    settings = ProfileSettings(dir=str(tmp_path), threshold_seconds=0.05, interval_seconds=0.005)
+    profiler = RequestProfiler(settings, loop=bg)
+    other = bg.submit(_other_mention())
+
+    with profiler.watch(channel="C1", thread_ts="1700000000.000100") as watch:
+        assert bg.run(watch.instrument(_slow_request())) == "ok"
+    other.result(2)
+
+    [path] = list(tmp_path.glob("mention-*.collapsed"))
+    assert "C1" in path.name and "1700000000.000100" in path.name
+    lines = path.read_text(encoding="utf-8").splitlines()
+    stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+    waiting = [s for s in stacks if s.startswith("[waiting]") and "_slow_request" in s]
+    running = [s for s in stacks if s.startswith("[running]") and "_blocking_step" in s]
+    assert waiting and running
+    assert all(s.split(";")[-1].startswith("[await") for s in waiting)
+    # 同じループ上の他のメンションのタスクは混ざらない
+    assert not any("_other_mention" in s for s in stacks)
+
+
+def test_fast_request_is_not_sampled(tmp_path: Path, bg: BackgroundLoop) -> None:
+    settings = ProfileSettings(dir=str(tmp_path), threshold_seconds=5.0)
+    profiler = RequestProfiler(settings, loop=bg)
+
+    with profiler.watch(channel="C1", thread_ts="1.0") as watch:
+        bg.run(watch.instrument(asyncio.sleep(0.05)))
+
+    assert watch.ticks == 0 and not watch.sampling
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disabled_profiler_does_not_wrap(bg: BackgroundLoop) -> None:
+    profiler = RequestProfiler(ProfileSettings(), loop=bg)
+    coro = asyncio.sleep(0)
+
+    with profiler.watch(channel="C1") as watch:
+        assert watch.instrument(coro) is coro
+        bg.run(coro)
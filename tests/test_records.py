@@ -0,0 +1,38 @@
+"""コンパクトなメッセージレコード（ThreadMessage）のテスト。"""
+
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+from slack_agent.records import ThreadMessage
+
+
+def test_from_slack_keeps_only_needed_fields() -> None:
+    raw = {
+        "ts": "1700000000.000100",
+        "user": "U1",
+        "text": "<@UBOT> 見てください",
+        "blocks": [{"type": "rich_text", "elements": []}],
+        "attachments": [{"fallback": "x"}],
+        "reactions": [{"name": "eyes", "count": 1}],
+        "files": [{"id": "F1"}],
+    }
+
+    msg = ThreadMessage.from_slack(raw)
+
+    assert msg == ThreadMessage(
+        ts="1700000000.000100", user="U1", is_bot=False, text="<@UBOT> 見てください"
+    )
+    assert not hasattr(msg, "__dict__")
+    assert ThreadMessage.from_slack({"ts": "1", "bot_id": "B1"}).is_bot is True
+
+
+def test_record_is_immutable() -> None:
+    msg = ThreadMessage(ts="1", user=None, is_bot=True, text="a")
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        msg.text = "b"  # type: ignore[misc]
+    assert msg.with_text("b").text == "b"
+    assert msg.text == "a"
@@ -1,6 +1,12 @@
 from __future__ import annotations
 
+import json
+import sys
+from types import SimpleNamespace
+from typing import Any
+
 import pytest
+from mcp.types import CallToolResult, TextContent
 
 from slack_agent.mcp import semche as semche_client
 
@@ -51,3 +57,76 @@ def test_semche_search_requires_path_without_mock(monkeypatch: pytest.MonkeyPatc
         semche_client.search(query="q")
 
     assert "MCP_SEMCHE_PATH" in str(ei.value)
+
+
+def _settings() -> semche_client.SemcheClientSettings:
+    return semche_client.SemcheClientSettings(path=None, url=None, timeout=10, chroma_dir=None)
+
+
+def test_parse_text_json_normalizes_in_place() -> None:
+    """テキストの JSON は 1 回だけ解析され、整形はその場で行われる（余分なキーは除去）。"""
+    payload = {
+        "status": "success",
+        "results": [
+            {"filepath": "a.py", "score": 1, "document": "本文", "metadata": None, "x": 1},
+            {"filepath": "b.py", "score": 0.5, "document": None},
+            "broken",
+        ],
+    }
+    result = CallToolResult(content=[TextContent(type="text", text=json.dumps(payload))])
+
+    resp = semche_client.parse_call_tool_result(result, _settings())
+
+    assert resp["results"] == [
+        {"filepath": "a.py", "score": 1.0, "document": "本文", "metadata": {}},
+        {"filepath": "b.py", "score": 0.5, "metadata": {}},
+    ]
+    assert resp["count"] == 2
+
+
+def test_structured_content_is_reused_without_copy() -> None:
+    """structuredContent があればテキストは解析せず、本文文字列も複製しない。"""
+    document = "長い本文" * 1000
+    structured = {"status": "success", "results": [{"filepath": "a.py", "document": document}]}
+    result = CallToolResult(
+        content=[TextContent(type="text", text="{not json")], structuredContent=structured
+    )
+
+    resp = semche_client.parse_call_tool_result(result, _settings())
+
+    assert resp["results"][0]["document"] is document
+    assert resp["results"][0] is structured["results"][0]
+
+
+def test_non_json_text_falls_back_to_message() -> None:
+    result = CallToolResult(content=[TextContent(type="text", text="検索しました")])
+
+    resp = semche_client.parse_call_tool_result(result, _settings())
+
+    assert resp["message"] == "検索しました"
+    assert resp["results"] == []
+
+
+def test_json_backend_is_read_from_settings_when_parsing(monkeypatch: pytest.MonkeyPatch) -> None:
+    """`SEMCHE_JSON_BACKEND` は import 時ではなく from_env() で読み、解析時にバックエンドを選ぶ。"""
+    monkeypatch.setenv("SEMCHE_JSON_BACKEND", " ORJSON ")
+    cfg = semche_client.SemcheClientSettings.from_env()
+    assert cfg.json_backend == "orjson"
+
+    parsed: list[str] = []
+
+    def fake_loads(text: str) -> Any:
+        parsed.append(text)
+        return json.loads(text)
+
+    monkeypatch.setitem(sys.modules, "orjson", SimpleNamespace(loads=fake_loads))
+    semche_client._select_json_loads.cache_clear()
+    try:
+        payload = json.dumps({"status": "success", "results": [{"filepath": "a.py"}]})
+        result = CallToolResult(content=[TextContent(type="text", text=payload)])
+        response = semche_client.parse_call_tool_result(result, cfg)
+    finally:
+        semche_client._select_json_loads.cache_clear()
+
+    assert parsed == [payload]
+    assert response["results"][0]["filepath"] == "a.py"
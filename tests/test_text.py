@@ -2,7 +2,12 @@ from __future__ import annotations
 
 import pytest
 
-from slack_agent.text import DEFAULT_EMPTY_MESSAGE, clean_mention_text
+from slack_agent.text import (
+    DEFAULT_EMPTY_MESSAGE,
+    clean_mention_text,
+    mentioned_ids,
+    normalize_slack_text,
+)
 
 
 @pytest.mark.parametrize(
@@ -18,3 +23,29 @@ from slack_agent.text import DEFAULT_EMPTY_MESSAGE, clean_mention_text
 )
 def test_clean_mention_text(input_text: str, expected: str) -> None:
     assert clean_mention_text(input_text) == expected
+
+
+@pytest.mark.parametrize(
+    "input_text, expected",
+    [
+        ("<@U123> さんに確認", "@山田 さんに確認"),
+        ("<@U999|old> 未解決", "@old 未解決"),
+        ("<@U999>", "@U999"),
+        ("<#C1|general> と <#C2>", "#general と #random"),
+        ("<https://example.com/a|設計書> を参照", "設計書 (https://example.com/a) を参照"),
+        ("<https://example.com>", "https://example.com"),
+        ("<!here> <!subteam^S1|@dev> <mailto:a@b.jp|a@b.jp>", "@here @dev a@b.jp"),
+        ("a &lt; b &amp;&amp; c &gt; d", "a < b && c > d"),
+        ("plain text", "plain text"),
+    ],
+)
+def test_normalize_slack_text(input_text: str, expected: str) -> None:
+    users = {"U123": "山田"}
+    channels = {"C2": "random"}
+    assert normalize_slack_text(input_text, users, channels) == expected
+
+
+def test_mentioned_ids_skips_labelled_channels() -> None:
+    users, channels = mentioned_ids("<@U1> <@W2|x> <#C1|general> <#C2>")
+    assert users == {"U1", "W2"}
+    assert channels == {"C2"}
@@ -0,0 +1,83 @@
+"""1 ステップ内の並列ツール呼び出し（ToolStepConcurrencyMiddleware）のテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+from fake_models import FakeToolModel
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from slack_agent import metrics
+from slack_agent.middleware.tool_concurrency import ToolStepConcurrencyMiddleware
+
+
+def _build_graph(max_concurrency: int, active: list[int], peak: list[int]) -> Any:
+    async def search(query: str, file_type: str) -> str:
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        try:
+            await asyncio.sleep(0.2)
+        finally:
+            active[0] -= 1
+        return f"{file_type}:{query}"
+
+    tool = StructuredTool.from_function(
+        coroutine=search, name="search", description="社内ドキュメント検索"
+    )
+    tool_calls = [
+        {"name": "search", "args": {"query": "ログイン", "file_type": ft}, "id": f"call-{i}"}
+        for i, ft in enumerate(["実装内容", "コード", "JIRA"])
+    ]
+    model = FakeToolModel(
+        messages=iter([AIMessage(content="", tool_calls=tool_calls), AIMessage(content="done")])
+    )
+    return create_agent(
+        model=model,
+        tools=[tool],
+        middleware=[ToolStepConcurrencyMiddleware(max_concurrency)],
+    )
+
+
+@pytest.mark.asyncio
+async def test_parallel_tool_calls_run_concurrently() -> None:
+    """3 件の tool_calls が並列に実行され、短縮時間がメトリクスに記録される。"""
+    metrics.REGISTRY.reset()
+    active, peak = [0], [0]
+    graph = _build_graph(3, active, peak)
+
+    state = await graph.ainvoke({"messages": [{"role": "user", "content": "q"}]})
+
+    assert state["messages"][-1].content == "done"
+    assert peak[0] == 3
+    saved = metrics.counter("slack_agent_tool_step_saved_seconds_total", "").value()
+    assert saved > 0.3
+    assert metrics.histogram("slack_agent_tool_step_calls", "").count() == 1
+
+
+@pytest.mark.asyncio
+async def test_step_concurrency_limit_is_enforced() -> None:
+    """max_concurrency=1 では同時実行数が 1 に制限される。"""
+    active, peak = [0], [0]
+    graph = _build_graph(1, active, peak)
+
+    state = await graph.ainvoke({"messages": [{"role": "user", "content": "q"}]})
+
+    assert state["messages"][-1].content == "done"
+    assert peak[0] == 1
+
+
+def test_metrics_render_prometheus_text() -> None:
+    registry = metrics.MetricsRegistry()
+    registry.counter("demo_total", "demo").inc(2, channel="C1")
+    registry.histogram("demo_seconds", "demo", (0.1, 1.0)).observe(0.5)
+
+    text = registry.render()
+
+    assert 'demo_total{channel="C1"} 2.0' in text
+    assert 'demo_seconds_bucket{le="0.1"} 0.0' in text
+    assert 'demo_seconds_bucket{le="1.0"} 1.0' in text
+    assert "demo_seconds_count 1.0" in text
@@ -0,0 +1,142 @@
+"""リクエストごとのツール選択とスキーマ縮小（ToolSelectionMiddleware）のテスト。"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from fake_models import RecordingModel
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage
+from langchain_core.tools import BaseTool, StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from slack_agent import metrics
+from slack_agent.config import ToolSelectionSettings
+from slack_agent.middleware.tool_selection import (
+    ToolSelectionMiddleware,
+    ToolSelector,
+    minify_tool_schema,
+)
+from slack_agent.middleware.usage import usage_scope
+
+
+def _tool(name: str, description: str, calls: list[str] | None = None) -> BaseTool:
+    async def _run(**kwargs: Any) -> str:
+        if calls is not None:
+            calls.append(name)
+        return f"{name} ok"
+
+    schema = {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "title": "Query",
+                "description": "検索クエリ。" + "詳しい説明。" * 40,
+                "default": "",
+            },
+        },
+        "required": ["query"],
+    }
+    return StructuredTool(name=name, description=description, args_schema=schema, coroutine=_run)
+
+
+def _catalog(calls: list[str] | None = None) -> list[BaseTool]:
+    return [
+        _tool("semche_search", "社内ドキュメントをベクトル検索します。", calls),
+        _tool("jira_get_issue", "Fetch a JIRA issue by key, including comments.", calls),
+        _tool("jira_create_issue", "Create a new JIRA issue in a project.", calls),
+        _tool("calendar_list_events", "List calendar events for a user and date range.", calls),
+        _tool("github_list_pull_requests", "List open pull requests of a GitHub repo.", calls),
+        _tool("github_get_file", "Read a file from a GitHub repository.", calls),
+        _tool("deploy_status", "デプロイの状態と直近のリリース履歴を返します。", calls),
+        _tool("wiki_page", "Confluence wiki page content.", calls),
+    ]
+
+
+def test_selector_keeps_matching_and_always_on_tools_in_order() -> None:
+    selector = ToolSelector(ToolSelectionSettings(max_tools=3))
+    tools = _catalog()
+
+    selected, outcome = selector.select("PROJ-12 の JIRA issue のコメントを要約して", tools)
+    assert outcome == "subset"
+    assert [t.name for t in selected] == ["semche_search", "jira_get_issue", "jira_create_issue"]
+
+    selected, _ = selector.select("本番デプロイの状態は？", tools)
+    assert [t.name for t in selected] == ["semche_search", "deploy_status"]
+
+    # 既に呼んだツールは質問に合わなくても残す
+    selected, _ = selector.select("本番デプロイの状態は？", tools, used={"wiki_page"})
+    assert [t.name for t in selected] == ["semche_search", "deploy_status", "wiki_page"]
+
+
+def test_selector_falls_back_to_all_tools_without_any_match() -> None:
+    selector = ToolSelector(ToolSelectionSettings(max_tools=3, always=frozenset()))
+    tools = _catalog()
+
+    assert selector.select("こんにちは", tools) == (tools, "fallback")
+    # 上限以内のツール数なら選択しない
+    assert ToolSelector().select("こんにちは", tools[:4]) == (tools[:4], "all")
+
+
+def test_minify_drops_defaults_and_trims_descriptions_but_keeps_param_names() -> None:
+    schema = convert_to_openai_tool(
+        StructuredTool(
+            name="notes",
+            description="Search notes.\n\n" + "Long usage notes. " * 50,
+            args_schema={
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string", "title": "Title", "default": "x"},
+                    "limit": {"type": "integer", "description": "y" * 500, "examples": [1]},
+                },
+            },
+            coroutine=lambda **_: None,
+        )
+    )
+
+    minified = minify_tool_schema(schema, description_chars=300, param_description_chars=20)
+    function = minified["function"]
+
+    assert function["description"] == "Search notes."
+    assert function["parameters"]["properties"] == {
+        "title": {"type": "string"},
+        "limit": {"type": "integer", "description": "y" * 19 + "…"},
+    }
+    assert schema["function"]["parameters"]["properties"]["title"]["default"] == "x"
+
+
+@pytest.mark.asyncio
+async def test_middleware_binds_minified_subset_and_reports_savings() -> None:
+    metrics.REGISTRY.reset()
+    calls: list[str] = []
+    model = RecordingModel(
+        messages=iter(
+            [
+                AIMessage(
+                    "",
+                    tool_calls=[{"name": "deploy_status", "args": {"query": "prod"}, "id": "c1"}],
+                ),
+                AIMessage("稼働中です"),
+            ]
+        )
+    )
+    model.bound = []
+    middleware = ToolSelectionMiddleware(ToolSelectionSettings(max_tools=2))
+    graph: Any = create_agent(model=model, tools=_catalog(calls), middleware=[middleware])
+
+    with usage_scope() as usage:
+        state = await graph.ainvoke({"messages": [{"role": "user", "content": "デプロイの状態"}]})
+
+    assert state["messages"][-1].content == "稼働中です"
+    assert calls == ["deploy_status"]
+    assert len(model.bound) == 2
+    for bound in model.bound:
+        assert [t["function"]["name"] for t in bound] == ["semche_search", "deploy_status"]
+        assert "title" not in bound[0]["function"]["parameters"]["properties"]["query"]
+
+    tokens = metrics.counter("slack_agent_tool_schema_tokens_total", "")
+    full, sent = tokens.value(kind="full"), tokens.value(kind="bound")
+    assert 0 < sent < full / 4
+    assert usage.tool_schema_tokens_saved == full - sent
@@ -0,0 +1,147 @@
+"""トークン使用量・コストの集計（実行単位の集計・時間窓・日次ファイル・単価）のテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fake_models import FakeToolModel
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from slack_agent import metrics
+from slack_agent.config import DEFAULT_MODEL_PRICES, UsageSettings, _parse_prices
+from slack_agent.middleware.usage import RunUsage, UsageAccountingMiddleware, usage_scope
+from slack_agent.usage import UsageLedger, estimate_cost
+
+
+def _usage(input_tokens: int, output_tokens: int, cached: int = 0) -> Any:
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+        "input_token_details": {"cache_read": cached},
+    }
+
+
+class _Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_middleware_sums_usage_across_agent_turns() -> None:
+    """ツール呼び出しの往復を含む 1 回の実行の全 LLM 呼び出しが合算される。"""
+
+    @tool
+    def lookup(query: str) -> str:
+        """Look up a term."""
+        return f"result for {query}"
+
+    model = FakeToolModel(
+        messages=iter(
+            [
+                AIMessage(
+                    "",
+                    tool_calls=[
+                        {"name": "lookup", "args": {"query": "a"}, "id": "c1"},
+                        {"name": "lookup", "args": {"query": "b"}, "id": "c2"},
+                    ],
+                    usage_metadata=_usage(100, 20, cached=64),
+                    response_metadata={"model_name": "gpt-5-nano-2025-08-07"},
+                ),
+                AIMessage("done", usage_metadata=_usage(180, 40)),
+            ]
+        )
+    )
+    graph: Any = create_agent(model=model, tools=[lookup], middleware=[UsageAccountingMiddleware()])
+
+    with usage_scope() as usage:
+        await graph.ainvoke({"messages": [{"role": "user", "content": "hi"}]})
+
+    assert usage.as_dict() == {
+        "model": "gpt-5-nano-2025-08-07",
+        "prompt_tokens": 280,
+        "completion_tokens": 60,
+        "cached_tokens": 64,
+        "llm_turns": 2,
+        "tool_calls": 2,
+        "tool_schema_tokens_saved": 0,
+    }
+
+
+def test_cost_uses_cached_price_and_longest_prefix() -> None:
+    usage = RunUsage(
+        model="gpt-5-mini-2025-08-07", prompt_tokens=1_000_000, completion_tokens=100_000
+    )
+    usage.cached_tokens = 400_000
+
+    # 非キャッシュ 60 万 × 0.25 + キャッシュ 40 万 × 0.025 + 出力 10 万 × 2.00（USD / 1M）
+    assert estimate_cost(usage, DEFAULT_MODEL_PRICES) == pytest.approx(0.15 + 0.01 + 0.2)
+    assert estimate_cost(RunUsage(model="other", prompt_tokens=10), DEFAULT_MODEL_PRICES) == 0.0
+
+
+def test_parse_prices_overrides_and_rejects_bad_entries() -> None:
+    prices = _parse_prices("gpt-5-nano=0.1/0.01/0.8, my-model=1/0.5/2")
+    assert prices["gpt-5-nano"] == (0.1, 0.01, 0.8)
+    assert prices["my-model"] == (1.0, 0.5, 2.0)
+    assert prices["gpt-5"] == DEFAULT_MODEL_PRICES["gpt-5"]
+    with pytest.raises(RuntimeError):
+        _parse_prices("gpt-5=1/2")
+
+
+def test_windows_aggregate_by_channel_user_and_model() -> None:
+    """時間窓ごとの合計がゲージに出て、窓から外れたキーのゲージは消える。"""
+    metrics.REGISTRY.reset()
+    clock = _Clock(1_700_000_000.0)
+    ledger = UsageLedger(UsageSettings(windows_minutes=(5, 60)), clock=clock)
+    ledger.record(RunUsage(model="gpt-5-nano", prompt_tokens=100, completion_tokens=10), "C1", "U1")
+    clock.now += 10 * 60
+    ledger.record(RunUsage(model="gpt-5-nano", prompt_tokens=50, completion_tokens=5), "C1", "U2")
+
+    short, long = ledger.window(5), ledger.window(60)
+    assert set(short["user"]) == {"U2"}
+    assert long["channel"]["C1"].requests == 2
+    assert long["channel"]["C1"].total_tokens == 165
+    assert long["model"]["gpt-5-nano"].prompt_tokens == 150
+
+    ledger.collect()
+    tokens = metrics.gauge("slack_agent_usage_window_tokens", "")
+    assert tokens.value(window="5m", dimension="channel", key="C1") == 55
+    assert tokens.value(window="60m", dimension="user", key="U1") == 110
+    assert {"window": "5m", "dimension": "user", "key": "U1"} not in tokens.label_sets()
+
+    clock.now += 60 * 60
+    ledger.collect()
+    assert tokens.label_sets() == []
+    counter = metrics.counter("slack_agent_llm_tokens_total", "")
+    assert counter.value(model="gpt-5-nano", kind="prompt") == 150
+
+
+def test_daily_rollup_is_written_and_resumed(tmp_path: Path) -> None:
+    """日次ファイルは一定間隔で書き出され、同じ日に作り直した集計は既存の値に加算を続ける。"""
+    clock = _Clock(1_700_000_000.0)
+    settings = UsageSettings(rollup_dir=str(tmp_path), flush_interval_seconds=60.0)
+    ledger = UsageLedger(settings, clock=clock)
+    ledger.record(RunUsage(model="gpt-5", prompt_tokens=1000, completion_tokens=100), "C1", "U1")
+    assert list(tmp_path.iterdir()) == []  # 間隔内はまだ書かない
+
+    assert ledger.flush()
+    [path] = list(tmp_path.glob("usage-*.json"))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["usage"]["total"]["all"]["prompt_tokens"] == 1000
+    assert data["usage"]["channel"]["C1"]["cost_usd"] == pytest.approx((1250 + 1000) / 1e6)
+
+    restarted = UsageLedger(settings, clock=clock)
+    clock.now += 61
+    restarted.record(RunUsage(model="gpt-5", prompt_tokens=10, completion_tokens=1), "C2", "U1")
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["usage"]["total"]["all"]["requests"] == 2
+    assert data["usage"]["user"]["U1"]["prompt_tokens"] == 1010
+    assert set(data["usage"]["channel"]) == {"C1", "C2"}
@@ -0,0 +1,162 @@
+"""1 プロセスで複数ワークスペースを受け持つ構成のテスト。"""
+
+from __future__ import annotations
+
+import json
+import types
+from pathlib import Path
+from typing import Any
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+import slack_agent.agent as agent_mod
+import slack_agent.handlers.message as message_handler
+from slack_agent import metrics
+from slack_agent.checkpoint import ThreadCheckpoints, thread_id_for
+from slack_agent.config import (
+    AdmissionSettings,
+    CheckpointSettings,
+    SlackSettings,
+    UsageSettings,
+    WorkspaceSettings,
+)
+from slack_agent.memory import MEMORY
+from slack_agent.middleware.usage import RunUsage
+from slack_agent.usage import UsageLedger
+
+
+def _write(tmp_path: Path, data: Any) -> str:
+    path = tmp_path / "workspaces.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def test_workspaces_file_reads_tokens_from_env(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("ACME_BOT", "xoxb-acme")
+    monkeypatch.setenv("ACME_APP", "xapp-acme")
+    path = _write(
+        tmp_path,
+        {
+            "workspaces": {
+                "acme": {
+                    "bot_token_env": "ACME_BOT",
+                    "app_token_env": "ACME_APP",
+                    "max_inflight": 2,
+                },
+                "beta": {"bot_token": "xoxb-beta", "app_token": "xapp-beta", "max_queue": 0},
+            }
+        },
+    )
+    monkeypatch.setenv("SLACK_WORKSPACES_FILE", path)
+
+    acme, beta = SlackSettings.workspaces_from_env()
+    assert (acme.name, acme.bot_token, acme.app_token, acme.max_inflight) == (
+        "acme",
+        "xoxb-acme",
+        "xapp-acme",
+        2,
+    )
+    assert beta.max_inflight is None and beta.max_queue == 0
+
+    base = AdmissionSettings(max_inflight=8, reserved_slots=2, max_queue=16)
+    assert acme.admission(base) == AdmissionSettings(max_inflight=2, reserved_slots=1, max_queue=16)
+    assert beta.admission(base) == AdmissionSettings(max_inflight=8, reserved_slots=2, max_queue=0)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"workspaces": {}},
+        {"workspaces": {"bad name": {"bot_token": "b", "app_token": "a"}}},
+        {"workspaces": {"acme": {"bot_token_env": "MISSING_BOT", "app_token": "a"}}},
+        {
+            "workspaces": {
+                "acme": {"bot_token": "b1", "app_token": "a"},
+                "beta": {"bot_token": "b2", "app_token": "a"},
+            }
+        },
+    ],
+)
+def test_invalid_workspaces_file_raises(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, data: Any
+) -> None:
+    monkeypatch.delenv("MISSING_BOT", raising=False)
+    monkeypatch.setenv("SLACK_WORKSPACES_FILE", _write(tmp_path, data))
+    with pytest.raises(RuntimeError):
+        SlackSettings.workspaces_from_env()
+
+
+def test_default_workspace_comes_from_single_tokens(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SLACK_WORKSPACES_FILE", "")
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-one")
+    monkeypatch.setenv("SLACK_APP_TOKEN", "xapp-one")
+    assert SlackSettings.workspaces_from_env() == (
+        WorkspaceSettings("default", "xoxb-one", "xapp-one"),
+    )
+
+
+def test_thread_state_is_isolated_per_workspace() -> None:
+    assert thread_id_for("C1", "1.0") == "C1:1.0"
+    assert thread_id_for("C1", "1.0", workspace="default") == "C1:1.0"
+    assert thread_id_for("C1", "1.0", workspace="acme") == "acme:C1:1.0"
+
+
+@pytest.mark.asyncio
+async def test_has_thread_state_uses_workspace_thread_id(monkeypatch: pytest.MonkeyPatch) -> None:
+    checkpoints = ThreadCheckpoints(InMemorySaver(), CheckpointSettings())
+    monkeypatch.setattr(agent_mod, "_thread_checkpoints", checkpoints)
+    await checkpoints.begin("acme:C1:1.0")
+    await checkpoints.end("acme:C1:1.0", message_count=2)
+
+    assert await agent_mod.has_thread_state(("C1", "1.0"), workspace="acme") is True
+    assert await agent_mod.has_thread_state(("C1", "1.0"), workspace="beta") is False
+    assert await agent_mod.has_thread_state(("C1", "1.0")) is False
+
+
+def test_usage_is_aggregated_by_workspace() -> None:
+    metrics.REGISTRY.reset()
+    ledger = UsageLedger(UsageSettings(windows_minutes=(60,)))
+    ledger.record(RunUsage(model="m", prompt_tokens=10), "C1", "U1", "acme")
+    ledger.record(RunUsage(model="m", prompt_tokens=5), "C1", "U1")
+
+    window = ledger.window(60)["workspace"]
+    assert window["acme"].prompt_tokens == 10
+    assert window["default"].prompt_tokens == 5
+
+
+def test_handlers_are_isolated_per_workspace(monkeypatch: pytest.MonkeyPatch) -> None:
+    metrics.REGISTRY.reset()
+    calls: list[tuple[str, dict[str, Any]]] = []
+
+    async def _fake_invoke(question: str, **kwargs: Any) -> str:
+        calls.append((question, kwargs))
+        return "ok"
+
+    monkeypatch.setattr(message_handler, "invoke_agent", _fake_invoke)
+
+    handlers: dict[str, Any] = {}
+    for name in ("acme", "beta"):
+        client = types.SimpleNamespace(
+            reactions_add=lambda **_k: None,
+            conversations_replies=lambda **_k: {"messages": []},
+        )
+        app = types.SimpleNamespace(
+            client=client,
+            event=lambda _name, name=name: lambda f: handlers.setdefault(name, f),
+        )
+        message_handler.register(
+            app,  # type: ignore[arg-type]
+            WorkspaceSettings(name, f"xoxb-{name}", f"xapp-{name}", max_inflight=1),
+        )
+
+    event = {"text": "<@UBOT> hi", "channel": "C1", "ts": "1.0", "user": "U1"}
+    handlers["acme"](event=event, say=lambda *_a, **_k: None)
+
+    assert calls[0][1]["workspace"] == "acme"
+    mentions = metrics.counter("slack_agent_workspace_mentions_total", "")
+    assert mentions.value(workspace="acme", outcome="answered") == 1
+    assert mentions.value(workspace="beta", outcome="answered") == 0
+    assert {"directory:acme", "directory:beta", "outbound:acme"} <= set(MEMORY.subsystems())